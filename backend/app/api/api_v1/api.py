@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.api_v1.endpoints import auth, users, projects, documents, ai
+from app.api.api_v1.endpoints import auth, users, projects, documents, ai, jobs
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
@@ -8,3 +8,4 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(projects.router, prefix="/projects", tags=["projects"])
 api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
 api_router.include_router(ai.router, prefix="/ai", tags=["ai"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
@@ -1,13 +1,21 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import tempfile
 import os
 
 from app import models, schemas
-from app.database import get_db
+from app.core.config import settings
+from app.database import AsyncSessionLocal, get_db
 from app.core.security import get_current_active_user
 from app.services.ai_service import AIService
+from app.services.generation_stream import relay_generation
+from app.services.job_queue import job_queue
+from app.services.llm_cache import CacheMode
+from app.services.llm_gateway import cancel_on_disconnect, llm_gateway
+from app.services.llm_scheduler import BATCH, llm_request_context, stream_in_context
+from app.services.model_registry import model_registry
 
 router = APIRouter()
 ai_service = AIService()
@@ -19,10 +27,12 @@ class DocumentType(str):
 
 @router.post("/generate-document")
 async def generate_document(
+    request: Request,
     document_type: str,
     project_id: int,
     code_files: List[UploadFile] = File(...),
     project_description: Optional[str] = None,
+    cache: CacheMode = "default",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
@@ -34,6 +44,7 @@ async def generate_document(
         project_id: ID of the project this document belongs to
         code_files: List of code files to analyze
         project_description: Optional project description
+        cache: 'bypass' to skip the response cache and force a fresh generation
         
     Returns:
         Generated document with analysis and suggestions
@@ -74,13 +85,15 @@ async def generate_document(
             for doc in existing_docs
         ]
         
-        # Generate document using AI service
-        result = await ai_service.generate_document(
-            document_type=document_type,
-            code_snippets=code_snippets,
-            project_description=project_description or "",
-            existing_docs=existing_docs_content
-        )
+        # Generate document using AI service, abandoning the LLM call if the client goes away
+        with llm_request_context(tenant=str(current_user.id), priority=BATCH):
+            result = await cancel_on_disconnect(request, ai_service.generate_document(
+                document_type=document_type,
+                code_snippets=code_snippets,
+                project_description=project_description or "",
+                existing_docs=existing_docs_content,
+                use_cache=cache != "bypass"
+            ))
         
         # Save the generated document
         db_document = models.Document(
@@ -121,6 +134,237 @@ async def generate_document(
                 except:
                     pass
 
+@router.post("/generate-document/stream")
+async def generate_document_stream(
+    document_type: str,
+    project_id: int,
+    code_files: List[UploadFile] = File(...),
+    project_description: Optional[str] = None,
+    document_id: Optional[str] = None,
+    cache: CacheMode = "default",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Generate a document (SRS/SDS) and stream it as Server-Sent Events.
+    
+    Emits one ``chunk`` event per text delta while the model writes, then
+    ``complete`` once the document has been saved and analyzed (or ``error``).
+    
+    Args:
+        document_type: Type of document to generate ('srs' or 'sds')
+        project_id: ID of the project this document belongs to
+        code_files: List of code files to analyze
+        project_description: Optional project description
+        document_id: Document of the project to write the result into; its
+            WebSocket viewers receive ``generation_chunk`` messages
+        cache: 'bypass' to skip the response cache and force a fresh generation
+        
+    Returns:
+        ``text/event-stream`` response
+    """
+    db_project = (
+        db.query(models.Project)
+        .filter(
+            models.Project.id == project_id,
+            models.Project.owner_id == current_user.id
+        )
+        .first()
+    )
+    if not db_project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    # Only the caller's own documents in this project can be streamed into
+    target_document = None
+    if document_id is not None:
+        target_document = (
+            db.query(models.Document)
+            .filter(
+                models.Document.id == document_id,
+                models.Document.project_id == project_id,
+                models.Document.author_id == current_user.id
+            )
+            .first()
+        )
+        if not target_document:
+            raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Read code from uploaded files before the response starts streaming
+    code_snippets = []
+    for file in code_files:
+        if file.filename.endswith(('.py', '.js', '.ts', '.java', '.c', '.cpp', '.go', '.rs')):
+            content = await file.read()
+            code_snippets.append(f"File: {file.filename}\n```\n{content.decode()}\n```")
+    
+    if not code_snippets:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid code files provided. Supported formats: .py, .js, .ts, .java, .c, .cpp, .go, .rs"
+        )
+    
+    existing_docs = db.query(models.Document).filter(
+        models.Document.project_id == project_id
+    ).all()
+    existing_docs_content = [
+        f"{doc.title} ({doc.document_type}):\n{doc.content}"
+        for doc in existing_docs
+    ]
+    
+    async def save(content: str) -> dict:
+        review = ai_service.review_generated_document(content, document_type)
+        metadata = {
+            "generated": True,
+            "analysis": review["analysis"],
+            "suggestions": review["suggestions"]
+        }
+        if target_document is not None:
+            # Viewers watched it stream into this document, so it is stored there
+            db_document = target_document
+            db_document.content = content
+            db_document.document_type = document_type
+            db_document.metadata_ = metadata
+        else:
+            db_document = models.Document(
+                title=f"{document_type.upper()} - {db_project.name}",
+                content=content,
+                document_type=document_type,
+                project_id=project_id,
+                author_id=current_user.id,
+                metadata_=metadata
+            )
+        try:
+            db.add(db_document)
+            db.commit()
+            db.refresh(db_document)
+        except Exception:
+            db.rollback()
+            raise
+        return {"document_id": db_document.id, **review}
+    
+    chunks = ai_service.stream_document(
+        document_type=document_type,
+        code_snippets=code_snippets,
+        project_description=project_description or "",
+        existing_docs=existing_docs_content,
+        use_cache=cache != "bypass"
+    )
+    chunks = stream_in_context(chunks, tenant=str(current_user.id), priority=BATCH)
+    return StreamingResponse(
+        relay_generation(chunks, save, document_id=document_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/generate-document/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_generate_document_job(
+    document_type: str,
+    project_id: int,
+    code_files: List[UploadFile] = File(...),
+    project_description: Optional[str] = None,
+    cache: CacheMode = "default",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Queue document generation as a background job.
+    
+    The job is stored durably before this returns, so it is not lost if the
+    client or a load balancer gives up on a long generation. Poll
+    ``/jobs/{job_id}`` or listen on the ``job:{job_id}`` WebSocket channel
+    for the ``job_update`` message sent on completion.
+    
+    Args:
+        document_type: Type of document to generate ('srs' or 'sds')
+        project_id: ID of the project this document belongs to
+        code_files: List of code files to analyze
+        project_description: Optional project description
+        cache: 'bypass' to skip the response cache and force a fresh generation
+        
+    Returns:
+        Job id, status and the URL to poll
+    """
+    db_project = (
+        db.query(models.Project)
+        .filter(
+            models.Project.id == project_id,
+            models.Project.owner_id == current_user.id
+        )
+        .first()
+    )
+    if not db_project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    code_snippets = []
+    for file in code_files:
+        if file.filename.endswith(('.py', '.js', '.ts', '.java', '.c', '.cpp', '.go', '.rs')):
+            content = await file.read()
+            code_snippets.append(f"File: {file.filename}\n```\n{content.decode()}\n```")
+    
+    if not code_snippets:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid code files provided. Supported formats: .py, .js, .ts, .java, .c, .cpp, .go, .rs"
+        )
+    
+    existing_docs = db.query(models.Document).filter(
+        models.Document.project_id == project_id
+    ).all()
+    
+    job = await job_queue.submit(
+        "generate_document",
+        {
+            "document_type": document_type,
+            "project_id": project_id,
+            "project_name": db_project.name,
+            "author_id": current_user.id,
+            "code_snippets": code_snippets,
+            "project_description": project_description or "",
+            "existing_docs": [f"{doc.title} ({doc.document_type}):\n{doc.content}" for doc in existing_docs],
+            "use_cache": cache != "bypass"
+        },
+        owner=str(current_user.id)
+    )
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"{settings.API_V1_STR}/jobs/{job['id']}"
+    }
+
+@job_queue.register("generate_document")
+async def run_generate_document_job(payload: dict) -> dict:
+    """Background job: generate a document and save it to the project."""
+    with llm_request_context(tenant=str(payload["author_id"]), priority=BATCH):
+        result = await ai_service.generate_document(
+            document_type=payload["document_type"],
+            code_snippets=payload["code_snippets"],
+            project_description=payload["project_description"],
+            existing_docs=payload["existing_docs"],
+            use_cache=payload.get("use_cache", True)
+        )
+    
+    async with AsyncSessionLocal() as db:
+        db_document = models.Document(
+            title=f"{payload['document_type'].upper()} - {payload['project_name']}",
+            content=result["document"],
+            document_type=payload["document_type"],
+            project_id=payload["project_id"],
+            author_id=payload["author_id"],
+            metadata_={
+                "generated": True,
+                "analysis": result.get("analysis", {}),
+                "suggestions": result.get("suggestions", [])
+            }
+        )
+        db.add(db_document)
+        await db.commit()
+        await db.refresh(db_document)
+    
+    return {
+        "document_id": db_document.id,
+        "analysis": result.get("analysis", {}),
+        "suggestions": result.get("suggestions", [])
+    }
+
 @router.post("/analyze-code-docs")
 async def analyze_code_documentation(
     code: str,
@@ -231,3 +475,23 @@ async def suggest_improvements(
             status_code=500,
             detail=f"Failed to generate suggestions: {str(e)}"
         )
+
+
+@router.get("/metrics")
+async def get_ai_metrics(
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Report runtime metrics for the AI services.
+    
+    Returns:
+        Embedding cache counters, loaded models and LLM gateway counters
+        (including response cache hit rate) and map-reduce summary reuse
+    """
+    return {
+        "embedding_cache": ai_service.embedding_cache.get_stats(),
+        "models": model_registry.get_stats(),
+        "llm": llm_gateway.get_stats(),
+        "map_reduce": ai_service.map_reduce.get_stats(),
+        "jobs": job_queue.get_stats()
+    }
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app import models
+from app.core.security import get_current_active_user
+from app.services.job_queue import job_queue
+
+router = APIRouter()
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Get the status of a background job.
+    
+    Args:
+        job_id: ID returned when the job was submitted
+        
+    Returns:
+        Job status (queued, running, done or failed) with its result or error
+    """
+    job = await job_queue.get(job_id)
+    # Jobs of other users are reported as missing rather than forbidden
+    if not job or (job["owner"] is not None and job["owner"] != str(current_user.id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.public_view(job)
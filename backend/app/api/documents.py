@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 import logging
 
 from ..services.openai_service import OpenAIService, DocumentGenerationRequest, document_type
+from ..services.llm_gateway import cancel_on_disconnect
+from ..services.llm_cache import CacheMode
+from ..services.llm_scheduler import BATCH, llm_request_context
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -17,7 +20,7 @@ class DocumentRequest(BaseModel):
     additional_context: Optional[str] = None
 
 @router.post("/generate")
-async def generate_document(request: DocumentRequest):
+async def generate_document(request: DocumentRequest, http_request: Request, cache: CacheMode = "default"):
     """
     Generate SRS or SDS document based on project information and code snippets.
     
@@ -26,6 +29,7 @@ async def generate_document(request: DocumentRequest):
     - **code_snippets**: List of code snippets with language and optional file path
     - **document_type**: Type of document to generate ('srs' or 'sds')
     - **additional_context**: Any additional context or requirements
+    - **cache**: `bypass` to skip the response cache and force a fresh generation
     """
     try:
         # Initialize OpenAI service
@@ -40,7 +44,10 @@ async def generate_document(request: DocumentRequest):
         )
         
         # Generate the document
-        document = await openai_service.generate_document(doc_request)
+        with llm_request_context(tenant=request.project_id, priority=BATCH):
+            document = await cancel_on_disconnect(http_request, openai_service.generate_document(
+                doc_request, use_cache=cache != "bypass"
+            ))
         
         # In a real application, you would save this to a database
         # For now, we'll just return it in the response
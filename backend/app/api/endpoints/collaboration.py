@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 import json
+import logging
 
 from app.database import get_db
 from app.models import Document, DocumentVersion, DocumentComment, User
 from app.services.websocket_manager import websocket_manager
+from app.services.version_store import add_document_version, get_version_range
 from app.core.security import get_current_user
 from app.schemas.document_schemas import (
     DocumentCreate, DocumentVersionCreate, DocumentCommentCreate,
@@ -15,6 +18,19 @@ from app.schemas.document_schemas import (
 
 router = APIRouter()
 
+def _version_response(version: DocumentVersion, content: str) -> DocumentVersionResponse:
+    # Content is not a column any more: it is rebuilt from snapshots and deltas
+    return DocumentVersionResponse(
+        id=version.id,
+        document_id=version.document_id,
+        version_number=version.version_number,
+        author_id=version.author_id,
+        created_at=version.created_at,
+        message=version.message,
+        change_summary=version.change_summary,
+        content=content
+    )
+
 # WebSocket endpoint for real-time collaboration
 @router.websocket("/ws/documents/{document_id}")
 async def websocket_endpoint(
@@ -22,6 +38,7 @@ async def websocket_endpoint(
     document_id: str,
     user_id: str = None,
     token: str = None,
+    version: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -30,6 +47,9 @@ async def websocket_endpoint(
     Query Parameters:
         user_id: ID of the current user (optional, for anonymous users)
         token: Authentication token (for future use)
+        version: Revision a reconnecting client already has; it then gets a
+            ``catch_up`` message with only the operations after it instead of
+            the full ``document_state``
     """
     # Verify document exists
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -42,6 +62,9 @@ async def websocket_endpoint(
     logger = logging.getLogger(__name__)
     
     try:
+        # Load the document first so the state sent below follows the connect without a gap
+        await websocket_manager.open_document(document_id)
+        
         # Connect the WebSocket
         user_id = await websocket_manager.connect(websocket, document_id, user_id)
         logger.info(f"User {user_id} connected to document {document_id}")
@@ -57,12 +80,10 @@ async def websocket_endpoint(
             exclude={websocket}
         )
         
-        # Send the current document state
-        await websocket.send_json({
-            "type": "document_state",
-            "document_id": document_id,
-            "content": document.content,
-            "version": document.version,
+        # Send the server copy of the document, or just the operations the client missed
+        state = await websocket_manager.document_state(document_id, version)
+        await websocket_manager.send(websocket, {
+            **state,
             "last_modified": document.updated_at.isoformat() if document.updated_at else None,
             "connected_users": websocket_manager.get_connected_users(document_id)
         })
@@ -148,22 +169,16 @@ def create_document_version(
     if current_user.id not in [c.id for c in document.collaborators]:
         raise HTTPException(status_code=403, detail="Not authorized to edit this document")
     
-    # Get the next version number
-    last_version = db.query(DocumentVersion)\
-        .filter(DocumentVersion.document_id == document_id)\
-        .order_by(DocumentVersion.version_number.desc())\
-        .first()
-    
-    version_number = 1 if not last_version else last_version.version_number + 1
-    
-    db_version = DocumentVersion(
-        **version.dict(exclude_unset=True),
-        document_id=document_id,
-        version_number=version_number,
-        author_id=current_user.id
+    # Stored as a snapshot or a delta against the previous version
+    db_version = add_document_version(
+        db,
+        document_id,
+        version.content,
+        current_user.id,
+        message=version.message,
+        change_summary=version.change_summary
     )
-    
-    db.add(db_version)
+    version_number = db_version.version_number
     db.commit()
     db.refresh(db_version)
     
@@ -180,7 +195,7 @@ def create_document_version(
         }
     )
     
-    return db_version
+    return _version_response(db_version, version.content)
 
 @router.get("/documents/{document_id}/versions", response_model=List[DocumentVersionResponse])
 def list_document_versions(
@@ -204,8 +219,11 @@ def list_document_versions(
         .offset(skip)\
         .limit(limit)\
         .all()
+    if not versions:
+        return []
     
-    return versions
+    contents = get_version_range(db, document_id, versions[-1].version_number, versions[0].version_number)
+    return [_version_response(v, contents[v.version_number]) for v in versions]
 
 # Comment endpoints
 @router.post("/versions/{version_id}/comments", response_model=DocumentCommentResponse)
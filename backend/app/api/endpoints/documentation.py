@@ -1,79 +1,202 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Any
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Dict, Any, AsyncIterator, Optional
 import tempfile
+import asyncio
+import shutil
+import json
 import os
 from pathlib import Path
-from app.services.document_service import DocumentService
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.models import Project
+from app.core.security import get_current_user_id
+from app.services.batch_analysis import (
+    BatchAnalysisError,
+    batch_analyzer,
+    extract_archive,
+    resolve_allowed_directory
+)
+from app.services.document_service import DocumentService, DocumentTooLargeError
 from app.services.grammar_service import GrammarService
+from app.services.llm_gateway import cancel_on_disconnect
+from app.services.llm_scheduler import BATCH, INTERACTIVE, llm_request_context, stream_in_context
 from app.core.config import settings
 
 router = APIRouter()
 document_service = DocumentService()
 grammar_service = GrammarService()
 
+async def _iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    """Yield an uploaded file in chunks instead of reading it whole."""
+    while chunk := await file.read(settings.DOCUMENT_UPLOAD_CHUNK_BYTES):
+        yield chunk
+
 @router.post("/document/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(request: Request, file: UploadFile = File(...)):
     """
     Upload and process a document for documentation generation.
     """
+    file_extension = Path(file.filename).suffix.lower()
+    if file_extension not in document_service.supported_formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file format. Supported formats: {', '.join(document_service.supported_formats)}"
+        )
+    # Reject before reading anything when the client declares the size up front
+    if file.size is not None and file.size > settings.DOCUMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Document is larger than {settings.DOCUMENT_MAX_BYTES} bytes")
+
     try:
-        # Save the uploaded file temporarily
-        file_extension = Path(file.filename).suffix.lower()
-        if file_extension not in document_service.supported_formats:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file format. Supported formats: {', '.join(document_service.supported_formats)}"
+        # The upload is decoded as it is read; nothing is copied to a temporary file
+        # Anonymous callers get their fair share of the LLM by client address
+        with llm_request_context(tenant=request.client.host if request.client else None, priority=INTERACTIVE):
+            result = await cancel_on_disconnect(
+                request,
+                document_service.process_source(_iter_upload(file), file.filename)
             )
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        try:
-            # Process the document
-            result = await document_service.process_document(temp_file_path)
-            return JSONResponse(content={"status": "success", "data": result})
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-
+        return JSONResponse(content={"status": "success", "data": result})
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/document/analyze")
-async def analyze_code(code: str, language: str = "python"):
+async def analyze_code(request: Request, code: str, language: str = "python"):
     """
     Analyze and document a code snippet.
     """
+    # The extension selects the analyzer for the snippet
+    extension_map = {
+        "python": ".py",
+        "javascript": ".js",
+        "typescript": ".ts",
+        "html": ".html",
+        "css": ".css"
+    }
+    
+    extension = extension_map.get(language.lower(), ".txt")
+    
     try:
-        # For code snippets, we'll create a temporary file with the appropriate extension
-        extension_map = {
-            "python": ".py",
-            "javascript": ".js",
-            "typescript": ".ts",
-            "html": ".html",
-            "css": ".css"
-        }
-        
-        extension = extension_map.get(language.lower(), ".txt")
-        
-        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as temp_file:
-            temp_file.write(code.encode('utf-8'))
-            temp_file_path = temp_file.name
-
-        try:
-            result = await document_service.process_document(temp_file_path)
-            return {"status": "success", "data": result}
-        finally:
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-                
+        with llm_request_context(tenant=request.client.host if request.client else None, priority=INTERACTIVE):
+            result = await cancel_on_disconnect(
+                request,
+                document_service.process_source(code, f"snippet{extension}")
+            )
+        return {"status": "success", "data": result}
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ndjson(records: AsyncIterator[Dict[str, Any]], cleanup_dir: Optional[str] = None) -> AsyncIterator[str]:
+    """Encode analysis records as newline-delimited JSON, removing ``cleanup_dir`` afterwards."""
+    try:
+        async for record in records:
+            yield json.dumps(record, default=str) + "\n"
+    finally:
+        if cleanup_dir:
+            await asyncio.to_thread(shutil.rmtree, cleanup_dir, True)
+
+async def _document_file(content: str, file_extension: str, code_structure: Dict, previous: Optional[str]) -> str:
+    documentation = await document_service._generate_documentation(
+        content=content,
+        file_extension=file_extension,
+        code_structure=code_structure,
+        previous_version=previous
+    )
+    # Failures are returned as text; raising keeps them out of the project manifest
+    if documentation.startswith("Error generating documentation"):
+        raise RuntimeError(documentation)
+    return documentation
+
+@router.post("/document/batch")
+async def analyze_repository(
+    file: Optional[UploadFile] = File(None),
+    path: Optional[str] = Form(None),
+    project_id: Optional[str] = Form(None),
+    generate_documentation: bool = Form(False),
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Analyze a whole repository, uploaded as a zip/tar archive or given as a server-side directory.
+
+    Files matched by .gitignore and dependency directories (node_modules,
+    vendor, ...) are skipped. Results are streamed as NDJSON: one ``file``,
+    ``error`` or ``skipped`` record per file as soon as it is analyzed, then
+    a ``summary`` record with project-wide documentation coverage.
+
+    With the ``project_id`` of a project the caller owns, results are kept in
+    the project's manifest and a resubmission only re-analyzes added or
+    modified files; entries of deleted files are dropped and reported as
+    ``deleted`` records. With
+    ``generate_documentation``, the LLM documents each added or modified
+    file and unchanged files get their stored documentation back.
+    """
+    if (file is None) == (path is None):
+        raise HTTPException(status_code=400, detail="Provide either an archive file or a directory path")
+    if project_id is not None:
+        # The manifest is keyed by project: only its owner may replace it
+        projects = Project.__table__
+        owned = await db.execute(
+            select(projects.c.id).where(projects.c.id == project_id, projects.c.owner_id == user_id)
+        )
+        if owned.first() is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+    documenter = _document_file if generate_documentation else None
+    tenant = user_id
+
+    def analyze(root: str) -> AsyncIterator[Dict[str, Any]]:
+        records = batch_analyzer.analyze_directory(root, project_id=project_id, documenter=documenter)
+        return stream_in_context(records, tenant=tenant, priority=BATCH)
+
+    if path is not None:
+        try:
+            root = resolve_allowed_directory(path, settings.batch_analysis_allowed_roots)
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return StreamingResponse(_ndjson(analyze(root)), media_type="application/x-ndjson")
+
+    workdir = tempfile.mkdtemp(prefix="inkwell-batch-")
+    try:
+        archive_path = os.path.join(workdir, "upload")
+        received = 0
+        with open(archive_path, "wb") as archive:
+            while chunk := await file.read(1024 * 1024):
+                received += len(chunk)
+                if received > settings.BATCH_ANALYSIS_MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Archive is larger than {settings.BATCH_ANALYSIS_MAX_UPLOAD_BYTES} bytes"
+                    )
+                # Disk writes go to a thread so a slow disk does not stall the event loop
+                await asyncio.to_thread(archive.write, chunk)
+
+        root = os.path.join(workdir, "tree")
+        os.mkdir(root)
+        await asyncio.to_thread(extract_archive, archive_path, root, settings.BATCH_ANALYSIS_MAX_EXTRACTED_BYTES)
+        await asyncio.to_thread(os.unlink, archive_path)
+    except BatchAnalysisError as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+    return StreamingResponse(
+        _ndjson(analyze(root), cleanup_dir=workdir),
+        media_type="application/x-ndjson"
+    )
+
 @router.post("/documentation/check-grammar")
 async def check_grammar(
     text: str = Body(..., embed=True, description="Text to check for grammar and style issues")
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from uuid import uuid4
 
+from app.services.semantic_search import semantic_search_service
+from app.services.text_index import text_search_service
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # In-memory storage (replace with database in production)
 project_inputs_db = {}
+# project_id -> kind -> item_id -> item, for resolving search hits
+project_items_db: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+SEARCHABLE_KINDS = ("code_snippets", "comments", "user_prompts")
 
 class CodeSnippet(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
@@ -40,12 +50,52 @@ class ProjectInput(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+def _searchable_text(kind: str, item: Any) -> str:
+    if kind == "code_snippets" and item.file_path:
+        return f"{item.file_path}\n{item.content}"
+    return item.content
+
+def _index_items(
+    background_tasks: BackgroundTasks,
+    project_id: str,
+    kind: str,
+    items: List[Any]
+) -> None:
+    """
+    Register items for lookup and add them to the project's search indexes.
+
+    The keyword index is cheap and updated inline; embedding runs as a
+    background task so model loading never sits on the request path.
+    """
+    lookup = project_items_db.setdefault(project_id, {}).setdefault(kind, {})
+    for item in items:
+        lookup[item.id] = item
+    indexed = [(kind, item.id, _searchable_text(kind, item)) for item in items]
+    try:
+        text_search_service.index_items(project_id, indexed)
+    except Exception:
+        logger.exception("Full-text indexing failed for project %s", project_id)
+    if indexed:
+        background_tasks.add_task(_index_semantic, project_id, indexed)
+
+async def _index_semantic(project_id: str, indexed: List[Any]) -> None:
+    try:
+        await run_in_threadpool(semantic_search_service.index_items, project_id, indexed)
+    except Exception:
+        logger.exception("Semantic indexing failed for project %s", project_id)
+
 @router.post("/projects/{project_id}/inputs")
-async def create_project_input(project_id: str, project_input: ProjectInput):
+async def create_project_input(
+    project_id: str,
+    project_input: ProjectInput,
+    background_tasks: BackgroundTasks
+):
     if project_id in project_inputs_db:
         raise HTTPException(status_code=400, detail="Project input already exists")
     
     project_inputs_db[project_id] = project_input
+    for kind in SEARCHABLE_KINDS:
+        _index_items(background_tasks, project_id, kind, getattr(project_input, kind))
     return {"message": "Project input created successfully", "project_id": project_id}
 
 @router.get("/projects/{project_id}/inputs")
@@ -55,54 +105,87 @@ async def get_project_inputs(project_id: str):
     return project_inputs_db[project_id]
 
 @router.post("/projects/{project_id}/code")
-async def add_code_snippet(project_id: str, code_snippet: CodeSnippet):
+async def add_code_snippet(project_id: str, code_snippet: CodeSnippet, background_tasks: BackgroundTasks):
     if project_id not in project_inputs_db:
         project_inputs_db[project_id] = ProjectInput(project_id=project_id)
     
     project_inputs_db[project_id].code_snippets.append(code_snippet)
     project_inputs_db[project_id].updated_at = datetime.utcnow()
+    _index_items(background_tasks, project_id, "code_snippets", [code_snippet])
     return {"message": "Code snippet added successfully", "snippet_id": code_snippet.id}
 
 @router.post("/projects/{project_id}/comments")
-async def add_comment(project_id: str, comment: Comment):
+async def add_comment(project_id: str, comment: Comment, background_tasks: BackgroundTasks):
     if project_id not in project_inputs_db:
         project_inputs_db[project_id] = ProjectInput(project_id=project_id)
     
     project_inputs_db[project_id].comments.append(comment)
     project_inputs_db[project_id].updated_at = datetime.utcnow()
+    _index_items(background_tasks, project_id, "comments", [comment])
     return {"message": "Comment added successfully", "comment_id": comment.id}
 
 @router.post("/projects/{project_id}/prompts")
-async def add_user_prompt(project_id: str, prompt: UserPrompt):
+async def add_user_prompt(project_id: str, prompt: UserPrompt, background_tasks: BackgroundTasks):
     if project_id not in project_inputs_db:
         project_inputs_db[project_id] = ProjectInput(project_id=project_id)
     
     project_inputs_db[project_id].user_prompts.append(prompt)
     project_inputs_db[project_id].updated_at = datetime.utcnow()
+    _index_items(background_tasks, project_id, "user_prompts", [prompt])
     return {"message": "User prompt added successfully", "prompt_id": prompt.id}
 
 @router.get("/projects/{project_id}/search")
-async def search_inputs(project_id: str, query: str):
+async def search_inputs(
+    project_id: str,
+    query: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Full-text search over a project's inputs, ranked by BM25.
+    
+    Terms are matched against code-aware tokens, so ``parse`` finds
+    ``parseTokens`` and ``parse_tokens``. Results are paginated across all
+    input kinds and grouped by kind in rank order.
+    """
+    results = {"code_snippets": [], "comments": [], "user_prompts": [], "has_more": False}
     if project_id not in project_inputs_db:
-        return {"code_snippets": [], "comments": [], "user_prompts": []}
+        return results
     
-    project = project_inputs_db[project_id]
+    page = text_search_service.search(project_id, query, offset=offset, limit=limit)
+    lookup = project_items_db.get(project_id, {})
+    for hit in page["results"]:
+        item = lookup.get(hit["kind"], {}).get(hit["id"])
+        if item is not None:
+            results[hit["kind"]].append(item)
+    results["has_more"] = page["has_more"]
+    return results
+
+@router.get("/projects/{project_id}/semantic-search")
+async def semantic_search_inputs(
+    project_id: str,
+    query: str,
+    limit: int = 10,
+    kind: Optional[List[str]] = Query(None)
+):
+    """
+    Rank a project's code snippets, comments and prompts by semantic similarity.
     
-    # Simple search implementation (replace with proper search in production)
-    results = {
-        "code_snippets": [
-            snippet for snippet in project.code_snippets 
-            if query.lower() in snippet.content.lower() or 
-               (snippet.file_path and query.lower() in snippet.file_path.lower())
-        ],
-        "comments": [
-            comment for comment in project.comments 
-            if query.lower() in comment.content.lower()
-        ],
-        "user_prompts": [
-            prompt for prompt in project.user_prompts 
-            if query.lower() in prompt.content.lower()
-        ]
-    }
+    Args:
+        query: Natural-language or code query
+        limit: Maximum number of results
+        kind: Optional filter, any of code_snippets, comments, user_prompts
+    """
+    if kind and any(k not in SEARCHABLE_KINDS for k in kind):
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(SEARCHABLE_KINDS)}")
+    if project_id not in project_inputs_db:
+        return {"results": [], "index": semantic_search_service.get_stats(project_id)}
     
-    return results
+    hits = await run_in_threadpool(semantic_search_service.search, project_id, query, limit, kind)
+    lookup = project_items_db.get(project_id, {})
+    results = [
+        {"kind": hit["kind"], "score": hit["score"], "item": lookup[hit["kind"]][hit["id"]]}
+        for hit in hits
+        if hit["id"] in lookup.get(hit["kind"], {})
+    ]
+    return {"results": results, "index": semantic_search_service.get_stats(project_id)}
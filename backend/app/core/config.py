@@ -16,6 +16,93 @@ class Settings(BaseSettings):
     
     # OpenAI
     OPENAI_API_KEY: str = Field(..., env="OPENAI_API_KEY")
+    OPENAI_BASE_URL: Optional[str] = Field(default=None, env="OPENAI_BASE_URL")  # OpenAI-compatible endpoint
+    LLM_MAX_CONCURRENCY: int = Field(default=8, env="LLM_MAX_CONCURRENCY")
+    LLM_TIMEOUT_SECONDS: float = Field(default=120.0, env="LLM_TIMEOUT_SECONDS")
+    LLM_TOKENS_PER_MINUTE: int = Field(default=0, env="LLM_TOKENS_PER_MINUTE")  # 0 = no token budget
+    LLM_INTERACTIVE_WEIGHT: float = Field(default=8.0, env="LLM_INTERACTIVE_WEIGHT")
+    LLM_BATCH_WEIGHT: float = Field(default=1.0, env="LLM_BATCH_WEIGHT")
+    LLM_CACHE_ENABLED: bool = Field(default=True, env="LLM_CACHE_ENABLED")
+    LLM_CACHE_SIZE: int = Field(default=1000, env="LLM_CACHE_SIZE")  # in-memory responses
+    LLM_CACHE_TTL_SECONDS: float = Field(default=86400.0, env="LLM_CACHE_TTL_SECONDS")
+    LLM_CACHE_PATH: Optional[str] = Field(default=None, env="LLM_CACHE_PATH")  # SQLite file for the persistent tier
+    LLM_PROMPT_TOKEN_BUDGET: int = Field(default=12000, env="LLM_PROMPT_TOKEN_BUDGET")  # larger inputs use map-reduce
+    
+    # Map-reduce generation
+    MAP_REDUCE_CHUNK_TOKENS: int = Field(default=3000, env="MAP_REDUCE_CHUNK_TOKENS")
+    MAP_REDUCE_SUMMARY_TOKENS: int = Field(default=400, env="MAP_REDUCE_SUMMARY_TOKENS")
+    MAP_REDUCE_CONCURRENCY: int = Field(default=4, env="MAP_REDUCE_CONCURRENCY")
+    MAP_REDUCE_SUMMARY_CACHE_SIZE: int = Field(default=10000, env="MAP_REDUCE_SUMMARY_CACHE_SIZE")
+    MAP_REDUCE_SUMMARY_CACHE_TTL_SECONDS: float = Field(default=30 * 86400.0, env="MAP_REDUCE_SUMMARY_CACHE_TTL_SECONDS")
+    MAP_REDUCE_SUMMARY_CACHE_PATH: Optional[str] = Field(default=None, env="MAP_REDUCE_SUMMARY_CACHE_PATH")
+    
+    # Embeddings
+    EMBEDDING_BATCH_SIZE: int = Field(default=64, env="EMBEDDING_BATCH_SIZE")
+    EMBEDDING_DEVICE: Optional[str] = Field(default=None, env="EMBEDDING_DEVICE")  # e.g. 'cpu', 'cuda'
+    EMBEDDING_CACHE_SIZE: int = Field(default=50000, env="EMBEDDING_CACHE_SIZE")  # in-memory entries
+    EMBEDDING_CACHE_DIR: Optional[str] = Field(default=None, env="EMBEDDING_CACHE_DIR")  # persistent tier
+    EMBEDDING_WARMUP: str = Field(default="off", env="EMBEDDING_WARMUP")  # off, background, blocking
+    
+    # Uploads (multipart files larger than 1 MB are spooled to disk by the server before processing)
+    DOCUMENT_MAX_BYTES: int = Field(default=5 * 1024 * 1024, env="DOCUMENT_MAX_BYTES")  # largest single document
+    DOCUMENT_UPLOAD_CHUNK_BYTES: int = Field(default=64 * 1024, env="DOCUMENT_UPLOAD_CHUNK_BYTES")
+    
+    # Code analysis cache (parsed structure and metadata by content hash)
+    ANALYSIS_CACHE_SIZE: int = Field(default=10000, env="ANALYSIS_CACHE_SIZE")  # in-memory files
+    ANALYSIS_CACHE_TTL_SECONDS: float = Field(default=30 * 86400.0, env="ANALYSIS_CACHE_TTL_SECONDS")
+    ANALYSIS_CACHE_PATH: Optional[str] = Field(default=None, env="ANALYSIS_CACHE_PATH")  # SQLite file for the persistent tier
+    
+    # Batch analysis of whole repositories (zip/tar upload or server-side directory)
+    BATCH_ANALYSIS_WORKERS: int = Field(default=0, env="BATCH_ANALYSIS_WORKERS")  # worker processes, 0 = one per core
+    BATCH_ANALYSIS_MAX_FILES: int = Field(default=20000, env="BATCH_ANALYSIS_MAX_FILES")
+    BATCH_ANALYSIS_MAX_FILE_BYTES: int = Field(default=1024 * 1024, env="BATCH_ANALYSIS_MAX_FILE_BYTES")  # larger files are skipped
+    BATCH_ANALYSIS_MAX_UPLOAD_BYTES: int = Field(default=100 * 1024 * 1024, env="BATCH_ANALYSIS_MAX_UPLOAD_BYTES")
+    BATCH_ANALYSIS_MAX_EXTRACTED_BYTES: int = Field(default=500 * 1024 * 1024, env="BATCH_ANALYSIS_MAX_EXTRACTED_BYTES")
+    BATCH_ANALYSIS_ALLOWED_ROOTS: str = Field(default="", env="BATCH_ANALYSIS_ALLOWED_ROOTS")  # comma-separated; empty disables directory analysis
+    PROJECT_MANIFEST_PATH: str = Field(default="./project_manifests.db", env="PROJECT_MANIFEST_PATH")  # per-project path -> hash -> result
+    
+    # Document version history: full snapshots every N versions, compressed deltas in between
+    VERSION_KEYFRAME_INTERVAL: int = Field(default=20, env="VERSION_KEYFRAME_INTERVAL")  # bounds deltas applied per read
+    VERSION_COMPRESSION: str = Field(default="zlib", env="VERSION_COMPRESSION")  # zlib, zstd (needs zstandard) or none
+    DIFF_CACHE_SIZE: int = Field(default=256, env="DIFF_CACHE_SIZE")  # version-pair diffs kept in memory
+    OT_HISTORY_LIMIT: int = Field(default=1000, env="OT_HISTORY_LIMIT")  # operations kept per open document for transforming late edits
+    OP_LOG_PATH: str = Field(default="./op_log.db", env="OP_LOG_PATH")  # SQLite file with applied operations and snapshots
+    OP_LOG_COMMIT_DELAY_MS: float = Field(default=0.0, env="OP_LOG_COMMIT_DELAY_MS")  # hold a group commit open for more operations
+    OP_LOG_BATCH_SIZE: int = Field(default=256, env="OP_LOG_BATCH_SIZE")  # ...unless this many are already waiting
+    OP_LOG_SNAPSHOT_EVERY: int = Field(default=500, env="OP_LOG_SNAPSHOT_EVERY")  # operations since the last snapshot before compacting
+    OP_LOG_RETAIN_OPS: int = Field(default=5000, env="OP_LOG_RETAIN_OPS")  # operations kept behind a snapshot for reconnecting clients
+    OP_LOG_COMPACT_INTERVAL_SECONDS: float = Field(default=30.0, env="OP_LOG_COMPACT_INTERVAL_SECONDS")
+    
+    # WebSocket fan-out: each connection has a bounded outbox written by its own task
+    WS_SEND_QUEUE_SIZE: int = Field(default=256, env="WS_SEND_QUEUE_SIZE")  # queued messages before drop/coalesce/disconnect
+    WS_MAX_LAG_SECONDS: float = Field(default=10.0, env="WS_MAX_LAG_SECONDS")  # disconnect clients whose oldest queued message is older
+    PRESENCE_MAX_HZ: float = Field(default=20.0, env="PRESENCE_MAX_HZ")  # presence_batch frames per second in small rooms; 0 sends each update
+    PRESENCE_MIN_HZ: float = Field(default=2.0, env="PRESENCE_MIN_HZ")
+    PRESENCE_SENDS_PER_SECOND: float = Field(default=2000.0, env="PRESENCE_SENDS_PER_SECOND")  # per-document budget the rate scales down to
+    WS_BACKPLANE: str = Field(default="memory", env="WS_BACKPLANE")  # memory (one process), unix (one host) or redis
+    WS_BACKPLANE_SOCKET_PATH: str = Field(default="./run/ws_backplane.sock", env="WS_BACKPLANE_SOCKET_PATH")
+    WS_BACKPLANE_REDIS_URL: str = Field(default="redis://localhost:6379/0", env="WS_BACKPLANE_REDIS_URL")
+    WS_BACKPLANE_CHANNEL_PREFIX: str = Field(default="inkwell:ws:", env="WS_BACKPLANE_CHANNEL_PREFIX")
+    WS_OWNER_TIMEOUT_SECONDS: float = Field(default=10.0, env="WS_OWNER_TIMEOUT_SECONDS")  # wait for a document's owning process to answer
+    WS_OWNER_LEASE_SECONDS: float = Field(default=10.0, env="WS_OWNER_LEASE_SECONDS")  # redis: documents of a dead process are taken over after this
+    
+    # Background jobs
+    JOB_QUEUE_PATH: str = Field(default="./jobs.db", env="JOB_QUEUE_PATH")  # SQLite file
+    JOB_WORKERS: int = Field(default=2, env="JOB_WORKERS")
+    JOB_POLL_INTERVAL_SECONDS: float = Field(default=1.0, env="JOB_POLL_INTERVAL_SECONDS")
+    JOB_LEASE_SECONDS: float = Field(default=60.0, env="JOB_LEASE_SECONDS")  # recover jobs of dead workers after this
+    JOB_MAX_ATTEMPTS: int = Field(default=3, env="JOB_MAX_ATTEMPTS")
+    
+    # Rate limiting of AI endpoints (token bucket per user, or per client IP when anonymous)
+    RATE_LIMIT_ENABLED: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    RATE_LIMIT_BURST: float = Field(default=30.0, env="RATE_LIMIT_BURST")  # bucket capacity in cost units
+    RATE_LIMIT_REFILL_PER_SECOND: float = Field(default=0.5, env="RATE_LIMIT_REFILL_PER_SECOND")
+    RATE_LIMIT_MAX_CONCURRENT: int = Field(default=4, env="RATE_LIMIT_MAX_CONCURRENT")  # in-flight requests per key
+    RATE_LIMIT_BACKEND: str = Field(default="memory", env="RATE_LIMIT_BACKEND")  # memory, sqlite
+    RATE_LIMIT_PATH: str = Field(default="./rate_limits.db", env="RATE_LIMIT_PATH")  # shared SQLite file
+    
+    # Search
+    SEMANTIC_INDEX_IVF_THRESHOLD: int = Field(default=20000, env="SEMANTIC_INDEX_IVF_THRESHOLD")
     
     # CORS (comma-separated list of origins)
     BACKEND_CORS_ORIGINS: str = Field(
@@ -23,6 +110,11 @@ class Settings(BaseSettings):
         env="BACKEND_CORS_ORIGINS"
     )
     
+    @property
+    def batch_analysis_allowed_roots(self) -> list[str]:
+        """Parse the allowed batch analysis directories into a list."""
+        return [root.strip() for root in self.BATCH_ANALYSIS_ALLOWED_ROOTS.split(",") if root.strip()]
+    
     @property
     def cors_origins_list(self) -> list[str]:
         """Parse the CORS origins string into a list."""
@@ -0,0 +1,265 @@
+import re
+import json
+import math
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.security import get_token_subject
+
+logger = logging.getLogger(__name__)
+
+# (method, path pattern, cost) of rate-limited routes; the first match wins.
+# Patterns match the end of the path so they apply wherever a router is mounted.
+DEFAULT_ROUTE_COSTS: List[Tuple[str, str, float]] = [
+    ("POST", r"/generate(-document)?(/stream|/jobs)?$", 10.0),
+    ("POST", r"/document/upload$", 5.0),
+    ("POST", r"/document/batch$", 20.0),
+    ("POST", r"/document/analyze$", 2.0),
+    ("POST", r"/documentation/check-grammar$", 1.0),
+    ("POST", r"/(analyze-code-docs|analyze-document-quality|suggest-improvements)$", 1.0),
+]
+
+def _take_tokens(
+    tokens: float,
+    updated_at: float,
+    now: float,
+    cost: float,
+    capacity: float,
+    refill_per_second: float
+) -> Tuple[float, float]:
+    """
+    Refill a bucket and try to take ``cost`` from it.
+
+    Returns:
+        The new token count and 0, or the unchanged count and the seconds
+        until ``cost`` tokens will be available
+    """
+    tokens = min(capacity, tokens + max(now - updated_at, 0.0) * refill_per_second)
+    cost = min(cost, capacity)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    if refill_per_second <= 0:
+        return tokens, math.inf
+    return tokens, (cost - tokens) / refill_per_second
+
+class RateLimitBackend:
+    """
+    Storage for token buckets.
+
+    The default backend keeps buckets in process memory; subclass this to
+    share limits between the worker processes of a deployment.
+    """
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float) -> float:
+        """
+        Try to take ``cost`` tokens from the bucket of ``key``.
+
+        Returns:
+            0 if the request is admitted, otherwise seconds until it would be
+        """
+        raise NotImplementedError
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in a bounded LRU map; the least recently seen keys are dropped first."""
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float) -> float:
+        now = self.clock()
+        tokens, updated_at = self._buckets.pop(key, (capacity, now))
+        tokens, retry_after = _take_tokens(tokens, updated_at, now, cost, capacity, refill_per_second)
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            # A dropped bucket comes back full, which only ever errs towards admitting
+            self._buckets.popitem(last=False)
+        return retry_after
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in a SQLite file shared by every worker process on the host.
+
+    Each take is one immediate transaction, so concurrent workers see a
+    consistent bucket. Wall-clock time is used because monotonic clocks are
+    not comparable between processes.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _take(self, key: str, cost: float, capacity: float, refill_per_second: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = self.clock()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated_at = row if row else (capacity, now)
+                tokens, retry_after = _take_tokens(tokens, updated_at, now, cost, capacity, refill_per_second)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float) -> float:
+        return await asyncio.to_thread(self._take, key, cost, capacity, refill_per_second)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    """Build the backend selected by settings."""
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimitBackend(settings.RATE_LIMIT_PATH)
+    if settings.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+    return InMemoryRateLimitBackend()
+
+def client_key(scope: Dict) -> str:
+    """
+    Identify the caller of a request.
+
+    A valid bearer token identifies the user; anything else falls back to
+    the client address, so a forged token cannot spend another user's budget.
+    """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                subject = get_token_subject(token.strip())
+                if subject is not None:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+class RateLimitMiddleware:
+    """
+    Admission control for expensive routes.
+
+    Every request to a route listed in ``route_costs`` takes its cost from
+    the caller's token bucket and holds one of the caller's concurrency
+    slots until the response is finished. A request over either limit is
+    answered with 429 and ``Retry-After`` before the route runs, so its body
+    (e.g. an upload) is never read.
+
+    This is plain ASGI middleware rather than BaseHTTPMiddleware so that
+    streaming responses and request bodies pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        backend: Optional[RateLimitBackend] = None,
+        burst: float = settings.RATE_LIMIT_BURST,
+        refill_per_second: float = settings.RATE_LIMIT_REFILL_PER_SECOND,
+        max_concurrent: int = settings.RATE_LIMIT_MAX_CONCURRENT,
+        route_costs: Sequence[Tuple[str, str, float]] = DEFAULT_ROUTE_COSTS,
+        key_func: Callable[[Dict], str] = client_key
+    ):
+        """
+        Args:
+            app: ASGI application to protect
+            backend: Token bucket storage (defaults to the configured backend)
+            burst: Bucket capacity in cost units
+            refill_per_second: Cost units returned to each bucket per second
+            max_concurrent: Requests per caller allowed in flight at once (0 disables)
+            route_costs: (method, path pattern, cost) of limited routes
+            key_func: Maps an ASGI scope to the caller's key
+        """
+        self.app = app
+        self.backend = backend or create_rate_limit_backend()
+        self.burst = burst
+        self.refill_per_second = refill_per_second
+        self.max_concurrent = max_concurrent
+        self.routes: List[Tuple[str, Pattern, float]] = [
+            (method.upper(), re.compile(pattern), cost) for method, pattern, cost in route_costs
+        ]
+        self.key_func = key_func
+        self._active: Dict[str, int] = {}
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"admitted": self.admitted, "rejected": self.rejected, "active_callers": len(self._active)}
+
+    def route_cost(self, method: str, path: str) -> Optional[float]:
+        for route_method, pattern, cost in self.routes:
+            if route_method == method and pattern.search(path):
+                return cost
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cost = self.route_cost(scope["method"], scope["path"])
+        if cost is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = self.key_func(scope)
+        if self.max_concurrent and self._active.get(key, 0) >= self.max_concurrent:
+            self.rejected += 1
+            await self._reject(send, 1.0, "Too many concurrent requests")
+            return
+
+        # Hold the slot while consulting the (possibly shared) backend so a burst cannot slip past the cap
+        self._active[key] = self._active.get(key, 0) + 1
+        try:
+            retry_after = await self.backend.take(key, cost, self.burst, self.refill_per_second)
+            if retry_after > 0:
+                self.rejected += 1
+                await self._reject(send, retry_after, "Rate limit exceeded")
+                return
+            self.admitted += 1
+            await self.app(scope, receive, send)
+        finally:
+            remaining = self._active[key] - 1
+            if remaining:
+                self._active[key] = remaining
+            else:
+                del self._active[key]
+
+    @staticmethod
+    async def _reject(send, retry_after: float, detail: str) -> None:
+        retry_seconds = 3600 if math.isinf(retry_after) else max(1, math.ceil(retry_after))
+        body = json.dumps({"detail": detail, "status_code": 429}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(retry_seconds).encode("latin-1")),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
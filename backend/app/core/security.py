@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import models, schemas
@@ -30,6 +32,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def get_token_subject(token: str) -> Optional[str]:
+    """Return the ``sub`` claim of a valid access token, or None."""
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 async def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
 ) -> models.User:
@@ -38,14 +50,8 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = get_token_subject(token)
+    if user_id is None:
         raise credentials_exception
     
     user = db.query(models.User).filter(models.User.id == int(user_id)).first()
@@ -53,6 +59,32 @@ async def get_current_user(
         raise credentials_exception
     return user
 
+async def get_current_user_id(
+    db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> str:
+    """
+    Id of the active user a bearer token was issued to.
+
+    Looked up with a Core query awaited on the async session, so endpoints
+    that only need the caller's id do not load the User model.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user_id = get_token_subject(token)
+    if user_id is None:
+        raise credentials_exception
+    
+    users = models.User.__table__
+    found = await db.execute(
+        select(users.c.id).where(users.c.id == str(user_id), users.c.is_active.is_(True))
+    )
+    if found.first() is None:
+        raise credentials_exception
+    return str(user_id)
+
 async def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
@@ -13,20 +13,21 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
-# Import database and models
+# Import settings, database and models
+from app.core.config import settings
+from app.core.rate_limit import RateLimitMiddleware
 from app.database import engine, get_db
 from app.models import Base, init_db
 
-# Import WebSocket manager
-from app.services.websocket_manager import ConnectionManager
+# Import the shared WebSocket manager (services broadcast through the same instance)
+from app.services.websocket_manager import is_document_channel, websocket_manager
+from app.services.op_log import op_log
+from app.services.backplane import create_backplane
 
 # Import API routers
 from app.api import api_router
 from app.api.endpoints import documentation as documents_router
 
-# Initialize WebSocket manager
-websocket_manager = ConnectionManager()
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,9 +36,6 @@ logger = logging.getLogger(__name__)
 env_path = Path('.') / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Initialize WebSocket manager
-websocket_manager = ConnectionManager()
-
 # Configure allowed origins for CORS
 origins = [
     "http://localhost:3000",
@@ -68,6 +66,10 @@ app = FastAPI(
     ],
 )
 
+# Rate-limit AI endpoints; added before CORS so rejections still carry CORS headers
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -119,7 +121,9 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat(),
         "environment": os.getenv("ENV", "development"),
         "websockets": {
-            "active_connections": len(websocket_manager.active_connections)
+            "active_connections": len(websocket_manager.active_connections),
+            "fanout": websocket_manager.get_stats(),
+            "presence": websocket_manager.presence_batches.get_stats()
         }
     }
     
@@ -137,6 +141,23 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
+    await op_log.start()
+    # Rooms span every worker process (and host, with redis); each document is edited by its owner
+    await websocket_manager.attach_backplane(create_backplane())
+
+@app.on_event("shutdown")
+async def stop_batch_workers():
+    from app.services.batch_analysis import batch_analyzer
+    batch_analyzer.shutdown()
+
+@app.on_event("shutdown")
+async def stop_backplane():
+    await websocket_manager.detach_backplane()
+
+@app.on_event("shutdown")
+async def stop_op_log():
+    # Commits operations still waiting for the next group commit
+    await op_log.stop()
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -201,7 +222,8 @@ async def websocket_endpoint(
     websocket: WebSocket, 
     document_id: str, 
     user_id: str = None,
-    token: str = None
+    token: str = None,
+    version: int = None
 ):
     """
     WebSocket endpoint for real-time document collaboration
@@ -211,6 +233,7 @@ async def websocket_endpoint(
         document_id: ID of the document being collaborated on
         user_id: Optional user ID for the connecting user
         token: Optional authentication token
+        version: Revision a reconnecting client already has; it is sent only the operations after it
     """
     # Accept the WebSocket connection
     await websocket.accept()
@@ -221,8 +244,15 @@ async def websocket_endpoint(
         # For now, we'll just log the connection attempt
         logger.info(f"New WebSocket connection for document {document_id} from user {user_id or 'anonymous'}")
         
+        # Job channels (job:<id>) only receive updates; there is no document to load
+        has_document = is_document_channel(document_id)
+        
+        # Load the document first so the state sent below follows the connect without a gap
+        if has_document:
+            await websocket_manager.open_document(document_id)
+        
         # Register the connection with the manager
-        await websocket_manager.connect(websocket, document_id, user_id)
+        user_id = await websocket_manager.connect(websocket, document_id, user_id)
         
         # Notify other users in the same document
         await websocket_manager.broadcast(
@@ -235,13 +265,11 @@ async def websocket_endpoint(
             exclude=[websocket]
         )
         
-        # Send initial document state
-        # TODO: Fetch and send the current document state
-        await websocket.send_json({
-            "type": "init",
-            "document_id": document_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        # Send the server copy of the document (or the operations the client missed);
+        # edits are made against this revision
+        if has_document:
+            state = await websocket_manager.document_state(document_id, version)
+            await websocket_manager.send(websocket, {**state, "type": "init", "timestamp": datetime.utcnow().isoformat()})
         
         # Process incoming messages
         while True:
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from sqlalchemy import String, Text, DateTime, ForeignKey, Boolean, Integer, JSON, Column, Table
+from sqlalchemy import String, Text, DateTime, ForeignKey, Boolean, Integer, JSON, Column, Table, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
 import uuid
@@ -78,11 +78,16 @@ class Document(Base):
 
 class DocumentVersion(Base):
     __tablename__ = "document_versions"
+    # Deltas apply to the previous number, so two rows with one number corrupt every later version
+    __table_args__ = (UniqueConstraint("document_id", "version_number", name="uq_document_versions_number"),)
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     document_id: Mapped[str] = mapped_column(String(36), ForeignKey("documents.id"), nullable=False)
     version_number: Mapped[int] = mapped_column(Integer, nullable=False)
-    content: Mapped[str] = mapped_column(Text, nullable=False)
+    # Only set for legacy 'text' rows; read content through app.services.version_store
+    content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    storage: Mapped[str] = mapped_column(String(10), nullable=False, default="text", server_default="text")  # text, keyframe or delta
+    payload: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # Compressed snapshot or delta
     author_id: Mapped[str] = mapped_column(String(36), nullable=False)  # User ID of the author
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Commit message
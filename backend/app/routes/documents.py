@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, status
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Literal
 from pydantic import BaseModel, Field
 from datetime import datetime
 import uuid
 import os
 from ..services.openai_service import OpenAIService, DocumentGenerationRequest
+from ..services.llm_gateway import cancel_on_disconnect
+from ..services.llm_cache import CacheMode
+from ..services.llm_scheduler import BATCH, llm_request_context, stream_in_context
+from ..services.generation_stream import format_sse, relay_generation
 
 router = APIRouter()
 
@@ -95,9 +100,10 @@ async def delete_document(doc_id: str):
     return None
 
 @router.post("/generate", status_code=status.HTTP_201_CREATED)
-async def generate_document(request: GenerateDocumentRequest):
+async def generate_document(request: GenerateDocumentRequest, http_request: Request, cache: CacheMode = "default"):
     """
     Generate a document (SRS or SDS) based on project description and code snippets.
+    Pass ``cache=bypass`` to skip the response cache and force a fresh generation.
     """
     try:
         # Convert the request to the format expected by OpenAIService
@@ -108,8 +114,11 @@ async def generate_document(request: GenerateDocumentRequest):
             additional_context=request.additional_context
         )
         
-        # Generate the document content
-        content = await openai_service.generate_document(doc_request)
+        # Generate the document content; generation shares the LLM per project at batch priority
+        with llm_request_context(tenant=request.project_id, priority=BATCH):
+            content = await cancel_on_disconnect(http_request, openai_service.generate_document(
+                doc_request, use_cache=cache != "bypass"
+            ))
         
         # Create a new document with the generated content
         doc_data = {
@@ -138,6 +147,66 @@ async def generate_document(request: GenerateDocumentRequest):
             detail=f"Error generating document: {str(e)}"
         )
 
+@router.post("/generate/stream")
+async def generate_document_stream(
+    request: GenerateDocumentRequest,
+    document_id: Optional[str] = None,
+    cache: CacheMode = "default"
+):
+    """
+    Generate a document and stream it as Server-Sent Events.
+    
+    Emits ``start`` (with the document id), one ``chunk`` per text delta and
+    finally ``complete`` with the saved document, or ``error``. Clients viewing
+    the document over WebSocket receive the deltas as ``generation_chunk``
+    messages. Pass ``document_id`` to regenerate an existing document in place.
+    """
+    if document_id is not None and document_id not in documents_db:
+        raise HTTPException(status_code=404, detail="Document not found")
+    doc_id = document_id or str(uuid.uuid4())
+    
+    doc_request = DocumentGenerationRequest(
+        project_description=request.project_description,
+        code_snippets=[snippet.dict() for snippet in request.code_snippets],
+        document_type=request.document_type,
+        additional_context=request.additional_context
+    )
+    
+    async def save(content: str) -> dict:
+        now = datetime.utcnow()
+        existing = documents_db.get(doc_id)
+        doc = Document(
+            id=doc_id,
+            title=f"{request.document_type.upper()} - {request.project_id}",
+            content=content,
+            doc_type=request.document_type,
+            project_id=request.project_id,
+            metadata={
+                "generated_by": "openai",
+                "model": openai_service.model
+            },
+            created_at=existing.created_at if existing else now,
+            updated_at=now
+        )
+        documents_db[doc_id] = doc
+        return {"document": doc.dict()}
+    
+    async def events():
+        yield format_sse("start", {"document_id": doc_id})
+        chunks = stream_in_context(
+            openai_service.stream_document(doc_request, use_cache=cache != "bypass"),
+            tenant=request.project_id,
+            priority=BATCH
+        )
+        async for event in relay_generation(chunks, save, document_id=doc_id):
+            yield event
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/import/markdown")
 async def import_markdown(file: UploadFile = File(...), project_id: str = Form(...), doc_type: str = Form(...)):
     """Import document from markdown file"""
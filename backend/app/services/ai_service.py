@@ -1,28 +1,43 @@
 import os
-from typing import Dict, List, Optional, Tuple
-import openai
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer, util
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException
 import numpy as np
 from datetime import datetime
 import logging
 
-from app.core.config import settings
+from app.services.embedding_cache import get_embedding_cache
+from app.services.llm_gateway import llm_gateway
+from app.services.map_reduce import MapReduceGenerator, estimate_tokens, map_reduce_generator, parse_snippet
+from app.services.model_registry import model_registry
+from app.services.similarity_engine import (
+    DEFAULT_EMBEDDING_MODEL,
+    BatchSimilarityEngine,
+    get_similarity_engine
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 class AIService:
     """Service for AI-powered document generation and analysis."""
     
     def __init__(self):
-        # Initialize sentence transformer model for semantic similarity
-        self.similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Sentence transformer model for semantic similarity, loaded lazily
+        # from the shared model registry on first use
+        self.similarity_model_name = DEFAULT_EMBEDDING_MODEL
+        self.embedding_cache = get_embedding_cache(self.similarity_model_name)
         self.openai_model = "gpt-4"  # Default model
+        # Condenses inputs that exceed the prompt token budget
+        self.map_reduce: MapReduceGenerator = map_reduce_generator
+    
+    @property
+    def similarity_model(self):
+        return model_registry.get(self.similarity_model_name)
+    
+    @property
+    def similarity_engine(self) -> BatchSimilarityEngine:
+        return get_similarity_engine(self.similarity_model_name)
     
     async def generate_document(
         self,
@@ -30,6 +45,7 @@ class AIService:
         code_snippets: List[str],
         project_description: str = "",
         existing_docs: List[str] = None,
+        use_cache: bool = True,
         **kwargs
     ) -> Dict[str, any]:
         """
@@ -40,41 +56,25 @@ class AIService:
             code_snippets: List of code snippets to analyze
             project_description: Description of the project
             existing_docs: List of existing documentation for context
+            use_cache: Whether an identical earlier response may be reused
             
         Returns:
             Dictionary containing generated document and suggestions
         """
         try:
-            # Prepare the prompt based on document type
-            if document_type.lower() == 'srs':
-                prompt = self._create_srs_prompt(project_description, code_snippets, existing_docs)
-            elif document_type.lower() == 'sds':
-                prompt = self._create_sds_prompt(project_description, code_snippets, existing_docs)
-            else:
-                raise ValueError(f"Unsupported document type: {document_type}")
-            
-            # Call OpenAI API
-            response = client.chat.completions.create(
+            # Call OpenAI API through the shared async gateway
+            generated_content = await llm_gateway.complete(
                 model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": "You are a professional technical writer and software engineer."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=await self._prepare_messages(document_type, code_snippets, project_description, existing_docs),
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                use_cache=use_cache
             )
             
-            # Extract the generated content
-            generated_content = response.choices[0].message.content
-            
-            # Analyze the generated content for quality and completeness
-            analysis = self.analyze_document_quality(generated_content, document_type)
-            
             return {
                 "status": "success",
                 "document": generated_content,
-                "analysis": analysis,
-                "suggestions": self._generate_suggestions(analysis, document_type)
+                **self.review_generated_document(generated_content, document_type)
             }
             
         except Exception as e:
@@ -84,6 +84,86 @@ class AIService:
                 detail=f"Failed to generate document: {str(e)}"
             )
     
+    async def stream_document(
+        self,
+        document_type: str,
+        code_snippets: List[str],
+        project_description: str = "",
+        existing_docs: List[str] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Generate a document (SRS/SDS) and yield the text as the model produces it.
+        
+        Takes the same arguments as generate_document. Once the stream is
+        exhausted, pass the joined text to review_generated_document.
+        
+        Yields:
+            Content deltas in generation order
+        """
+        messages = await self._prepare_messages(document_type, code_snippets, project_description, existing_docs)
+        async for delta in llm_gateway.stream(
+            model=self.openai_model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=2000,
+            use_cache=use_cache
+        ):
+            yield delta
+    
+    def review_generated_document(self, content: str, document_type: str) -> Dict[str, any]:
+        """Analyze a generated document for quality and completeness."""
+        analysis = self.analyze_document_quality(content, document_type)
+        return {
+            "analysis": analysis,
+            "suggestions": self._generate_suggestions(analysis, document_type)
+        }
+    
+    async def _prepare_messages(
+        self,
+        document_type: str,
+        code_snippets: List[str],
+        project_description: str,
+        existing_docs: Optional[List[str]]
+    ) -> List[Dict[str, str]]:
+        """
+        Build the generation messages, condensing the inputs with map-reduce
+        when the direct prompt would exceed the token budget.
+        """
+        messages = self._build_messages(document_type, code_snippets, project_description, existing_docs)
+        if self.map_reduce.fits(*(message["content"] for message in messages)):
+            return messages
+        
+        files = [parse_snippet(snippet, i) for i, snippet in enumerate(code_snippets)]
+        files += [
+            {"path": f"existing_doc_{i + 1}.md", "content": doc}
+            for i, doc in enumerate(existing_docs or [])
+        ]
+        skeleton = self._build_messages(document_type, [], project_description, None)
+        reserved = sum(estimate_tokens(message["content"]) for message in skeleton)
+        notes = await self.map_reduce.condense(files, f"a {document_type.upper()} document", reserved)
+        return self._build_messages(document_type, notes, project_description, None)
+    
+    def _build_messages(
+        self,
+        document_type: str,
+        code_snippets: List[str],
+        project_description: str,
+        existing_docs: Optional[List[str]]
+    ) -> List[Dict[str, str]]:
+        # Prepare the prompt based on document type
+        if document_type.lower() == 'srs':
+            prompt = self._create_srs_prompt(project_description, code_snippets, existing_docs)
+        elif document_type.lower() == 'sds':
+            prompt = self._create_sds_prompt(project_description, code_snippets, existing_docs)
+        else:
+            raise ValueError(f"Unsupported document type: {document_type}")
+        
+        return [
+            {"role": "system", "content": "You are a professional technical writer and software engineer."},
+            {"role": "user", "content": prompt}
+        ]
+    
     def analyze_code_documentation_consistency(
         self, 
         code: str, 
@@ -103,14 +183,12 @@ class AIService:
             # Extract code elements (simplified example)
             code_elements = self._extract_code_elements(code)
             
-            # Calculate semantic similarity between code elements and documentation
-            similarities = []
-            for element in code_elements:
-                similarity = self._calculate_semantic_similarity(element, documentation)
-                similarities.append({
-                    'element': element,
-                    'similarity_score': similarity
-                })
+            # Score all code elements against the documentation in one batch
+            scores = self.similarity_engine.score(code_elements, documentation)
+            similarities = [
+                {'element': element, 'similarity_score': float(score)}
+                for element, score in zip(code_elements, scores)
+            ]
             
             # Calculate overall consistency score
             avg_similarity = np.mean([s['similarity_score'] for s in similarities])
@@ -333,13 +411,7 @@ class AIService:
     
     def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """Calculate semantic similarity between two texts."""
-        # Encode the texts
-        embeddings1 = self.similarity_model.encode(text1, convert_to_tensor=True)
-        embeddings2 = self.similarity_model.encode(text2, convert_to_tensor=True)
-        
-        # Calculate cosine similarity
-        cosine_scores = util.cos_sim(embeddings1, embeddings2)
-        return float(cosine_scores[0][0])
+        return float(self.similarity_engine.score([text1], text2)[0])
     
     def _get_required_sections(self, doc_type: str) -> List[str]:
         """Get the list of required sections for a document type."""
@@ -373,3 +445,5 @@ class AIService:
             
             if analysis.get('missing_sections'):
                 suggestions.append(f"Add missing sections: {', '.join(analysis['missing_sections'])}")
+        
+        return suggestions
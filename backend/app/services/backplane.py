@@ -0,0 +1,847 @@
+import os
+import json
+import fcntl
+import struct
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with (room, payload, policy, key, exclude_users) for every message
+# another process broadcast to a room this process subscribes to; returns the
+# number of local connections it was queued for
+Deliver = Callable[[str, str, str, Any, Set[str]], int]
+
+# A user's connection on one process: (process origin, user_id)
+Connection = Tuple[Optional[str], str]
+
+# Rooms through which processes send each other messages directly
+INBOX_PREFIX = "process:"
+
+class BackplaneUnavailableError(Exception):
+    """Raised when the backplane cannot answer an ownership claim in time."""
+
+def encode_envelope(
+    origin: str,
+    payload: str,
+    policy: str,
+    key: Any,
+    exclude_users: Optional[Set[str]] = None,
+    exclude_connection: Optional[Connection] = None
+) -> bytes:
+    """
+    Wrap an already serialized message for the backplane.
+
+    A one-line JSON header (origin process, send policy, coalesce key,
+    excluded users and excluded connection) precedes the payload, which is
+    passed through untouched.
+    """
+    header = [origin, policy, list(key) if key is not None else None]
+    if exclude_users or exclude_connection:
+        header.append(sorted(exclude_users or ()))
+    if exclude_connection:
+        header.append(list(exclude_connection))
+    return json.dumps(header, separators=(",", ":")).encode() + b"\n" + payload.encode()
+
+def decode_envelope(data: bytes) -> Tuple[str, str, str, Any, Set[str], Optional[Connection]]:
+    """
+    Returns:
+        (origin, payload, policy, key, exclude_users, exclude_connection)
+    """
+    header, _, payload = data.partition(b"\n")
+    fields = json.loads(header)
+    key = tuple(fields[2]) if fields[2] is not None else None
+    exclude_users = set(fields[3]) if len(fields) > 3 else set()
+    exclude_connection = tuple(fields[4]) if len(fields) > 4 else None
+    return fields[0], payload.decode(), fields[1], key, exclude_users, exclude_connection
+
+class Backplane:
+    """
+    Carries broadcasts between the ConnectionManagers of several processes,
+    so a document's room spans every worker and node it has clients on.
+
+    Each process subscribes to the rooms it has local connections in and
+    publishes every broadcast it makes; messages come back to it only from
+    other processes (echo suppression). Publishing, subscribing and
+    unsubscribing queue their writes without awaiting, so broadcasts leave
+    in the order they were made. Messages published while a networked
+    backend is reconnecting are dropped and counted; on reconnect every
+    room is subscribed again.
+
+    A room can also be owned by one process at a time (``acquire``), which
+    is how a document's edits are all applied by the same OT session; other
+    processes send their clients' edits to the owner's inbox
+    (``send_direct``). Ownership ends with ``release``, when the owning
+    process goes away, or, if the backend cannot keep it, with ``on_lost``.
+    """
+
+    name = "base"
+
+    def __init__(self, max_rooms: int = 1000, claim_timeout: float = settings.WS_OWNER_TIMEOUT_SECONDS):
+        """
+        Args:
+            max_rooms: Rooms with routing stats kept (least recently used are dropped)
+            claim_timeout: Seconds to wait for the backend to answer an ownership claim
+        """
+        self.origin = uuid.uuid4().hex
+        self.deliver: Optional[Deliver] = None
+        # Called with the payload of each message sent to this process's inbox
+        self.on_direct: Optional[Callable[[str], None]] = None
+        # Called with a room this process was told it no longer owns
+        self.on_lost: Optional[Callable[[str], None]] = None
+        self.rooms: Set[str] = set()
+        self.owned: Set[str] = set()
+        self.claim_timeout = claim_timeout
+        self.max_rooms = max_rooms
+        self.room_stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.publish_dropped = 0
+
+    @property
+    def inbox(self) -> str:
+        return INBOX_PREFIX + self.origin
+
+    async def start(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+        self.subscribe(self.inbox)
+
+    async def stop(self) -> None:
+        self.deliver = None
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    def subscribe(self, room: str) -> None:
+        """Start receiving what other processes broadcast to ``room``."""
+        if room in self.rooms:
+            return
+        self.rooms.add(room)
+        self._subscribe(room)
+
+    def unsubscribe(self, room: str) -> None:
+        if room not in self.rooms:
+            return
+        self.rooms.discard(room)
+        self._unsubscribe(room)
+
+    def publish(
+        self,
+        room: str,
+        payload: str,
+        policy: str,
+        key: Any = None,
+        exclude_users: Optional[Set[str]] = None,
+        exclude_connection: Optional[Connection] = None
+    ) -> None:
+        """
+        Send a serialized broadcast to the other processes subscribed to ``room``.
+
+        ``exclude_users`` are skipped on every process, ``exclude_connection``
+        only on the process it names.
+        """
+        self._count(room, "published")
+        if not self._publish(room, encode_envelope(self.origin, payload, policy, key, exclude_users, exclude_connection)):
+            self.publish_dropped += 1
+
+    def send_direct(self, origin: str, payload: str) -> bool:
+        """
+        Send a serialized message to the inbox of process ``origin``.
+
+        Returns:
+            False if the message could not be sent
+        """
+        return self._publish(INBOX_PREFIX + origin, encode_envelope(self.origin, payload, "deliver", None))
+
+    def owns(self, room: str) -> bool:
+        return room in self.owned
+
+    async def acquire(self, room: str) -> str:
+        """
+        Take ownership of ``room`` unless another process holds it.
+
+        Returns:
+            Origin of the owning process (``self.origin`` if it is this one)
+
+        Raises:
+            BackplaneUnavailableError: If the backend did not answer within ``claim_timeout``
+        """
+        if room in self.owned:
+            return self.origin
+        owner = await self._claim(room)
+        if owner == self.origin:
+            self.owned.add(room)
+        return owner
+
+    def release(self, room: str) -> None:
+        """Give up ownership of ``room``; the next process to acquire it takes over."""
+        if room not in self.owned:
+            return
+        self.owned.discard(room)
+        self._release(room)
+
+    def _lost(self, room: str) -> None:
+        if room not in self.owned:
+            return
+        self.owned.discard(room)
+        logger.warning(f"Lost ownership of room {room}")
+        if self.on_lost is not None:
+            self.on_lost(room)
+
+    def _received(self, room: str, data: bytes) -> None:
+        try:
+            origin, payload, policy, key, exclude_users, exclude_connection = decode_envelope(data)
+        except (ValueError, IndexError, UnicodeDecodeError) as e:
+            logger.warning(f"Discarding malformed backplane message for room {room}: {e}")
+            return
+        if room == self.inbox:
+            if self.on_direct is not None:
+                self.on_direct(payload)
+            return
+        if origin == self.origin:
+            self._count(room, "echoes_suppressed")
+            return
+        self._count(room, "received")
+        if exclude_connection is not None and exclude_connection[0] == self.origin:
+            exclude_users = exclude_users | {exclude_connection[1]}
+        if self.deliver is not None and room in self.rooms:
+            self._count(room, "delivered", self.deliver(room, payload, policy, key, exclude_users))
+
+    def _count(self, room: str, name: str, amount: int = 1) -> None:
+        stats = self.room_stats.pop(room, None)
+        if stats is None:
+            stats = {"published": 0, "received": 0, "delivered": 0, "echoes_suppressed": 0}
+        stats[name] += amount
+        self.room_stats[room] = stats
+        while len(self.room_stats) > self.max_rooms:
+            self.room_stats.popitem(last=False)
+
+    # Backend hooks; they must not await
+    def _subscribe(self, room: str) -> None:
+        raise NotImplementedError
+
+    def _unsubscribe(self, room: str) -> None:
+        raise NotImplementedError
+
+    def _publish(self, room: str, data: bytes) -> bool:
+        """Returns: False if the message could not be sent"""
+        raise NotImplementedError
+
+    async def _claim(self, room: str) -> str:
+        """Record this process as the owner of ``room`` if it has none; returns the owner."""
+        raise NotImplementedError
+
+    def _release(self, room: str) -> None:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "origin": self.origin,
+            "connected": self.connected,
+            "subscribed_rooms": len(self.rooms) - (self.inbox in self.rooms),
+            "owned_rooms": len(self.owned),
+            "publish_dropped": self.publish_dropped,
+            "rooms": {room: dict(stats) for room, stats in self.room_stats.items()}
+        }
+
+class InProcessHub:
+    """Rooms shared by the InProcessBackplanes attached to it."""
+
+    def __init__(self):
+        # room -> backplanes subscribed to it
+        self.subscribers: Dict[str, Set["InProcessBackplane"]] = {}
+        # room -> backplane owning it
+        self.owners: Dict[str, "InProcessBackplane"] = {}
+
+_default_hub = InProcessHub()
+
+class InProcessBackplane(Backplane):
+    """
+    Backplane between ConnectionManagers of the same process.
+
+    With a single manager per process it is a no-op; it is the default
+    and the reference for the networked backends.
+    """
+
+    name = "memory"
+
+    def __init__(self, hub: Optional[InProcessHub] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.hub = hub or _default_hub
+
+    def _subscribe(self, room: str) -> None:
+        self.hub.subscribers.setdefault(room, set()).add(self)
+
+    def _unsubscribe(self, room: str) -> None:
+        subscribers = self.hub.subscribers.get(room)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.hub.subscribers[room]
+
+    def _publish(self, room: str, data: bytes) -> bool:
+        for backplane in list(self.hub.subscribers.get(room, ())):
+            if backplane is not self:
+                backplane._received(room, data)
+        return True
+
+    async def _claim(self, room: str) -> str:
+        return self.hub.owners.setdefault(room, self).origin
+
+    def _release(self, room: str) -> None:
+        if self.hub.owners.get(room) is self:
+            del self.hub.owners[room]
+
+    async def stop(self) -> None:
+        for room in list(self.owned):
+            self.release(room)
+        for room in list(self.rooms):
+            self.unsubscribe(room)
+        await super().stop()
+
+# Frames on the Unix socket: op, room length, data length, room, data
+_FRAME = struct.Struct("!BHI")
+_SUB, _UNSUB, _PUB = 1, 2, 3
+# Ownership: claim and release carry the process origin, the hub answers a claim with the owner's
+_CLAIM, _RELEASE, _OWNER = 4, 5, 6
+
+def _frame(op: int, room: str, data: bytes = b"") -> bytes:
+    room_bytes = room.encode()
+    return _FRAME.pack(op, len(room_bytes), len(data)) + room_bytes + data
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, str, bytes]:
+    op, room_length, data_length = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    body = await reader.readexactly(room_length + data_length)
+    return op, body[:room_length].decode(), body[room_length:]
+
+class UnixSocketBackplane(Backplane):
+    """
+    Backplane between the worker processes of one host over a Unix socket.
+
+    The first process to take an exclusive lock on ``<path>.lock`` becomes
+    the hub: it listens on ``path`` and routes each published frame only to
+    the processes subscribed to its room, never back to the publisher. The
+    others connect to it. If the hub process exits, its lock is released,
+    the others lose their connection and one of them takes over.
+
+    The hub also keeps the owner of each room. A process's rooms are freed
+    when its connection drops; after a failover the survivors claim the
+    rooms they own again from the new hub.
+    """
+
+    name = "unix"
+
+    def __init__(
+        self,
+        path: str = settings.WS_BACKPLANE_SOCKET_PATH,
+        reconnect_delay: float = 0.2,
+        max_buffer: int = 16 * 1024 * 1024,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            path: Socket path shared by the processes
+            reconnect_delay: Seconds between attempts to reach or become the hub
+            max_buffer: Unsent bytes to a process before it is disconnected
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self.max_buffer = max_buffer
+        self.is_hub = False
+        self._lock_file: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Connection to the hub, when not the hub
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Hub only: connected process -> its rooms
+        self._peers: Dict[asyncio.StreamWriter, Set[str]] = {}
+        # Hub only: room -> (owner origin, its connection or None for the hub itself)
+        self._owners: Dict[str, Tuple[str, Optional[asyncio.StreamWriter]]] = {}
+        # Claims sent to the hub and not answered yet
+        self._claims: Dict[str, asyncio.Future] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.is_hub or self._writer is not None
+
+    async def start(self, deliver: Deliver, timeout: float = 5.0) -> None:
+        await super().start(deliver)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Backplane socket {self.path} not reachable yet; retrying in the background")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._take_lock():
+                    await self._serve()
+                else:
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    await self._follow(reader, writer)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if self._ready.is_set():
+                    logger.warning(f"Lost backplane hub at {self.path}: {e}")
+            except Exception as e:
+                logger.error(f"Backplane error: {e}", exc_info=True)
+            self._ready.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _take_lock(self) -> bool:
+        descriptor = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(descriptor)
+            return False
+        self._lock_file = descriptor
+        return True
+
+    async def _serve(self) -> None:
+        try:
+            # Left behind by a hub that exited without cleaning up
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._owners = {room: (self.origin, None) for room in self.owned}
+            self._server = await asyncio.start_unix_server(self._serve_peer, self.path)
+            self.is_hub = True
+            logger.info(f"Backplane hub listening on {self.path}")
+            self._ready.set()
+            await asyncio.Future()
+        finally:
+            self.is_hub = False
+            if self._server is not None:
+                self._server.close()
+                self._server = None
+            for writer in list(self._peers):
+                writer.close()
+            self._peers.clear()
+            self._owners.clear()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            os.close(self._lock_file)
+            self._lock_file = None
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        rooms: Set[str] = set()
+        self._peers[writer] = rooms
+        try:
+            while True:
+                op, room, data = await _read_frame(reader)
+                if op == _SUB:
+                    rooms.add(room)
+                elif op == _UNSUB:
+                    rooms.discard(room)
+                elif op == _PUB:
+                    self._route(room, data, writer)
+                elif op == _CLAIM:
+                    writer.write(_frame(_OWNER, room, self._grant(room, data.decode(), writer).encode()))
+                elif op == _RELEASE:
+                    if self._owners.get(room, (None, None))[1] is writer:
+                        del self._owners[room]
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.pop(writer, None)
+            for room, (_, owner) in list(self._owners.items()):
+                if owner is writer:
+                    del self._owners[room]
+            writer.close()
+
+    def _grant(self, room: str, origin: str, writer: Optional[asyncio.StreamWriter]) -> str:
+        owner = self._owners.get(room)
+        if owner is None or owner[0] == origin:
+            self._owners[room] = (origin, writer)
+            return origin
+        return owner[0]
+
+    def _route(self, room: str, data: bytes, source: Optional[asyncio.StreamWriter]) -> None:
+        frame = None
+        for writer, rooms in list(self._peers.items()):
+            if writer is source or room not in rooms:
+                continue
+            frame = frame or _frame(_PUB, room, data)
+            self._write(writer, frame)
+        if source is not None:
+            self._received(room, data)
+
+    def _write(self, writer: asyncio.StreamWriter, frame: bytes) -> bool:
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            logger.warning(f"Backplane connection more than {self.max_buffer} bytes behind; disconnecting it")
+            writer.close()
+            return False
+        writer.write(frame)
+        return True
+
+    async def _follow(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            for room in self.rooms:
+                writer.write(_frame(_SUB, room))
+            # A new hub does not know who owned what
+            for room in self.owned:
+                writer.write(_frame(_CLAIM, room, self.origin.encode()))
+            self._writer = writer
+            self._ready.set()
+            while True:
+                op, room, data = await _read_frame(reader)
+                if op == _PUB:
+                    self._received(room, data)
+                elif op == _OWNER:
+                    claim = self._claims.pop(room, None)
+                    if claim is not None and not claim.done():
+                        claim.set_result(data.decode())
+                    elif data.decode() != self.origin:
+                        self._lost(room)
+        finally:
+            self._writer = None
+            writer.close()
+            for claim in self._claims.values():
+                if not claim.done():
+                    claim.set_exception(BackplaneUnavailableError(f"Lost backplane hub at {self.path}"))
+            self._claims.clear()
+
+    def _subscribe(self, room: str) -> None:
+        if self._writer is not None:
+            self._writer.write(_frame(_SUB, room))
+
+    def _unsubscribe(self, room: str) -> None:
+        if self._writer is not None:
+            self._writer.write(_frame(_UNSUB, room))
+
+    def _publish(self, room: str, data: bytes) -> bool:
+        if self.is_hub:
+            self._route(room, data, None)
+            return True
+        if self._writer is None:
+            return False
+        return self._write(self._writer, _frame(_PUB, room, data))
+
+    async def _claim(self, room: str) -> str:
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.claim_timeout)
+        except asyncio.TimeoutError:
+            raise BackplaneUnavailableError(f"Backplane socket {self.path} not reachable")
+        if self.is_hub:
+            return self._grant(room, self.origin, None)
+        if self._writer is None:
+            raise BackplaneUnavailableError(f"Lost backplane hub at {self.path}")
+        claim = self._claims.get(room)
+        if claim is None:
+            claim = self._claims[room] = asyncio.get_running_loop().create_future()
+            self._writer.write(_frame(_CLAIM, room, self.origin.encode()))
+        try:
+            return await asyncio.wait_for(asyncio.shield(claim), self.claim_timeout)
+        except asyncio.TimeoutError:
+            raise BackplaneUnavailableError(f"No answer from the backplane hub at {self.path}")
+
+    def _release(self, room: str) -> None:
+        if self.is_hub:
+            if self._owners.get(room, (None, None))[0] == self.origin:
+                del self._owners[room]
+        elif self._writer is not None:
+            self._writer.write(_frame(_RELEASE, room, self.origin.encode()))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "hub": self.is_hub, "peers": len(self._peers)}
+
+class RedisError(Exception):
+    """Error reply from the Redis server."""
+
+def _command(*args: Any) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP2 reply; error replies are returned as RedisError."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by Redis")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest
+    if kind == b"-":
+        return RedisError(rest.decode(errors="replace"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply from Redis: {line[:50]!r}")
+
+class RedisBackplane(Backplane):
+    """
+    Backplane through Redis pub/sub, for processes on several hosts.
+
+    Speaks RESP directly over two connections (one publishing, one in
+    subscribe mode), so it needs no client library and works with anything
+    implementing PUBLISH/SUBSCRIBE. Rooms map to channels
+    ``<channel_prefix><room>``. Redis also delivers a process's own
+    messages back to it; they are recognized by the origin in the envelope
+    and dropped.
+
+    Room ownership is a lease, the key ``<channel_prefix>owner:<room>``
+    holding the owner's origin, set with ``SET NX PX`` and renewed while the
+    room is owned. The rooms of a process that dies are free once their
+    leases expire.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = settings.WS_BACKPLANE_REDIS_URL,
+        channel_prefix: str = settings.WS_BACKPLANE_CHANNEL_PREFIX,
+        reconnect_delay: float = 0.5,
+        max_buffer: int = 16 * 1024 * 1024,
+        lease_seconds: float = settings.WS_OWNER_LEASE_SECONDS,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            url: redis://[:password@]host[:port]
+            channel_prefix: Prepended to room names to form channel and lease key names
+            reconnect_delay: Seconds between connection attempts
+            max_buffer: Unsent bytes before publishing is dropped
+            lease_seconds: Seconds a room stays owned without renewal (renewed every third of it)
+        """
+        super().__init__(**kwargs)
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.channel_prefix = channel_prefix
+        self.reconnect_delay = reconnect_delay
+        self.max_buffer = max_buffer
+        self.lease_seconds = lease_seconds
+        self._publisher: Optional[asyncio.StreamWriter] = None
+        self._subscriber: Optional[asyncio.StreamWriter] = None
+        # Waiters for the replies on the publishing connection, in command order (None: PUBLISH)
+        self._replies: Deque[Optional[asyncio.Future]] = deque()
+        # room -> task deleting its lease
+        self._releasing: Dict[str, asyncio.Task] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._renewer: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._publisher is not None
+
+    async def start(self, deliver: Deliver, timeout: float = 5.0) -> None:
+        await super().start(deliver)
+        self._task = asyncio.create_task(self._run())
+        self._renewer = asyncio.create_task(self._renew())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Backplane Redis at {self.host}:{self.port} not reachable yet; retrying in the background")
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password is not None:
+            writer.write(_command("AUTH", self.password))
+            reply = await _read_reply(reader)
+            if isinstance(reply, RedisError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def _run(self) -> None:
+        while True:
+            writers: List[asyncio.StreamWriter] = []
+            try:
+                publish_reader, publisher = await self._open()
+                writers.append(publisher)
+                subscribe_reader, subscriber = await self._open()
+                writers.append(subscriber)
+                if self.rooms:
+                    subscriber.write(_command("SUBSCRIBE", *(self.channel_prefix + room for room in self.rooms)))
+                self._publisher, self._subscriber = publisher, subscriber
+                self._ready.set()
+                logger.info(f"Backplane connected to Redis at {self.host}:{self.port}")
+                await asyncio.gather(self._read_publish_replies(publish_reader), self._read_messages(subscribe_reader))
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError, RedisError) as e:
+                if self._ready.is_set():
+                    logger.warning(f"Lost backplane Redis connection: {e}")
+            except Exception as e:
+                logger.error(f"Backplane error: {e}", exc_info=True)
+            finally:
+                self._publisher = self._subscriber = None
+                for writer in writers:
+                    writer.close()
+                for reply in self._replies:
+                    if reply is not None and not reply.done():
+                        reply.set_exception(BackplaneUnavailableError("Lost backplane Redis connection"))
+                self._replies.clear()
+            self._ready.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _read_publish_replies(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            reply = await _read_reply(reader)
+            waiter = self._replies.popleft() if self._replies else None
+            if waiter is not None:
+                if not waiter.done():
+                    waiter.set_result(reply)
+            elif isinstance(reply, RedisError):
+                logger.warning(f"Backplane PUBLISH failed: {reply}")
+
+    async def _read_messages(self, reader: asyncio.StreamReader) -> None:
+        prefix = len(self.channel_prefix)
+        while True:
+            reply = await _read_reply(reader)
+            if isinstance(reply, RedisError):
+                raise reply
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                self._received(reply[1][prefix:].decode(), reply[2])
+
+    def _subscribe(self, room: str) -> None:
+        if self._subscriber is not None:
+            self._subscriber.write(_command("SUBSCRIBE", self.channel_prefix + room))
+
+    def _unsubscribe(self, room: str) -> None:
+        if self._subscriber is not None:
+            self._subscriber.write(_command("UNSUBSCRIBE", self.channel_prefix + room))
+
+    def _publish(self, room: str, data: bytes) -> bool:
+        if self._publisher is None or self._publisher.transport.get_write_buffer_size() > self.max_buffer:
+            return False
+        self._publisher.write(_command("PUBLISH", self.channel_prefix + room, data))
+        self._replies.append(None)
+        return True
+
+    async def _execute(self, *args: Any) -> Any:
+        """Send a command on the publishing connection and return its reply."""
+        if self._publisher is None:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.claim_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self._publisher is None:
+                raise BackplaneUnavailableError(f"Backplane Redis at {self.host}:{self.port} not reachable")
+        reply = asyncio.get_running_loop().create_future()
+        self._publisher.write(_command(*args))
+        self._replies.append(reply)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(reply), self.claim_timeout)
+        except asyncio.TimeoutError:
+            raise BackplaneUnavailableError(f"No answer from Redis at {self.host}:{self.port}")
+        if isinstance(result, RedisError):
+            raise result
+        return result
+
+    def _lease_key(self, room: str) -> str:
+        return f"{self.channel_prefix}owner:{room}"
+
+    async def _take_lease(self, room: str) -> bool:
+        """Returns: False if another process holds the lease"""
+        ttl = str(int(self.lease_seconds * 1000))
+        return await self._execute("SET", self._lease_key(room), self.origin, "NX", "PX", ttl) is not None
+
+    async def _claim(self, room: str) -> str:
+        releasing = self._releasing.get(room)
+        if releasing is not None:
+            await asyncio.wait([releasing])
+        while True:
+            if await self._take_lease(room):
+                return self.origin
+            owner = await self._execute("GET", self._lease_key(room))
+            # None: it expired in between, so try again
+            if owner is not None:
+                return owner.decode()
+
+    def _release(self, room: str) -> None:
+        self._releasing[room] = asyncio.ensure_future(self._drop_lease(room))
+
+    async def _drop_lease(self, room: str) -> None:
+        key = self._lease_key(room)
+        try:
+            if await self._execute("GET", key) == self.origin.encode():
+                await self._execute("DEL", key)
+        except (BackplaneUnavailableError, RedisError) as e:
+            logger.warning(f"Room {room} stays owned until its lease expires: {e}")
+        finally:
+            if self._releasing.get(room) is asyncio.current_task():
+                del self._releasing[room]
+
+    async def _renew(self) -> None:
+        """Extend the leases of the owned rooms; one taken over by another process is lost."""
+        origin = self.origin.encode()
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            for room in list(self.owned):
+                key = self._lease_key(room)
+                try:
+                    owner = await self._execute("GET", key)
+                    if owner == origin:
+                        await self._execute("PEXPIRE", key, str(int(self.lease_seconds * 1000)))
+                        continue
+                    # Expired while Redis was unreachable, and nobody took it over
+                    if owner is None and room in self.owned and await self._take_lease(room):
+                        continue
+                except (BackplaneUnavailableError, RedisError) as e:
+                    logger.warning(f"Could not renew room leases: {e}")
+                    break
+                self._lost(room)
+
+    async def stop(self) -> None:
+        # Hand the rooms over now rather than when their leases expire
+        for room in list(self.owned):
+            self.release(room)
+        if self._releasing:
+            await asyncio.wait(list(self._releasing.values()), timeout=self.claim_timeout)
+        for task in (self._renewer, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._renewer = None
+        await super().stop()
+
+def create_backplane() -> Backplane:
+    """Build the backplane selected by settings."""
+    if settings.WS_BACKPLANE == "unix":
+        return UnixSocketBackplane(settings.WS_BACKPLANE_SOCKET_PATH)
+    if settings.WS_BACKPLANE == "redis":
+        return RedisBackplane(settings.WS_BACKPLANE_REDIS_URL, settings.WS_BACKPLANE_CHANNEL_PREFIX)
+    if settings.WS_BACKPLANE != "memory":
+        raise ValueError(f"Unknown WebSocket backplane: {settings.WS_BACKPLANE}")
+    return InProcessBackplane()
@@ -0,0 +1,634 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import multiprocessing
+import tarfile
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+from app.core.config import settings
+from app.services.document_service import ANALYZER_VERSION, DocumentService
+from app.services.project_manifest import ManifestEntry, ProjectManifestStore, project_manifests
+
+logger = logging.getLogger(__name__)
+
+# Directories that hold dependencies, build output or VCS data rather than project code
+DEFAULT_IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "vendor",
+    "__pycache__", ".venv", "venv", "site-packages", ".tox", ".mypy_cache",
+    ".pytest_cache", "dist", "build", ".next", "coverage",
+})
+
+SOURCE_EXTENSIONS = frozenset({'.py', '.js', '.ts', '.md', '.rst', '.txt', '.json'})
+
+# Fields of a file record kept in the project manifest
+MANIFEST_RESULT_KEYS = ("language", "documentable", "documented", "code_structure", "metadata")
+
+# (content, file extension, code structure, previous documentation) -> documentation
+Documenter = Callable[[str, str, Dict[str, Any], Optional[str]], Awaitable[str]]
+
+class BatchAnalysisError(Exception):
+    """Raised when an archive or directory cannot be analyzed."""
+
+def _translate_gitignore(pattern: str) -> str:
+    """Translate one gitignore glob to a regex matched against a relative posix path."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+            continue
+        if char == "*":
+            parts.append(".*" if pattern.startswith("**", i) else "[^/]*")
+            i += 2 if pattern.startswith("**", i) else 1
+            continue
+        if char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+class IgnoreRules:
+    """
+    The subset of .gitignore semantics needed to skip files in a repository.
+
+    Rules are collected from every .gitignore on the way down and apply to
+    paths below the directory that holds them. Patterns without a slash
+    match a name at any depth, a trailing slash matches directories only,
+    ``!`` re-includes and the last matching rule wins. As in git, files
+    inside an ignored directory cannot be re-included.
+    """
+
+    def __init__(self, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS):
+        self.ignored_dirs = frozenset(ignored_dirs)
+        # (base directory, regex, negated, directories only)
+        self._rules: List[Tuple[str, Pattern, bool, bool]] = []
+
+    def add_patterns(self, lines: Iterable[str], base: str = "") -> None:
+        """
+        Add gitignore patterns.
+
+        Args:
+            lines: Lines of a .gitignore file
+            base: Posix path, relative to the root, of the directory holding the file
+        """
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            regex = _translate_gitignore(line.lstrip("/"))
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            self._rules.append((base, re.compile(regex + r"\Z"), negated, dir_only))
+
+    def load(self, directory: Path, base: str = "") -> None:
+        """Add the patterns of ``directory/.gitignore`` if there is one."""
+        gitignore = directory / ".gitignore"
+        if gitignore.is_file():
+            try:
+                self.add_patterns(gitignore.read_text(encoding="utf-8", errors="replace").splitlines(), base)
+            except OSError as e:
+                logger.warning(f"Could not read {gitignore}: {str(e)}")
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Check a posix path relative to the root.
+
+        Args:
+            path: Relative path of the file or directory
+            is_dir: Whether the path is a directory
+
+        Returns:
+            True if the path should be skipped
+        """
+        if is_dir and path.rsplit("/", 1)[-1] in self.ignored_dirs:
+            return True
+        ignored = False
+        for base, regex, negated, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not path.startswith(base + "/"):
+                    continue
+                relative = path[len(base) + 1:]
+            else:
+                relative = path
+            if regex.match(relative):
+                ignored = not negated
+        return ignored
+
+def collect_files(
+    root: str,
+    extensions: Iterable[str] = SOURCE_EXTENSIONS,
+    ignore: Optional[IgnoreRules] = None
+) -> Iterator[Tuple[str, str, int]]:
+    """
+    Walk a directory tree, skipping ignored paths and symlinks.
+
+    Args:
+        root: Directory to walk
+        extensions: File extensions to include
+        ignore: Ignore rules; defaults to the standard ignored directories
+
+    Yields:
+        (relative posix path, absolute path, size in bytes) in a stable order
+    """
+    extensions = frozenset(extensions)
+    ignore = ignore or IgnoreRules()
+    root_path = Path(root)
+    for directory, dirnames, filenames in os.walk(root_path):
+        directory_path = Path(directory)
+        base = directory_path.relative_to(root_path).as_posix()
+        base = "" if base == "." else base
+        ignore.load(directory_path, base)
+
+        kept = []
+        for name in sorted(dirnames):
+            relative = f"{base}/{name}" if base else name
+            if not (directory_path / name).is_symlink() and not ignore.is_ignored(relative, is_dir=True):
+                kept.append(name)
+        dirnames[:] = kept
+
+        for name in sorted(filenames):
+            path = directory_path / name
+            relative = f"{base}/{name}" if base else name
+            if path.suffix.lower() not in extensions or path.is_symlink():
+                continue
+            if ignore.is_ignored(relative):
+                continue
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            yield relative, str(path), size
+
+def _safe_member_path(destination: Path, name: str) -> Optional[Path]:
+    """Resolve an archive member inside ``destination``, or None if it would escape it."""
+    name = name.replace("\\", "/")
+    if name.startswith("/") or re.match(r"^[A-Za-z]:", name):
+        return None
+    target = (destination / name).resolve()
+    if target != destination and destination not in target.parents:
+        return None
+    return target
+
+def _wanted_member(name: str, extensions: frozenset) -> bool:
+    suffix = Path(name).suffix.lower()
+    return suffix in extensions or Path(name).name == ".gitignore"
+
+def extract_archive(
+    archive_path: str,
+    destination: str,
+    max_bytes: int,
+    extensions: Iterable[str] = SOURCE_EXTENSIONS
+) -> int:
+    """
+    Extract the source files of a zip or tar archive.
+
+    Only regular files with an analyzable extension (and .gitignore files)
+    are written. Members with absolute or ``..`` paths, links and devices
+    are skipped, and extraction stops with an error once more than
+    ``max_bytes`` have been decompressed, whatever the headers claim.
+
+    Args:
+        archive_path: Path of the uploaded archive
+        destination: Empty directory to extract into
+        max_bytes: Limit on the total decompressed size
+        extensions: File extensions to extract
+
+    Returns:
+        Number of files extracted
+    """
+    extensions = frozenset(extensions)
+    destination_path = Path(destination).resolve()
+    budget = [max_bytes]
+
+    def write(source, name: str) -> bool:
+        target = _safe_member_path(destination_path, name)
+        if target is None:
+            logger.warning(f"Skipping unsafe archive member {name!r}")
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "wb") as out:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                budget[0] -= len(chunk)
+                if budget[0] < 0:
+                    raise BatchAnalysisError(f"Archive expands to more than {max_bytes} bytes")
+                out.write(chunk)
+        return True
+
+    extracted = 0
+    if zipfile.is_zipfile(archive_path):
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    # Unix file type in the high bits; symlinks and devices are skipped
+                    file_type = (info.external_attr >> 16) & 0o170000
+                    if info.is_dir() or (file_type and file_type != 0o100000):
+                        continue
+                    if not _wanted_member(info.filename, extensions):
+                        continue
+                    with archive.open(info) as source:
+                        extracted += write(source, info.filename)
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            raise BatchAnalysisError(f"Corrupt zip archive: {str(e)}")
+        return extracted
+
+    try:
+        archive = tarfile.open(archive_path, mode="r:*")
+    except tarfile.TarError:
+        raise BatchAnalysisError("Unsupported archive format; upload a zip or tar(.gz/.bz2/.xz) file")
+    try:
+        with archive:
+            for member in archive:
+                if not member.isfile() or not _wanted_member(member.name, extensions):
+                    continue
+                source = archive.extractfile(member)
+                if source is not None:
+                    with source:
+                        extracted += write(source, member.name)
+    except (tarfile.TarError, zlib.error, EOFError) as e:
+        raise BatchAnalysisError(f"Corrupt tar archive: {str(e)}")
+    return extracted
+
+def resolve_allowed_directory(path: str, allowed_roots: Iterable[str]) -> str:
+    """
+    Resolve a server-side directory that may be analyzed.
+
+    Args:
+        path: Requested directory
+        allowed_roots: Directories under which analysis is permitted
+
+    Returns:
+        The resolved directory
+
+    Raises:
+        PermissionError: If the directory is outside every allowed root
+        FileNotFoundError: If it does not exist
+    """
+    resolved = Path(path).resolve()
+    for root in allowed_roots:
+        root_path = Path(root).resolve()
+        if resolved == root_path or root_path in resolved.parents:
+            if not resolved.is_dir():
+                raise FileNotFoundError(f"Directory not found: {path}")
+            return str(resolved)
+    raise PermissionError(f"Directory is not under an allowed analysis root: {path}")
+
+_worker_service = None
+
+def analyze_source_file(path: str, relative_path: str, known_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read and analyze one file. Runs in a worker process.
+
+    Args:
+        path: Absolute path of the file
+        relative_path: Path reported in the result
+        known_hash: Version hash of a stored analysis of this file; if the
+            content still has this hash it is not analyzed again
+
+    Returns:
+        A ``file`` record with the code structure and metadata, an
+        ``unchanged`` record, or an ``error`` record
+    """
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = DocumentService()
+
+    extension = Path(path).suffix.lower()
+    try:
+        with open(path, 'rb') as file:
+            content = file.read().decode('utf-8')
+        version_hash = _worker_service._generate_version_hash(content)
+        if version_hash == known_hash:
+            return {"type": "unchanged", "path": relative_path, "version_hash": version_hash}
+        code_structure = _worker_service._analyze_code_structure(content, extension)
+        metadata = _worker_service._extract_metadata(content, extension)
+    except Exception as e:
+        return {"type": "error", "path": relative_path, "error": f"{type(e).__name__}: {str(e)}"}
+
+    elements = code_structure.get('functions', []) + code_structure.get('classes', [])
+    return {
+        "type": "file",
+        "path": relative_path,
+        "version_hash": version_hash,
+        "language": _worker_service.supported_formats.get(extension, 'unknown'),
+        "documentable": len(elements),
+        "documented": sum(1 for element in elements if element.get('has_docstring')),
+        "code_structure": code_structure,
+        "metadata": metadata
+    }
+
+class CoverageSummary:
+    """Project-wide documentation coverage accumulated from file records."""
+
+    def __init__(self):
+        self.files = 0
+        self.errors = 0
+        self.skipped = 0
+        self.documentable = 0
+        self.documented = 0
+        self.lines = 0
+        self.languages: Dict[str, Dict[str, int]] = {}
+        self.truncated = False
+
+    def add(self, record: Dict[str, Any]) -> None:
+        if record["type"] == "error":
+            self.errors += 1
+            return
+        if record["type"] == "skipped":
+            self.skipped += 1
+            return
+        self.files += 1
+        self.documentable += record["documentable"]
+        self.documented += record["documented"]
+        self.lines += record["metadata"].get("line_count", 0)
+        language = self.languages.setdefault(record["language"], {"files": 0, "documentable": 0, "documented": 0})
+        language["files"] += 1
+        language["documentable"] += record["documentable"]
+        language["documented"] += record["documented"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        def coverage(documented: int, documentable: int) -> float:
+            return round(documented / documentable, 4) if documentable else 0.0
+
+        return {
+            "type": "summary",
+            "files": self.files,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "truncated": self.truncated,
+            "lines": self.lines,
+            "documentable": self.documentable,
+            "documented": self.documented,
+            "coverage": coverage(self.documented, self.documentable),
+            "languages": {
+                name: {**counts, "coverage": coverage(counts["documented"], counts["documentable"])}
+                for name, counts in sorted(self.languages.items())
+            }
+        }
+
+class BatchAnalyzer:
+    """
+    Analyzes whole repositories on a pool of worker processes.
+
+    Parsing is CPU-bound, so files are fanned out to a ``ProcessPoolExecutor``
+    instead of running on the event loop. At most ``max_workers * 4`` files
+    are in flight so results stream back while the tree is still being
+    worked through, and a client that disconnects stops the submissions.
+
+    When a project id is given, results are recorded in the project's
+    manifest and a resubmission only re-analyzes (and re-documents) files
+    whose version hash changed.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_files: int = 20000,
+        max_file_bytes: int = 1024 * 1024,
+        manifests: ProjectManifestStore = project_manifests
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.manifests = manifests
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.files_analyzed = 0
+        self.files_reused = 0
+        self.batches = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # The pool starts inside a threaded server; a forked worker could inherit
+            # a lock (logging, SQLite) held by another thread and deadlock on it
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                # Import the analyzers once in the single-threaded fork server, not in every worker
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the worker processes; a later batch starts a new pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _analyze_file(
+        self,
+        relative: str,
+        path: str,
+        entry: Optional[ManifestEntry],
+        documenter: Optional[Documenter]
+    ) -> Dict[str, Any]:
+        """Analyze one file on the pool, reusing ``entry`` if the file is unchanged."""
+        reusable = (
+            entry is not None
+            and entry.analyzer_version == ANALYZER_VERSION
+            and (documenter is None or entry.documentation is not None)
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            record = await loop.run_in_executor(
+                self._get_executor(), analyze_source_file, path, relative, entry.version_hash if reusable else None
+            )
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); the next submission starts a fresh pool
+            logger.error(f"Analysis worker crashed on {relative}: {str(e)}")
+            self._executor = None
+            return {"type": "error", "path": relative, "error": "Analysis worker crashed"}
+        except Exception as e:
+            return {"type": "error", "path": relative, "error": f"{type(e).__name__}: {str(e)}"}
+
+        if record["type"] == "unchanged":
+            record = {"type": "file", "path": relative, "version_hash": entry.version_hash, **entry.result, "reused": True}
+            if entry.documentation is not None:
+                record["documentation"] = entry.documentation
+            return record
+        if record["type"] == "file":
+            record["reused"] = False
+            if documenter is not None:
+                try:
+                    content = await asyncio.to_thread(Path(path).read_text, encoding="utf-8")
+                    record["documentation"] = await documenter(
+                        content,
+                        Path(path).suffix.lower(),
+                        record["code_structure"],
+                        entry.documentation if entry else None
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not document {relative}: {str(e)}")
+                    record["documentation_error"] = str(e)
+        return record
+
+    async def analyze_directory(
+        self,
+        root: str,
+        ignore: Optional[IgnoreRules] = None,
+        project_id: Optional[str] = None,
+        documenter: Optional[Documenter] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze every source file under ``root``.
+
+        Args:
+            root: Directory to analyze
+            ignore: Ignore rules; .gitignore files in the tree are added to them
+            project_id: Project whose manifest is diffed against and updated
+            documenter: Coroutine generating documentation for an analyzed
+                file from (content, extension, code structure, previous
+                documentation); only called for added or modified files
+
+        Yields:
+            ``file``, ``error`` and ``skipped`` records in completion order,
+            ``deleted`` records for files dropped from the manifest, then one
+            ``summary`` record with project-wide coverage and how many files
+            were reused versus recomputed
+        """
+        started = time.perf_counter()
+        self.batches += 1
+        summary = CoverageSummary()
+        # Walking stats every file, so it runs off the event loop as well
+        entries = await asyncio.to_thread(lambda: list(collect_files(root, ignore=ignore)))
+        if len(entries) > self.max_files:
+            summary.truncated = True
+            entries = entries[:self.max_files]
+
+        known: Dict[str, ManifestEntry] = {}
+        if project_id is not None:
+            known = await asyncio.to_thread(self.manifests.load, project_id)
+        changes = {"reused": 0, "recomputed": 0, "added": 0, "modified": 0, "deleted": 0}
+        updates: List[ManifestEntry] = []
+        current: Set[str] = set()
+
+        pending: Set[asyncio.Task] = set()
+        queue = iter(entries)
+        window = self.max_workers * 4
+        try:
+            while True:
+                for relative, path, size in queue:
+                    if size > self.max_file_bytes:
+                        record = {"type": "skipped", "path": relative, "reason": f"larger than {self.max_file_bytes} bytes"}
+                        summary.add(record)
+                        yield record
+                        continue
+                    pending.add(asyncio.create_task(self._analyze_file(relative, path, known.get(relative), documenter)))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    record = task.result()
+                    if record["type"] == "file":
+                        current.add(record["path"])
+                        if record["reused"]:
+                            changes["reused"] += 1
+                        else:
+                            changes["recomputed"] += 1
+                            changes["modified" if record["path"] in known else "added"] += 1
+                            updates.append(ManifestEntry(
+                                path=record["path"],
+                                version_hash=record["version_hash"],
+                                analyzer_version=ANALYZER_VERSION,
+                                result={key: record[key] for key in MANIFEST_RESULT_KEYS},
+                                documentation=record.get("documentation")
+                            ))
+                    summary.add(record)
+                    yield record
+
+                if project_id is not None and len(updates) >= 100:
+                    await asyncio.to_thread(self.manifests.upsert, project_id, updates)
+                    updates = []
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if project_id is not None:
+            await asyncio.to_thread(self.manifests.upsert, project_id, updates)
+            if not summary.truncated:
+                # Entries of files that are gone, failed or were skipped are stale
+                walked = {relative for relative, _, _ in entries}
+                stale = sorted(set(known) - current)
+                await asyncio.to_thread(self.manifests.delete, project_id, stale)
+                for path in stale:
+                    if path not in walked:
+                        changes["deleted"] += 1
+                        yield {"type": "deleted", "path": path}
+
+        self.files_analyzed += changes["recomputed"]
+        self.files_reused += changes["reused"]
+        result = summary.to_dict()
+        result["reused"] = changes["reused"]
+        result["recomputed"] = changes["recomputed"]
+        if project_id is not None:
+            result["project_id"] = project_id
+            result["added"] = changes["added"]
+            result["modified"] = changes["modified"]
+            result["deleted"] = changes["deleted"]
+        result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Analyzed {summary.files} files ({changes['reused']} reused, {summary.errors} errors, "
+            f"{summary.skipped} skipped) in {result['elapsed_seconds']}s, coverage {result['coverage']:.1%}"
+        )
+        yield result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "pool_running": self._executor is not None,
+            "batches": self.batches,
+            "files_analyzed": self.files_analyzed,
+            "files_reused": self.files_reused
+        }
+
+batch_analyzer = BatchAnalyzer(
+    max_workers=settings.BATCH_ANALYSIS_WORKERS or None,
+    max_files=settings.BATCH_ANALYSIS_MAX_FILES,
+    max_file_bytes=settings.BATCH_ANALYSIS_MAX_FILE_BYTES
+)
@@ -0,0 +1,382 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (tag, i1, i2, j1, j2) with the same meaning as difflib.SequenceMatcher.get_opcodes()
+Opcode = Tuple[str, int, int, int, int]
+
+# Words, runs of whitespace and single punctuation characters
+_WORD_RE = re.compile(r"\w+|\s+|[^\w\s]")
+
+def _intern(a: Sequence[Hashable], b: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    """Replace each distinct line (or word) by a small integer so comparisons are int compares."""
+    ids: Dict[Hashable, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest run of pairs (sorted by a-index) whose b-indexes increase (patience sorting)."""
+    tails: List[int] = []  # b-index of the smallest tail of each pile
+    tail_pairs: List[int] = []  # index into pairs of that tail
+    back = [-1] * len(pairs)
+    for n, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            back[n] = tail_pairs[lo - 1]
+        if lo == len(tails):
+            tails.append(j)
+            tail_pairs.append(n)
+        else:
+            tails[lo] = j
+            tail_pairs[lo] = n
+    result = []
+    n = tail_pairs[-1] if tail_pairs else -1
+    while n != -1:
+        result.append(pairs[n])
+        n = back[n]
+    result.reverse()
+    return result
+
+def _unique_anchors(a: List[int], a_lo: int, a_hi: int, b: List[int], b_lo: int, b_hi: int) -> List[Tuple[int, int]]:
+    """Lines occurring exactly once on each side, aligned by patience sorting."""
+    counts: Dict[int, List[int]] = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.get(a[i])
+        if entry is None:
+            counts[a[i]] = [1, 0, i, -1]
+        else:
+            entry[0] += 1
+    for j in range(b_lo, b_hi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+    pairs = [(entry[2], entry[3]) for entry in counts.values() if entry[0] == 1 and entry[1] == 1]
+    pairs.sort()
+    return _longest_increasing(pairs)
+
+def _middle_snake(a: List[int], a_lo: int, a_hi: int, b: List[int], b_lo: int, b_hi: int) -> Tuple[int, int, int, int]:
+    """
+    Myers' middle snake of a[a_lo:a_hi] vs b[b_lo:b_hi] in linear space.
+
+    Returns:
+        (x, y, u, v): the snake runs diagonally from (x, y) to (u, v),
+        relative to (a_lo, b_lo)
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            kr = delta - k
+            if odd and -(d - 1) <= kr <= d - 1 and x + backward[offset + kr] >= n:
+                return x0, y0, x, y
+        for kr in range(-d, d + 1, 2):
+            if kr == -d or (kr != d and backward[offset + kr - 1] < backward[offset + kr + 1]):
+                x = backward[offset + kr + 1]
+            else:
+                x = backward[offset + kr - 1] + 1
+            y = x - kr
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - x - 1] == b[b_hi - y - 1]:
+                x += 1
+                y += 1
+            backward[offset + kr] = x
+            k = delta - kr
+            if not odd and -d <= k <= d and x + forward[offset + k] >= n:
+                return n - x, m - y, n - x0, m - y0
+    raise AssertionError("middle snake not found")
+
+def matching_blocks(a: Sequence[Hashable], b: Sequence[Hashable]) -> List[Tuple[int, int, int]]:
+    """
+    Matching runs between two sequences, as (i, j, size) sorted by position.
+
+    Patience diff: elements that occur exactly once on both sides are
+    matched first and split the problem into independent regions; regions
+    without such anchors (runs of blank lines, repeated list markers) fall
+    back to Myers' O(ND) algorithm. Common prefixes and suffixes are
+    stripped from every region before either step.
+    """
+    a, b = _intern(a, b)
+    matches: List[Tuple[int, int]] = []
+    # Explicit stack of regions: repetitive documents would otherwise recurse very deep
+    stack = [(0, len(a), 0, len(b), True)]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi, patience = stack.pop()
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi) if patience else []
+        if anchors:
+            previous_i, previous_j = a_lo, b_lo
+            for i, j in anchors:
+                matches.append((i, j))
+                stack.append((previous_i, i, previous_j, j, True))
+                previous_i, previous_j = i + 1, j + 1
+            stack.append((previous_i, a_hi, previous_j, b_hi, True))
+            continue
+
+        if set(a[a_lo:a_hi]).isdisjoint(b[b_lo:b_hi]):
+            continue
+        x, y, u, v = _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi)
+        for offset in range(u - x):
+            matches.append((a_lo + x + offset, b_lo + y + offset))
+        # Sub-regions of a Myers split have no unique anchors worth looking for again
+        stack.append((a_lo, a_lo + x, b_lo, b_lo + y, False))
+        stack.append((a_lo + u, a_hi, b_lo + v, b_hi, False))
+
+    matches.sort()
+    blocks: List[Tuple[int, int, int]] = []
+    for i, j in matches:
+        if blocks and blocks[-1][0] + blocks[-1][2] == i and blocks[-1][1] + blocks[-1][2] == j:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + 1)
+        else:
+            blocks.append((i, j, 1))
+    return blocks
+
+def get_opcodes(a: Sequence[Hashable], b: Sequence[Hashable]) -> List[Opcode]:
+    """Opcodes turning ``a`` into ``b``, in difflib's format."""
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for block_i, block_j, size in matching_blocks(a, b) + [(len(a), len(b), 0)]:
+        if i < block_i and j < block_j:
+            opcodes.append(("replace", i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(("delete", i, block_i, j, j))
+        elif j < block_j:
+            opcodes.append(("insert", i, i, j, block_j))
+        if size:
+            opcodes.append(("equal", block_i, block_i + size, block_j, block_j + size))
+        i, j = block_i + size, block_j + size
+    return opcodes
+
+def word_diff(old: str, new: str) -> List[Tuple[str, str]]:
+    """
+    Word-level changes between two pieces of text.
+
+    Returns:
+        (tag, text) segments in order, tag being 'equal', 'delete' or 'insert'
+    """
+    old_words = _WORD_RE.findall(old)
+    new_words = _WORD_RE.findall(new)
+    segments: List[Tuple[str, str]] = []
+    for tag, i1, i2, j1, j2 in get_opcodes(old_words, new_words):
+        if tag == "equal":
+            segments.append(("equal", "".join(old_words[i1:i2])))
+            continue
+        if i1 < i2:
+            segments.append(("delete", "".join(old_words[i1:i2])))
+        if j1 < j2:
+            segments.append(("insert", "".join(new_words[j1:j2])))
+    return segments
+
+def _format_range(start: int, stop: int) -> str:
+    """Line range of a unified diff hunk header, as difflib writes it."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+@dataclass
+class DiffResult:
+    """
+    Line diff of two texts.
+
+    Opcodes are computed once; stats, hunks and the unified text are derived
+    from them and the first two are kept, so a cached result answers every
+    question about the pair without diffing again.
+    """
+    old_lines: List[str] = field(repr=False)
+    new_lines: List[str] = field(repr=False)
+    opcodes: List[Opcode]
+    context: int = 3
+    max_word_diff_chars: int = 20000
+
+    @cached_property
+    def stats(self) -> Dict[str, int]:
+        """Lines only in the new text, lines only in the old text, and replaced blocks."""
+        stats = {"added": 0, "removed": 0, "modified": 0}
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag == "insert":
+                stats["added"] += j2 - j1
+            elif tag == "delete":
+                stats["removed"] += i2 - i1
+            elif tag == "replace":
+                stats["modified"] += 1
+        return stats
+
+    @cached_property
+    def grouped_opcodes(self) -> List[List[Opcode]]:
+        """Changes grouped into hunks with ``context`` unchanged lines around them."""
+        codes = list(self.opcodes) or [("equal", 0, 1, 0, 1)]
+        if codes[0][0] == "equal":
+            tag, i1, i2, j1, j2 = codes[0]
+            codes[0] = tag, max(i1, i2 - self.context), i2, max(j1, j2 - self.context), j2
+        if codes[-1][0] == "equal":
+            tag, i1, i2, j1, j2 = codes[-1]
+            codes[-1] = tag, i1, min(i2, i1 + self.context), j1, min(j2, j1 + self.context)
+        groups, group = [], []
+        for tag, i1, i2, j1, j2 in codes:
+            if tag == "equal" and i2 - i1 > 2 * self.context:
+                group.append((tag, i1, min(i2, i1 + self.context), j1, min(j2, j1 + self.context)))
+                groups.append(group)
+                group = []
+                i1, j1 = max(i1, i2 - self.context), max(j1, j2 - self.context)
+            group.append((tag, i1, i2, j1, j2))
+        if group and not (len(group) == 1 and group[0][0] == "equal"):
+            groups.append(group)
+        return groups
+
+    @cached_property
+    def hunks(self) -> List[Dict[str, Any]]:
+        """
+        Structured hunks: line ranges, per-line operations, and for replaced
+        blocks a word-level diff of the old against the new lines.
+        """
+        hunks = []
+        for group in self.grouped_opcodes:
+            lines, words = [], []
+            for tag, i1, i2, j1, j2 in group:
+                if tag == "equal":
+                    lines.extend({"op": " ", "text": line} for line in self.old_lines[i1:i2])
+                    continue
+                lines.extend({"op": "-", "text": line} for line in self.old_lines[i1:i2])
+                lines.extend({"op": "+", "text": line} for line in self.new_lines[j1:j2])
+                if tag == "replace":
+                    old_text = "".join(self.old_lines[i1:i2])
+                    new_text = "".join(self.new_lines[j1:j2])
+                    if len(old_text) + len(new_text) <= self.max_word_diff_chars:
+                        words.append({"old_start": i1 + 1, "new_start": j1 + 1, "segments": word_diff(old_text, new_text)})
+            hunks.append({
+                "old_start": group[0][1] + 1,
+                "old_count": group[-1][2] - group[0][1],
+                "new_start": group[0][3] + 1,
+                "new_count": group[-1][4] - group[0][3],
+                "lines": lines,
+                "word_changes": words
+            })
+        return hunks
+
+    def unified(self, fromfile: str = "old", tofile: str = "new", fromfiledate: str = "", tofiledate: str = "") -> str:
+        """The diff in unified format."""
+        output = []
+        for group in self.grouped_opcodes:
+            if not output:
+                output.append(f"--- {fromfile}\t{fromfiledate}" if fromfiledate else f"--- {fromfile}")
+                output.append(f"+++ {tofile}\t{tofiledate}" if tofiledate else f"+++ {tofile}")
+            first, last = group[0], group[-1]
+            output.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@")
+            for tag, i1, i2, j1, j2 in group:
+                if tag == "equal":
+                    output.extend(" " + line.rstrip("\r\n") for line in self.old_lines[i1:i2])
+                    continue
+                output.extend("-" + line.rstrip("\r\n") for line in self.old_lines[i1:i2])
+                output.extend("+" + line.rstrip("\r\n") for line in self.new_lines[j1:j2])
+        return "\n".join(output)
+
+def diff_texts(old: str, new: str, context: int = 3) -> DiffResult:
+    """Line diff of two texts."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    return DiffResult(old_lines, new_lines, get_opcodes(old_lines, new_lines), context=context)
+
+class DiffCache:
+    """
+    LRU of diff results by (old version, new version).
+
+    Versions never change once created, so an entry stays valid until it
+    is evicted; comparing the same two versions again (reviewers flipping
+    between them, several clients opening the same comparison) costs a
+    dictionary lookup.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], DiffResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(
+        self,
+        old_key: str,
+        new_key: str,
+        old: Union[str, Callable[[], str]],
+        new: Union[str, Callable[[], str]]
+    ) -> DiffResult:
+        """
+        Return the cached diff of the pair, computing it on a miss.
+
+        ``old`` and ``new`` may be callables so contents that are expensive
+        to rebuild (e.g. from a version chain) are only loaded on a miss.
+        """
+        key = (old_key, new_key)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = diff_texts(old() if callable(old) else old, new() if callable(new) else new)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+version_diff_cache = DiffCache(max_entries=settings.DIFF_CACHE_SIZE)
@@ -1,30 +1,103 @@
 import os
-import re
+import ast
+import asyncio
+import codecs
 import json
 import hashlib
 import logging
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple, Set
+from typing import AsyncIterable, Dict, Any, List, Optional, Tuple, Set, Union
 from datetime import datetime
-import openai
-from openai import OpenAI
-import difflib
 import uuid
 from dataclasses import dataclass, field
 from collections import defaultdict
 
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache
+from app.services.js_analyzer import analyze_javascript
+from app.services.llm_gateway import llm_gateway
+from app.services.map_reduce import estimate_tokens, map_reduce_generator
+from app.services.version_store import VersionChain
+from app.services.diff_engine import diff_texts, version_diff_cache
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Bump whenever an analyzer's output changes so cached structures are not reused
+ANALYZER_VERSION = "2"
+
+# Parsed code structure and metadata by content hash, shared by every DocumentService
+analysis_cache = LLMResponseCache(
+    max_entries=settings.ANALYSIS_CACHE_SIZE,
+    ttl=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    path=settings.ANALYSIS_CACHE_PATH
+)
+
+# Text, UTF-8 bytes, or UTF-8 byte chunks as they arrive (e.g. from an upload)
+DocumentSource = Union[str, bytes, AsyncIterable[bytes]]
+
+class DocumentTooLargeError(ValueError):
+    """Raised when a document exceeds the accepted size."""
+
+async def read_text(source: DocumentSource, max_bytes: int) -> str:
+    """
+    Decode a document source to text, enforcing ``max_bytes``.
+    
+    Byte streams are decoded incrementally and rejected as soon as they
+    pass the limit, without reading the rest.
+    
+    Args:
+        source: Text, UTF-8 bytes or an async iterator of UTF-8 byte chunks
+        max_bytes: Largest accepted size in bytes
+        
+    Returns:
+        The decoded text
+        
+    Raises:
+        DocumentTooLargeError: If the source is larger than ``max_bytes``
+        ValueError: If the bytes are not valid UTF-8
+    """
+    too_large = f"Document is larger than {max_bytes} bytes"
+    if isinstance(source, str):
+        # Cheap upper bound first; only count exactly when it could be over
+        if len(source) * 4 > max_bytes and len(source.encode('utf-8')) > max_bytes:
+            raise DocumentTooLargeError(too_large)
+        return source
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            if len(source) > max_bytes:
+                raise DocumentTooLargeError(too_large)
+            return bytes(source).decode('utf-8')
+        
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = []
+        received = 0
+        async for chunk in source:
+            received += len(chunk)
+            if received > max_bytes:
+                raise DocumentTooLargeError(too_large)
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b'', final=True))
+        return ''.join(parts)
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Document is not valid UTF-8: {str(e)}")
+
 @dataclass
 class DocumentVersion:
-    content: str
+    """One entry of a document's history; the content lives in the shared VersionChain."""
+    chain: VersionChain = field(repr=False)
+    index: int
     author: str
+    content_length: int
     version_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     timestamp: datetime = field(default_factory=datetime.utcnow)
     message: str = ""
     comments: List[Dict] = field(default_factory=list)
 
+    @property
+    def content(self) -> str:
+        return self.chain.get(self.index)
+
 @dataclass
 class Comment:
     content: str
@@ -38,11 +111,13 @@ class DocumentCollaboration:
     def __init__(self, document_id: str):
         self.document_id = document_id
         self.versions: List[DocumentVersion] = []
+        self.chain = VersionChain()
         self.collaborators: Set[str] = set()
         self.pending_suggestions: List[Dict] = []
 
     def add_version(self, content: str, author: str, message: str = "") -> DocumentVersion:
-        version = DocumentVersion(content, author, message=message)
+        index = self.chain.append(content)
+        version = DocumentVersion(self.chain, index, author, len(content), message=message)
         self.versions.append(version)
         return version
 
@@ -55,33 +130,26 @@ class DocumentCollaboration:
         
         if not old_version or not new_version:
             return {"error": "One or both versions not found"}
-            
-        diff = difflib.unified_diff(
-            old_version.content.splitlines(keepends=True),
-            new_version.content.splitlines(keepends=True),
-            fromfile=f"version_{old_version_id[:8]}",
-            tofile=f"version_{new_version_id[:8]}",
-            fromfiledate=old_version.timestamp.isoformat(),
-            tofiledate=new_version.timestamp.isoformat(),
-            lineterm=''
-        )
         
+        # Computed once per version pair; text, hunks and stats all come from the same opcodes.
+        # Contents are rebuilt from the chain only on a cache miss
+        result = version_diff_cache.get_or_compute(
+            old_version_id,
+            new_version_id,
+            lambda: old_version.content,
+            lambda: new_version.content
+        )
         return {
             "old_version": old_version_id,
             "new_version": new_version_id,
-            "diff": '\n'.join(diff),
-            "changes": self._calculate_changes(old_version.content, new_version.content)
-        }
-
-    def _calculate_changes(self, old_content: str, new_content: str) -> Dict[str, int]:
-        old_lines = old_content.splitlines()
-        new_lines = new_content.splitlines()
-        diff = difflib.SequenceMatcher(None, old_lines, new_lines)
-        
-        return {
-            "added": sum(size for op, i1, i2, j1, j2 in diff.get_opcodes() if op == 'insert'),
-            "removed": sum(size for op, i1, i2, j1, j2 in diff.get_opcodes() if op == 'delete'),
-            "modified": sum(1 for op, i1, i2, j1, j2 in diff.get_opcodes() if op == 'replace')
+            "diff": result.unified(
+                fromfile=f"version_{old_version_id[:8]}",
+                tofile=f"version_{new_version_id[:8]}",
+                fromfiledate=old_version.timestamp.isoformat(),
+                tofiledate=new_version.timestamp.isoformat()
+            ),
+            "hunks": result.hunks,
+            "changes": result.stats
         }
 
     def add_comment(self, version_id: str, content: str, author: str) -> Optional[Comment]:
@@ -100,7 +168,7 @@ class DocumentCollaboration:
         return None
 
 class DocumentService:
-    def __init__(self):
+    def __init__(self, analysis_cache: LLMResponseCache = analysis_cache):
         self.supported_formats = {
             '.py': 'python',
             '.js': 'javascript',
@@ -119,6 +187,75 @@ class DocumentService:
             '.ts': self._analyze_typescript_code
         }
         
+        # Documentation quality metrics configuration
+        self.metrics_config = {
+            'coverage_weight': 0.4,
+            'readability_weight': 0.3,
+            'consistency_weight': 0.3,
+            'min_docstring_length': 20,
+            'target_readability_score': 60  # 0-100 scale
+        }
+        
+        self.documentation_standards = {
+            'python': {
+                'function': {
+                    'required': ['description', 'parameters', 'returns', 'raises'],
+                    'template': """{function_name}
+        
+        {description}
+        
+        Args:
+            {parameters}
+            
+        Returns:
+            {returns}
+            
+        Raises:
+            {raises}"""
+                },
+                'class': {
+                    'required': ['description', 'attributes', 'methods'],
+                    'template': """{class_name}
+        
+        {description}
+        
+        Attributes:
+            {attributes}
+            
+        Methods:
+            {methods}"""
+                }
+            },
+            'javascript': {
+                'function': {
+                    'required': ['description', 'params', 'returns', 'throws'],
+                    'template': """/**
+ * {description}
+ * 
+ * @param {{{params}}}
+ * @returns {{{returns}}}
+ * @throws {{{throws}}}
+ */"""
+                },
+                'class': {
+                    'required': ['description', 'properties', 'methods'],
+                    'template': """/**
+ * {description}
+ * 
+ * @class {class_name}
+ * @property {{{properties}}}
+ * 
+ * @method {methods}
+ */"""
+                }
+            }
+        }
+        
+        # Results of _analyze_code_structure/_extract_metadata by content hash and analyzer version
+        self.analysis_cache = analysis_cache
+        self.analyses_computed = 0
+        self.analyses_reused = 0
+        
     # Version History Methods
     def create_document_version(self, document_id: str, content: str, author: str, message: str = "") -> Dict[str, Any]:
         """Create a new version of a document."""
@@ -147,7 +284,7 @@ class DocumentService:
             "timestamp": v.timestamp.isoformat(),
             "author": v.author,
             "message": v.message,
-            "content_length": len(v.content)
+            "content_length": v.content_length
         } for v in collaboration.versions]
     
     def get_version_diff(self, document_id: str, version1_id: str, version2_id: str) -> Dict[str, Any]:
@@ -243,71 +380,6 @@ class DocumentService:
             "timestamp": version.timestamp.isoformat(),
             "message": version.message
         }
-        
-        # Documentation quality metrics configuration
-        self.metrics_config = {
-            'coverage_weight': 0.4,
-            'readability_weight': 0.3,
-            'consistency_weight': 0.3,
-            'min_docstring_length': 20,
-            'target_readability_score': 60  # 0-100 scale
-        }
-        
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.documentation_standards = {
-            'python': {
-                'function': {
-                    'required': ['description', 'parameters', 'returns', 'raises'],
-                    'template': """{function_name}
-        
-        {description}
-        
-        Args:
-            {parameters}
-            
-        Returns:
-            {returns}
-            
-        Raises:
-            {raises}"""
-                },
-                'class': {
-                    'required': ['description', 'attributes', 'methods'],
-                    'template': """{class_name}
-        
-        {description}
-        
-        Attributes:
-            {attributes}
-            
-        Methods:
-            {methods}"""
-                }
-            },
-            'javascript': {
-                'function': {
-                    'required': ['description', 'params', 'returns', 'throws'],
-                    'template': """/**
- * {description}
- * 
- * @param {{{params}}}
- * @returns {{{returns}}}
- * @throws {{{throws}}}
- */"""
-                },
-                'class': {
-                    'required': ['description', 'properties', 'methods'],
-                    'template': """/**
- * {description}
- * 
- * @class {class_name}
- * @property {{{properties}}}
- * 
- * @method {methods}
- */"""
-                }
-            }
-        }
 
     async def process_document(self, file_path: str, previous_version: str = None) -> Dict[str, Any]:
         """
@@ -328,56 +400,100 @@ class DocumentService:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
 
-            # Analyze code structure using appropriate analyzer
-            code_structure = self._analyze_code_structure(content, file_extension)
+            return await self._process_content(content, file_extension, file_path, previous_version)
             
-            # Generate documentation with AI assistance
-            documentation = await self._generate_documentation(
-                content=content,
-                file_extension=file_extension,
-                code_structure=code_structure,
-                previous_version=previous_version
-            )
-            
-            # Analyze documentation quality
-            quality_metrics = self._analyze_documentation_quality(
-                content=content,
-                documentation=documentation,
-                file_extension=file_extension,
-                code_structure=code_structure
-            )
-            
-            # Generate diff if previous version exists
-            diff = None
-            if previous_version:
-                diff = self._generate_diff(previous_version, documentation)
-            
-            # Extract metadata and generate version hash
-            metadata = self._extract_metadata(content, file_extension)
-            version_hash = self._generate_version_hash(content)
-            
-            # Calculate overall documentation score
-            doc_score = self._calculate_overall_score(quality_metrics)
+        except Exception as e:
+            logger.error(f"Error processing document {file_path}: {str(e)}", exc_info=True)
+            raise Exception(f"Error processing document: {str(e)}")
+
+    async def process_source(
+        self,
+        source: DocumentSource,
+        file_name: str,
+        previous_version: str = None,
+        max_bytes: int = None
+    ) -> Dict[str, Any]:
+        """
+        Process a document held in memory or arriving as a byte stream.
+        
+        Uploads are decoded chunk by chunk as they are read, so nothing is
+        written to disk or read back from it.
+        
+        Args:
+            source: Text, UTF-8 bytes or an async iterator of UTF-8 byte chunks
+            file_name: Name of the document; its extension selects the analyzer
+            previous_version: Optional previous version of the documentation for diffing
+            max_bytes: Largest accepted size (defaults to DOCUMENT_MAX_BYTES)
             
-            return {
-                "file_path": file_path,
-                "documentation": documentation,
-                "metadata": metadata,
-                "code_structure": code_structure,
-                "quality_metrics": {
-                    **quality_metrics,
-                    "overall_score": doc_score,
-                    "grade": self._score_to_grade(doc_score)
-                },
-                "diff": diff,
-                "version_hash": version_hash,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        Returns:
+            Dict containing processed documentation and analysis results
             
+        Raises:
+            DocumentTooLargeError: As soon as more than ``max_bytes`` have been read
+        """
+        file_extension = Path(file_name).suffix.lower()
+        if file_extension not in self.supported_formats:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+        content = await read_text(source, settings.DOCUMENT_MAX_BYTES if max_bytes is None else max_bytes)
+        
+        try:
+            return await self._process_content(content, file_extension, file_name, previous_version)
         except Exception as e:
-            logger.error(f"Error processing document {file_path}: {str(e)}", exc_info=True)
+            logger.error(f"Error processing document {file_name}: {str(e)}", exc_info=True)
             raise Exception(f"Error processing document: {str(e)}")
 
+    async def _process_content(
+        self,
+        content: str,
+        file_extension: str,
+        file_path: str,
+        previous_version: str = None
+    ) -> Dict[str, Any]:
+        """Analyze a document, generate its documentation and score it."""
+        # Analyze code structure and extract metadata, reusing the result for unchanged content;
+        # runs in a thread since a miss parses the file and the cache may read from disk
+        version_hash = self._generate_version_hash(content)
+        code_structure, metadata = await asyncio.to_thread(self._get_analysis, content, file_extension)
+        
+        # Generate documentation with AI assistance
+        documentation = await self._generate_documentation(
+            content=content,
+            file_extension=file_extension,
+            code_structure=code_structure,
+            previous_version=previous_version
+        )
+        
+        # Analyze documentation quality
+        quality_metrics = self._analyze_documentation_quality(
+            content=content,
+            documentation=documentation,
+            file_extension=file_extension,
+            code_structure=code_structure
+        )
+        
+        # Generate diff if previous version exists
+        diff = None
+        if previous_version:
+            diff = self._generate_diff(previous_version, documentation)
+        
+        # Calculate overall documentation score
+        doc_score = self._calculate_overall_score(quality_metrics)
+        
+        return {
+            "file_path": file_path,
+            "documentation": documentation,
+            "metadata": metadata,
+            "code_structure": code_structure,
+            "quality_metrics": {
+                **quality_metrics,
+                "overall_score": doc_score,
+                "grade": self._score_to_grade(doc_score)
+            },
+            "diff": diff,
+            "version_hash": version_hash,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
     async def _generate_documentation(self, content: str, file_extension: str, 
                                     code_structure: Dict, previous_version: str = None) -> str:
         """Generate documentation using AI with enhanced context."""
@@ -388,6 +504,22 @@ class DocumentService:
                 # Fallback documentation when no API key is available
                 return self._generate_fallback_documentation(content, file_extension, code_structure)
                 
+            structure_json = json.dumps(code_structure, separators=(",", ":"), default=str)
+            source_label = "File content"
+            source_text = content
+            if not map_reduce_generator.fits(content, structure_json, previous_version or ""):
+                # Too large for one prompt: document from chunk summaries instead of the raw file
+                reserved = estimate_tokens(structure_json) + estimate_tokens(previous_version or "") + 500
+                notes = await map_reduce_generator.condense(
+                    [{"path": f"source{file_extension}", "content": content}],
+                    "file-level API documentation",
+                    reserved
+                )
+                source_label = "Summaries of the file, in order"
+                source_text = "\n\n".join(notes)
+                if not map_reduce_generator.fits(source_text, structure_json, previous_version or ""):
+                    structure_json = json.dumps(code_structure.get("language"), default=str)
+
             messages = [
                 {
                     "role": "system",
@@ -400,11 +532,11 @@ class DocumentService:
                     "content": f"""
                     Please generate documentation for the following {file_extension} code:
                     
-                    File content:
-                    {content}
+                    {source_label}:
+                    {source_text}
                     
                     Code structure analysis:
-                    {json.dumps(code_structure, indent=2)}
+                    {structure_json}
                     
                     Previous version (if available):
                     {previous_version or 'No previous version available'}
@@ -419,18 +551,13 @@ class DocumentService:
                 }
             ]
             
-            response = self.client.chat.completions.create(
+            return await llm_gateway.complete(
                 model="gpt-4-turbo-preview",
                 messages=messages,
                 temperature=0.3,
                 max_tokens=2000
             )
             
-            # Process the response
-            if response.choices and len(response.choices) > 0:
-                return response.choices[0].message.content
-            return ""
-            
         except Exception as e:
             logger.error(f"Error generating documentation: {str(e)}")
             return f"Error generating documentation: {str(e)}"
@@ -468,6 +595,45 @@ class DocumentService:
             "warning": "No specific analyzer available for this file type"
         }
 
+    def _get_analysis(self, content: str, file_extension: str) -> Tuple[Dict, Dict[str, Any]]:
+        """
+        Return the code structure and metadata of a file, analyzing it only on a cache miss.
+        
+        Args:
+            content: Source code content
+            file_extension: File extension to determine the analyzer
+            
+        Returns:
+            Tuple of (code structure, metadata)
+        """
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        key = f"{ANALYZER_VERSION}\0{file_extension}\0{content_hash}"
+        cached = self.analysis_cache.get(key)
+        if cached is not None:
+            self.analyses_reused += 1
+            entry = json.loads(cached)
+            return entry['code_structure'], entry['metadata']
+        
+        code_structure = self._analyze_code_structure(content, file_extension)
+        metadata = self._extract_metadata(content, file_extension)
+        self.analyses_computed += 1
+        # Stored as JSON so callers never share (and mutate) a cached dict
+        self.analysis_cache.put(key, json.dumps(
+            {'code_structure': code_structure, 'metadata': metadata},
+            separators=(",", ":"),
+            default=str
+        ))
+        return code_structure, metadata
+
+    def get_analysis_stats(self) -> Dict[str, Any]:
+        """Return counters of the code analysis cache."""
+        return {
+            "analyzer_version": ANALYZER_VERSION,
+            "computed": self.analyses_computed,
+            "reused": self.analyses_reused,
+            "cache": self.analysis_cache.get_stats()
+        }
+
     def _analyze_documentation_quality(self, content: str, documentation: str, 
                                       file_extension: str, code_structure: Dict) -> Dict[str, Any]:
         """Analyze documentation quality and completeness."""
@@ -560,14 +726,7 @@ class DocumentService:
 
     def _generate_diff(self, old_content: str, new_content: str) -> str:
         """Generate a unified diff between old and new content."""
-        diff = difflib.unified_diff(
-            old_content.splitlines(keepends=True),
-            new_content.splitlines(keepends=True),
-            fromfile='old',
-            tofile='new',
-            lineterm=''
-        )
-        return '\n'.join(diff)
+        return diff_texts(old_content, new_content).unified(fromfile='old', tofile='new')
     
     def _generate_version_hash(self, content: str) -> str:
         """Generate a hash for version tracking."""
@@ -752,7 +911,7 @@ To enable AI-generated documentation, please set the OPENAI_API_KEY environment
 
     def _analyze_javascript_code(self, content: str) -> Dict[str, Any]:
         """
-        Analyze JavaScript/TypeScript code structure.
+        Analyze JavaScript code structure.
         
         Args:
             content: The source code to analyze
@@ -760,64 +919,14 @@ To enable AI-generated documentation, please set the OPENAI_API_KEY environment
         Returns:
             Dict containing code structure information
         """
-        # Count functions using regex (basic implementation)
-        function_pattern = r'(?:function\s+([a-zA-Z_$][0-9a-zA-Z_$]*)\s*\()|(?:const\s+([a-zA-Z_$][0-9a-zA-Z_$]*)\s*=\s*(?:\([^)]*\)|\w+)\s*=>)'
-        functions = []
-        for match in re.finditer(function_pattern, content):
-            func_name = match.group(1) or match.group(2)
-            if func_name:
-                functions.append({
-                    'name': func_name,
-                    'line': content[:match.start()].count('\n') + 1,
-                    'has_docstring': bool(re.search(r'/\*\*[\s\S]*?\*/', content[:match.start()])),
-                    'type': 'function' if match.group(1) else 'arrow_function'
-                })
-        
-        # Find class definitions
-        class_pattern = r'class\s+([a-zA-Z_$][0-9a-zA-Z_$]*)'
-        classes = []
-        for match in re.finditer(class_pattern, content):
-            classes.append({
-                'name': match.group(1),
-                'line': content[:match.start()].count('\n') + 1,
-                'has_docstring': bool(re.search(r'/\*\*[\s\S]*?\*/', content[:match.start()]))
-            })
-        
-        # Count JSDoc comments
-        jsdoc_comments = re.findall(r'/\*\*[\s\S]*?\*/', content)
-        
-        # Count imports (ES6)
-        imports = []
-        import_pattern = r'import\s+(?:{[^}]*}\s+from\s+)?["\']([^"\']+)["\']'
-        for match in re.finditer(import_pattern, content):
-            imports.append({
-                'module': match.group(1),
-                'line': content[:match.start()].count('\n') + 1
-            })
-        
-        return {
-            'language': 'javascript',
-            'functions': functions,
-            'classes': classes,
-            'imports': imports,
-            'docstrings': jsdoc_comments,
-            'metrics': {
-                'function_count': len(functions),
-                'class_count': len(classes),
-                'import_count': len(imports),
-                'docstring_coverage': self._calculate_docstring_coverage(functions + classes)
-            }
-        }
+        return analyze_javascript(content, 'javascript')
         
     def _analyze_typescript_code(self, content: str) -> Dict[str, Any]:
         """
         Analyze TypeScript code structure.
-        For now, we'll use the same implementation as JavaScript.
-        In a real implementation, we would use a TypeScript parser.
+        The JavaScript tokenizer also understands type annotations, decorators and access modifiers.
         """
-        result = self._analyze_javascript_code(content)
-        result['language'] = 'typescript'
-        return result
+        return analyze_javascript(content, 'typescript')
 
     def _analyze_code_structure(self, content: str, file_extension: str) -> Dict:
         """
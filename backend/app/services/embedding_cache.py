@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding store.
+
+    Vectors are stored as rows of a raw float16 file that is read through a
+    memory map; a tab-separated index maps cache keys to row numbers. Both
+    files are append-only so the store survives restarts and partial writes
+    only ever lose the last entry.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / "embeddings.f16"
+        self.index_path = self.directory / "index.tsv"
+        self.meta_path = self.directory / "meta.json"
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._mmap_rows = 0
+        self._load()
+
+    def _load(self):
+        if self.meta_path.exists():
+            self.dim = json.loads(self.meta_path.read_text())["dim"]
+        if not self.index_path.exists() or not self.dim:
+            return
+
+        complete_rows = os.path.getsize(self.data_path) // (self.dim * 2) if self.data_path.exists() else 0
+        with open(self.index_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < complete_rows:
+                    self.rows[parts[0]] = int(parts[1])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._mmap is None or row >= self._mmap_rows:
+            self._remap()
+        return np.array(self._mmap[row])
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        self.put_many([key], [vector])
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        """Append several vectors with one write to each file."""
+        fresh: Dict[str, np.ndarray] = {}
+        for key, vector in zip(keys, vectors):
+            if key in self.rows or key in fresh:
+                continue
+            vector = np.asarray(vector, dtype=np.float16).reshape(-1)
+            if self.dim is None:
+                self.dim = int(vector.shape[0])
+                self.meta_path.write_text(json.dumps({"dim": self.dim}))
+            elif vector.shape[0] != self.dim:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} does not match store dimension {self.dim}")
+            fresh[key] = vector
+        if not fresh:
+            return
+
+        row_bytes = self.dim * 2
+        size = os.path.getsize(self.data_path) if self.data_path.exists() else 0
+        first, partial = divmod(size, row_bytes)
+        if partial:
+            # Drop a torn row left behind by an interrupted write
+            os.truncate(self.data_path, first * row_bytes)
+        with open(self.data_path, "ab") as data_file:
+            data_file.write(np.stack(list(fresh.values())).tobytes())
+        with open(self.index_path, "a", encoding="utf-8") as index_file:
+            index_file.write("".join(f"{key}\t{first + i}\n" for i, key in enumerate(fresh)))
+        for i, key in enumerate(fresh):
+            self.rows[key] = first + i
+
+    def _remap(self):
+        total_rows = os.path.getsize(self.data_path) // (self.dim * 2)
+        self._mmap = np.memmap(self.data_path, dtype=np.float16, mode="r", shape=(total_rows, self.dim))
+        self._mmap_rows = total_rows
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by a hash of the model name and the text. A bounded LRU
+    keeps hot vectors in memory; an optional memory-mapped disk tier keeps
+    every vector ever computed so re-analysing an unchanged repository after
+    a restart does not hit the model at all. Vectors are stored as float16.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 10000, directory: Optional[str] = None):
+        """
+        Args:
+            model_name: Name of the embedding model, part of every cache key
+            max_entries: Maximum number of vectors held in memory
+            directory: Root directory for the persistent tier (disabled if ``None``)
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk: Optional[DiskEmbeddingStore] = None
+        if directory:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self.disk = DiskEmbeddingStore(os.path.join(directory, slug))
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        """Cache key for a text under this cache's model."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for several texts.
+
+        Returns:
+            One float32 vector per text, or ``None`` where the text is not cached
+        """
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                elif self.disk is not None and key in self.disk:
+                    vector = self.disk.get(key)
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                results.append(vector.astype(np.float32) if vector is not None else None)
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Store embeddings for several texts."""
+        keys, stored = [], []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                keys.append(self.key(text))
+                stored.append(np.asarray(vector, dtype=np.float16))
+                self._remember(keys[-1], stored[-1])
+            if self.disk is not None:
+                # The whole batch in one append
+                self.disk.put_many(keys, stored)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return hit/miss/eviction counters and tier sizes."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_memory_entries": self.max_entries,
+            "disk_entries": len(self.disk) if self.disk is not None else 0
+        }
+
+_shared_caches: Dict[str, EmbeddingCache] = {}
+_shared_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Return the process-wide cache for a model, configured from settings."""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(model_name)
+        if cache is None:
+            cache = EmbeddingCache(
+                model_name,
+                max_entries=settings.EMBEDDING_CACHE_SIZE,
+                directory=settings.EMBEDDING_CACHE_DIR
+            )
+            _shared_caches[model_name] = cache
+        return cache
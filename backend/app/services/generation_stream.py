@@ -0,0 +1,69 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.services.websocket_manager import ConnectionManager, websocket_manager
+
+logger = logging.getLogger(__name__)
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def relay_generation(
+    chunks: AsyncIterator[str],
+    on_complete: Callable[[str], Awaitable[Dict[str, Any]]],
+    document_id: Optional[str] = None,
+    manager: ConnectionManager = websocket_manager
+) -> AsyncIterator[str]:
+    """
+    Relay a streamed generation to an SSE client and to document viewers.
+
+    Every delta is yielded as an SSE ``chunk`` event and, when a document id
+    is given, broadcast as a ``generation_chunk`` message to everyone
+    connected to that document. Once the model finishes, ``on_complete`` is
+    called with the full text (to persist and analyze it) and its result is
+    sent as the ``complete`` event / ``generation_complete`` message.
+
+    Args:
+        chunks: Content deltas from the model
+        on_complete: Coroutine called with the final text
+        document_id: Document whose viewers receive the chunks
+        manager: WebSocket connection manager used for broadcasting
+
+    Yields:
+        SSE-formatted events
+    """
+    parts = []
+    try:
+        async for delta in chunks:
+            index = len(parts)
+            parts.append(delta)
+            yield format_sse("chunk", {"index": index, "delta": delta})
+            if document_id:
+                await manager.broadcast(document_id, {
+                    "type": "generation_chunk",
+                    "document_id": document_id,
+                    "index": index,
+                    "delta": delta
+                })
+
+        result = await on_complete("".join(parts))
+        yield format_sse("complete", result)
+        if document_id:
+            await manager.broadcast(document_id, {
+                "type": "generation_complete",
+                "document_id": document_id,
+                "chunks": len(parts),
+                "timestamp": datetime.utcnow().isoformat()
+            })
+    except Exception as e:
+        logger.error(f"Error streaming generation: {str(e)}")
+        yield format_sse("error", {"detail": str(e)})
+        if document_id:
+            await manager.broadcast(document_id, {
+                "type": "generation_error",
+                "document_id": document_id,
+                "detail": str(e)
+            })
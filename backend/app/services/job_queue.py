@@ -0,0 +1,362 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.websocket_manager import JOB_CHANNEL_PREFIX, ConnectionManager, websocket_manager
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobStore:
+    """
+    SQLite-backed job table.
+
+    A job is claimed by atomically flipping it from ``queued`` to ``running``
+    and stamping the worker id. Running workers refresh ``heartbeat_at``; a
+    job whose heartbeat is older than the lease belongs to a worker that died
+    and is put back in the queue (or failed once it ran out of attempts).
+    Finishing a job only succeeds for the worker that currently holds it.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, owner TEXT, channel TEXT, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "max_attempts INTEGER NOT NULL, worker_id TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, heartbeat_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        owner: Optional[str] = None,
+        channel: Optional[str] = None,
+        max_attempts: int = 3
+    ) -> Dict[str, Any]:
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, owner, channel, max_attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, default=str), JobStatus.QUEUED.value,
+                 owner, channel, max_attempts, time.time())
+            )
+            # Read back under the same lock so a worker cannot claim it in between
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Move the oldest queued job to running for ``worker_id``."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, started_at = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (JobStatus.RUNNING.value, worker_id, now, now, JobStatus.QUEUED.value)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (time.time(), job_id, worker_id, JobStatus.RUNNING.value)
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._settle(job_id, worker_id, JobStatus.DONE, result=json.dumps(result, default=str))
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._settle(job_id, worker_id, JobStatus.FAILED, error=error)
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Return a running job to the queue, e.g. on graceful shutdown."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (JobStatus.QUEUED.value, job_id, worker_id, JobStatus.RUNNING.value)
+            )
+        return cursor.rowcount == 1
+
+    def _settle(
+        self,
+        job_id: str,
+        worker_id: str,
+        status: JobStatus,
+        result: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (status.value, result, error, time.time(), job_id, worker_id, JobStatus.RUNNING.value)
+            )
+        return cursor.rowcount == 1
+
+    def requeue_stale(self, lease_seconds: float) -> List[Dict[str, Any]]:
+        """
+        Recover jobs whose worker stopped heartbeating.
+
+        Returns:
+            Jobs that were failed because they used up their attempts
+        """
+        cutoff = time.time() - lease_seconds
+        with self._lock:
+            exhausted = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= max_attempts RETURNING *",
+                (JobStatus.FAILED.value, "Worker lost the job too many times", time.time(),
+                 JobStatus.RUNNING.value, cutoff)
+            ).fetchall()
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL WHERE status = ? AND heartbeat_at < ?",
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value, cutoff)
+            )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} job(s) abandoned by a lost worker")
+        return [self._to_dict(row) for row in exhausted]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status.value: 0 for status in JobStatus}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+class JobQueue:
+    """
+    Durable background job queue with an in-process worker pool.
+
+    Jobs are persisted in SQLite before the request that submitted them
+    returns, so they survive a worker or process restart: work left running
+    by a dead process is picked up again once its lease expires. Completion
+    (done or failed) is pushed through ConnectionManager to the job's
+    channel, ``job:<id>`` unless the submitter chose another one.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.JOB_QUEUE_PATH,
+        workers: int = settings.JOB_WORKERS,
+        poll_interval: float = settings.JOB_POLL_INTERVAL_SECONDS,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        manager: ConnectionManager = websocket_manager
+    ):
+        """
+        Args:
+            path: SQLite file holding the job table
+            workers: Number of concurrent worker tasks
+            poll_interval: Seconds an idle worker waits before checking for work
+            lease_seconds: Heartbeat age after which a running job is recovered
+            max_attempts: Attempts before a repeatedly lost job is failed
+            manager: WebSocket manager used to push completion
+        """
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.manager = manager
+        self.handlers: Dict[str, JobHandler] = {}
+        self._store: Optional[JobStore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.path)
+        return self._store
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        """Decorator registering the coroutine that executes jobs of ``kind``."""
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.handlers[kind] = handler
+            return handler
+        return decorator
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        owner: Optional[str] = None,
+        channel: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Persist a job and wake a worker; returns the queued job."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        job = await asyncio.to_thread(self.store.enqueue, kind, payload, owner, channel, self.max_attempts)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        await self._recover()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{uuid.uuid4().hex[:8]}-{i}"))
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} job worker(s) on {self.path}")
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        # The flag ends worker loops even if a cancellation is swallowed mid-await
+        self._stopping = True
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _recover(self) -> None:
+        for job in await asyncio.to_thread(self.store.requeue_stale, self.lease_seconds):
+            await self._notify(job)
+
+    async def _worker(self, worker_id: str) -> None:
+        last_recovery = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() - last_recovery > self.lease_seconds / 2:
+                last_recovery = time.monotonic()
+                await self._recover()
+
+            # Clear before claiming so a submit racing with an empty claim still wakes us
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim, worker_id)
+            if job is None:
+                wakeup = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({wakeup}, timeout=self.poll_interval)
+                finally:
+                    wakeup.cancel()
+                continue
+
+            try:
+                await self._run(job, worker_id)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to record job {job['id']}: {str(e)}", exc_info=True)
+
+    async def _run(self, job: Dict[str, Any], worker_id: str) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], worker_id))
+        try:
+            handler = self.handlers.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind: {job['kind']}")
+            result = await handler(job["payload"])
+        except asyncio.CancelledError:
+            # Graceful shutdown: hand the job back so the next start picks it up
+            await asyncio.shield(asyncio.to_thread(self.store.release, job["id"], worker_id))
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            settled = await asyncio.to_thread(self.store.fail, job["id"], worker_id, str(e))
+        else:
+            settled = await asyncio.to_thread(self.store.finish, job["id"], worker_id, result)
+        finally:
+            heartbeat.cancel()
+
+        if settled:
+            await self._notify(await self.get(job["id"]))
+        else:
+            logger.warning(f"Job {job['id']} was reassigned before worker {worker_id} finished it")
+
+    async def _heartbeat(self, job_id: str, worker_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self.store.heartbeat, job_id, worker_id)
+
+    async def _notify(self, job: Dict[str, Any]) -> None:
+        channel = job.get("channel") or f"{JOB_CHANNEL_PREFIX}{job['id']}"
+        try:
+            await self.manager.broadcast(channel, {
+                "type": "job_update",
+                "job_id": job["id"],
+                "kind": job["kind"],
+                "status": job["status"],
+                "result": job["result"],
+                "error": job["error"]
+            })
+        except Exception as e:
+            logger.error(f"Error pushing update for job {job['id']}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "jobs": self.store.counts()
+        }
+
+    @staticmethod
+    def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job fields safe to return to API clients."""
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "result": job["result"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"]
+        }
+
+# Singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,530 @@
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# One token at a time (with the whitespace before it), anchored at the current
+# position. Regular expression literals and the inside of template literals
+# depend on what came before, so they are matched separately by the scanner.
+_TOKEN_RE = re.compile(
+    r"""
+    \s*
+    (?: (?P<jsdoc>/\*\*(?!/)[\s\S]*?(?:\*/|\Z))
+    | (?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+    | (?P<string>"(?:[^"\\\n]|\\[\s\S])*"?|'(?:[^'\\\n]|\\[\s\S])*'?)
+    | (?P<template>`)
+    | (?P<name>\#?[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*)
+    | (?P<number>\.?\d[\w.]*)
+    | (?P<punct>=>|\.\.\.|\?\.|[{}()\[\];,.<>=*/:?!+\-%&|^~@])
+    | (?P<other>.)
+    | (?P<end>\Z)
+    )
+    """,
+    re.X,
+)
+_REGEX_LITERAL_RE = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*")
+# Rest of a template literal up to its end or the next substitution
+_TEMPLATE_CHUNK_RE = re.compile(r"(?:[^`\\$]|\\[\s\S]|\$(?!\{))*(?:`|\$\{|\Z)")
+
+# After these tokens a '/' starts a regular expression rather than a division
+_REGEX_PREFIX_KEYWORDS = frozenset({
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+})
+# Words that may precede a declaration without being part of its name
+_STATEMENT_MODIFIERS = frozenset({"export", "default", "async", "declare", "abstract"})
+_MEMBER_MODIFIERS = frozenset({
+    "static", "async", "get", "set", "public", "private", "protected",
+    "readonly", "abstract", "override", "declare", "*",
+})
+_MEMBER_BOUNDARIES = frozenset({"{", "}", ";", ")"})
+_VARIABLE_KEYWORDS = frozenset({"const", "let", "var"})
+_EXPORTED_DECLARATIONS = frozenset({
+    "function", "class", "const", "let", "var", "interface", "type", "enum", "namespace", "module",
+})
+
+class _Token:
+    __slots__ = ("kind", "value", "start", "doc")
+
+    def __init__(self, kind: str, value: str, start: int, doc: Optional[str]):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.doc = doc
+
+def _clean_jsdoc(comment: str) -> str:
+    """Strip the comment markers and leading asterisks of a JSDoc block."""
+    body = comment[3:-2] if comment.endswith("*/") else comment[3:]
+    lines = [re.sub(r"^\s*\*? ?", "", line) for line in body.splitlines()]
+    return "\n".join(lines).strip()
+
+class JavaScriptAnalyzer:
+    """
+    Single-pass analyzer for JavaScript and TypeScript source.
+
+    The source is tokenized once; comments, strings, template literals and
+    regular expression literals are skipped as whole tokens, so braces and
+    keywords inside them are never mistaken for code. A JSDoc block is
+    attached to a declaration only if nothing but modifiers (``export``,
+    ``async``, ``static``...) stands between the comment and the
+    declaration. The work is linear in the size of the file.
+
+    Recognizes function declarations and expressions, arrow functions
+    assigned to variables or class fields, classes and their methods, ES
+    module imports/exports and ``require`` calls.
+    """
+
+    def __init__(self, content: str, language: str = "javascript"):
+        self.content = content
+        self.language = language
+
+        self.functions: List[Dict[str, Any]] = []
+        self.classes: List[Dict[str, Any]] = []
+        self.imports: List[Dict[str, Any]] = []
+        self.exports: List[Dict[str, Any]] = []
+        self.docstrings: List[str] = []
+
+        self._recent: Deque[_Token] = deque(maxlen=8)
+        self._pending_doc: Optional[str] = None
+        # Open braces: ('block', None), ('class', class dict) or ('template', None)
+        self._braces: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+        # Open parentheses with the tokens that preceded each one
+        self._parens: List[Tuple[_Token, ...]] = []
+        self._closed_paren: Tuple[_Token, ...] = ()
+        self._last_closed: Optional[str] = None
+        self._class_pending: Optional[Dict[str, Any]] = None
+        self._class_paren_depth = 0
+        self._function_pending: Optional[Tuple[_Token, Tuple[_Token, ...]]] = None
+        # [doc, paren depth, phase] while inside ``@decorator(...)``
+        self._decorator: Optional[List[Any]] = None
+        self._module_pending = False
+        self._export_state: Optional[str] = None
+        self._export_names: List[str] = []
+        self._line = 1
+        self._line_offset = 0
+
+    # Positions
+
+    def _line_at(self, offset: int) -> int:
+        # Offsets are requested in increasing order, so counting from the last one keeps this linear
+        if offset >= self._line_offset:
+            self._line += self.content.count("\n", self._line_offset, offset)
+        else:
+            self._line -= self.content.count("\n", offset, self._line_offset)
+        self._line_offset = offset
+        return self._line
+
+    # Tokenizer
+
+    def analyze(self) -> Dict[str, Any]:
+        content = self.content
+        match = _TOKEN_RE.match
+        emit = self._emit
+        pos, end = 0, len(content)
+        while pos < end:
+            token = match(content, pos)
+            kind = token.lastgroup
+            pos = token.end()
+            if kind == "end":
+                break
+            value = token.group(kind)
+            start = token.start(kind)
+            if kind == "comment":
+                continue
+            if kind == "jsdoc":
+                self.docstrings.append(value)
+                self._pending_doc = _clean_jsdoc(value)
+            elif kind == "template":
+                pos = self._scan_template(pos)
+                emit("template", "`", start)
+            elif value == "/" and self._regex_allowed():
+                literal = _REGEX_LITERAL_RE.match(content, start)
+                if literal:
+                    emit("regex", literal.group(), start)
+                    pos = literal.end()
+                else:
+                    emit(kind, value, start)
+            else:
+                emit(kind, value, start)
+                if value == "}" and self._last_closed == "template":
+                    pos = self._scan_template(pos)
+
+        return self._result()
+
+    def _regex_allowed(self) -> bool:
+        if not self._recent:
+            return True
+        last = self._recent[-1]
+        if last.kind == "punct":
+            return last.value not in (")", "]", "}")
+        if last.kind == "name":
+            return last.value in _REGEX_PREFIX_KEYWORDS
+        return False
+
+    def _scan_template(self, pos: int) -> int:
+        """Skip template text from ``pos``; returns where scanning resumes."""
+        chunk = _TEMPLATE_CHUNK_RE.match(self.content, pos)
+        if chunk.group().endswith("${"):
+            self._braces.append(("template", None))
+        return chunk.end()
+
+    # Declarations
+
+    def _emit(self, kind: str, value: str, start: int) -> None:
+        doc = self._pending_doc
+        if self._decorator is not None and not self._in_decorator(kind, value):
+            # JSDoc written above a decorator belongs to the declaration after it
+            doc = doc or self._decorator[0]
+            self._decorator = None
+        token = _Token(kind, value, start, doc)
+        self._pending_doc = None
+        if kind == "punct" and value == "@":
+            self._decorator = [doc, len(self._parens), "name"]
+        self._last_closed = None
+        previous = self._recent[-1] if self._recent else None
+        after_dot = previous is not None and previous.value in (".", "?.")
+
+        if kind == "name" and not after_dot:
+            self._on_name(token)
+        elif kind == "string":
+            self._on_string(token)
+        elif kind == "punct":
+            self._on_punct(token)
+
+        if self._function_pending is not None and token is not self._function_pending[0]:
+            self._on_function_name(token)
+
+        self._recent.append(token)
+
+    def _in_decorator(self, kind: str, value: str) -> bool:
+        """Advance the decorator state machine; False once the decorator has ended."""
+        doc, depth, phase = self._decorator
+        if phase == "name":
+            if kind != "name":
+                return False
+            self._decorator[2] = "after_name"
+            return True
+        if phase == "after_name":
+            if value == ".":
+                self._decorator[2] = "name"
+                return True
+            if value == "(":
+                self._decorator[2] = "arguments"
+                return True
+            return False
+        return len(self._parens) > depth
+
+    def _on_name(self, token: _Token) -> None:
+        value = token.value
+        self._on_export_token(token)
+        if value == "function":
+            self._function_pending = (token, tuple(self._recent))
+        elif value == "class":
+            self._class_pending = {
+                "name": None,
+                "line": self._line_at(token.start),
+                "methods": [],
+                "_start": self._statement_start(tuple(self._recent), token),
+            }
+            self._class_paren_depth = len(self._parens)
+        elif self._class_pending is not None and self._class_pending["name"] is None:
+            if value not in ("extends", "implements"):
+                self._class_pending["name"] = value
+            else:
+                self._class_pending["name"] = ""
+        elif value == "import":
+            self._module_pending = True
+
+    def _on_string(self, token: _Token) -> None:
+        recent = self._recent
+        module = token.value[1:-1] if len(token.value) >= 2 else token.value[1:]
+        if self._module_pending:
+            self._module_pending = False
+            self.imports.append({"module": module, "line": self._line_at(token.start)})
+            if self._export_state == "from":
+                self._export_state = None
+        elif (
+            len(recent) >= 2 and recent[-1].value == "(" and recent[-2].value in ("require", "import")
+        ):
+            self.imports.append({"module": module, "line": self._line_at(token.start)})
+
+    def _on_punct(self, token: _Token) -> None:
+        value = token.value
+        self._on_export_token(token)
+        if self._class_pending is not None and self._class_pending["name"] is None and value != "{":
+            # ``class`` used as a property name, e.g. ``{ class: 'x' }``
+            self._class_pending = None
+        if value in (".", "?.") and self._recent and self._recent[-1].value == "import":
+            # import.meta
+            self._module_pending = False
+        if value == "{":
+            if self._class_pending is not None and len(self._parens) == self._class_paren_depth:
+                cls = self._finish_class(self._class_pending)
+                self._class_pending = None
+                self._braces.append(("class", cls))
+            else:
+                self._braces.append(("block", None))
+        elif value == "}":
+            if self._braces:
+                self._last_closed = self._braces.pop()[0]
+        elif value == "(":
+            self._on_open_paren(token)
+            self._parens.append(tuple(self._recent))
+        elif value == ")":
+            self._closed_paren = self._parens.pop() if self._parens else ()
+        elif value == "=>":
+            self._on_arrow(token)
+        elif value == ";":
+            self._module_pending = False
+
+    def _on_function_name(self, token: _Token) -> None:
+        keyword, before = self._function_pending
+        if token.value == "*":
+            return
+        self._function_pending = None
+        assignment = before[:-1] if before and before[-1].value == "async" else before
+        if len(assignment) >= 3 and assignment[-1].value == "=" and assignment[-3].value in _VARIABLE_KEYWORDS:
+            # Function expression assigned to a variable: the statement starts at const/let/var
+            start = self._statement_start(assignment[:-3], assignment[-3])
+        else:
+            start = self._statement_start(before, keyword)
+        if token.kind == "name":
+            name = token.value
+        else:
+            # Anonymous function expression: named by what it is assigned to
+            name = self._assigned_name(before) or ("default" if self._has_default(before) else None)
+            if name is None:
+                return
+        self._add_function(name, keyword, start, "function")
+
+    def _on_open_paren(self, token: _Token) -> None:
+        """Detect class methods: ``name(`` directly inside a class body."""
+        if not self._braces or self._braces[-1][0] != "class":
+            return
+        recent = self._recent
+        if not recent:
+            return
+        name = recent[-1]
+        if name.kind not in ("name", "string", "number"):
+            return
+        if name.value in _MEMBER_MODIFIERS and name.value not in ("get", "set"):
+            return
+        index = self._member_boundary(list(recent), len(recent) - 2)
+        if index is None:
+            return
+        start = recent[index + 1]
+        cls = self._braces[-1][1]
+        method_name = name.value.strip("'\"")
+        self._record_method(cls, method_name, start, name, "method")
+
+    def _on_arrow(self, token: _Token) -> None:
+        recent = self._recent
+        if not recent:
+            return
+        if recent[-1].value == ")" or self._after_return_type():
+            before = self._closed_paren
+        elif recent[-1].kind == "name":
+            before = tuple(recent)[:-1]
+        else:
+            return
+        if before and before[-1].value == "async":
+            before = before[:-1]
+        if len(before) < 2 or before[-1].value != "=" or before[-2].kind != "name":
+            return
+        name = before[-2]
+        if self._braces and self._braces[-1][0] == "class":
+            # Arrow function in a class field, e.g. ``handle = (event) => {...}``
+            index = self._member_boundary(list(before), len(before) - 3)
+            if index is None:
+                return
+            self._record_method(self._braces[-1][1], name.value, before[index + 1], name, "arrow_method")
+            return
+        if len(before) >= 3 and before[-3].value in _VARIABLE_KEYWORDS:
+            start = self._statement_start(before[:-3], before[-3])
+            self._add_function(name.value, name, start, "arrow_function")
+
+    def _after_return_type(self) -> bool:
+        """Whether the tokens before ``=>`` are ``): Type`` (a TypeScript return annotation)."""
+        recent = list(self._recent)
+        for index in range(len(recent) - 1, 0, -1):
+            if recent[index].value == ":":
+                return recent[index - 1].value == ")"
+            if recent[index].value in ("(", ")", "{", "}", ";", "=", ","):
+                return False
+        return False
+
+    def _member_boundary(self, tokens: List[_Token], index: int) -> Optional[int]:
+        """
+        Index of the token that ends the previous class member, walking back
+        from ``index`` over member modifiers, or None if ``tokens[index + 1]``
+        does not start a member.
+        """
+        while index >= 0 and tokens[index].value in _MEMBER_MODIFIERS:
+            index -= 1
+        if index < 0 or tokens[index].value in _MEMBER_BOUNDARIES:
+            return index
+        # A member after a field without a semicolon starts on a new line
+        if "\n" in self.content[tokens[index].start:tokens[index + 1].start]:
+            return index
+        return None
+
+    # Exports
+
+    def _on_export_token(self, token: _Token) -> None:
+        value = token.value
+        state = self._export_state
+        if value == "export" and token.kind == "name":
+            self._export_state = "start"
+            return
+        if state is None:
+            return
+        line = self._line_at(token.start)
+        if state == "start":
+            if value == "default":
+                self.exports.append({"name": "default", "line": line})
+                self._export_state = None
+            elif value == "{":
+                self._export_state = "list"
+                self._export_names = []
+            elif value == "*":
+                self._export_state = "star"
+            elif value in ("async", "declare", "abstract"):
+                pass
+            elif value in _EXPORTED_DECLARATIONS:
+                self._export_state = "name"
+            else:
+                self._export_state = None
+        elif state == "name":
+            if token.kind == "name":
+                self.exports.append({"name": value, "line": line})
+                self._export_state = None
+            elif value != "*":
+                self._export_state = None
+        elif state == "list":
+            if value == "}":
+                for name in self._export_names:
+                    self.exports.append({"name": name, "line": line})
+                self._export_state = "from"
+            elif token.kind == "name" and value not in ("as", "type"):
+                previous = self._recent[-1].value if self._recent else None
+                if previous == "as" and self._export_names:
+                    self._export_names[-1] = value
+                else:
+                    self._export_names.append(value)
+        elif state == "star":
+            if token.kind == "name" and value not in ("as", "from"):
+                self.exports.append({"name": value, "line": line})
+            elif value == "from":
+                self._module_pending = True
+                self._export_state = None
+            elif value != "as":
+                self._export_state = None
+        elif state == "from":
+            if value == "from":
+                self._module_pending = True
+            self._export_state = None
+
+    # Helpers
+
+    def _statement_start(self, before: Tuple[_Token, ...], keyword: _Token) -> _Token:
+        """First token of the statement declaring ``keyword``, walking back over modifiers."""
+        start = keyword
+        index = len(before) - 1
+        while index >= 0 and before[index].value in _STATEMENT_MODIFIERS:
+            start = before[index]
+            index -= 1
+        return start
+
+    @staticmethod
+    def _assigned_name(before: Tuple[_Token, ...]) -> Optional[str]:
+        tokens = list(before)
+        if tokens and tokens[-1].value == "async":
+            tokens.pop()
+        if len(tokens) >= 2 and tokens[-1].value in ("=", ":") and tokens[-2].kind in ("name", "string"):
+            return tokens[-2].value.strip("'\"")
+        return None
+
+    @staticmethod
+    def _has_default(before: Tuple[_Token, ...]) -> bool:
+        return any(token.value == "default" for token in before[-2:])
+
+    def _add_function(self, name: str, anchor: _Token, start: _Token, kind: str) -> None:
+        doc = start.doc
+        self.functions.append({
+            "name": name,
+            "line": self._line_at(anchor.start),
+            "docstring": doc,
+            "has_docstring": bool(doc),
+            "type": kind,
+            "exported": start.value == "export",
+        })
+
+    def _record_method(self, cls: Dict[str, Any], name: str, start: _Token, anchor: _Token, kind: str) -> None:
+        doc = start.doc
+        cls["methods"].append({
+            "name": name,
+            "line": self._line_at(anchor.start),
+            "docstring": doc,
+            "has_docstring": bool(doc),
+        })
+        self.functions.append({
+            "name": name,
+            "line": self._line_at(anchor.start),
+            "docstring": doc,
+            "has_docstring": bool(doc),
+            "type": kind,
+            "class": cls["name"],
+            "exported": False,
+        })
+
+    def _finish_class(self, pending: Dict[str, Any]) -> Dict[str, Any]:
+        start: _Token = pending.pop("_start")
+        name = pending["name"]
+        if not name:
+            name = self._assigned_name(tuple(t for t in self._recent if t.start < start.start)) or "default"
+        doc = start.doc
+        cls = {
+            "name": name,
+            "line": pending["line"],
+            "docstring": doc,
+            "has_docstring": bool(doc),
+            "exported": start.value == "export",
+            "methods": pending["methods"],
+        }
+        self.classes.append(cls)
+        return cls
+
+    def _result(self) -> Dict[str, Any]:
+        methods = [f for f in self.functions if f["type"] in ("method", "arrow_method")]
+        elements = self.functions + self.classes
+        return {
+            "language": self.language,
+            "functions": self.functions,
+            "classes": self.classes,
+            "imports": self.imports,
+            "exports": self.exports,
+            "docstrings": self.docstrings,
+            "metrics": {
+                "function_count": len(self.functions),
+                "method_count": len(methods),
+                "class_count": len(self.classes),
+                "import_count": len(self.imports),
+                "export_count": len(self.exports),
+                "docstring_coverage": (
+                    sum(1 for e in elements if e["has_docstring"]) / len(elements) if elements else 0.0
+                ),
+            },
+        }
+
+def analyze_javascript(content: str, language: str = "javascript") -> Dict[str, Any]:
+    """
+    Analyze JavaScript or TypeScript source in one pass.
+
+    Args:
+        content: Source code
+        language: Reported language ('javascript' or 'typescript')
+
+    Returns:
+        Dict with functions (including methods), classes, imports, exports,
+        JSDoc comments and metrics
+    """
+    return JavaScriptAnalyzer(content, language).analyze()
@@ -0,0 +1,278 @@
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Value of the ``cache`` query parameter on generate endpoints
+CacheMode = Literal["default", "bypass"]
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Normalize chat messages for cache keying.
+
+    Prompts built from triple-quoted templates differ only in trailing
+    whitespace and line endings between runs; those differences never change
+    what the model is asked, so they are stripped before hashing.
+    """
+    normalized = []
+    for message in messages:
+        content = (message.get("content") or "").replace("\r\n", "\n").strip()
+        normalized.append({
+            "role": (message.get("role") or "").strip().lower(),
+            "content": "\n".join(line.rstrip() for line in content.split("\n"))
+        })
+    return normalized
+
+def make_cache_key(model: str, temperature: float, messages: List[Dict[str, str]], max_tokens: int) -> str:
+    """Hash of everything that determines an LLM response."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": round(float(temperature), 4),
+            "max_tokens": max_tokens,
+            "messages": normalize_messages(messages)
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteResponseStore:
+    """
+    Persistent tier of the LLM response cache.
+
+    One row per response in a local SQLite file. Expired rows are pruned on
+    open and the table is trimmed to ``max_entries`` oldest-first every
+    ``trim_interval`` writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float,
+        max_entries: int = 100000,
+        trim_interval: int = 100,
+        clock: Callable[[], float] = time.time
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.trim_interval = trim_interval
+        self.clock = clock
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_created_at ON llm_responses (created_at)")
+        self.prune()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, response: str, created_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, created_at)
+            )
+            self._writes += 1
+            if self._writes % self.trim_interval == 0:
+                self._trim()
+            self._conn.commit()
+
+    def _trim(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY created_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Delete expired rows; returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (self.clock() - self.ttl,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class LLMResponseCache:
+    """
+    Cache of LLM responses keyed by a hash of model, temperature, max tokens
+    and normalized messages.
+
+    Regenerating an SRS/SDS for an unchanged project builds a byte-identical
+    prompt, so the response can be served from here instead of paying the full
+    latency and token cost again. A bounded LRU holds recent responses in
+    memory; an optional SQLite file keeps them across restarts. Entries older
+    than ``ttl`` seconds are treated as misses in both tiers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl: float = 86400.0,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            max_entries: Maximum number of responses held in memory
+            ttl: Seconds a response stays valid
+            path: SQLite file for the persistent tier (disabled if ``None``)
+            clock: Time source, overridable in tests
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = SQLiteResponseStore(path, ttl, clock=clock) if path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or ``None`` on a miss."""
+        now = self.clock()
+        cached = self._get_memory(key, now)
+        if cached is not None:
+            return cached
+        return self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Like ``get``, but reads the persistent tier in a worker thread."""
+        now = self.clock()
+        cached = self._get_memory(key, now)
+        if cached is not None:
+            return cached
+        if self.disk is None:
+            return self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def put(self, key: str, response: str) -> None:
+        entry = (response, self.clock())
+        with self._lock:
+            self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, *entry)
+
+    async def aput(self, key: str, response: str) -> None:
+        """Like ``put``, but writes the persistent tier in a worker thread."""
+        entry = (response, self.clock())
+        with self._lock:
+            self._remember(key, entry)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, *entry)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+                self.expired += 1
+        return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        """Look ``key`` up in the persistent tier, counting a miss if absent."""
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    with self._lock:
+                        self._remember(key, entry)
+                        self.hits += 1
+                        self.disk_hits += 1
+                    return entry[0]
+                self.disk.delete(key)
+                with self._lock:
+                    self.expired += 1
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def _remember(self, key: str, entry: Tuple[str, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self) -> Dict[str, object]:
+        """Return hit/miss counters, hit rate and tier sizes."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_memory_entries": self.max_entries,
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+            "ttl_seconds": self.ttl
+        }
+
+def create_response_cache() -> Optional[LLMResponseCache]:
+    """Build the process-wide response cache from settings (``None`` if disabled)."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return LLMResponseCache(
+        max_entries=settings.LLM_CACHE_SIZE,
+        ttl=settings.LLM_CACHE_TTL_SECONDS,
+        path=settings.LLM_CACHE_PATH
+    )
@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, TypeVar
+
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache, create_response_cache, make_cache_key
+from app.services.llm_scheduler import LLMScheduler, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call does not finish within its timeout."""
+
+class ClientDisconnectedError(Exception):
+    """Raised when the HTTP client goes away while its LLM call is running."""
+
+class _Flight:
+    """An upstream call shared by every concurrent request with the same key."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[str]"):
+        self.task = task
+        self.waiters = 0
+
+class LLMGateway:
+    """
+    Shared asynchronous gateway for chat-completion calls.
+
+    All services send LLM traffic through one gateway so the process holds a
+    single async HTTP client and one admission scheduler, which shares the
+    concurrency slots fairly between tenants and priority classes (see
+    LLMScheduler). Calls never block the event loop; each call gets a
+    timeout and can be cancelled. When a response cache is attached,
+    identical prompts are answered from it without taking a slot.
+
+    Identical requests that arrive while a matching call is still running
+    are coalesced onto it (single flight): every caller awaits the same
+    upstream call and gets its result. The upstream call is cancelled only
+    once all of its callers have gone away.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        timeout: float = settings.LLM_TIMEOUT_SECONDS,
+        client: Optional[AsyncOpenAI] = None,
+        cache: Optional[LLMResponseCache] = None,
+        scheduler: Optional[LLMScheduler] = None
+    ):
+        """
+        Args:
+            api_key: OpenAI API key (defaults to settings)
+            base_url: Alternative OpenAI-compatible endpoint, e.g. a local fake provider
+            max_concurrency: Maximum number of upstream calls in flight
+            timeout: Default per-call timeout in seconds
+            client: Pre-built async client (overrides api_key/base_url)
+            cache: Response cache consulted before calling upstream
+            scheduler: Admission scheduler (defaults to one with ``max_concurrency`` slots)
+        """
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.base_url = base_url or settings.OPENAI_BASE_URL
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client = client
+        self._client_lock = asyncio.Lock()
+        self.cache = cache
+        self.scheduler = scheduler or LLMScheduler(max_concurrency=max_concurrency)
+        self._flights: Dict[str, _Flight] = {}
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.coalesced = 0
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _build_client(self) -> AsyncOpenAI:
+        # Retries are handled by callers; a retried call would also hold a slot twice as long
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        # Resource classes are imported on first access
+        client.chat.completions
+        return client
+
+    async def _get_client(self) -> AsyncOpenAI:
+        """
+        Return the client, building it in a thread on first use.
+
+        Loading the TLS trust store and the SDK's resource modules takes long
+        enough to stall every other request if done on the event loop.
+        """
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await asyncio.to_thread(self._build_client)
+        return self._client
+
+    @property
+    def waiting(self) -> int:
+        return self.scheduler.waiting
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        use_cache: bool = True
+    ) -> str:
+        """
+        Run a chat completion and return the message content.
+
+        Args:
+            use_cache: If False, skip the cache lookup; the fresh response
+                still replaces the cached one
+
+        Raises:
+            LLMTimeoutError: If the call exceeds its timeout
+        """
+        key = make_cache_key(model, temperature, messages, max_tokens)
+        if self.cache is not None:
+            if use_cache:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    return cached
+            else:
+                self.cache.record_bypass()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(
+                self._call_and_store(key, messages, model, temperature, max_tokens, timeout or self.timeout)
+            )
+            flight = _Flight(task)
+            self._flights[key] = flight
+            task.add_done_callback(lambda _, key=key, flight=flight: self._land(key, flight))
+        else:
+            # A bypassing caller may still join: the running call is already fresh
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # Shield so one caller going away does not abort the call for the others
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                # Unlisted now, so an identical request arriving before the task
+                # unwinds starts its own call instead of inheriting the cancellation
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _land(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Retrieve the exception so an unawaited failure is not logged as lost
+            flight.task.exception()
+
+    async def _call_and_store(
+        self,
+        key: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> str:
+        content = await self._call(messages, model, temperature, max_tokens, timeout)
+        if self.cache is not None and content:
+            await self.cache.aput(key, content)
+        return content
+
+    async def _call(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> str:
+        client = await self._get_client()
+        async with self.scheduler.slot(self._estimate_cost(messages, max_tokens)) as usage:
+            self.in_flight += 1
+            try:
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    ),
+                    timeout=timeout
+                )
+                self.completed += 1
+                if getattr(response, "usage", None) is not None:
+                    usage["total_tokens"] = response.usage.total_tokens
+                if response.choices:
+                    return response.choices[0].message.content or ""
+                return ""
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise LLMTimeoutError(f"LLM call to {model} timed out after {timeout}s")
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    @staticmethod
+    def _estimate_cost(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Tokens a call may use: the prompt estimate plus the completion limit."""
+        return sum(estimate_tokens(message.get("content") or "") for message in messages) + max_tokens
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        timeout: Optional[float] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Run a chat completion and yield content deltas as they arrive.
+
+        A cached response is replayed as a single delta. Streamed calls are
+        not coalesced; the complete text is stored in the cache once the
+        stream finishes. Closing the iterator aborts the upstream call.
+
+        Raises:
+            LLMTimeoutError: If the whole stream exceeds its timeout
+        """
+        key = make_cache_key(model, temperature, messages, max_tokens)
+        if self.cache is not None:
+            if use_cache:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    yield cached
+                    return
+            else:
+                self.cache.record_bypass()
+
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        cost = self._estimate_cost(messages, max_tokens)
+        client = await self._get_client()
+        await self.scheduler.acquire(cost)
+        self.in_flight += 1
+        parts: List[str] = []
+        try:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                ),
+                timeout=timeout
+            )
+            try:
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            finally:
+                await response.close()
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeoutError(f"LLM stream from {model} timed out after {timeout}s")
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            # Streamed responses carry no usage; approximate it from the text received
+            self.scheduler.release(cost, self._estimate_cost(messages, 0) + estimate_tokens("".join(parts)))
+
+        if self.cache is not None and parts:
+            await self.cache.aput(key, "".join(parts))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "coalesced": self.coalesced,
+            "distinct_in_flight": len(self._flights),
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "scheduler": self.scheduler.get_stats()
+        }
+
+async def cancel_on_disconnect(request: Any, awaitable: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Await ``awaitable`` but cancel it if the HTTP client disconnects first.
+
+    Args:
+        request: The incoming Starlette/FastAPI request
+        awaitable: Work to run on behalf of the request
+        poll_interval: Seconds between disconnect checks
+
+    Raises:
+        ClientDisconnectedError: If the client went away before the work finished
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                logger.info("Client disconnected; cancelled in-flight LLM work")
+                raise ClientDisconnectedError("Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+# Singleton instance
+llm_gateway = LLMGateway(cache=create_response_cache())
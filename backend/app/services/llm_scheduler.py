@@ -0,0 +1,312 @@
+import math
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Upper bounds (seconds) of the wait-time histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Who is asking and how urgently, for LLM calls made in the current task
+_request_context: ContextVar[Tuple[str, str]] = ContextVar("llm_request_context", default=("default", INTERACTIVE))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and code)."""
+    return math.ceil(len(text) / 4)
+
+@contextmanager
+def llm_request_context(tenant: Optional[str] = None, priority: Optional[str] = None) -> Iterator[None]:
+    """
+    Attribute LLM calls made inside the block to a tenant and priority class.
+
+    The context is inherited by tasks created inside the block, so it covers
+    map-reduce fan-out and calls wrapped in cancel_on_disconnect.
+    """
+    current_tenant, current_priority = _request_context.get()
+    token = _request_context.set((tenant or current_tenant, priority or current_priority))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+def current_request_context() -> Tuple[str, str]:
+    return _request_context.get()
+
+async def stream_in_context(
+    chunks: AsyncIterator[T],
+    tenant: Optional[str] = None,
+    priority: Optional[str] = None
+) -> AsyncIterator[T]:
+    """
+    Iterate ``chunks`` inside ``llm_request_context``.
+
+    Streaming responses are consumed after the endpoint has returned, so the
+    context has to be entered by the generator itself.
+    """
+    with llm_request_context(tenant, priority):
+        async for chunk in chunks:
+            yield chunk
+
+class _Waiter:
+    __slots__ = ("tenant", "priority", "cost", "enqueued_at", "future")
+
+    def __init__(self, tenant: str, priority: str, cost: int, enqueued_at: float, future: asyncio.Future):
+        self.tenant = tenant
+        self.priority = priority
+        self.cost = cost
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+class _FairQueue:
+    """Start-time fair queueing over named sub-queues with weights."""
+
+    def __init__(self):
+        self.queues: Dict[str, Deque] = {}
+        self.finish_tags: Dict[str, float] = {}
+        self.virtual_time = 0.0
+
+    def push(self, name: str, item: Any) -> None:
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.queues[name] = deque()
+        if not queue:
+            # A queue becoming active cannot claim credit for the time it was idle
+            self.finish_tags[name] = max(self.finish_tags.get(name, 0.0), self.virtual_time)
+        queue.append(item)
+
+    def pick(self) -> Optional[str]:
+        """Name of the active queue with the smallest virtual start time."""
+        active = [name for name, queue in self.queues.items() if queue]
+        if not active:
+            return None
+        return min(active, key=lambda name: self.finish_tags[name])
+
+    def charge(self, name: str, cost: float, weight: float) -> None:
+        self.virtual_time = self.finish_tags[name]
+        self.finish_tags[name] += cost / max(weight, 1e-9)
+        if not self.queues[name]:
+            del self.queues[name]
+
+class _Histogram:
+    __slots__ = ("counts", "total", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(WAIT_BUCKETS, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(list(WAIT_BUCKETS) + [float("inf")], self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "count": self.total, "sum": self.sum}
+
+class LLMScheduler:
+    """
+    Admission scheduler for LLM calls.
+
+    Calls wait in per-tenant FIFO queues grouped by priority class. When a
+    concurrency slot and enough of the tokens-per-minute budget are free,
+    the next call is chosen by weighted fair queueing at two levels: first
+    between priority classes (interactive outweighs batch, but batch is
+    never starved), then between tenants of that class, charging each pick
+    its estimated token cost. A user queueing 200 files therefore only
+    delays other users by their fair share.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        tokens_per_minute: int = settings.LLM_TOKENS_PER_MINUTE,
+        class_weights: Optional[Dict[str, float]] = None,
+        clock=time.monotonic
+    ):
+        """
+        Args:
+            max_concurrency: Maximum number of calls admitted at once
+            tokens_per_minute: Global token budget (0 disables the budget)
+            class_weights: Share of each priority class
+            clock: Monotonic time source
+        """
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.class_weights = class_weights or {
+            INTERACTIVE: settings.LLM_INTERACTIVE_WEIGHT,
+            BATCH: settings.LLM_BATCH_WEIGHT
+        }
+        self.tenant_weights: Dict[str, float] = {}
+        self.clock = clock
+
+        self.in_flight = 0
+        self._classes = _FairQueue()
+        self._tenants: Dict[str, _FairQueue] = {}
+        self._depth: Dict[str, int] = {name: 0 for name in self.class_weights}
+        self._wait_histograms: Dict[str, _Histogram] = {name: _Histogram() for name in self.class_weights}
+        self._dispatched: Dict[str, int] = {name: 0 for name in self.class_weights}
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = clock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def set_tenant_weight(self, tenant: str, weight: float) -> None:
+        self.tenant_weights[tenant] = weight
+
+    @property
+    def waiting(self) -> int:
+        return sum(self._depth.values())
+
+    async def acquire(self, cost: int, tenant: Optional[str] = None, priority: Optional[str] = None) -> int:
+        """
+        Wait until the call may run.
+
+        Args:
+            cost: Estimated tokens (prompt plus completion limit)
+            tenant: User or project the call is made for (defaults to the request context)
+            priority: Priority class (defaults to the request context)
+
+        Returns:
+            The cost that was charged, to pass back to ``release``
+        """
+        context_tenant, context_priority = current_request_context()
+        tenant = tenant or context_tenant
+        priority = priority or context_priority
+        if priority not in self.class_weights:
+            raise ValueError(f"Unknown priority class: {priority}")
+
+        waiter = _Waiter(tenant, priority, cost, self.clock(), asyncio.get_running_loop().create_future())
+        self._tenants.setdefault(priority, _FairQueue()).push(tenant, waiter)
+        self._classes.push(priority, None)
+        self._depth[priority] += 1
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller gave up: hand the slot on
+                self.release(cost)
+            else:
+                # Left in its queue and skipped when it reaches the head
+                waiter.future.cancel()
+                self._depth[priority] -= 1
+            raise
+        return cost
+
+    def release(self, cost: int, used_tokens: Optional[int] = None) -> None:
+        """Free a slot; ``used_tokens`` corrects the budget for the real usage."""
+        self.in_flight -= 1
+        if self.tokens_per_minute and used_tokens is not None:
+            self._refill()
+            self._tokens = min(self._tokens + cost - used_tokens, float(self.tokens_per_minute))
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, cost: int, tenant: Optional[str] = None, priority: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Hold a slot for the duration of the block.
+
+        Set ``usage["total_tokens"]`` inside the block to report actual usage.
+        """
+        await self.acquire(cost, tenant, priority)
+        usage: Dict[str, Any] = {}
+        try:
+            yield usage
+        finally:
+            self.release(cost, usage.get("total_tokens"))
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60.0
+        )
+        self._refilled_at = now
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_concurrency:
+            priority = self._classes.pick()
+            if priority is None:
+                return
+            tenants = self._tenants[priority]
+            tenant = tenants.pick()
+            waiter: _Waiter = tenants.queues[tenant][0]
+
+            if waiter.future.done():
+                # Cancelled while queued
+                self._pop(priority, tenant, waiter, charge=False)
+                continue
+
+            if self.tokens_per_minute:
+                self._refill()
+                needed = min(waiter.cost, self.tokens_per_minute)
+                if self._tokens < needed:
+                    self._schedule_retry((needed - self._tokens) * 60.0 / self.tokens_per_minute)
+                    return
+                self._tokens -= waiter.cost
+
+            self._pop(priority, tenant, waiter, charge=True)
+            self.in_flight += 1
+            self._dispatched[priority] += 1
+            self._wait_histograms[priority].observe(self.clock() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _pop(self, priority: str, tenant: str, waiter: _Waiter, charge: bool) -> None:
+        tenants = self._tenants[priority]
+        tenants.queues[tenant].popleft()
+        self._classes.queues[priority].popleft()
+        if charge:
+            self._depth[priority] -= 1
+        cost = waiter.cost if charge else 0
+        tenants.charge(tenant, cost, self.tenant_weights.get(tenant, 1.0))
+        self._classes.charge(priority, cost, self.class_weights[priority])
+
+    def _schedule_retry(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def retry():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = loop.call_later(max(delay, 0.001), retry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self.tokens_per_minute:
+            self._refill()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "tokens_per_minute": self.tokens_per_minute,
+            "tokens_available": round(self._tokens) if self.tokens_per_minute else None,
+            "classes": {
+                name: {
+                    "weight": weight,
+                    "queue_depth": self._depth[name],
+                    "dispatched": self._dispatched[name],
+                    "wait_seconds": self._wait_histograms[name].to_dict()
+                }
+                for name, weight in self.class_weights.items()
+            },
+            "queued_tenants": {
+                name: {tenant: len(queue) for tenant, queue in tenants.queues.items() if queue}
+                for name, tenants in self._tenants.items()
+            }
+        }
@@ -0,0 +1,312 @@
+import re
+import ast
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import LLMGateway, llm_gateway
+from app.services.llm_scheduler import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Bump when the map prompt changes so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+
+# Lines that start a top-level declaration in brace/indent languages without a Python AST
+_DECLARATION_RE = re.compile(
+    r"^(?:export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+|abstract\s+|final\s+)*"
+    r"(?:function|class|interface|enum|type|const|let|var|def|func|fn|struct|impl|trait|module|namespace)\b"
+)
+_SNIPPET_HEADER_RE = re.compile(r"^File:\s*(?P<path>[^\n]+)\n```[^\n]*\n(?P<body>.*?)\n?```\s*$", re.S)
+
+@dataclass
+class Chunk:
+    source: str
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+    @property
+    def label(self) -> str:
+        return f"{self.source}:{self.start_line}-{self.end_line}"
+
+def _python_boundaries(text: str) -> Optional[List[int]]:
+    """Start lines (1-based) of top-level Python statements, or None if unparsable."""
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return None
+    starts = []
+    for node in tree.body:
+        # Decorators belong to the definition they decorate
+        decorators = getattr(node, "decorator_list", None) or []
+        starts.append(min([node.lineno] + [d.lineno for d in decorators]))
+    return starts
+
+def _declaration_boundaries(lines: List[str]) -> List[int]:
+    """Start lines of unindented declarations, pulling leading comments along."""
+    starts = []
+    for i, line in enumerate(lines):
+        if not _DECLARATION_RE.match(line):
+            continue
+        start = i
+        while start > 0 and lines[start - 1].lstrip().startswith(("//", "/*", "*", "#", "@")):
+            start -= 1
+        starts.append(start + 1)
+    return starts
+
+def chunk_source(source: str, text: str, max_tokens: int) -> List[Chunk]:
+    """
+    Split a file into chunks of at most ``max_tokens`` at syntactic boundaries.
+
+    Python files are cut between top-level AST nodes; other languages between
+    unindented declarations. Consecutive units are packed together until the
+    budget is reached, and a single unit larger than the budget is split by
+    lines.
+
+    Args:
+        source: File name, used to label chunks
+        text: File content
+        max_tokens: Token budget per chunk
+
+    Returns:
+        Chunks in file order
+    """
+    lines = text.split("\n")
+    boundaries = None
+    if source.endswith(".py"):
+        boundaries = _python_boundaries(text)
+    if boundaries is None:
+        boundaries = _declaration_boundaries(lines)
+    starts = sorted({1, *(b for b in boundaries if 1 <= b <= len(lines))})
+
+    # Syntactic units as (first line, last line), 1-based inclusive
+    units = [(start, (starts[i + 1] - 1) if i + 1 < len(starts) else len(lines)) for i, start in enumerate(starts)]
+
+    chunks: List[Chunk] = []
+    current_start, current_lines, current_tokens = None, [], 0
+
+    def flush():
+        nonlocal current_start, current_lines, current_tokens
+        if current_lines and any(line.strip() for line in current_lines):
+            chunks.append(Chunk(source, current_start, current_start + len(current_lines) - 1, "\n".join(current_lines)))
+        current_start, current_lines, current_tokens = None, [], 0
+
+    for first, last in units:
+        unit_lines = lines[first - 1:last]
+        unit_tokens = estimate_tokens("\n".join(unit_lines))
+        if current_lines and current_tokens + unit_tokens > max_tokens:
+            flush()
+        if unit_tokens <= max_tokens:
+            if current_start is None:
+                current_start = first
+            current_lines.extend(unit_lines)
+            current_tokens += unit_tokens
+            continue
+        # Oversized unit: fall back to line-based splitting
+        for offset, line in enumerate(unit_lines):
+            line_tokens = estimate_tokens(line) + 1
+            if current_lines and current_tokens + line_tokens > max_tokens:
+                flush()
+            if current_start is None:
+                current_start = first + offset
+            current_lines.append(line)
+            current_tokens += line_tokens
+    flush()
+    return chunks
+
+def parse_snippet(snippet: str, index: int) -> Dict[str, str]:
+    """Split a ``File: name`` + fenced code snippet into its path and body."""
+    match = _SNIPPET_HEADER_RE.match(snippet.strip())
+    if match:
+        return {"path": match.group("path").strip(), "content": match.group("body")}
+    return {"path": f"snippet_{index + 1}", "content": snippet}
+
+class MapReduceGenerator:
+    """
+    Token-budgeted map-reduce over source files for prompts that do not fit
+    into one context window.
+
+    Map: every file is chunked at AST/declaration boundaries and each chunk
+    is summarized by the LLM, with bounded concurrency. Summaries are cached
+    by chunk content hash, so regenerating after a change only re-summarizes
+    the chunks that changed. Reduce: summaries are merged in groups that fit
+    the budget until one set of notes fits into the final prompt.
+    """
+
+    def __init__(
+        self,
+        gateway: LLMGateway = llm_gateway,
+        summary_cache: Optional[LLMResponseCache] = None,
+        model: str = "gpt-4",
+        prompt_budget: int = settings.LLM_PROMPT_TOKEN_BUDGET,
+        chunk_tokens: int = settings.MAP_REDUCE_CHUNK_TOKENS,
+        summary_tokens: int = settings.MAP_REDUCE_SUMMARY_TOKENS,
+        concurrency: int = settings.MAP_REDUCE_CONCURRENCY
+    ):
+        """
+        Args:
+            gateway: Gateway used for map and reduce calls
+            summary_cache: Cache of chunk summaries keyed by content hash
+            model: Model used for summaries
+            prompt_budget: Maximum estimated tokens of any single prompt
+            chunk_tokens: Maximum estimated tokens of one chunk
+            summary_tokens: Completion limit for each summary
+            concurrency: Maximum number of summaries requested at once
+        """
+        self.gateway = gateway
+        self.summary_cache = summary_cache if summary_cache is not None else LLMResponseCache(
+            max_entries=settings.MAP_REDUCE_SUMMARY_CACHE_SIZE,
+            ttl=settings.MAP_REDUCE_SUMMARY_CACHE_TTL_SECONDS,
+            path=settings.MAP_REDUCE_SUMMARY_CACHE_PATH
+        )
+        self.model = model
+        self.prompt_budget = prompt_budget
+        self.chunk_tokens = min(chunk_tokens, prompt_budget)
+        self.summary_tokens = summary_tokens
+        self.concurrency = concurrency
+
+        self.chunks_summarized = 0
+        self.chunks_reused = 0
+
+    def fits(self, *texts: str) -> bool:
+        return sum(estimate_tokens(text) for text in texts) <= self.prompt_budget
+
+    def chunk_files(self, files: Sequence[Dict[str, str]]) -> List[Chunk]:
+        """Chunk ``{"path", "content"}`` files within the per-chunk budget."""
+        chunks = []
+        for file in files:
+            chunks.extend(chunk_source(file["path"], file["content"], self.chunk_tokens))
+        return chunks
+
+    async def summarize(self, chunks: Sequence[Chunk], purpose: str) -> List[str]:
+        """
+        Map step: summarize every chunk, reusing cached summaries.
+
+        Args:
+            chunks: Chunks to summarize
+            purpose: What the summaries will be used for, e.g. 'an SRS document'
+
+        Returns:
+            One summary per chunk, in input order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize_one(chunk: Chunk) -> str:
+            key = f"{self.model}\0{SUMMARY_PROMPT_VERSION}\0{purpose}\0{chunk.content_hash}"
+            cached = await self.summary_cache.aget(key)
+            if cached is not None:
+                self.chunks_reused += 1
+                return f"[{chunk.label}]\n{cached}"
+            async with semaphore:
+                summary = await self.gateway.complete(
+                    model=self.model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You summarize source code for technical writers. Be factual and concise."
+                        },
+                        {
+                            "role": "user",
+                            "content": (
+                                f"Summarize this part of {chunk.source} for writing {purpose}. "
+                                "List its responsibilities, public functions/classes with their inputs and "
+                                "outputs, external interfaces, data it stores and notable constraints.\n\n"
+                                f"```\n{chunk.text}\n```"
+                            )
+                        }
+                    ],
+                    temperature=0.2,
+                    max_tokens=self.summary_tokens
+                )
+            await self.summary_cache.aput(key, summary)
+            self.chunks_summarized += 1
+            return f"[{chunk.label}]\n{summary}"
+
+        return list(await asyncio.gather(*(summarize_one(chunk) for chunk in chunks)))
+
+    async def reduce(self, summaries: List[str], purpose: str, reserved_tokens: int = 0) -> List[str]:
+        """
+        Reduce step: merge summaries until they fit into the remaining budget.
+
+        Args:
+            summaries: Chunk summaries from the map step
+            purpose: What the notes will be used for
+            reserved_tokens: Tokens of the final prompt taken by everything else
+
+        Returns:
+            Summaries that together fit into ``prompt_budget - reserved_tokens``
+        """
+        available = max(self.prompt_budget - reserved_tokens, self.summary_tokens * 2)
+        while sum(estimate_tokens(s) for s in summaries) > available and len(summaries) > 1:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                tokens = estimate_tokens(summary)
+                if group and size + tokens > self.prompt_budget - self.summary_tokens:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += tokens
+            groups.append(group)
+            if len(groups) == len(summaries):
+                # Every summary is already too large to pair up; merge two at a time
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def merge(group: List[str]) -> str:
+                if len(group) == 1:
+                    return group[0]
+                async with semaphore:
+                    return await self.gateway.complete(
+                        model=self.model,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": "You merge code summaries for technical writers without losing facts."
+                            },
+                            {
+                                "role": "user",
+                                "content": (
+                                    f"Merge these code summaries into one concise set of notes for writing {purpose}. "
+                                    "Keep every component, interface and constraint; drop repetition.\n\n"
+                                    + "\n\n".join(group)
+                                )
+                            }
+                        ],
+                        temperature=0.2,
+                        max_tokens=self.summary_tokens
+                    )
+
+            summaries = list(await asyncio.gather(*(merge(group) for group in groups)))
+        return summaries
+
+    async def condense(self, files: Sequence[Dict[str, str]], purpose: str, reserved_tokens: int = 0) -> List[str]:
+        """Chunk, summarize and reduce files into notes that fit the final prompt."""
+        chunks = self.chunk_files(files)
+        summaries = await self.summarize(chunks, purpose)
+        logger.info(
+            f"Map-reduce over {len(chunks)} chunks for {purpose}: "
+            f"{self.chunks_summarized} summarized, {self.chunks_reused} reused so far"
+        )
+        return await self.reduce(summaries, purpose, reserved_tokens)
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "prompt_budget": self.prompt_budget,
+            "chunk_tokens": self.chunk_tokens,
+            "chunks_summarized": self.chunks_summarized,
+            "chunks_reused": self.chunks_reused,
+            "summary_cache": self.summary_cache.get_stats()
+        }
+
+# Singleton instance
+map_reduce_generator = MapReduceGenerator()
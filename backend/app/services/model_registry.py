@@ -0,0 +1,80 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def load_sentence_transformer(name: str) -> Any:
+    """Load a SentenceTransformer model, importing torch only when first needed."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name, device=settings.EMBEDDING_DEVICE)
+
+class ModelRegistry:
+    """
+    Process-wide registry of ML models.
+
+    Models are loaded lazily on first use and shared by every service in the
+    process, so importing a service or serving ``/health`` never pays for
+    torch or model weights. Loads are serialised per model name so concurrent
+    first requests trigger a single load.
+    """
+
+    def __init__(self, loader: Callable[[str], Any] = load_sentence_transformer):
+        self.loader = loader
+        self._models: Dict[str, Any] = {}
+        self._load_times: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._warmup_tasks: Dict[str, asyncio.Task] = {}
+
+    def get(self, name: str) -> Any:
+        """Return the named model, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._registry_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._models:
+                logger.info(f"Loading model {name}...")
+                start = time.perf_counter()
+                self._models[name] = self.loader(name)
+                self._load_times[name] = time.perf_counter() - start
+                logger.info(f"Loaded model {name} in {self._load_times[name]:.2f}s")
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    async def warm(self, names: Iterable[str]) -> None:
+        """Load models in a worker thread without blocking the event loop."""
+        for name in names:
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                logger.error(f"Failed to warm model {name}: {e}")
+
+    def schedule_warmup(self, names: Iterable[str]) -> Optional[asyncio.Task]:
+        """Start warming models in a background task on the running loop."""
+        pending = [name for name in names if not self.is_loaded(name) and name not in self._warmup_tasks]
+        if not pending:
+            return None
+        task = asyncio.get_running_loop().create_task(self.warm(pending))
+        for name in pending:
+            self._warmup_tasks[name] = task
+        return task
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": sorted(self._models),
+            "load_seconds": dict(self._load_times),
+            "warming": sorted(name for name, task in self._warmup_tasks.items() if not task.done())
+        }
+
+# Singleton instance
+model_registry = ModelRegistry()
@@ -0,0 +1,518 @@
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.database import engine as database_engine
+from app.services.ot_engine import DocumentSession, OTEngine, OTError, Rope, StaleRevisionError, TextOperation, ot_engine
+from app.services.version_store import compress, decompress, get_latest_content
+
+logger = logging.getLogger(__name__)
+
+# (document_id, revision, encoded operation)
+LogRow = Tuple[str, int, bytes]
+
+# Stored text of a document the log has never seen (None if there is none)
+ContentLoader = Callable[[str], Awaitable[Optional[str]]]
+
+class OpLogCommitError(Exception):
+    """Raised to the waiters of operations the log could not commit."""
+
+def encode_operation(operation: TextOperation) -> bytes:
+    return json.dumps(operation.to_json(), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def decode_operation(payload: bytes) -> TextOperation:
+    return TextOperation.from_json(json.loads(payload))
+
+class OpLogStore:
+    """
+    SQLite append-only log of the operations applied to each document,
+    plus the latest snapshot of its text.
+
+    Row ``revision`` holds the operation that took the document from
+    ``revision - 1`` to ``revision``. A snapshot at revision R is the text
+    after operation R; operations up to R may be trimmed from the log, but
+    a tail is kept so clients that were a little behind can still catch up
+    without downloading the whole document.
+    """
+
+    def __init__(self, path: str, codec: str = settings.VERSION_COMPRESSION):
+        self.path = path
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the module does not create the file
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Operations are acknowledged once committed, so commits have to reach the disk
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_ops ("
+                "document_id TEXT NOT NULL, revision INTEGER NOT NULL, operation BLOB NOT NULL, "
+                "PRIMARY KEY (document_id, revision)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_snapshots ("
+                "document_id TEXT PRIMARY KEY, revision INTEGER NOT NULL, content BLOB NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def append(self, rows: List[LogRow]) -> None:
+        """Write a batch of operations in one transaction."""
+        if not rows:
+            return
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("INSERT INTO document_ops VALUES (?, ?, ?)", rows)
+
+    def save_snapshot(self, document_id: str, revision: int, content: str) -> None:
+        payload = compress(content.encode("utf-8"), self.codec)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO document_snapshots VALUES (?, ?, ?, ?)",
+                (document_id, revision, payload, time.time())
+            )
+
+    def load_snapshot(self, document_id: str) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT revision, content FROM document_snapshots WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return (row[0], decompress(row[1]).decode("utf-8")) if row else None
+
+    def _contiguous(self, document_id: str, after: int, until: Optional[int] = None) -> List[TextOperation]:
+        """Operations from ``after + 1`` up to the first missing revision (or ``until``)."""
+        query = "SELECT revision, operation FROM document_ops WHERE document_id = ? AND revision > ?"
+        params: Tuple[Any, ...] = (document_id, after)
+        if until is not None:
+            query += " AND revision <= ?"
+            params += (until,)
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY revision", params).fetchall()
+        operations = []
+        for revision, payload in rows:
+            if revision != after + 1 + len(operations):
+                logger.error(f"Operation log of document {document_id} is missing revision {after + 1 + len(operations)}")
+                break
+            operations.append(decode_operation(payload))
+        return operations
+
+    def operations_between(self, document_id: str, after: int, until: int) -> Optional[List[TextOperation]]:
+        """
+        Operations ``after + 1`` to ``until``, oldest first.
+
+        Returns:
+            None if some of them have been trimmed (or were never written)
+        """
+        operations = self._contiguous(document_id, after, until)
+        return operations if len(operations) == until - after else None
+
+    def load(self, document_id: str, history_limit: int) -> Optional[Tuple[int, str, List[TextOperation]]]:
+        """
+        Rebuild a document from its snapshot and the operations after it.
+
+        Returns:
+            (revision, content, up to ``history_limit`` latest operations),
+            or None if nothing was ever logged for the document
+        """
+        snapshot = self.load_snapshot(document_id)
+        base_revision, content = snapshot if snapshot else (0, "")
+        with self._lock:
+            oldest = self.conn.execute(
+                "SELECT MIN(revision) FROM document_ops WHERE document_id = ?", (document_id,)
+            ).fetchone()[0]
+        if snapshot is None and oldest is None:
+            return None
+
+        # The retained tail of the log overlaps the snapshot, so the history can reach back past it
+        start = oldest - 1 if oldest is not None and oldest <= base_revision else base_revision
+        operations = self._contiguous(document_id, start)
+        if start + len(operations) < base_revision:
+            start, operations = base_revision, self._contiguous(document_id, base_revision)
+
+        rope = Rope(content)
+        for operation in operations[base_revision - start:]:
+            rope.apply(operation)
+        return start + len(operations), str(rope), operations[-history_limit:]
+
+    def documents_to_compact(self, min_operations: int) -> List[str]:
+        """Documents with at least ``min_operations`` logged since their snapshot."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT o.document_id FROM document_ops o "
+                "LEFT JOIN document_snapshots s ON s.document_id = o.document_id "
+                "WHERE o.revision > COALESCE(s.revision, 0) "
+                "GROUP BY o.document_id HAVING COUNT(*) >= ?",
+                (min_operations,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def compact(self, document_id: str, retain: int) -> Optional[int]:
+        """
+        Fold the operations after the snapshot into a new snapshot and trim
+        the log to the ``retain`` operations before it.
+
+        Returns:
+            The revision of the new snapshot, or None if there was nothing to fold
+        """
+        snapshot = self.load_snapshot(document_id)
+        revision, content = snapshot if snapshot else (0, "")
+        operations = self._contiguous(document_id, revision)
+        if not operations:
+            return None
+        rope = Rope(content)
+        for operation in operations:
+            rope.apply(operation)
+        revision += len(operations)
+
+        payload = compress(str(rope).encode("utf-8"), self.codec)
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO document_snapshots VALUES (?, ?, ?, ?)",
+                    (document_id, revision, payload, time.time())
+                )
+                self.conn.execute(
+                    "DELETE FROM document_ops WHERE document_id = ? AND revision <= ?",
+                    (document_id, revision - retain)
+                )
+        return revision
+
+    def count(self, document_id: str) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM document_ops WHERE document_id = ?", (document_id,)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class OpLog:
+    """
+    Durable operation log behind the OT engine.
+
+    Applied operations are queued in memory and written by a background
+    task in group commits instead of one transaction per keystroke: a
+    commit starts as soon as operations are waiting, and everything that
+    arrives while it is on disk goes into the next one, so batches grow with
+    load. ``commit_delay_ms`` additionally holds a commit open for more
+    operations, up to ``batch_size``. ``record`` returns a future that
+    resolves once the operation is committed. A compactor periodically
+    folds the operations of busy documents into a snapshot and trims the log.
+
+    Sessions are opened through here so a document edited before a restart
+    comes back at its last committed revision, with its recent history, and
+    reconnecting clients can be sent just the operations they missed.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.OP_LOG_PATH,
+        engine: OTEngine = ot_engine,
+        commit_delay_ms: float = settings.OP_LOG_COMMIT_DELAY_MS,
+        batch_size: int = settings.OP_LOG_BATCH_SIZE,
+        snapshot_every: int = settings.OP_LOG_SNAPSHOT_EVERY,
+        retain: int = settings.OP_LOG_RETAIN_OPS,
+        compact_interval: float = settings.OP_LOG_COMPACT_INTERVAL_SECONDS,
+        content_loader: Optional[ContentLoader] = None
+    ):
+        """
+        Args:
+            path: SQLite file holding the log and snapshots
+            engine: OT engine whose sessions are persisted
+            commit_delay_ms: How long a commit waits for more operations to join it
+            batch_size: Waiting operations that end the commit delay early
+            snapshot_every: Operations since the last snapshot that make a document due for compaction
+            retain: Operations kept in the log behind a snapshot for catching up clients
+            compact_interval: Seconds between compaction passes
+            content_loader: Reads the text a document starts from when it was
+                never edited and the caller did not pass one
+        """
+        self.path = path
+        self.engine = engine
+        self.commit_delay = commit_delay_ms / 1000
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.retain = retain
+        self.compact_interval = compact_interval
+        self.content_loader = content_loader
+        self._store: Optional[OpLogStore] = None
+        self._pending: List[Tuple[LogRow, asyncio.Future]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._opening: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.operations_written = 0
+        self.operations_failed = 0
+        self.commits = 0
+        self.snapshots = 0
+
+    @property
+    def store(self) -> OpLogStore:
+        if self._store is None:
+            self._store = OpLogStore(self.path)
+        return self._store
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def open_session(self, document_id: str, content: Optional[str] = None) -> DocumentSession:
+        """
+        Return the open session of a document, restoring it from the log.
+
+        A document that was never edited starts from ``content``, or from
+        what ``content_loader`` reads if that is not given.
+        """
+        session = self.engine.sessions.get(document_id)
+        if session is not None:
+            return session
+        # Concurrent connects to the same document share one load
+        task = self._opening.get(document_id)
+        if task is None:
+            task = asyncio.ensure_future(self._restore(document_id, content))
+            self._opening[document_id] = task
+            task.add_done_callback(lambda _: self._opening.pop(document_id, None))
+        return await asyncio.shield(task)
+
+    async def _restore(self, document_id: str, content: Optional[str]) -> DocumentSession:
+        history_limit = self.engine.history_limit or settings.OT_HISTORY_LIMIT
+        stored = await asyncio.to_thread(self.store.load, document_id, history_limit)
+        if stored is None:
+            if content is None and self.content_loader is not None:
+                content = await self.content_loader(document_id)
+            content = content or ""
+            if content:
+                # Operations are relative to this text, so it has to be the base of the log
+                await asyncio.to_thread(self.store.save_snapshot, document_id, 0, content)
+            session = DocumentSession(document_id, content, history_limit=history_limit)
+        else:
+            revision, content, history = stored
+            session = DocumentSession(document_id, content, revision=revision, history_limit=history_limit)
+            session.history.extend(history)
+            logger.info(f"Restored document {document_id} at revision {revision} from the operation log")
+        return self.engine.sessions.setdefault(document_id, session)
+
+    def record(self, document_id: str, revision: int, operation: TextOperation) -> asyncio.Future:
+        """
+        Queue an applied operation for the next group commit.
+
+        Must be called right after ``DocumentSession.submit`` (without
+        awaiting in between) so operations are logged in revision order.
+
+        Returns:
+            Future resolved once the operation is committed; it raises
+            OpLogCommitError if the operation cannot be written
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((document_id, revision, encode_operation(operation)), future))
+        if not self.running:
+            # No background flusher (tests, scripts): commit right away
+            asyncio.ensure_future(self.flush()).add_done_callback(self._flushed)
+        else:
+            self._wakeup.set()
+            if len(self._pending) >= self.batch_size:
+                self._batch_full.set()
+        return future
+
+    async def flush(self) -> int:
+        """
+        Commit every queued operation; returns how many were written.
+
+        Raises:
+            sqlite3.OperationalError: The database was locked or unavailable;
+                the operations stay queued for the next attempt
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                await asyncio.to_thread(self.store.append, [row for row, _ in batch])
+            except sqlite3.OperationalError:
+                # Transient: keep them, in order, for the next attempt; waiters stay unacknowledged
+                self._pending[:0] = batch
+                raise
+            except Exception as e:
+                # Retrying cannot fix a rejected row (e.g. a revision another writer
+                # already logged), so commit the other documents and fail its own
+                logger.error(f"Operation log rejected a commit, writing documents separately: {str(e)}")
+                return await self._flush_by_document(batch)
+            self._acknowledge(batch)
+            return len(batch)
+
+    @staticmethod
+    def _by_document(batch: List[Tuple[LogRow, asyncio.Future]]) -> Dict[str, List[Tuple[LogRow, asyncio.Future]]]:
+        by_document: Dict[str, List[Tuple[LogRow, asyncio.Future]]] = {}
+        for entry in batch:
+            by_document.setdefault(entry[0][0], []).append(entry)
+        return by_document
+
+    async def _flush_by_document(self, batch: List[Tuple[LogRow, asyncio.Future]]) -> int:
+        written = 0
+        documents = list(self._by_document(batch).items())
+        for position, (document_id, entries) in enumerate(documents):
+            try:
+                await asyncio.to_thread(self.store.append, [row for row, _ in entries])
+            except sqlite3.OperationalError:
+                self._pending[:0] = [entry for _, rest in documents[position:] for entry in rest]
+                raise
+            except Exception as e:
+                self._fail(document_id, entries, e)
+                continue
+            self._acknowledge(entries)
+            written += len(entries)
+        return written
+
+    def _acknowledge(self, entries: List[Tuple[LogRow, asyncio.Future]]) -> None:
+        self.operations_written += len(entries)
+        self.commits += 1
+        for _, future in entries:
+            if not future.done():
+                future.set_result(None)
+
+    def _fail(self, document_id: str, entries: List[Tuple[LogRow, asyncio.Future]], error: Exception) -> None:
+        """
+        Fail the waiters of operations that were not written.
+
+        The session already applied them, so it is dropped: reopening it
+        restores what the log actually holds, and clients resync from that.
+        """
+        logger.error(f"Could not log {len(entries)} operations of document {document_id}: {str(error)}")
+        self.operations_failed += len(entries)
+        self.engine.close_session(document_id)
+        for _, future in entries:
+            if not future.done():
+                future.set_exception(OpLogCommitError(f"Operation could not be committed: {str(error)}"))
+
+    def _flushed(self, task: asyncio.Future) -> None:
+        """Done callback of a flush started without the background flusher."""
+        if task.cancelled() or task.exception() is None:
+            return
+        # Nothing retries without the flusher, so fail what it left queued
+        batch, self._pending = self._pending, []
+        for document_id, entries in self._by_document(batch).items():
+            self._fail(document_id, entries, task.exception())
+
+    async def operations_since(self, session: DocumentSession, revision: int) -> Optional[List[TextOperation]]:
+        """
+        Operations a client at ``revision`` is missing, from memory or the log.
+
+        Returns:
+            None if the client cannot catch up incrementally (too far behind,
+            or ahead of the server after a crash lost its last operations)
+        """
+        try:
+            return session.operations_since(revision)
+        except StaleRevisionError:
+            pass
+        except OTError:
+            return None
+
+        oldest = session.revision - len(session.history)
+        await self.flush()
+        older = await asyncio.to_thread(self.store.operations_between, session.document_id, revision, oldest)
+        if older is None:
+            return None
+        try:
+            # Re-read after the awaits: the session may have moved on meanwhile
+            return older + session.operations_since(oldest)
+        except OTError:
+            return None
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._flusher()), asyncio.create_task(self._compactor())]
+        logger.info(f"Started operation log on {self.path}")
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        self._stopping = True
+        if not tasks:
+            return
+        flusher, compactor = tasks
+        # Let the flusher finish its commit instead of cancelling it mid-write
+        self._wakeup.set()
+        self._batch_full.set()
+        compactor.cancel()
+        await asyncio.gather(flusher, compactor, return_exceptions=True)
+        await self.flush()
+
+    async def _flusher(self) -> None:
+        while not self._stopping:
+            await self._wakeup.wait()
+            if self.commit_delay and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.commit_delay)
+                except asyncio.TimeoutError:
+                    pass
+            # Operations recorded from here on wake the next round
+            self._wakeup.clear()
+            self._batch_full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Operation log commit failed, retrying: {str(e)}")
+                self._wakeup.set()
+                await asyncio.sleep(1)
+
+    async def _compactor(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Operation log compaction failed: {str(e)}", exc_info=True)
+
+    async def compact(self) -> int:
+        """Snapshot every document due for it; returns how many were compacted."""
+        compacted = 0
+        for document_id in await asyncio.to_thread(self.store.documents_to_compact, self.snapshot_every):
+            if await asyncio.to_thread(self.store.compact, document_id, self.retain) is not None:
+                compacted += 1
+        self.snapshots += compacted
+        return compacted
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "operations_written": self.operations_written,
+            "operations_failed": self.operations_failed,
+            "commits": self.commits,
+            "operations_per_commit": self.operations_written / self.commits if self.commits else 0.0,
+            "snapshots": self.snapshots
+        }
+
+async def load_stored_content(document_id: str) -> Optional[str]:
+    """Latest saved version of a document, the base of its first operations."""
+    async with database_engine.connect() as connection:
+        return await connection.run_sync(get_latest_content, document_id)
+
+op_log = OpLog(content_loader=load_stored_content)
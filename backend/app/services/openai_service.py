@@ -1,9 +1,8 @@
-import os
-from typing import Dict, List, Optional, Literal
-import openai
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List, Optional, Literal
 from pydantic import BaseModel
 
+from app.services.llm_gateway import LLMGateway, llm_gateway
+
 # Define document types
 document_type = Literal["srs", "sds"]
 
@@ -14,42 +13,59 @@ class DocumentGenerationRequest(BaseModel):
     additional_context: Optional[str] = None
 
 class OpenAIService:
-    def __init__(self, api_key: str = None):
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key: str = None, gateway: LLMGateway = None):
+        # Share the process-wide gateway unless a different API key is requested
+        if gateway is None:
+            gateway = llm_gateway if not api_key or api_key == llm_gateway.api_key else LLMGateway(api_key=api_key)
+        self.gateway = gateway
         self.model = "gpt-4-turbo"  # or "gpt-4" if you don't have access to turbo
 
-    async def generate_document(self, request: DocumentGenerationRequest) -> str:
+    async def generate_document(self, request: DocumentGenerationRequest, use_cache: bool = True) -> str:
         """Generate SRS or SDS document based on project description and code snippets."""
         try:
-            # Prepare the system message based on document type
-            if request.document_type == "srs":
-                system_message = self._get_srs_system_prompt()
-            else:  # sds
-                system_message = self._get_sds_system_prompt()
-
-            # Prepare the user message with project information
-            user_message = self._prepare_user_message(
-                request.project_description,
-                request.code_snippets,
-                request.additional_context
-            )
-
-            # Call the OpenAI API
-            response = await self.client.chat.completions.create(
+            # Call the OpenAI API through the async gateway
+            return await self.gateway.complete(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
+                messages=self._build_messages(request),
                 temperature=0.7,
-                max_tokens=3000
+                max_tokens=3000,
+                use_cache=use_cache
             )
 
-            return response.choices[0].message.content
-
         except Exception as e:
             raise Exception(f"Error generating document: {str(e)}")
 
+    async def stream_document(self, request: DocumentGenerationRequest, use_cache: bool = True) -> AsyncIterator[str]:
+        """Generate SRS or SDS document, yielding the text as the model produces it."""
+        async for delta in self.gateway.stream(
+            model=self.model,
+            messages=self._build_messages(request),
+            temperature=0.7,
+            max_tokens=3000,
+            use_cache=use_cache
+        ):
+            yield delta
+
+    def _build_messages(self, request: DocumentGenerationRequest) -> List[Dict[str, str]]:
+        """Build the chat messages for a generation request."""
+        # Prepare the system message based on document type
+        if request.document_type == "srs":
+            system_message = self._get_srs_system_prompt()
+        else:  # sds
+            system_message = self._get_sds_system_prompt()
+
+        # Prepare the user message with project information
+        user_message = self._prepare_user_message(
+            request.project_description,
+            request.code_snippets,
+            request.additional_context
+        )
+
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ]
+
     def _get_srs_system_prompt(self) -> str:
         """Return the system prompt for SRS generation."""
         return """You are a technical writer specializing in creating comprehensive Software Requirements Specification (SRS) documents. 
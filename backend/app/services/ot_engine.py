@@ -0,0 +1,443 @@
+import logging
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate, islice
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# One component of an operation: retain n characters (n > 0), delete n
+# characters (-n) or insert a string
+Component = Union[int, str]
+
+class OTError(ValueError):
+    """Raised for malformed operations or operations that do not fit the document."""
+
+class StaleRevisionError(OTError):
+    """Raised when an operation is based on a revision older than the kept history."""
+
+class TextOperation:
+    """
+    An edit of a whole document as a sequence of retain/insert/delete components.
+
+    Same model and JSON form as ot.js, so browser editors can use an
+    off-the-shelf client: ``[5, "abc", -2, 10]`` keeps 5 characters,
+    inserts "abc", deletes 2 and keeps the remaining 10. The operation
+    spans the entire document it applies to (``base_length``) and produces
+    a document of ``target_length`` characters.
+    """
+
+    __slots__ = ("ops", "base_length", "target_length")
+
+    def __init__(self):
+        self.ops: List[Component] = []
+        self.base_length = 0
+        self.target_length = 0
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, TextOperation) and self.ops == other.ops
+
+    def __repr__(self) -> str:
+        return f"TextOperation({self.ops!r})"
+
+    def retain(self, n: int) -> "TextOperation":
+        if n <= 0:
+            return self
+        self.base_length += n
+        self.target_length += n
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] > 0:
+            self.ops[-1] += n
+        else:
+            self.ops.append(n)
+        return self
+
+    def insert(self, text: str) -> "TextOperation":
+        if not text:
+            return self
+        self.target_length += len(text)
+        ops = self.ops
+        if ops and isinstance(ops[-1], str):
+            ops[-1] += text
+        elif ops and isinstance(ops[-1], int) and ops[-1] < 0:
+            # Keep inserts before deletes so equal edits have one canonical form
+            if len(ops) > 1 and isinstance(ops[-2], str):
+                ops[-2] += text
+            else:
+                ops.insert(len(ops) - 1, text)
+        else:
+            ops.append(text)
+        return self
+
+    def delete(self, n: int) -> "TextOperation":
+        if n <= 0:
+            return self
+        self.base_length += n
+        if self.ops and isinstance(self.ops[-1], int) and self.ops[-1] < 0:
+            self.ops[-1] -= n
+        else:
+            self.ops.append(-n)
+        return self
+
+    def is_noop(self) -> bool:
+        return not self.ops or (len(self.ops) == 1 and isinstance(self.ops[0], int) and self.ops[0] > 0)
+
+    @classmethod
+    def from_json(cls, data: Any) -> "TextOperation":
+        """Build an operation from its JSON list form, validating every component."""
+        if not isinstance(data, list):
+            raise OTError("An operation must be a list of components")
+        operation = cls()
+        for component in data:
+            if isinstance(component, str):
+                operation.insert(component)
+            elif isinstance(component, int) and not isinstance(component, bool) and component != 0:
+                if component > 0:
+                    operation.retain(component)
+                else:
+                    operation.delete(-component)
+            else:
+                raise OTError(f"Invalid operation component: {component!r}")
+        return operation
+
+    def to_json(self) -> List[Component]:
+        return list(self.ops)
+
+    def edits(self) -> List[Tuple[int, int, str]]:
+        """The operation as (position, characters deleted, text inserted) edits of the base document."""
+        edits: List[Tuple[int, int, str]] = []
+        position = 0
+        for component in self.ops:
+            if isinstance(component, str):
+                edits.append((position, 0, component))
+            elif component > 0:
+                position += component
+            else:
+                if edits and edits[-1][0] + edits[-1][1] == position:
+                    # Replace: the insert just before this delete becomes one edit
+                    start, deleted, text = edits[-1]
+                    edits[-1] = (start, deleted - component, text)
+                else:
+                    edits.append((position, -component, ""))
+                position -= component
+        return edits
+
+    def apply(self, text: str) -> str:
+        """Apply the operation to a string."""
+        if len(text) != self.base_length:
+            raise OTError(f"Operation expects a document of {self.base_length} characters, got {len(text)}")
+        parts = []
+        position = 0
+        for component in self.ops:
+            if isinstance(component, str):
+                parts.append(component)
+            elif component > 0:
+                parts.append(text[position:position + component])
+                position += component
+            else:
+                position -= component
+        return "".join(parts)
+
+def transform(a: TextOperation, b: TextOperation) -> Tuple[TextOperation, TextOperation]:
+    """
+    Transform two concurrent operations on the same document.
+
+    Returns ``(a', b')`` such that applying ``a`` then ``b'`` gives the same
+    document as ``b`` then ``a'``. When both insert at the same position,
+    the text of ``a`` ends up first.
+    """
+    if a.base_length != b.base_length:
+        raise OTError("Concurrent operations must apply to documents of the same length")
+    a_prime, b_prime = TextOperation(), TextOperation()
+    ops1, ops2 = iter(a.ops), iter(b.ops)
+    op1, op2 = next(ops1, None), next(ops2, None)
+
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, str):
+            a_prime.insert(op1)
+            b_prime.retain(len(op1))
+            op1 = next(ops1, None)
+            continue
+        if isinstance(op2, str):
+            a_prime.retain(len(op2))
+            b_prime.insert(op2)
+            op2 = next(ops2, None)
+            continue
+        if op1 is None or op2 is None:
+            raise OTError("Operations do not cover the same document")
+
+        if op1 > 0 and op2 > 0:
+            length = min(op1, op2)
+            a_prime.retain(length)
+            b_prime.retain(length)
+        elif op1 < 0 and op2 < 0:
+            length = min(-op1, -op2)
+        elif op1 < 0:
+            length = min(-op1, op2)
+            a_prime.delete(length)
+        else:
+            length = min(op1, -op2)
+            b_prime.delete(length)
+
+        # Consume ``length`` characters from both components
+        op1 = (op1 - length if op1 > 0 else op1 + length) or next(ops1, None)
+        op2 = (op2 - length if op2 > 0 else op2 + length) or next(ops2, None)
+    return a_prime, b_prime
+
+def compose(a: TextOperation, b: TextOperation) -> TextOperation:
+    """Combine ``a`` followed by ``b`` into one operation with the same effect."""
+    if a.target_length != b.base_length:
+        raise OTError("The second operation must apply to the result of the first")
+    result = TextOperation()
+    ops1, ops2 = iter(a.ops), iter(b.ops)
+    op1, op2 = next(ops1, None), next(ops2, None)
+
+    while op1 is not None or op2 is not None:
+        if isinstance(op1, int) and op1 < 0:
+            result.delete(-op1)
+            op1 = next(ops1, None)
+            continue
+        if isinstance(op2, str):
+            result.insert(op2)
+            op2 = next(ops2, None)
+            continue
+        if op1 is None or op2 is None:
+            raise OTError("Operations cannot be composed")
+
+        # op1 is a retain or an insert, op2 a retain or a delete
+        length = min(len(op1) if isinstance(op1, str) else op1, abs(op2))
+        if isinstance(op1, str):
+            if op2 > 0:
+                result.insert(op1[:length])
+            op1 = op1[length:] or next(ops1, None)
+        else:
+            if op2 > 0:
+                result.retain(length)
+            else:
+                result.delete(length)
+            op1 = (op1 - length) or next(ops1, None)
+        op2 = (op2 - length if op2 > 0 else op2 + length) or next(ops2, None)
+    return result
+
+class Rope:
+    """
+    Document text as a two-level rope: chunks of a few KB grouped into nodes.
+
+    An edit rewrites only the chunks it touches instead of copying the
+    whole document, and finding a position scans the node lengths and then
+    the chunks of one node, so applying a keystroke to a multi-megabyte
+    document costs a chunk-sized copy plus two short scans.
+    """
+
+    def __init__(self, text: str = "", chunk_size: int = 4096, node_size: int = 64):
+        self.chunk_size = chunk_size
+        self.node_size = node_size
+        chunks = self._split(text)
+        self._nodes: List[List[str]] = [chunks[i:i + node_size] for i in range(0, len(chunks), node_size)]
+        self._node_lengths: List[int] = [sum(map(len, node)) for node in self._nodes]
+        self._length = len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return "".join("".join(node) for node in self._nodes)
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(map(len, self._nodes))
+
+    def _split(self, text: str) -> List[str]:
+        # Chunks may grow to twice the target size before splitting, and split
+        # evenly, so a keystroke never leaves a one-character chunk behind
+        if len(text) <= 2 * self.chunk_size:
+            return [text] if text else []
+        pieces = -(-len(text) // self.chunk_size)
+        size = -(-len(text) // pieces)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _locate(self, position: int) -> Tuple[int, int, int]:
+        """(node, chunk in node, start of that chunk) containing ``position``; the end maps to the last chunk."""
+        node_starts = list(accumulate(self._node_lengths[:-1], initial=0))
+        node = max(bisect_right(node_starts, position) - 1, 0)
+        chunks = self._nodes[node]
+        chunk_starts = list(accumulate(map(len, chunks[:-1]), initial=node_starts[node]))
+        chunk = max(bisect_right(chunk_starts, position) - 1, 0)
+        return node, chunk, chunk_starts[chunk]
+
+    def splice(self, position: int, deleted: int, text: str) -> None:
+        """Delete ``deleted`` characters at ``position`` and insert ``text`` there."""
+        if position < 0 or deleted < 0 or position + deleted > self._length:
+            raise OTError("Edit outside the document")
+        if not self._nodes:
+            if text:
+                self._nodes, self._node_lengths = [self._split(text)], [len(text)]
+                self._length = len(text)
+            return
+
+        node, first, start = self._locate(position)
+        last_node, last, _ = self._locate(position + deleted) if deleted else (node, first, start)
+        if last_node != node:
+            # The deletion crosses nodes: merge them, re-split below if too big
+            for merged in self._nodes[node:last_node]:
+                last += len(merged)
+            self._nodes[node:last_node + 1] = [[chunk for n in self._nodes[node:last_node + 1] for chunk in n]]
+            self._node_lengths[node:last_node + 1] = [sum(self._node_lengths[node:last_node + 1])]
+
+        chunks = self._nodes[node]
+        # Merge a small neighbour in so chunks do not fragment under many small edits
+        if first > 0 and len(chunks[first - 1]) < self.chunk_size // 2:
+            first -= 1
+            start -= len(chunks[first])
+        segment = "".join(chunks[first:last + 1])
+        local = position - start
+        chunks[first:last + 1] = self._split(segment[:local] + text + segment[local + deleted:])
+        self._node_lengths[node] += len(text) - deleted
+        self._length += len(text) - deleted
+
+        if not chunks:
+            del self._nodes[node]
+            del self._node_lengths[node]
+        elif len(chunks) > 2 * self.node_size:
+            half = len(chunks) // 2
+            self._nodes[node:node + 1] = [chunks[:half], chunks[half:]]
+            self._node_lengths[node:node + 1] = [sum(map(len, chunks[:half])), sum(map(len, chunks[half:]))]
+
+    def apply(self, operation: TextOperation) -> None:
+        """Apply an operation in place."""
+        if operation.base_length != self._length:
+            raise OTError(f"Operation expects a document of {operation.base_length} characters, got {self._length}")
+        # From the end, so positions of earlier edits stay valid
+        for position, deleted, text in reversed(operation.edits()):
+            self.splice(position, deleted, text)
+
+class DocumentSession:
+    """
+    Server-authoritative state of one document: its text, a revision
+    counter and the recent operations.
+
+    A client sends each operation with the revision it was made against.
+    The server transforms it past every operation applied since then,
+    applies the result, bumps the revision and broadcasts only that
+    transformed operation. ``submit`` does not await, so under asyncio
+    operations on a document are applied one at a time without a lock.
+    """
+
+    def __init__(self, document_id: str, content: str = "", revision: int = 0, history_limit: Optional[int] = None):
+        self.document_id = document_id
+        self.buffer = Rope(content)
+        self.revision = revision
+        self.history: Deque[TextOperation] = deque(maxlen=history_limit or settings.OT_HISTORY_LIMIT)
+        self.max_length = settings.DOCUMENT_MAX_BYTES
+        self.operations_applied = 0
+        self.transforms = 0
+
+    def submit(self, base_revision: int, operation: TextOperation) -> TextOperation:
+        """
+        Apply a client operation made against ``base_revision``.
+
+        Returns:
+            The operation as applied (transformed past concurrent ones);
+            the document is now at ``self.revision``
+
+        Raises:
+            StaleRevisionError: The client is too far behind to transform; it must resync
+            OTError: The operation does not fit the document
+        """
+        if not isinstance(base_revision, int) or isinstance(base_revision, bool) or not 0 <= base_revision <= self.revision:
+            raise OTError(f"Unknown revision: {base_revision!r}")
+        behind = self.revision - base_revision
+        if behind > len(self.history):
+            raise StaleRevisionError(
+                f"Revision {base_revision} is older than the kept history (oldest {self.revision - len(self.history)})"
+            )
+        for concurrent in islice(self.history, len(self.history) - behind, None):
+            operation = transform(operation, concurrent)[0]
+            self.transforms += 1
+        if operation.target_length > self.max_length:
+            raise OTError("Document would exceed the maximum size")
+        self.buffer.apply(operation)
+        self.history.append(operation)
+        self.revision += 1
+        self.operations_applied += 1
+        return operation
+
+    def operations_since(self, revision: int) -> List[TextOperation]:
+        """Operations a client at ``revision`` is missing, oldest first."""
+        behind = self.revision - revision
+        if behind < 0:
+            raise OTError(f"Unknown revision: {revision}")
+        if behind > len(self.history):
+            raise StaleRevisionError(f"Revision {revision} is older than the kept history")
+        return list(islice(self.history, len(self.history) - behind, None))
+
+    def snapshot(self) -> Tuple[int, str]:
+        return self.revision, str(self.buffer)
+
+class OTEngine:
+    """In-memory registry of document sessions, created on first use."""
+
+    def __init__(self, history_limit: Optional[int] = None):
+        self.history_limit = history_limit
+        self.sessions: Dict[str, DocumentSession] = {}
+
+    def get_session(self, document_id: str, content: str = "") -> DocumentSession:
+        """Return the session of a document, starting it from ``content`` if it is not open yet."""
+        session = self.sessions.get(document_id)
+        if session is None:
+            session = DocumentSession(document_id, content, history_limit=self.history_limit)
+            self.sessions[document_id] = session
+        return session
+
+    def close_session(self, document_id: str) -> None:
+        self.sessions.pop(document_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.sessions),
+            "operations_applied": sum(s.operations_applied for s in self.sessions.values()),
+            "transforms": sum(s.transforms for s in self.sessions.values())
+        }
+
+class OTClient:
+    """
+    Reference client for the protocol, as an editor runs it.
+
+    At most one operation is in flight; edits made while waiting for its
+    acknowledgement are composed into a buffer. Operations from the server
+    are transformed past both before being applied locally. Used by the
+    fuzz tests and the benchmark to simulate many editors.
+    """
+
+    def __init__(self, revision: int = 0, text: str = ""):
+        self.revision = revision
+        self.text = text
+        self.outstanding: Optional[TextOperation] = None
+        self.buffer: Optional[TextOperation] = None
+
+    def edit(self, operation: TextOperation) -> Optional[Tuple[int, TextOperation]]:
+        """Apply a local edit; returns (revision, operation) to send, or None while waiting."""
+        self.text = operation.apply(self.text)
+        if self.outstanding is None:
+            self.outstanding = operation
+            return self.revision, operation
+        self.buffer = operation if self.buffer is None else compose(self.buffer, operation)
+        return None
+
+    def acknowledge(self, revision: int) -> Optional[Tuple[int, TextOperation]]:
+        """The server applied our outstanding operation as ``revision``; returns the next one to send."""
+        self.revision = revision
+        self.outstanding, self.buffer = self.buffer, None
+        return (self.revision, self.outstanding) if self.outstanding is not None else None
+
+    def receive(self, revision: int, operation: TextOperation) -> None:
+        """Apply an operation another client made, broadcast as ``revision``."""
+        if self.outstanding is not None:
+            self.outstanding, operation = transform(self.outstanding, operation)
+            if self.buffer is not None:
+                self.buffer, operation = transform(self.buffer, operation)
+        self.revision = revision
+        self.text = operation.apply(self.text)
+
+ot_engine = OTEngine()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class PresenceAggregator:
+    """
+    Batches cursor and status updates per document.
+
+    Only the latest cursor and status of each user is kept, and once per
+    tick everything that changed is broadcast as a single ``presence_batch``
+    frame (one timestamp, serialized once) instead of one message per
+    update. The frame goes to everyone in the document; clients skip their
+    own entry. The tick rate drops as the room grows so the sends per
+    second per document stay near ``sends_per_second``, between ``min_hz``
+    and ``max_hz``. A document's ticker stops after an idle tick and starts
+    again with the next update.
+
+    Frames may be dropped for a client that is behind, and a user who stops
+    moving sends nothing that would supersede them, so after a drop the
+    next frame carries the latest entry of everyone in the room.
+    """
+
+    def __init__(
+        self,
+        manager: Any,
+        max_hz: float = settings.PRESENCE_MAX_HZ,
+        min_hz: float = settings.PRESENCE_MIN_HZ,
+        sends_per_second: float = settings.PRESENCE_SENDS_PER_SECOND
+    ):
+        """
+        Args:
+            manager: ConnectionManager the frames are broadcast through
+            max_hz: Tick rate of small rooms; 0 disables batching
+            min_hz: Lowest tick rate, however large the room
+            sends_per_second: Fan-out budget per document the tick rate is derived from
+        """
+        self.manager = manager
+        self.max_hz = max_hz
+        self.min_hz = min_hz
+        self.sends_per_second = sends_per_second
+        # document_id -> user_id -> {"cursor": ..., "status": ...}
+        self.pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Latest entry of every user, for frames resending the whole room
+        self.state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.stale: Set[str] = set()
+        self.tickers: Dict[str, asyncio.Task] = {}
+        self.messages_in = 0
+        self.frames_out = 0
+        self.sends_out = 0
+        self.resyncs = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_hz > 0
+
+    def tick_rate(self, subscribers: int) -> float:
+        """Frames per second for a room with ``subscribers`` connections."""
+        return max(self.min_hz, min(self.max_hz, self.sends_per_second / max(subscribers, 1)))
+
+    def update(self, document_id: str, user_id: str, **fields: Any) -> None:
+        """Record the latest ``cursor`` and/or ``status`` of a user for the next frame."""
+        self.messages_in += 1
+        self.pending.setdefault(document_id, {}).setdefault(user_id, {}).update(fields)
+        self.state.setdefault(document_id, {}).setdefault(user_id, {}).update(fields)
+        self._schedule(document_id)
+
+    def resync(self, document_id: str) -> None:
+        """A frame was dropped for some client: send the whole room with the next one."""
+        if document_id in self.state:
+            self.stale.add(document_id)
+            self._schedule(document_id)
+
+    def remove(self, document_id: str, user_id: str) -> None:
+        """Forget a user who left so no entry of theirs is sent after ``user_left``."""
+        for entries in (self.pending, self.state):
+            users = entries.get(document_id)
+            if users is not None:
+                users.pop(user_id, None)
+                if not users:
+                    del entries[document_id]
+        if document_id not in self.state:
+            self.stale.discard(document_id)
+
+    def _schedule(self, document_id: str) -> None:
+        if document_id not in self.tickers:
+            self.tickers[document_id] = asyncio.create_task(self._tick(document_id))
+
+    async def _tick(self, document_id: str) -> None:
+        try:
+            while True:
+                subscribers = len(self.manager.active_connections.get(document_id, ()))
+                await asyncio.sleep(1 / self.tick_rate(subscribers))
+                users = self.pending.pop(document_id, None)
+                if document_id in self.stale:
+                    self.stale.discard(document_id)
+                    users = {user_id: dict(entry) for user_id, entry in self.state.get(document_id, {}).items()}
+                    self.resyncs += 1
+                if not users:
+                    return
+                await self.manager.broadcast(document_id, {
+                    "type": "presence_batch",
+                    "users": users,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                self.frames_out += 1
+                self.sends_out += len(self.manager.active_connections.get(document_id, ()))
+        except Exception as e:
+            logger.error(f"Presence ticker for document {document_id} failed: {str(e)}")
+        finally:
+            self.tickers.pop(document_id, None)
+
+    def close(self) -> None:
+        for task in list(self.tickers.values()):
+            task.cancel()
+        self.pending.clear()
+        self.state.clear()
+        self.stale.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "messages_in": self.messages_in,
+            "frames_out": self.frames_out,
+            "sends_out": self.sends_out,
+            "resyncs": self.resyncs,
+            "messages_per_frame": self.messages_in / self.frames_out if self.frames_out else 0.0,
+            "active_documents": len(self.tickers),
+            "tick_hz": {
+                document_id: self.tick_rate(len(self.manager.active_connections.get(document_id, ())))
+                for document_id in self.tickers
+            }
+        }
@@ -0,0 +1,115 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ManifestEntry:
+    """What is known about one file of a project as of its last analysis."""
+    path: str
+    version_hash: str
+    analyzer_version: str
+    result: Dict[str, Any]
+    documentation: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+class ProjectManifestStore:
+    """
+    SQLite table of path -> version hash -> analysis result per project.
+
+    A project that is resubmitted (e.g. re-documented nightly) only needs
+    the files whose hash changed re-analyzed and re-documented; the results
+    of the others are read back from here.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Opened on first use so importing the module does not create the file
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest_entries ("
+                "project_id TEXT NOT NULL, path TEXT NOT NULL, version_hash TEXT NOT NULL, "
+                "analyzer_version TEXT NOT NULL, result TEXT NOT NULL, documentation TEXT, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (project_id, path))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def load(self, project_id: str) -> Dict[str, ManifestEntry]:
+        """Return the entries of a project by path."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, version_hash, analyzer_version, result, documentation, updated_at "
+                "FROM manifest_entries WHERE project_id = ?",
+                (project_id,)
+            ).fetchall()
+        return {
+            row[0]: ManifestEntry(
+                path=row[0],
+                version_hash=row[1],
+                analyzer_version=row[2],
+                result=json.loads(row[3]),
+                documentation=row[4],
+                updated_at=row[5]
+            )
+            for row in rows
+        }
+
+    def upsert(self, project_id: str, entries: Iterable[ManifestEntry]) -> None:
+        """Insert or replace entries in one transaction."""
+        rows = [
+            (
+                project_id, entry.path, entry.version_hash, entry.analyzer_version,
+                json.dumps(entry.result, separators=(",", ":"), default=str),
+                entry.documentation, entry.updated_at
+            )
+            for entry in entries
+        ]
+        if not rows:
+            return
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("INSERT OR REPLACE INTO manifest_entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete(self, project_id: str, paths: Iterable[str]) -> None:
+        """Drop the entries of files that no longer exist."""
+        rows = [(project_id, path) for path in paths]
+        if not rows:
+            return
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("DELETE FROM manifest_entries WHERE project_id = ? AND path = ?", rows)
+
+    def count(self, project_id: str) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM manifest_entries WHERE project_id = ?", (project_id,)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+project_manifests = ProjectManifestStore(settings.PROJECT_MANIFEST_PATH)
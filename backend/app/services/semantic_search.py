@@ -0,0 +1,110 @@
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.similarity_engine import BatchSimilarityEngine, get_similarity_engine
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+class SemanticSearchService:
+    """
+    Per-project semantic search over project inputs.
+
+    Every project gets its own VectorIndex of MiniLM embeddings. Items are
+    identified by ``(kind, item_id)`` where kind is ``code_snippets``,
+    ``comments`` or ``user_prompts`` and are indexed incrementally as they
+    are added.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], BatchSimilarityEngine] = get_similarity_engine,
+        ivf_threshold: int = settings.SEMANTIC_INDEX_IVF_THRESHOLD
+    ):
+        self.engine_factory = engine_factory
+        self.ivf_threshold = ivf_threshold
+        self.indexes: Dict[str, VectorIndex] = {}
+        # Guards index creation; handlers call in from the threadpool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, item_id: str) -> str:
+        return f"{kind}:{item_id}"
+
+    def _index(self, project_id: str) -> VectorIndex:
+        index = self.indexes.get(project_id)
+        if index is None:
+            with self._lock:
+                index = self.indexes.get(project_id)
+                if index is None:
+                    index = VectorIndex(ivf_threshold=self.ivf_threshold)
+                    self.indexes[project_id] = index
+        return index
+
+    def index_items(self, project_id: str, items: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Add or update items in a project's index.
+
+        Args:
+            project_id: Project the items belong to
+            items: ``(kind, item_id, text)`` tuples
+
+        Returns:
+            Number of items indexed
+        """
+        items = [item for item in items if item[2] and item[2].strip()]
+        if not items:
+            return 0
+        vectors = self.engine_factory().encode([text for _, _, text in items])
+        self._index(project_id).add_many(
+            [self._key(kind, item_id) for kind, item_id, _ in items],
+            vectors
+        )
+        return len(items)
+
+    def search(
+        self,
+        project_id: str,
+        query: str,
+        limit: int = 10,
+        kinds: Optional[List[str]] = None
+    ) -> List[Dict[str, object]]:
+        """
+        Rank a project's items by semantic similarity to the query.
+
+        Returns:
+            List of ``{"kind", "id", "score"}`` dicts, best first
+        """
+        index = self.indexes.get(project_id)
+        if not index or not query.strip():
+            return []
+
+        query_vector = self.engine_factory().encode([query])[0]
+        # Over-fetch when filtering by kind, widening until the page is full
+        # or every candidate has been seen
+        fetch = limit if not kinds else limit * 4
+        while True:
+            hits = index.search(query_vector, fetch)
+            results = []
+            for key, score in hits:
+                kind, item_id = key.split(":", 1)
+                if kinds and kind not in kinds:
+                    continue
+                results.append({"kind": kind, "id": item_id, "score": score})
+                if len(results) >= limit:
+                    return results
+            if len(hits) < fetch or fetch >= len(index):
+                return results
+            fetch *= 4
+
+    def get_stats(self, project_id: str) -> Dict[str, object]:
+        index = self.indexes.get(project_id)
+        return {
+            "indexed_items": len(index) if index else 0,
+            "index_type": "ivf" if index and index.uses_ivf else "exact"
+        }
+
+# Singleton instance
+semantic_search_service = SemanticSearchService()
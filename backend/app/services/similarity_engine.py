@@ -0,0 +1,125 @@
+from typing import Dict, Optional, Sequence
+import numpy as np
+import logging
+import threading
+
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+class BatchSimilarityEngine:
+    """
+    Batched semantic similarity scoring.
+
+    Scores many texts against a single reference text: the reference is encoded
+    once, the candidates are encoded in padded batches, and all cosine scores
+    come out of one matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = 64,
+        device: Optional[str] = None,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Args:
+            model: A SentenceTransformer-compatible model exposing ``encode``
+            batch_size: Number of texts encoded per forward pass
+            device: Torch device to run the model on (``None`` lets the model decide)
+            cache: Optional embedding cache consulted before the model is called
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.model = model
+        self.batch_size = batch_size
+        self.device = device
+        self.cache = cache
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Encode texts into L2-normalised float32 embeddings.
+
+        Args:
+            texts: Texts to encode
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts)
+
+        cached = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            fresh = dict(zip(missing, self._encode(missing)))
+            self.cache.put_many(missing, list(fresh.values()))
+            cached = [vector if vector is not None else fresh[text] for text, vector in zip(texts, cached)]
+        return np.stack(cached).astype(np.float32)
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            device=self.device,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return self._normalize(np.asarray(embeddings, dtype=np.float32))
+
+    def score(self, texts: Sequence[str], reference: str) -> np.ndarray:
+        """
+        Cosine similarity of every text against the reference text.
+
+        Args:
+            texts: Candidate texts (e.g. extracted code elements)
+            reference: Text to compare against (e.g. documentation)
+
+        Returns:
+            Array of shape (len(texts),) with scores in [-1, 1]
+        """
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+
+        reference_embedding = self.encode([reference])[0]
+        return self.score_embeddings(self.encode(texts), reference_embedding)
+
+    @staticmethod
+    def score_embeddings(embeddings: np.ndarray, reference_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of pre-normalised embeddings against a reference vector."""
+        return embeddings @ reference_embedding
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+_shared_engines: Dict[str, BatchSimilarityEngine] = {}
+_shared_engines_lock = threading.Lock()
+
+def get_similarity_engine(model_name: str = DEFAULT_EMBEDDING_MODEL) -> BatchSimilarityEngine:
+    """
+    Return the process-wide engine for a model.
+
+    The model comes from the shared model registry (loaded on first call) and
+    the engine uses the shared embedding cache for that model.
+    """
+    with _shared_engines_lock:
+        engine = _shared_engines.get(model_name)
+        if engine is None:
+            engine = BatchSimilarityEngine(
+                model_registry.get(model_name),
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                device=settings.EMBEDDING_DEVICE,
+                cache=get_embedding_cache(model_name)
+            )
+            _shared_engines[model_name] = engine
+        return engine
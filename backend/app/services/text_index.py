@@ -0,0 +1,275 @@
+import re
+import math
+import heapq
+import bisect
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower-case search terms, keeping code identifiers intact.
+
+    Each identifier is emitted whole and, when it is a compound, also as its
+    snake_case / camelCase parts: ``parseHTTPResponse`` yields
+    ``parsehttpresponse``, ``parse``, ``http`` and ``response``.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        terms.append(word.lower())
+        parts = [
+            part.lower()
+            for chunk in word.split("_") if chunk
+            for part in _CAMEL_RE.findall(chunk)
+        ]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+class _ImpactList:
+    """Postings of one term ordered by descending BM25 term weight."""
+
+    __slots__ = ("avg_length", "entries", "impacts")
+
+    def __init__(self, avg_length: float, impacts: Dict[str, float]):
+        self.avg_length = avg_length
+        self.impacts = impacts
+        # (negated weight, doc_id) so bisect keeps the list in descending weight order;
+        # entries whose doc was removed or re-weighted are skipped lazily
+        self.entries: List[Tuple[float, str]] = sorted((-weight, doc_id) for doc_id, weight in impacts.items())
+
+    def is_live(self, entry: Tuple[float, str]) -> bool:
+        return self.impacts.get(entry[1]) == -entry[0]
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking.
+
+    Each term maps to a posting list of ``doc_id -> term frequency``. For
+    ranking, every queried term also keeps an impact-ordered copy of its
+    postings (docs sorted by their BM25 weight for that term), and queries run
+    the threshold algorithm over those lists: they stop as soon as no unseen
+    document could still enter the requested page. Search cost therefore
+    depends on the page size and score distribution rather than on the size
+    of the corpus. Documents can be added, replaced and deleted incrementally.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._impact_lists: Dict[str, _ImpactList] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version with the same id."""
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self.remove(doc_id)
+            length = sum(terms.values())
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+                impact_list = self._impact_lists.get(term)
+                if impact_list is not None:
+                    weight = self._term_weight(frequency, length, impact_list.avg_length)
+                    impact_list.impacts[doc_id] = weight
+                    bisect.insort(impact_list.entries, (-weight, doc_id))
+            self.doc_lengths[doc_id] = length
+            self._doc_terms[doc_id] = terms
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        """Delete a document; returns False if it was not indexed."""
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return False
+            for term in terms:
+                posting = self.postings[term]
+                del posting[doc_id]
+                if not posting:
+                    del self.postings[term]
+                    self._impact_lists.pop(term, None)
+                elif term in self._impact_lists:
+                    self._impact_lists[term].impacts.pop(doc_id, None)
+            self._total_length -= self.doc_lengths.pop(doc_id)
+            return True
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: int = 10,
+        doc_filter: Optional[Callable[[str], bool]] = None
+    ) -> Tuple[List[Tuple[str, float]], bool]:
+        """
+        Rank documents matching any query term with BM25.
+
+        Args:
+            query: Free-text query
+            offset: Number of ranked results to skip
+            limit: Maximum number of results to return
+            doc_filter: Optional predicate on doc ids
+
+        Returns:
+            Tuple of ([(doc_id, score), ...], whether more results follow)
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            query_terms = [term for term in query_terms if term in self.postings]
+            if not query_terms or limit <= 0:
+                return [], False
+
+            doc_count = len(self.doc_lengths)
+            avg_length = self._total_length / doc_count or 1.0
+            lists = []
+            for term in query_terms:
+                document_frequency = len(self.postings[term])
+                idf = math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                lists.append((idf, self._impact_list(term, avg_length)))
+
+            # Fetch one extra result to know whether another page exists
+            top = self._threshold_top_k(lists, offset + limit + 1, doc_filter)
+
+        return top[offset:offset + limit], len(top) > offset + limit
+
+    def _threshold_top_k(
+        self,
+        lists: List[Tuple[float, _ImpactList]],
+        k: int,
+        doc_filter: Optional[Callable[[str], bool]]
+    ) -> List[Tuple[str, float]]:
+        """Fagin's threshold algorithm over impact-ordered posting lists."""
+        heap: List[Tuple[float, str]] = []
+        seen = set()
+        positions = [0] * len(lists)
+
+        while True:
+            threshold = 0.0
+            advanced = False
+            for i, (idf, impact_list) in enumerate(lists):
+                entries = impact_list.entries
+                position = positions[i]
+                while position < len(entries) and not impact_list.is_live(entries[position]):
+                    position += 1
+                if position >= len(entries):
+                    positions[i] = position
+                    continue
+                negative_weight, doc_id = entries[position]
+                positions[i] = position + 1
+                advanced = True
+                threshold += idf * -negative_weight
+
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if doc_filter is not None and not doc_filter(doc_id):
+                    continue
+                score = sum(w * other.impacts.get(doc_id, 0.0) for w, other in lists)
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, doc_id))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, doc_id))
+
+            if not advanced or (len(heap) >= k and heap[0][0] >= threshold):
+                break
+
+        return [(doc_id, score) for score, doc_id in sorted(heap, key=lambda item: (-item[0], item[1]))]
+
+    def _impact_list(self, term: str, avg_length: float) -> _ImpactList:
+        impact_list = self._impact_lists.get(term)
+        posting = self.postings[term]
+        stale = (
+            impact_list is None
+            # Weights depend on the average document length; rebuild once it drifts
+            or abs(impact_list.avg_length - avg_length) > 0.1 * impact_list.avg_length
+            # Compact once removed/re-weighted entries dominate the list
+            or len(impact_list.entries) > 2 * len(posting) + 16
+        )
+        if stale:
+            impact_list = _ImpactList(avg_length, {
+                doc_id: self._term_weight(frequency, self.doc_lengths[doc_id], avg_length)
+                for doc_id, frequency in posting.items()
+            })
+            self._impact_lists[term] = impact_list
+        return impact_list
+
+    def _term_weight(self, frequency: int, length: int, avg_length: float) -> float:
+        norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+        return frequency * (self.k1 + 1) / (frequency + norm)
+
+class TextSearchService:
+    """
+    Per-project full-text search over project inputs.
+
+    Items are identified by ``(kind, item_id)`` like in SemanticSearchService.
+    """
+
+    def __init__(self):
+        self.indexes: Dict[str, InvertedIndex] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kind: str, item_id: str) -> str:
+        return f"{kind}:{item_id}"
+
+    def index_items(self, project_id: str, items: Iterable[Tuple[str, str, str]]) -> None:
+        """Add or update ``(kind, item_id, text)`` items in a project's index."""
+        index = self.indexes.get(project_id)
+        if index is None:
+            with self._lock:
+                index = self.indexes.setdefault(project_id, InvertedIndex())
+        for kind, item_id, text in items:
+            index.add(self._key(kind, item_id), text or "")
+
+    def remove_item(self, project_id: str, kind: str, item_id: str) -> bool:
+        index = self.indexes.get(project_id)
+        return bool(index) and index.remove(self._key(kind, item_id))
+
+    def search(
+        self,
+        project_id: str,
+        query: str,
+        offset: int = 0,
+        limit: int = 20,
+        kinds: Optional[List[str]] = None
+    ) -> Dict[str, object]:
+        """
+        Rank a project's items by BM25.
+
+        Returns:
+            ``{"results": [{"kind", "id", "score"}, ...], "has_more": bool}``
+        """
+        index = self.indexes.get(project_id)
+        if not index:
+            return {"results": [], "has_more": False}
+
+        doc_filter = None
+        if kinds:
+            prefixes = tuple(f"{kind}:" for kind in kinds)
+            doc_filter = lambda doc_id: doc_id.startswith(prefixes)
+
+        hits, has_more = index.search(query, offset=offset, limit=limit, doc_filter=doc_filter)
+        results = []
+        for key, score in hits:
+            kind, item_id = key.split(":", 1)
+            results.append({"kind": kind, "id": item_id, "score": score})
+        return {"results": results, "has_more": has_more}
+
+# Singleton instance
+text_search_service = TextSearchService()
@@ -0,0 +1,191 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """
+    Incrementally updatable cosine-similarity index.
+
+    Small indexes are searched exactly with a single matrix-vector product and
+    ``argpartition`` top-k. Once the index grows past ``ivf_threshold`` vectors
+    it builds an inverted-file (IVF) structure: vectors are clustered with
+    k-means, each query scores the centroids and only scans the ``n_probe``
+    closest lists. New vectors are assigned to their nearest centroid on
+    insert and the clustering is retrained when the index has doubled in size.
+    """
+
+    def __init__(
+        self,
+        ivf_threshold: int = 20000,
+        n_probe: int = 8,
+        kmeans_iterations: int = 10,
+        seed: int = 0
+    ):
+        """
+        Args:
+            ivf_threshold: Number of vectors above which the IVF index is used
+            n_probe: Number of inverted lists scanned per query
+            kmeans_iterations: Lloyd iterations when (re)training centroids
+            seed: Random seed for centroid initialisation
+        """
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+        # IVF state
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    @property
+    def uses_ivf(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, item_id: str, vector: np.ndarray) -> None:
+        """Insert or replace a vector."""
+        self.add_many([item_id], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def add_many(self, item_ids: List[str], vectors: np.ndarray) -> None:
+        """Insert or replace several vectors."""
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if not len(vectors):
+            return
+        with self._lock:
+            self._ensure_dim(vectors.shape[1])
+            for item_id, vector in zip(item_ids, vectors):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = self._append_row(item_id)
+                self._vectors[row] = vector
+                if self._assignments is not None:
+                    self._assignments[row] = self._nearest_centroid(vector)
+            self._maybe_train()
+
+    def remove(self, item_id: str) -> bool:
+        """Remove a vector; returns False if the id is unknown."""
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole to keep storage dense
+                moved_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+                if self._assignments is not None:
+                    self._assignments[row] = self._assignments[last]
+            self._ids.pop()
+            self._size -= 1
+            if self._centroids is not None and self._size < self.ivf_threshold // 2:
+                self._centroids = None
+                self._assignments = None
+            return True
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Find the ``k`` most similar vectors.
+
+        Returns:
+            List of (item_id, cosine similarity) pairs, best first
+        """
+        with self._lock:
+            if self._size == 0 or k <= 0:
+                return []
+            query = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+            if self._centroids is None:
+                candidates = None
+                scores = self._vectors[:self._size] @ query
+            else:
+                probe = min(self.n_probe, len(self._centroids))
+                centroid_scores = self._centroids @ query
+                lists = np.argpartition(-centroid_scores, probe - 1)[:probe]
+                candidates = np.flatnonzero(np.isin(self._assignments[:self._size], lists))
+                scores = self._vectors[candidates] @ query
+
+            k = min(k, len(scores))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows = top if candidates is None else candidates[top]
+            return [(self._ids[row], float(scores[i])) for i, row in zip(top, rows)]
+
+    def _append_row(self, item_id: str) -> int:
+        if self._vectors is None:
+            raise ValueError("Vector dimension is unknown")
+        if self._size == len(self._vectors):
+            capacity = max(16, len(self._vectors) * 2)
+            grown = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+            if self._assignments is not None:
+                assignments = np.zeros(capacity, dtype=np.int32)
+                assignments[:self._size] = self._assignments[:self._size]
+                self._assignments = assignments
+        row = self._size
+        self._size += 1
+        self._ids.append(item_id)
+        self._rows[item_id] = row
+        return row
+
+    def _maybe_train(self) -> None:
+        if self._size < self.ivf_threshold:
+            return
+        if self._centroids is not None and self._size < self._trained_size * 2:
+            return
+        self._train()
+
+    def _train(self) -> None:
+        data = self._vectors[:self._size]
+        n_lists = max(1, int(np.sqrt(self._size)))
+        sample_size = min(self._size, n_lists * 64)
+        sample = data[self._rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        self._centroids = centroids
+        self._assignments = np.zeros(len(self._vectors), dtype=np.int32)
+        self._assignments[:self._size] = np.argmax(data @ centroids.T, axis=1)
+        self._trained_size = self._size
+        logger.info(f"Trained IVF index with {n_lists} lists over {self._size} vectors")
+
+    def _nearest_centroid(self, vector: np.ndarray) -> int:
+        return int(np.argmax(self._centroids @ vector))
+
+    def _ensure_dim(self, dim: int) -> None:
+        if self._vectors is None:
+            self._vectors = np.zeros((16, dim), dtype=np.float32)
+        elif self._vectors.shape[1] != dim:
+            raise ValueError(f"Vector dimension {dim} does not match index dimension {self._vectors.shape[1]}")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
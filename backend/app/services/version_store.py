@@ -0,0 +1,449 @@
+import json
+import zlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.diff_engine import get_opcodes
+
+logger = logging.getLogger(__name__)
+
+# How a version's content is stored
+TEXT = "text"          # legacy row: full uncompressed copy in the content column
+KEYFRAME = "keyframe"  # compressed full snapshot
+DELTA = "delta"        # compressed forward delta from the previous version
+
+# Line ranges copied from the base ([start, end]) or literal inserted text
+DeltaOp = Union[List[int], str]
+
+def _zstd():
+    """Import zstandard only when the zstd codec is used."""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("VERSION_COMPRESSION=zstd requires the 'zstandard' package")
+    return zstandard
+
+def compress(data: bytes, codec: str = "zlib") -> bytes:
+    """Compress ``data`` and prefix a one-byte codec id so payloads are self-describing."""
+    if codec == "zlib":
+        return b"z" + zlib.compress(data, 6)
+    if codec == "zstd":
+        return b"s" + _zstd().ZstdCompressor(level=9).compress(data)
+    if codec == "none":
+        return b"n" + data
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+def decompress(payload: bytes) -> bytes:
+    """Inverse of :func:`compress`; the codec is read from the payload."""
+    codec, body = payload[:1], payload[1:]
+    if codec == b"z":
+        return zlib.decompress(body)
+    if codec == b"s":
+        return _zstd().ZstdDecompressor().decompress(body)
+    if codec == b"n":
+        return body
+    raise ValueError(f"Unknown payload codec: {codec!r}")
+
+def make_delta(base: str, target: str) -> List[DeltaOp]:
+    """
+    Line-level forward delta turning ``base`` into ``target``.
+
+    Unchanged runs of lines are referenced by range, so a small edit to a
+    large document costs a few bytes plus the changed lines. Lines are
+    matched by the patience/Myers diff engine, which stays near-linear on
+    long, repetitive Markdown where difflib goes quadratic.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops: List[DeltaOp] = []
+    for tag, i1, i2, j1, j2 in get_opcodes(base_lines, target_lines):
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(target_lines[j1:j2]))
+    return ops
+
+def apply_delta(base: str, ops: Sequence[DeltaOp]) -> str:
+    """Rebuild the target of :func:`make_delta` from its base."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
+
+def encode_version(
+    previous: Optional[str],
+    content: str,
+    position: int,
+    keyframe_interval: int,
+    codec: str = "zlib"
+) -> Tuple[str, bytes]:
+    """
+    Choose how to store one version of a document.
+
+    Every ``keyframe_interval``-th version (by position in the document's
+    history) is a full snapshot, so rebuilding any version applies at most
+    ``keyframe_interval - 1`` deltas. A delta that would not be much smaller
+    than a snapshot is stored as a snapshot instead.
+
+    Args:
+        previous: Content of the preceding version, or None for the first
+        content: Content of this version
+        position: Zero-based position of the version in the history
+        keyframe_interval: Versions between scheduled snapshots
+        codec: 'zlib', 'zstd' or 'none'
+
+    Returns:
+        The storage kind (KEYFRAME or DELTA) and its payload
+    """
+    data = content.encode("utf-8")
+    if previous is None or keyframe_interval <= 1 or position % keyframe_interval == 0:
+        return KEYFRAME, compress(data, codec)
+    delta = json.dumps(make_delta(previous, content), separators=(",", ":")).encode("utf-8")
+    if len(delta) > len(data) // 2:
+        return KEYFRAME, compress(data, codec)
+    return DELTA, compress(delta, codec)
+
+def decode_version(kind: str, payload: bytes, previous: Optional[str]) -> str:
+    """Rebuild a version from its payload and the content of the preceding version."""
+    if kind == KEYFRAME:
+        return decompress(payload).decode("utf-8")
+    if kind == DELTA:
+        if previous is None:
+            raise ValueError("Delta version without a preceding version")
+        return apply_delta(previous, json.loads(decompress(payload)))
+    raise ValueError(f"Cannot decode storage kind: {kind}")
+
+class VersionChain:
+    """
+    In-memory history of one document stored as snapshots plus deltas.
+
+    The latest content is kept in full, because it is what the next
+    version is diffed against and what readers ask for most. Older versions
+    are rebuilt from the nearest preceding snapshot; the last rebuilt
+    version is remembered so walking the history in order applies each
+    delta once.
+    """
+
+    def __init__(self, keyframe_interval: Optional[int] = None, codec: Optional[str] = None):
+        self.keyframe_interval = keyframe_interval or settings.VERSION_KEYFRAME_INTERVAL
+        self.codec = codec or settings.VERSION_COMPRESSION
+        self._entries: List[Tuple[str, bytes]] = []
+        self._head: Optional[str] = None
+        self._last: Optional[Tuple[int, str]] = None
+        self.deltas_applied = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, content: str) -> int:
+        """Store a new latest version and return its index."""
+        index = len(self._entries)
+        self._entries.append(encode_version(self._head, content, index, self.keyframe_interval, self.codec))
+        self._head = content
+        return index
+
+    def get(self, index: int) -> str:
+        """Return the content of version ``index``."""
+        if index < 0:
+            index += len(self._entries)
+        if not 0 <= index < len(self._entries):
+            raise IndexError("version index out of range")
+        if index == len(self._entries) - 1:
+            return self._head
+
+        start = index
+        while self._entries[start][0] != KEYFRAME:
+            start -= 1
+        content = None
+        if self._last is not None and start <= self._last[0] <= index:
+            start, content = self._last
+            start += 1
+        for position in range(start, index + 1):
+            kind, payload = self._entries[position]
+            content = decode_version(kind, payload, content)
+            self.deltas_applied += kind == DELTA
+        self._last = (index, content)
+        return content
+
+    def stored_bytes(self) -> int:
+        """Size of all payloads (the head copy is not counted)."""
+        return sum(len(payload) for _, payload in self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "versions": len(self._entries),
+            "keyframes": sum(1 for kind, _ in self._entries if kind == KEYFRAME),
+            "stored_bytes": self.stored_bytes(),
+            "keyframe_interval": self.keyframe_interval,
+            "codec": self.codec
+        }
+
+# Core view of the table, independent of the ORM model, for use in migrations
+_versions_table = sa.table(
+    "document_versions",
+    sa.column("id", sa.String),
+    sa.column("document_id", sa.String),
+    sa.column("version_number", sa.Integer),
+    sa.column("content", sa.Text),
+    sa.column("storage", sa.String),
+    sa.column("payload", sa.LargeBinary),
+    sa.column("created_at", sa.DateTime),
+)
+
+def get_version_range(
+    db: Union[Session, sa.engine.Connection],
+    document_id: str,
+    first: int,
+    last: int
+) -> Dict[int, str]:
+    """
+    Return the contents of versions ``first``..``last`` of a document.
+
+    Rows are read from the nearest snapshot at or before ``first``, so the
+    extra work is bounded by the keyframe interval in force when they were
+    written, and each delta in the range is applied once.
+
+    Args:
+        db: Database session or connection
+        document_id: Document the versions belong to
+        first: Lowest version number wanted
+        last: Highest version number wanted
+
+    Returns:
+        Content by version number, for the versions that exist
+    """
+    t = _versions_table
+    keyframe = db.execute(
+        sa.select(sa.func.max(t.c.version_number)).where(
+            t.c.document_id == document_id,
+            t.c.version_number <= first,
+            t.c.storage != DELTA
+        )
+    ).scalar()
+    rows = db.execute(
+        sa.select(t.c.version_number, t.c.storage, t.c.payload, t.c.content)
+        .where(
+            t.c.document_id == document_id,
+            t.c.version_number.between(keyframe if keyframe is not None else first, last)
+        )
+        .order_by(t.c.version_number)
+    ).all()
+    contents = {}
+    content = None
+    for number, storage, payload, text in rows:
+        content = text if storage == TEXT else decode_version(storage, payload, content)
+        if number >= first:
+            contents[number] = content
+    return contents
+
+def get_version_content(db: Union[Session, sa.engine.Connection], document_id: str, version_number: int) -> Optional[str]:
+    """Return the content of one stored document version, or None if it does not exist."""
+    return get_version_range(db, document_id, version_number, version_number).get(version_number)
+
+def get_latest_content(db: Union[Session, sa.engine.Connection], document_id: str) -> Optional[str]:
+    """Return the content of the latest stored version of a document, or None if it has none."""
+    t = _versions_table
+    last_number = db.execute(
+        sa.select(sa.func.max(t.c.version_number)).where(t.c.document_id == document_id)
+    ).scalar()
+    return get_version_content(db, document_id, last_number) if last_number else None
+
+def encode_next_version(
+    db: Union[Session, sa.engine.Connection],
+    document_id: str,
+    content: str,
+    keyframe_interval: Optional[int] = None,
+    codec: Optional[str] = None
+) -> Tuple[int, str, bytes]:
+    """
+    Encode the next version of a document against the current latest one.
+
+    Returns:
+        The new version number, its storage kind and its payload
+    """
+    t = _versions_table
+    last_number = db.execute(
+        sa.select(sa.func.max(t.c.version_number)).where(t.c.document_id == document_id)
+    ).scalar()
+    previous = get_version_content(db, document_id, last_number) if last_number else None
+    storage, payload = encode_version(
+        previous,
+        content,
+        last_number or 0,
+        keyframe_interval or settings.VERSION_KEYFRAME_INTERVAL,
+        codec or settings.VERSION_COMPRESSION
+    )
+    return (last_number or 0) + 1, storage, payload
+
+def add_document_version(
+    db: Session,
+    document_id: str,
+    content: str,
+    author_id: str,
+    message: Optional[str] = None,
+    change_summary: Optional[Dict[str, Any]] = None,
+    retries: int = 3
+):
+    """
+    Create the next version of a document, stored as a snapshot or a delta.
+
+    The row is flushed in a savepoint. If a concurrent writer took the same
+    version number first, the unique constraint rejects it and the version
+    is re-encoded against the new latest one.
+
+    Args:
+        db: Database session; the caller commits
+        document_id: Document to add a version to
+        content: Full content of the new version
+        author_id: User creating the version
+        message: Optional commit message
+        change_summary: Optional JSON summary of the changes
+        retries: Attempts before a version number conflict is raised
+
+    Returns:
+        The new DocumentVersion row
+
+    Raises:
+        IntegrityError: If every attempt lost the race for the next number
+    """
+    from app.models import DocumentVersion
+
+    for attempt in range(retries):
+        version_number, storage, payload = encode_next_version(db, document_id, content)
+        version = DocumentVersion(
+            document_id=document_id,
+            version_number=version_number,
+            content=None,
+            storage=storage,
+            payload=payload,
+            author_id=author_id,
+            message=message,
+            change_summary=change_summary
+        )
+        try:
+            with db.begin_nested():
+                db.add(version)
+                db.flush()
+        except IntegrityError:
+            if attempt == retries - 1:
+                raise
+            logger.info(f"Version {version_number} of document {document_id} was taken concurrently; retrying")
+            continue
+        return version
+
+def compress_legacy_versions(connection: sa.engine.Connection, keyframe_interval: int, codec: str = "zlib") -> int:
+    """
+    Convert full-copy rows to snapshots and deltas, one document at a time.
+
+    Used by the migration that introduced delta storage. Documents whose
+    history mixes legacy and compressed rows are rebuilt and re-encoded as
+    a whole, so the keyframe spacing holds afterwards.
+
+    Returns:
+        Number of rows converted
+    """
+    t = _versions_table
+    document_ids = connection.execute(
+        sa.select(t.c.document_id).where(t.c.storage == TEXT).distinct()
+    ).scalars().all()
+    converted = 0
+    for document_id in document_ids:
+        rows = connection.execute(
+            sa.select(t.c.id, t.c.storage, t.c.payload, t.c.content)
+            .where(t.c.document_id == document_id)
+            .order_by(t.c.version_number)
+        ).all()
+        previous = None
+        for position, (row_id, storage, payload, text) in enumerate(rows):
+            content = text if storage == TEXT else decode_version(storage, payload, previous)
+            new_storage, new_payload = encode_version(previous, content, position, keyframe_interval, codec)
+            connection.execute(
+                t.update().where(t.c.id == row_id).values(storage=new_storage, payload=new_payload, content=None)
+            )
+            previous = content
+            converted += storage == TEXT
+    logger.info(f"Compressed {converted} document versions of {len(document_ids)} documents")
+    return converted
+
+def expand_versions(connection: sa.engine.Connection) -> int:
+    """Write every version back as a full uncompressed copy (downgrade of the migration)."""
+    t = _versions_table
+    document_ids = connection.execute(
+        sa.select(t.c.document_id).where(t.c.storage != TEXT).distinct()
+    ).scalars().all()
+    expanded = 0
+    for document_id in document_ids:
+        rows = connection.execute(
+            sa.select(t.c.id, t.c.storage, t.c.payload, t.c.content)
+            .where(t.c.document_id == document_id)
+            .order_by(t.c.version_number)
+        ).all()
+        previous = None
+        for row_id, storage, payload, text in rows:
+            content = text if storage == TEXT else decode_version(storage, payload, previous)
+            if storage != TEXT:
+                connection.execute(
+                    t.update().where(t.c.id == row_id).values(storage=TEXT, payload=None, content=content)
+                )
+                expanded += 1
+            previous = content
+    return expanded
+
+def renumber_duplicate_versions(connection: sa.engine.Connection, keyframe_interval: int, codec: str = "zlib") -> int:
+    """
+    Give every version of a document its own number and re-encode the history.
+
+    Concurrent writers could both store version N+1 as a delta against N.
+    Each duplicate is decoded against the content it was encoded from:
+    the previous number as the reader rebuilt it, duplicates applied in
+    order. The resulting versions are then numbered sequentially by
+    (number, creation time) and stored as fresh snapshots and deltas.
+
+    Used by the migration that adds the unique constraint.
+
+    Returns:
+        Number of documents renumbered
+    """
+    t = _versions_table
+    document_ids = connection.execute(
+        sa.select(t.c.document_id)
+        .group_by(t.c.document_id, t.c.version_number)
+        .having(sa.func.count() > 1)
+        .distinct()
+    ).scalars().all()
+    for document_id in document_ids:
+        rows = connection.execute(
+            sa.select(t.c.id, t.c.version_number, t.c.storage, t.c.payload, t.c.content)
+            .where(t.c.document_id == document_id)
+            .order_by(t.c.version_number, t.c.created_at, t.c.id)
+        ).all()
+        contents = []
+        rebuilt = None  # content as get_version_range rebuilds it, applying rows in order
+        base = None     # rebuilt content of the previous number, which duplicates were encoded against
+        current = None
+        for row_id, number, storage, payload, text in rows:
+            if number != current:
+                base, current = rebuilt, number
+            contents.append((row_id, text if storage == TEXT else decode_version(storage, payload, base)))
+            rebuilt = text if storage == TEXT else decode_version(storage, payload, rebuilt)
+        previous = None
+        for position, (row_id, content) in enumerate(contents):
+            storage, payload = encode_version(previous, content, position, keyframe_interval, codec)
+            connection.execute(
+                t.update().where(t.c.id == row_id).values(
+                    version_number=position + 1, storage=storage, payload=payload, content=None
+                )
+            )
+            previous = content
+    if document_ids:
+        logger.warning(f"Renumbered duplicate versions of {len(document_ids)} documents")
+    return len(document_ids)
@@ -1,21 +1,191 @@
 import json
+import time
 import asyncio
 import logging
 import uuid
-from typing import Dict, Set, List, Callable, Any, Optional, Union
+from typing import Deque, Dict, Set, List, Callable, Any, Optional, Union
 from fastapi import WebSocket, WebSocketDisconnect
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime
 
+from app.core.config import settings
+from app.services.backplane import Backplane, BackplaneUnavailableError, Connection, RedisError
+from app.services.presence import PresenceAggregator
+from app.services.op_log import OpLog, OpLogCommitError, op_log
+from app.services.ot_engine import OTError, StaleRevisionError, TextOperation
+
 logger = logging.getLogger(__name__)
 
+# What happens to a broadcast when a client's outbox is full, by message type
+DELIVER = "deliver"    # must arrive: a client that cannot take it is disconnected and resyncs
+COALESCE = "coalesce"  # only the newest per sender matters; replaces the queued one
+DROP = "drop"          # informational; discarded for a backed-up client
+
+MESSAGE_POLICIES: Dict[str, str] = {
+    # Sent one by one only when presence batching is disabled
+    "cursor_update": COALESCE,
+    "presence_update": COALESCE,
+    # A skipped frame is followed by one with the whole room (PresenceAggregator.resync)
+    "presence_batch": DROP,
+    # Connected users can be re-read with get_presence
+    "user_joined": DROP,
+    "user_left": DROP,
+}
+
+# Channels carrying job updates rather than a document (see job_queue)
+JOB_CHANNEL_PREFIX = "job:"
+
+# Messages that read or edit the document text, so only valid on document channels
+DOCUMENT_MESSAGES = {"content_update", "get_document_state", "sync"}
+
+def is_document_channel(channel: str) -> bool:
+    return not channel.startswith(JOB_CHANNEL_PREFIX)
+
+# Close code asking the client to reconnect later (it then catches up with ?version=)
+LAGGING_CLOSE_CODE = 1013
+
+# Times a request is re-sent while the process owning its document hands it over
+OWNER_ATTEMPTS = 5
+OWNER_RETRY_DELAY = 0.05
+
+class DocumentOwnerError(Exception):
+    """Raised when the process owning a document did not answer a forwarded request."""
+
+class ConnectionOutbox:
+    """
+    Bounded queue of serialized messages for one WebSocket, written by its
+    own task so a slow or stuck client never delays the others.
+
+    Queued COALESCE messages are replaced by newer ones with the same key.
+    When the queue is full, DROP messages are discarded and DELIVER
+    messages abort the connection, as does a queue whose oldest message has
+    waited longer than ``max_lag`` seconds: such a client is better served
+    by reconnecting and catching up than by a growing backlog.
+    """
+
+    def __init__(self, websocket: WebSocket, max_size: int, max_lag: float, on_abort: Callable[["ConnectionOutbox"], None]):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.max_lag = max_lag
+        self.on_abort = on_abort
+        # Entries are [payload, queued_at, coalesce key]
+        self.queue: Deque[List[Any]] = deque()
+        self.coalescable: Dict[Any, List[Any]] = {}
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.task = asyncio.create_task(self._write())
+
+    def put(self, payload: str, policy: str = DELIVER, key: Any = None) -> bool:
+        """
+        Queue a serialized message.
+
+        Returns:
+            False if the connection was aborted instead
+        """
+        if self.closed:
+            return False
+        now = time.monotonic()
+        if self.queue and now - self.queue[0][1] > self.max_lag:
+            self.abort(f"more than {self.max_lag:g}s behind")
+            return False
+        if policy == COALESCE:
+            queued = self.coalescable.get(key)
+            if queued is not None:
+                queued[0] = payload
+                self.coalesced += 1
+                return True
+        if len(self.queue) >= self.max_size:
+            if policy == DELIVER:
+                self.abort(f"more than {self.max_size} messages behind")
+                return False
+            self.dropped += 1
+            return True
+        entry = [payload, now, key]
+        if policy == COALESCE:
+            self.coalescable[key] = entry
+        self.queue.append(entry)
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    async def _write(self) -> None:
+        while True:
+            if not self.queue:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            payload, _, key = self.queue.popleft()
+            if key is not None:
+                self.coalescable.pop(key, None)
+            try:
+                await self.websocket.send_text(payload)
+            except Exception as e:
+                logger.warning(f"Dropping connection after failed send: {e}")
+                self.abort(None)
+                return
+            self.sent += 1
+
+    def abort(self, reason: Optional[str]) -> None:
+        """Stop writing, discard the queue and close the socket (``reason`` None: already broken)."""
+        if self.closed:
+            return
+        self.close()
+        if reason is not None:
+            logger.warning(f"Disconnecting lagging client: {reason}")
+            asyncio.ensure_future(self._close_socket(reason))
+        self.on_abort(self)
+
+    async def _close_socket(self, reason: str) -> None:
+        try:
+            await self.websocket.close(code=LAGGING_CLOSE_CODE, reason=reason)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.closed = True
+        self.queue.clear()
+        self.coalescable.clear()
+        self._idle.set()
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    async def drain(self) -> None:
+        """Wait until everything queued so far has been written."""
+        await self._idle.wait()
+
 class ConnectionManager:
     """
     Manages WebSocket connections for real-time document collaboration.
     Handles connection lifecycle, message routing, and broadcasting.
+
+    Outgoing messages go through a ConnectionOutbox per connection, so
+    sending never waits on the network. With a backplane attached,
+    broadcasts also reach the clients other processes have in the same
+    document, and each document's edits and sync requests are served by
+    the one process owning it (the first to need it): the others forward
+    their clients' requests to it and relay its replies.
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        max_lag: float = settings.WS_MAX_LAG_SECONDS,
+        owner_timeout: float = settings.WS_OWNER_TIMEOUT_SECONDS,
+        log: Optional[OpLog] = None
+    ):
+        """
+        Args:
+            queue_size: Messages queued per connection before the MESSAGE_POLICIES apply
+            max_lag: Seconds a queued message may wait before its client is disconnected
+            owner_timeout: Seconds to wait for another process to answer a forwarded request
+            log: Operation log of the documents this process owns (default: op_log)
+        """
         # document_id -> { user_id -> WebSocket }
         self.active_connections: Dict[str, Dict[str, WebSocket]] = defaultdict(dict)
         # user_id -> Set[document_id]
@@ -24,6 +194,25 @@ class ConnectionManager:
         self.handlers: Dict[str, Callable] = {}
         # Track user presence
         self.presence: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.outboxes: Dict[WebSocket, ConnectionOutbox] = {}
+        self.lag_disconnects = 0
+        self.presence_batches = PresenceAggregator(self)
+        self.backplane: Optional[Backplane] = None
+        self.owner_timeout = owner_timeout
+        self._log = log
+        self._releases: Set[asyncio.Task] = set()
+        # document_id -> task giving up its session and ownership
+        self._releasing: Dict[str, asyncio.Task] = {}
+        # document_id -> requests being served as its owner, and the event set when none are left
+        self._owner_work: Dict[str, int] = {}
+        self._owner_idle: Dict[str, asyncio.Event] = {}
+        # call id -> reply to a request forwarded to the owning process
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._answers: Set[asyncio.Task] = set()
+        # Counters of closed connections
+        self.totals = {"sent": 0, "dropped": 0, "coalesced": 0}
 
     async def connect(self, websocket: WebSocket, document_id: str, user_id: Optional[str] = None):
         """Register a new WebSocket connection for a user and document"""
@@ -31,23 +220,37 @@ class ConnectionManager:
             user_id = f"anonymous_{id(websocket)}"
             
         # Store the connection
+        if self.backplane is not None and document_id not in self.active_connections:
+            self.backplane.subscribe(document_id)
         self.active_connections[document_id][user_id] = websocket
         self.user_subscriptions[user_id].add(document_id)
+        if websocket not in self.outboxes:
+            self.outboxes[websocket] = ConnectionOutbox(websocket, self.queue_size, self.max_lag, self._on_abort)
         
         # Update presence
         self.presence[document_id][user_id] = {
-            'last_seen': datetime.utcnow().isoformat(),
+            'last_seen': time.time(),
             'status': 'online'
         }
         
         logger.info(f"User {user_id} connected to document {document_id}")
         return user_id
 
+    @property
+    def op_log(self) -> OpLog:
+        # Looked up on use, so the module's op_log can be replaced
+        return self._log if self._log is not None else op_log
+
+    @property
+    def origin(self) -> Optional[str]:
+        """This process on the backplane (None without one)"""
+        return self.backplane.origin if self.backplane is not None else None
+
     async def disconnect(self, websocket: WebSocket, document_id: str, user_id: Optional[str] = None):
         """Remove a WebSocket connection"""
         if not user_id:
             # Find the user_id for this websocket
-            for uid, ws in self.active_connections[document_id].items():
+            for uid, ws in self.active_connections.get(document_id, {}).items():
                 if ws == websocket:
                     user_id = uid
                     break
@@ -55,9 +258,27 @@ class ConnectionManager:
             if not user_id:
                 return
         
-        # Remove the connection
-        if document_id in self.active_connections and user_id in self.active_connections[document_id]:
-            del self.active_connections[document_id][user_id]
+        self._remove(websocket, document_id, user_id)
+        if not any(websocket in connections.values() for connections in self.active_connections.values()):
+            outbox = self.outboxes.pop(websocket, None)
+            if outbox is not None:
+                outbox.close()
+                self._retire(outbox)
+            
+        logger.info(f"User {user_id} disconnected from document {document_id}")
+
+    def _remove(self, websocket: WebSocket, document_id: str, user_id: str) -> None:
+        # Only if it is still this socket: the user may have reconnected meanwhile
+        connections = self.active_connections.get(document_id)
+        if not connections or connections.get(user_id) is not websocket:
+            return
+        del connections[user_id]
+        if not connections:
+            del self.active_connections[document_id]
+            if self.backplane is not None:
+                self.backplane.unsubscribe(document_id)
+            if document_id in self.op_log.engine.sessions or (self.backplane is not None and self.backplane.owns(document_id)):
+                self._schedule_release(document_id)
             
         if user_id in self.user_subscriptions:
             self.user_subscriptions[user_id].discard(document_id)
@@ -67,41 +288,299 @@ class ConnectionManager:
         # Update presence
         if document_id in self.presence and user_id in self.presence[document_id]:
             del self.presence[document_id][user_id]
-            
-        logger.info(f"User {user_id} disconnected from document {document_id}")
+            if not self.presence[document_id]:
+                del self.presence[document_id]
+        self.presence_batches.remove(document_id, user_id)
+
+    def _schedule_release(self, document_id: str, lost: bool = False) -> None:
+        if document_id in self._releasing and not lost:
+            return
+        task = asyncio.ensure_future(self._release_session(document_id, lost))
+        self._releasing[document_id] = task
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+    async def _release_session(self, document_id: str, lost: bool = False) -> None:
+        """
+        Drop the OT session of a document nobody here is connected to any
+        more, once its queued operations are committed, and give up owning
+        it. Whoever needs it next restores it from the operation log.
+
+        Requests for it wait until this is done. ``lost``: another process
+        owns it already, so the session goes whatever happens.
+        """
+        try:
+            while document_id in self._owner_work:
+                await self._owner_idle.setdefault(document_id, asyncio.Event()).wait()
+            await self.op_log.flush()
+        except Exception as e:
+            if not lost:
+                # Keep the session: its operations are still waiting to be written
+                logger.warning(f"Keeping session of document {document_id} open: {str(e)}")
+                return
+        finally:
+            if self._releasing.get(document_id) is asyncio.current_task():
+                del self._releasing[document_id]
+        # Someone may have joined while the operations were being written
+        if lost or document_id not in self.active_connections:
+            self.op_log.engine.close_session(document_id)
+            if self.backplane is not None:
+                self.backplane.release(document_id)
+
+    def _on_abort(self, outbox: ConnectionOutbox) -> None:
+        """A connection's outbox gave up on it: stop routing messages to it."""
+        self.outboxes.pop(outbox.websocket, None)
+        self._retire(outbox)
+        self.lag_disconnects += 1
+        for document_id, connections in list(self.active_connections.items()):
+            for user_id, connection in list(connections.items()):
+                if connection is outbox.websocket:
+                    self._remove(connection, document_id, user_id)
+
+    def _retire(self, outbox: ConnectionOutbox) -> None:
+        for name in self.totals:
+            self.totals[name] += getattr(outbox, name)
+
+    async def attach_backplane(self, backplane: Backplane) -> None:
+        """Start exchanging broadcasts and document requests with other processes through ``backplane``."""
+        backplane.on_direct = self._on_direct
+        backplane.on_lost = self._on_lost
+        await backplane.start(self._deliver)
+        self.backplane = backplane
+        for document_id in list(self.active_connections):
+            backplane.subscribe(document_id)
+
+    async def detach_backplane(self) -> None:
+        backplane, self.backplane = self.backplane, None
+        if backplane is None:
+            return
+        if backplane.owned:
+            # The next owners restore these documents from the log
+            try:
+                await self.op_log.flush()
+            except Exception as e:
+                logger.warning(f"Handing over documents with uncommitted operations: {str(e)}")
+        await backplane.stop()
+
+    def _on_lost(self, document_id: str) -> None:
+        if document_id in self.op_log.engine.sessions:
+            self._schedule_release(document_id, lost=True)
+
+    async def _owner_of(self, document_id: str) -> Optional[str]:
+        """
+        Origin of the process owning a document, or None if it is this one
+        (which takes it over if nobody owns it).
+        """
+        releasing = self._releasing.get(document_id)
+        if releasing is not None:
+            await asyncio.wait([releasing])
+        if self.backplane is None:
+            return None
+        try:
+            owner = await self.backplane.acquire(document_id)
+        except (BackplaneUnavailableError, RedisError) as e:
+            raise DocumentOwnerError(f"Owner of document {document_id} unknown: {str(e)}")
+        return None if owner == self.backplane.origin else owner
+
+    async def open_document(self, document_id: str) -> None:
+        """Load a document about to be joined, if this process owns it."""
+        if await self._owner_of(document_id) is None:
+            await self.op_log.open_session(document_id)
+
+    async def document_state(self, document_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+        """``document_sync`` of the process owning the document."""
+        return await self._route({"type": "sync", "document_id": document_id, "version": version})
+
+    async def submit(self, document_id: str, user_id: str, changes: Any, version: Any) -> Optional[Dict[str, Any]]:
+        """``apply_content_update`` in the process owning the document, for a client of this one."""
+        return await self._route({
+            "type": "content_update",
+            "document_id": document_id,
+            "sender": [self.origin, user_id],
+            "changes": changes,
+            "version": version
+        })
+
+    async def _route(self, request: Dict[str, Any]) -> Any:
+        """
+        Serve a document request here if this process owns the document,
+        otherwise in the process that does.
+
+        Raises:
+            DocumentOwnerError: If the owner did not answer; an edit may or
+                may not have been applied
+        """
+        document_id = request["document_id"]
+        for attempt in range(OWNER_ATTEMPTS):
+            owner = await self._owner_of(document_id)
+            if owner is None:
+                return await self._serve(request)
+            reply = await self._call(owner, request)
+            if "error" in reply:
+                raise DocumentOwnerError(reply["error"])
+            if not reply.get("not_owner"):
+                return reply["result"]
+            # It is handing the document over
+            await asyncio.sleep(OWNER_RETRY_DELAY * (attempt + 1))
+        raise DocumentOwnerError(f"No process took document {document_id} over")
+
+    async def _serve(self, request: Dict[str, Any]) -> Any:
+        """Serve a document request as its owner; releasing the document waits for it."""
+        document_id = request["document_id"]
+        self._owner_work[document_id] = self._owner_work.get(document_id, 0) + 1
+        try:
+            if request["type"] == "sync":
+                return await document_sync(document_id, request.get("version"), log=self.op_log)
+            return await apply_content_update(
+                self, document_id, tuple(request["sender"]), request["changes"], request["version"]
+            )
+        finally:
+            self._owner_work[document_id] -= 1
+            if not self._owner_work[document_id]:
+                del self._owner_work[document_id]
+                idle = self._owner_idle.pop(document_id, None)
+                if idle is not None:
+                    idle.set()
+
+    async def _call(self, owner: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Forward a request to the process owning its document and wait for the reply."""
+        call_id = uuid.uuid4().hex
+        reply = asyncio.get_running_loop().create_future()
+        self._calls[call_id] = reply
+        try:
+            message = json.dumps({**request, "call": call_id, "reply_to": self.backplane.origin})
+            if not self.backplane.send_direct(owner, message):
+                raise DocumentOwnerError(f"Could not reach the owner of document {request['document_id']}")
+            try:
+                return await asyncio.wait_for(reply, self.owner_timeout)
+            except asyncio.TimeoutError:
+                raise DocumentOwnerError(f"No answer from the owner of document {request['document_id']}")
+        finally:
+            self._calls.pop(call_id, None)
+
+    def _on_direct(self, payload: str) -> None:
+        """A request forwarded by another process, or the reply to one forwarded from here."""
+        try:
+            message = json.loads(payload)
+        except ValueError as e:
+            logger.warning(f"Discarding malformed message from another process: {e}")
+            return
+        if "reply" in message:
+            reply = self._calls.get(message["reply"])
+            if reply is not None and not reply.done():
+                reply.set_result(message)
+            return
+        if not {"call", "reply_to", "document_id", "type"} <= message.keys():
+            logger.warning("Discarding incomplete request from another process")
+            return
+        task = asyncio.ensure_future(self._answer(message))
+        self._answers.add(task)
+        task.add_done_callback(self._answers.discard)
+
+    async def _answer(self, request: Dict[str, Any]) -> None:
+        document_id = request["document_id"]
+        reply: Dict[str, Any] = {"reply": request["call"]}
+        if self.backplane is None or not self.backplane.owns(document_id) or document_id in self._releasing:
+            reply["not_owner"] = True
+        else:
+            try:
+                reply["result"] = await self._serve(request)
+            except Exception as e:
+                logger.error(f"Error serving a request for document {document_id}: {e}", exc_info=True)
+                reply["error"] = f"Owner failed: {str(e)}"
+        if self.backplane is not None:
+            self.backplane.send_direct(request["reply_to"], json.dumps(reply))
 
     async def broadcast(
         self,
         document_id: str,
         message: Union[Dict[str, Any], str],
         exclude: Optional[Set[WebSocket]] = None,
-        exclude_users: Optional[Set[str]] = None
+        exclude_users: Optional[Set[str]] = None,
+        exclude_connection: Optional[Connection] = None
     ) -> None:
-        """Broadcast a message to all clients in a document"""
-        if document_id not in self.active_connections:
-            return
+        """
+        Queue a message for all clients in a document.
 
-        exclude = exclude or set()
-        exclude_users = exclude_users or set()
+        The message is serialized once for all recipients and queued without
+        awaiting, so messages reach every client in the order they were
+        broadcast. ``exclude`` only applies to this process's connections;
+        ``exclude_users`` applies everywhere, and ``exclude_connection``
+        (process origin, user_id) on whichever process it is.
+        """
+        connections = self.active_connections.get(document_id)
+        if not connections and self.backplane is None:
+            return
         
+        policy, key, message_type = DELIVER, None, None
         if isinstance(message, dict):
+            message_type = message.get("type")
+            policy = MESSAGE_POLICIES.get(message_type, DELIVER)
+            if policy == COALESCE:
+                key = (document_id, message_type, message.get("user_id"))
             message = json.dumps(message)
-            
-        disconnected = []
         
-        for user_id, connection in list(self.active_connections[document_id].items()):
+        if self.backplane is not None:
+            self.backplane.publish(document_id, message, policy, key, exclude_users, exclude_connection)
+        if connections:
+            exclude_users = set(exclude_users or ())
+            if exclude_connection is not None and exclude_connection[0] == self.origin:
+                exclude_users.add(exclude_connection[1])
+            # A client that missed a presence frame gets the whole room with the next one
+            on_drop = self.presence_batches.resync if message_type == "presence_batch" else None
+            self._deliver(document_id, message, policy, key, exclude_users, exclude or set(), on_drop)
+
+    def _deliver(
+        self,
+        document_id: str,
+        payload: str,
+        policy: str,
+        key: Any,
+        exclude_users: Set[str],
+        exclude: Set[WebSocket] = frozenset(),
+        on_drop: Optional[Callable[[str], None]] = None
+    ) -> int:
+        """
+        Queue a serialized message for the local clients of a document; returns how many.
+
+        ``on_drop`` is called with the document once if a full queue discarded it for any of them.
+        """
+        queued = 0
+        for user_id, connection in list(self.active_connections.get(document_id, {}).items()):
             if connection in exclude or user_id in exclude_users:
                 continue
-                
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error sending to {user_id}: {e}")
-                disconnected.append((user_id, connection))
-        
-        # Clean up disconnected clients
-        for user_id, connection in disconnected:
-            await self.disconnect(connection, document_id, user_id)
+            outbox = self.outboxes.get(connection)
+            if outbox is not None:
+                dropped = outbox.dropped
+                outbox.put(payload, policy, key)
+                queued += 1
+                if on_drop is not None and outbox.dropped != dropped:
+                    on_drop(document_id)
+                    on_drop = None
+        return queued
+
+    async def send(self, websocket: WebSocket, message: Dict[str, Any]) -> None:
+        """Queue a message for one client behind the broadcasts already queued for it"""
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            await websocket.send_json(message)
+        else:
+            outbox.put(json.dumps(message))
+
+    async def drain(self) -> None:
+        """Wait until every queued message has been written (or its connection dropped)."""
+        await asyncio.gather(*(outbox.drain() for outbox in list(self.outboxes.values())))
+
+    def get_stats(self) -> Dict[str, Any]:
+        outboxes = list(self.outboxes.values())
+        return {
+            "connections": len(outboxes),
+            "queued": sum(len(outbox.queue) for outbox in outboxes),
+            "max_queued": max((len(outbox.queue) for outbox in outboxes), default=0),
+            **{name: total + sum(getattr(outbox, name) for outbox in outboxes) for name, total in self.totals.items()},
+            "lag_disconnects": self.lag_disconnects,
+            "backplane": self.backplane.get_stats() if self.backplane is not None else None
+        }
 
     async def handle_message(
         self, 
@@ -116,26 +595,35 @@ class ConnectionManager:
             message_type = message.get('type')
             
             if not message_type:
-                await websocket.send_json({"error": "Message type is required"})
+                await self.send(websocket, {"error": "Message type is required"})
                 return
                 
             handler = self.handlers.get(message_type)
             if not handler:
-                await websocket.send_json({"error": f"Unknown message type: {message_type}"})
+                await self.send(websocket, {"error": f"Unknown message type: {message_type}"})
+                return
+            if message_type in DOCUMENT_MESSAGES and not is_document_channel(document_id):
+                await self.send(websocket, {"error": f"{message_type} is only valid on document channels"})
                 return
                 
-            # Update user's last seen time
+            # Update user's last seen time (formatted only when read)
             if document_id in self.presence and user_id in self.presence[document_id]:
-                self.presence[document_id][user_id]['last_seen'] = datetime.utcnow().isoformat()
+                self.presence[document_id][user_id]['last_seen'] = time.time()
             
             # Process the message
             await handler(self, websocket, document_id, user_id, message)
             
         except json.JSONDecodeError:
-            await websocket.send_json({"error": "Invalid JSON format"})
+            await self.send(websocket, {"error": "Invalid JSON format"})
+        except DocumentOwnerError as e:
+            # Whether an edit was applied is unknown; reconnecting catches the client up
+            logger.warning(f"Reconnecting client of document {document_id}: {str(e)}")
+            outbox = self.outboxes.get(websocket)
+            if outbox is not None:
+                outbox.abort(str(e))
         except Exception as e:
             logger.error(f"Error handling message: {e}", exc_info=True)
-            await websocket.send_json({"error": "Internal server error"})
+            await self.send(websocket, {"error": "Internal server error"})
 
     def register_handler(self, message_type: str) -> Callable:
         """Decorator to register a message handler"""
@@ -150,13 +638,139 @@ class ConnectionManager:
             return []
             
         return [
-            {"user_id": user_id, **data}
+            {"user_id": user_id, **data, "last_seen": datetime.utcfromtimestamp(data["last_seen"]).isoformat()}
             for user_id, data in self.presence[document_id].items()
         ]
 
 # Singleton instance
 websocket_manager = ConnectionManager()
 
+async def document_sync(
+    document_id: str,
+    version: Optional[int] = None,
+    content: Optional[str] = None,
+    log: Optional[OpLog] = None
+) -> Dict[str, Any]:
+    """
+    Message bringing a (re)connecting client up to the server revision.
+
+    A client that still has ``version`` gets only the operations after it
+    (``catch_up``). Without one, or if the log no longer reaches back that
+    far, it gets the whole text (``document_state``). Queue the result with
+    ``ConnectionManager.send`` before awaiting anything else. If the session
+    is open and the operations are in memory this does not yield, so nothing
+    is broadcast in between. On the slower paths, operations broadcast
+    meanwhile may arrive first; clients skip ``content_update`` messages at
+    or below their revision.
+
+    Args:
+        document_id: Document being joined
+        version: Revision the client already has, if any
+        content: Text to start the document from if it was never edited
+            (read from its stored versions if not given)
+        log: Operation log holding the document (default: op_log)
+
+    Returns:
+        Message without timestamp
+    """
+    log = log or op_log
+    session = await log.open_session(document_id, content)
+    operations = None
+    if isinstance(version, int) and not isinstance(version, bool):
+        operations = await log.operations_since(session, version)
+    if operations is not None:
+        return {
+            "type": "catch_up",
+            "document_id": document_id,
+            "from_version": version,
+            "version": session.revision,
+            "operations": [operation.to_json() for operation in operations]
+        }
+    revision, text = session.snapshot()
+    return {
+        "type": "document_state",
+        "document_id": document_id,
+        "version": revision,
+        "content": text
+    }
+
+async def apply_content_update(
+    manager: ConnectionManager,
+    document_id: str,
+    sender: Connection,
+    changes: Any,
+    version: Any
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply a client operation to the server copy of a document this process owns.
+
+    ``changes`` is the operation (ot.js form) and ``version`` the revision
+    it was made against. The operation is transformed past everything
+    applied since, and the result is what every other client receives.
+
+    Args:
+        sender: Connection the operation came from, (process origin, user_id)
+
+    Returns:
+        Message for the sender: the acknowledgement once the operation is
+        durable, or why it was rejected. None if it could not be logged, in
+        which case everyone was sent resync_required.
+    """
+    log = manager.op_log
+    session = await log.open_session(document_id)
+    try:
+        applied = session.submit(version, TextOperation.from_json(changes))
+    except StaleRevisionError as e:
+        # Too far behind to transform: the client has to reload the document
+        revision, content = session.snapshot()
+        return {
+            "type": "resync_required",
+            "message": str(e),
+            "version": revision,
+            "content": content
+        }
+    except OTError as e:
+        return {
+            "type": "error",
+            "message": f"Rejected update: {str(e)}",
+            "version": session.revision
+        }
+    
+    # Queue for the next group commit before anything else can be applied
+    committed = log.record(document_id, session.revision, applied)
+    revision = session.revision
+    
+    timestamp = datetime.utcnow().isoformat()
+    await manager.broadcast(
+        document_id=document_id,
+        message={
+            "type": "content_update",
+            "user_id": sender[1],
+            "changes": applied.to_json(),
+            "version": revision,
+            "timestamp": timestamp
+        },
+        exclude_connection=sender
+    )
+    
+    # Acknowledge the update with the revision it became, once it is durable
+    try:
+        await committed
+    except OpLogCommitError as e:
+        # The log dropped the session; everyone reloads what it actually holds
+        state = await document_sync(document_id, log=log)
+        await manager.broadcast(document_id=document_id, message={
+            **state,
+            "type": "resync_required",
+            "message": str(e)
+        })
+        return None
+    return {
+        "type": "content_update_ack",
+        "version": revision,
+        "timestamp": timestamp
+    }
+
 # Register message handlers
 def register_handlers():
     @websocket_manager.register_handler("cursor_update")
@@ -168,6 +782,13 @@ def register_handlers():
         message: dict
     ):
         """Handle cursor position updates from clients"""
+        if manager.presence_batches.enabled:
+            # Sent with the next presence_batch frame, superseding earlier moves
+            manager.presence_batches.update(document_id, user_id, cursor={
+                "position": message.get("position"),
+                "user_info": message.get("user_info", {})
+            })
+            return
         await manager.broadcast(
             document_id=document_id,
             message={
@@ -188,38 +809,47 @@ def register_handlers():
         user_id: str,
         message: dict
     ):
-        """Handle document content updates from clients"""
-        changes = message.get("changes", [])
+        """
+        Apply a client operation to the server copy of the document, in
+        the process owning it (see apply_content_update).
+        """
+        changes = message.get("changes")
         version = message.get("version")
         
         if not changes or version is None:
-            await websocket.send_json({
+            await manager.send(websocket, {
                 "type": "error",
                 "message": "Missing required fields: changes and version are required"
             })
             return
         
-        # Here you would typically validate and save the changes to your database
-        # For now, we'll just broadcast them to other clients
-        
-        await manager.broadcast(
-            document_id=document_id,
-            message={
-                "type": "content_update",
-                "user_id": user_id,
-                "changes": changes,
-                "version": version,
-                "timestamp": datetime.utcnow().isoformat()
-            },
-            exclude={websocket}
-        )
-        
-        # Acknowledge the update
-        await websocket.send_json({
-            "type": "content_update_ack",
-            "version": version,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        reply = await manager.submit(document_id, user_id, changes, version)
+        if reply is not None:
+            await manager.send(websocket, reply)
+
+    @websocket_manager.register_handler("get_document_state")
+    async def handle_get_document_state(
+        manager: ConnectionManager,
+        websocket: WebSocket,
+        document_id: str,
+        user_id: str,
+        message: dict
+    ):
+        """Send the server copy of the document and its revision"""
+        state = await manager.document_state(document_id)
+        await manager.send(websocket, {**state, "timestamp": datetime.utcnow().isoformat()})
+    
+    @websocket_manager.register_handler("sync")
+    async def handle_sync(
+        manager: ConnectionManager,
+        websocket: WebSocket,
+        document_id: str,
+        user_id: str,
+        message: dict
+    ):
+        """Send the operations after the client's ``version``, or the whole document"""
+        state = await manager.document_state(document_id, message.get("version"))
+        await manager.send(websocket, {**state, "timestamp": datetime.utcnow().isoformat()})
 
     @websocket_manager.register_handler("comment")
     async def handle_comment(
@@ -234,7 +864,7 @@ def register_handlers():
         comment_range = message.get("range")
         
         if not comment or not comment_range:
-            await websocket.send_json({
+            await manager.send(websocket, {
                 "type": "error",
                 "message": "Missing required fields: comment and range are required"
             })
@@ -273,8 +903,13 @@ def register_handlers():
         
         # Update presence information
         if document_id in manager.presence and user_id in manager.presence[document_id]:
-            manager.presence[document_id][user_id].update(status)
-            manager.presence[document_id][user_id]["last_seen"] = datetime.utcnow().isoformat()
+            manager.presence[document_id][user_id].update(
+                {key: value for key, value in status.items() if key != "last_seen"}
+            )
+        
+        if manager.presence_batches.enabled:
+            manager.presence_batches.update(document_id, user_id, status=status)
+            return
         
         # Broadcast the update to other clients
         await manager.broadcast(
@@ -297,7 +932,7 @@ def register_handlers():
         message: dict
     ):
         """Send current presence information for a document"""
-        await websocket.send_json({
+        await manager.send(websocket, {
             "type": "presence_info",
             "users": manager.get_connected_users(document_id),
             "timestamp": datetime.utcnow().isoformat()
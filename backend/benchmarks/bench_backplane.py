@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the WebSocket broadcast backplane.
+
+Starts ``--workers`` processes, as uvicorn/gunicorn would, each with its
+own ConnectionManager and ``--clients`` connections to the same document.
+Worker 0 broadcasts ``--messages`` content updates at ``--rate`` per
+second (0: as fast as it can). For each backplane (none, then unix and
+redis) reports how many of the clients that should receive each message
+actually do, delivery latency to the clients of the other workers, and
+broadcasts per second. Without a backplane only
+worker 0's own clients see the edits. The redis backend runs against the
+local RESP stand-in from the tests, so the numbers reflect the protocol
+and a hop through another process rather than a tuned Redis server.
+
+Run with: python benchmarks/bench_backplane.py --workers 4 --clients 50 --messages 2000 --rate 500
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.backplane import RedisBackplane, UnixSocketBackplane
+from app.services.websocket_manager import ConnectionManager
+from tests.fake_redis_server import FakeRedisServer
+
+class TimingWebSocket:
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.received = 0
+
+    async def send_text(self, data):
+        self.received += 1
+        self.latencies.append(time.time() - json.loads(data)["sent_at"])
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+def make_backplane(kind, target):
+    if kind == "unix":
+        return UnixSocketBackplane(target)
+    if kind == "redis":
+        return RedisBackplane(target, "bench:")
+    return None
+
+async def run_worker(index, kind, target, clients, messages, rate, ready, results):
+    manager = ConnectionManager(queue_size=messages + 1)
+    backplane = make_backplane(kind, target)
+    if backplane is not None:
+        await manager.attach_backplane(backplane)
+    latencies = []
+    sockets = [TimingWebSocket(latencies) for _ in range(clients)]
+    for i, websocket in enumerate(sockets):
+        await manager.connect(websocket, "doc", f"w{index}-u{i}")
+    # Give subscriptions time to reach the hub or server
+    await asyncio.sleep(0.3)
+    await asyncio.to_thread(ready.wait)
+
+    elapsed = 0.0
+    if index == 0:
+        start = time.perf_counter()
+        for n in range(messages):
+            await manager.broadcast("doc", {"type": "content_update", "version": n, "sent_at": time.time()})
+            if rate:
+                await asyncio.sleep(max(0.0, start + (n + 1) / rate - time.perf_counter()))
+            elif n % 50 == 0:
+                await asyncio.sleep(0)
+        await manager.drain()
+        elapsed = time.perf_counter() - start
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline and sum(websocket.received for websocket in sockets) < clients * messages:
+        await asyncio.sleep(0.01)
+    await manager.drain()
+    # Keep routing until everyone is done, in case this worker is the hub
+    await asyncio.to_thread(ready.wait)
+    stats = backplane.get_stats()["rooms"].get("doc", {}) if backplane is not None else {}
+    await manager.detach_backplane()
+    for outbox in list(manager.outboxes.values()):
+        outbox.close()
+    results.put((index, sum(websocket.received for websocket in sockets), latencies, elapsed, stats))
+
+def worker_main(index, kind, target, clients, messages, rate, ready, results):
+    asyncio.run(run_worker(index, kind, target, clients, messages, rate, ready, results))
+
+def run(kind, target, workers, clients, messages, rate):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker_main, args=(index, kind, target, clients, messages, rate, ready, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = sorted(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join()
+    return collected
+
+async def run_with_redis(workers, clients, messages, rate):
+    async with FakeRedisServer() as server:
+        return await asyncio.to_thread(run, "redis", server.url, workers, clients, messages, rate)
+
+def main_run(args):
+    print(f"{'backplane':>10} {'delivered':>10} {'of':>10} {'remote p50 ms':>14} {'remote p99 ms':>14} {'broadcasts/s':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in ("none", "unix", "redis"):
+            if kind == "redis":
+                results = asyncio.run(run_with_redis(args.workers, args.clients, args.messages, args.rate))
+            else:
+                results = run(kind, os.path.join(directory, "ws.sock"), args.workers, args.clients, args.messages, args.rate)
+            delivered = sum(received for _, received, _, _, _ in results)
+            remote = sorted(latency for index, _, latencies, _, _ in results if index != 0 for latency in latencies)
+            elapsed = results[0][3]
+            p50 = f"{statistics.median(remote) * 1e3:14.2f}" if remote else f"{'-':>14}"
+            p99 = f"{remote[int(len(remote) * 0.99)] * 1e3:14.2f}" if remote else f"{'-':>14}"
+            print(
+                f"{kind:>10} {delivered:>10} {args.workers * args.clients * args.messages:>10} "
+                f"{p50} {p99} {args.messages / elapsed:13.0f}"
+            )
+            if args.verbose:
+                for index, received, _, _, stats in results:
+                    print(f"{'':>10} worker {index}: {received} delivered, room stats {stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500.0, help="Broadcasts per second; 0 for a burst")
+    parser.add_argument("--verbose", action="store_true", help="Print per-worker room stats")
+    args = parser.parse_args()
+    main_run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the JavaScript/TypeScript code analyzer.
+
+Compares the original regex analyzer, which slices and rescans the whole
+prefix of the file for every function and class it finds, with the
+single-pass tokenizer on generated 1-10 MB files in readable and minified
+form. The tokenizer's time should grow linearly with file size while the
+original grows quadratically, so it is only run up to --baseline-max-mb.
+
+Run with: python benchmarks/bench_js_analyzer.py --sizes 1 2 5 10
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.js_analyzer import analyze_javascript
+
+MODULE_TEMPLATE = """
+/**
+ * Service number {i}.
+ * @param {{Object}} options
+ */
+export class Service{i} extends Base {{
+  state = {{ ready: false, label: `service-{i}-${{Date.now()}}` }}
+
+  /** Load item {i}. */
+  async load(id) {{
+    const url = `/api/items/${{id}}?v={i}`;
+    const match = /^[a-z]+\\/{{2}}$/i.test(url);
+    return this.http.get(url, {{ retry: match ? 1 : 0 }});
+  }}
+
+  handle = (event) => {{
+    if (event.key === "}}") {{ return 'class Fake {{'; }}
+    return event.value / 2 / {i};
+  }}
+
+  static create() {{ return new Service{i}(); }}
+}}
+
+// helper for service {i}
+function helper{i}(a, b) {{
+  return a + b * {i};
+}}
+
+/** Format value {i}. */
+export const format{i} = (value, digits = 2) => value.toFixed(digits);
+"""
+
+def make_source(megabytes, minified, seed=0):
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size, i = ["import { Base } from './base';\n"], 0, 0
+    while size < target:
+        module = MODULE_TEMPLATE.format(i=i)
+        if minified:
+            # Drop comments and collapse whitespace the way a minifier would
+            module = re.sub(r"/\*\*[\s\S]*?\*/|//[^\n]*", "", module)
+            module = re.sub(r"\s*\n\s*", "", module)
+        parts.append(module)
+        size += len(module)
+        i += rng.randint(1, 2)
+    return "".join(parts)
+
+def regex_analyze(content):
+    """The original _analyze_javascript_code implementation."""
+    function_pattern = r'(?:function\s+([a-zA-Z_$][0-9a-zA-Z_$]*)\s*\()|(?:const\s+([a-zA-Z_$][0-9a-zA-Z_$]*)\s*=\s*(?:\([^)]*\)|\w+)\s*=>)'
+    functions = []
+    for match in re.finditer(function_pattern, content):
+        func_name = match.group(1) or match.group(2)
+        if func_name:
+            functions.append({
+                'name': func_name,
+                'line': content[:match.start()].count('\n') + 1,
+                'has_docstring': bool(re.search(r'/\*\*[\s\S]*?\*/', content[:match.start()])),
+            })
+    classes = []
+    for match in re.finditer(r'class\s+([a-zA-Z_$][0-9a-zA-Z_$]*)', content):
+        classes.append({
+            'name': match.group(1),
+            'line': content[:match.start()].count('\n') + 1,
+            'has_docstring': bool(re.search(r'/\*\*[\s\S]*?\*/', content[:match.start()])),
+        })
+    return {'functions': functions, 'classes': classes}
+
+def timed(fn, content):
+    start = time.perf_counter()
+    result = fn(content)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 5, 10], help="File sizes in MB")
+    parser.add_argument("--baseline-max-mb", type=float, default=2, help="Largest size to run the regex analyzer on")
+    args = parser.parse_args()
+
+    print(f"{'MB':>5} {'form':>9} {'functions':>10} {'classes':>8} {'tokenizer s':>12} {'MB/s':>7} {'regex s':>9}")
+    for megabytes in args.sizes:
+        for minified in (False, True):
+            content = make_source(megabytes, minified)
+            seconds, result = timed(lambda c: analyze_javascript(c), content)
+            baseline = "-"
+            if megabytes <= args.baseline_max_mb:
+                baseline = f"{timed(regex_analyze, content)[0]:9.2f}"
+            print(
+                f"{len(content) / 1024 / 1024:5.1f} {'minified' if minified else 'readable':>9} "
+                f"{len(result['functions']):>10} {len(result['classes']):>8} "
+                f"{seconds:12.2f} {len(content) / 1024 / 1024 / seconds:7.2f} {baseline:>9}"
+            )
+
+if __name__ == "__main__":
+    main()
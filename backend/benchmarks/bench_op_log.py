@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the collaboration operation log.
+
+Concurrent editors submit keystroke operations to one document and wait
+for each to be durable before sending the next, as the WebSocket handler
+does before acknowledging. Compares committing every operation on its
+own with the group commit (operations arriving during a commit share the
+next one), reporting throughput, commits and acknowledgement latency. Also compares
+the size of the catch-up message a reconnecting client receives with the
+full document state.
+
+Run with: python benchmarks/bench_op_log.py --editors 1 50 200 --seconds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.op_log import OpLog
+from app.services.ot_engine import OTEngine, TextOperation
+
+def keystroke(rng, length):
+    position = rng.randint(0, length)
+    return TextOperation().retain(position).insert(rng.choice("abcdefgh \n")).retain(length - position)
+
+async def run(editors, seconds, group_commit, commit_delay_ms, directory):
+    log = OpLog(
+        os.path.join(directory, f"ops-{editors}-{group_commit}.db"),
+        engine=OTEngine(),
+        commit_delay_ms=commit_delay_ms
+    )
+    if group_commit:
+        await log.start()
+    session = await log.open_session("bench", "# Shared notes\n" * 1000)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def editor(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            applied = session.submit(session.revision, keystroke(rng, len(session.buffer)))
+            if group_commit:
+                await log.record("bench", session.revision, applied)
+            else:
+                # Baseline: one transaction per operation
+                await asyncio.to_thread(log.store.append, [("bench", session.revision, json.dumps(applied.to_json()).encode())])
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(editor(seed) for seed in range(editors)))
+    elapsed = time.perf_counter() - started
+    await log.stop()
+    commits = log.commits if group_commit else len(latencies)
+    latencies.sort()
+    return log, session, len(latencies) / elapsed, commits, latencies
+
+async def main_async(args):
+    print(f"{'editors':>8} {'mode':>13} {'ops/s':>9} {'commits':>8} {'ops/commit':>11} {'ack p50 ms':>11} {'ack p99 ms':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for editors in args.editors:
+            for group_commit in (False, True):
+                log, session, throughput, commits, latencies = await run(editors, args.seconds, group_commit, args.commit_delay_ms, directory)
+                print(
+                    f"{editors:>8} {'group commit' if group_commit else 'per operation':>13} {throughput:9.0f} "
+                    f"{commits:>8} {len(latencies) / commits:11.1f} "
+                    f"{statistics.median(latencies) * 1e3:11.2f} {latencies[int(len(latencies) * 0.99)] * 1e3:11.2f}"
+                )
+
+        revision, content = session.snapshot()
+        missed = session.operations_since(revision - args.missed)
+        catch_up = len(json.dumps([operation.to_json() for operation in missed]))
+        print(
+            f"\nreconnect {args.missed} ops behind on a {len(content) // 1024} KB document: "
+            f"catch_up {catch_up} bytes vs document_state {len(json.dumps(content))} bytes"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editors", type=int, nargs="+", default=[1, 50, 200])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--commit-delay-ms", type=float, default=0.0)
+    parser.add_argument("--missed", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Fuzz/benchmark harness for the operational-transform engine.
+
+Simulates hundreds of editors on one document. Each runs the reference
+client (one operation in flight, later edits buffered) behind a network
+with random delays, so the server sees operations based on revisions
+well behind its own and has to transform them. Reports the server's
+throughput, transforms per operation and submit latency, and checks
+that every editor ends with the server's text.
+
+Also compares applying single-keystroke operations to the rope buffer
+with rebuilding a plain string, on documents of growing size.
+
+Run with: python benchmarks/bench_ot_engine.py --editors 50 200 500 --edits 5000
+"""
+
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ot_engine import DocumentSession, OTClient, Rope, TextOperation
+
+def random_operation(rng, text):
+    operation = TextOperation()
+    position = rng.randint(0, len(text))
+    deleted = rng.randint(0, min(4, len(text) - position)) if rng.random() < 0.3 else 0
+    operation.retain(position)
+    operation.insert("".join(rng.choice("abcdefgh \n") for _ in range(rng.randint(1, 4))) if not deleted or rng.random() < 0.5 else "")
+    operation.delete(deleted)
+    operation.retain(len(text) - position - deleted)
+    return operation
+
+def simulate(editors, edits, seed=0, max_delay=50.0, initial="# Shared notes\n" * 100):
+    """Run ``edits`` local edits spread over ``editors`` clients; returns server stats."""
+    rng = random.Random(seed)
+    session = DocumentSession("bench", initial, history_limit=100000)
+    clients = [OTClient(0, initial) for _ in range(editors)]
+    events = []  # (time, sequence, kind, payload)
+    sequence = 0
+    latencies = []
+
+    def schedule(at, kind, payload):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, payload))
+
+    # Links are FIFO: each message leaves no earlier than the previous one on the same link
+    upstream_free = [0.0] * editors
+    downstream_free = [0.0] * editors
+
+    def send_to_server(now, index, pending):
+        upstream_free[index] = max(upstream_free[index], now + rng.uniform(1, max_delay))
+        schedule(upstream_free[index], "server", (index, *pending))
+
+    for n in range(edits):
+        schedule(rng.uniform(0, edits / 10), "edit", rng.randrange(editors))
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == "edit":
+            client = clients[payload]
+            pending = client.edit(random_operation(rng, client.text))
+            if pending:
+                send_to_server(now, payload, pending)
+        elif kind == "server":
+            index, revision, operation = payload
+            start = time.perf_counter()
+            applied = session.submit(revision, operation)
+            latencies.append(time.perf_counter() - start)
+            for other in range(editors):
+                downstream_free[other] = max(downstream_free[other], now + rng.uniform(1, max_delay))
+                message = ("ack", session.revision) if other == index else ("op", session.revision, applied)
+                schedule(downstream_free[other], "client", (other, message))
+        else:
+            index, message = payload
+            client = clients[index]
+            if message[0] == "ack":
+                pending = client.acknowledge(message[1])
+                if pending:
+                    send_to_server(now, index, pending)
+            else:
+                client.receive(message[1], message[2])
+
+    revision, content = session.snapshot()
+    diverged = sum(1 for client in clients if (client.revision, client.text) != (revision, content))
+    return session, latencies, diverged
+
+def bench_buffer(sizes_kb, keystrokes, seed=0):
+    rng = random.Random(seed)
+    print(f"\n{'doc KB':>7} {'rope us/op':>11} {'string us/op':>13}")
+    for size in sizes_kb:
+        text = "".join(rng.choice("abcdefgh \n") for _ in range(size * 1024))
+        operations = []
+        length = len(text)
+        for _ in range(keystrokes):
+            position = rng.randint(0, length)
+            operations.append(TextOperation().retain(position).insert("x").retain(length - position))
+            length += 1
+
+        rope = Rope(text)
+        start = time.perf_counter()
+        for operation in operations:
+            rope.apply(operation)
+        rope_seconds = time.perf_counter() - start
+
+        plain = text
+        start = time.perf_counter()
+        for operation in operations:
+            plain = operation.apply(plain)
+        string_seconds = time.perf_counter() - start
+        assert str(rope) == plain
+        print(f"{size:>7} {rope_seconds / keystrokes * 1e6:11.1f} {string_seconds / keystrokes * 1e6:13.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editors", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--edits", type=int, default=5000)
+    parser.add_argument("--buffer-kb", type=int, nargs="+", default=[64, 1024, 4096])
+    parser.add_argument("--keystrokes", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'editors':>8} {'server ops':>11} {'ops/s':>9} {'transforms/op':>14} {'p50 us':>8} {'p99 us':>8} {'diverged':>9}")
+    for editors in args.editors:
+        session, latencies, diverged = simulate(editors, args.edits)
+        total = sum(latencies)
+        latencies.sort()
+        print(
+            f"{editors:>8} {session.operations_applied:>11} {len(latencies) / total:9.0f} "
+            f"{session.transforms / session.operations_applied:14.1f} "
+            f"{statistics.median(latencies) * 1e6:8.1f} {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} {diverged:>9}"
+        )
+        if diverged:
+            sys.exit(f"{diverged} editors diverged from the server")
+
+    bench_buffer(args.buffer_kb, args.keystrokes)
+
+if __name__ == "__main__":
+    main()
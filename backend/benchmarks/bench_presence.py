@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for presence batching.
+
+Every user of a document moves their cursor at ``--hz`` (60 by default)
+for a few seconds, through the real cursor_update handler. Reports
+messages in, presence_batch frames out, the tick rate chosen for the
+room size and the WebSocket sends made. These are compared with
+broadcasting each update to everyone else, which is measured for the
+smallest room and computed as messages x (users - 1) for the larger
+ones. At those sizes it cannot keep up in real time.
+
+Run with: python benchmarks/bench_presence.py --users 30 200 500 --seconds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.presence import PresenceAggregator
+from app.services.websocket_manager import ConnectionManager, websocket_manager
+
+class CountingWebSocket:
+    sends = 0
+
+    async def send_text(self, data):
+        CountingWebSocket.sends += 1
+
+    async def send_json(self, data):
+        CountingWebSocket.sends += 1
+
+async def run(users, seconds, hz, batched):
+    manager = ConnectionManager()
+    manager.handlers = websocket_manager.handlers
+    manager.presence_batches = PresenceAggregator(manager, max_hz=manager.presence_batches.max_hz if batched else 0)
+    sockets = [CountingWebSocket() for _ in range(users)]
+    for i, websocket in enumerate(sockets):
+        await manager.connect(websocket, "doc", f"user{i}")
+    CountingWebSocket.sends = 0
+
+    messages = 0
+    busy = 0.0
+    start = time.perf_counter()
+    for step in range(int(seconds * hz)):
+        began = time.perf_counter()
+        for i, websocket in enumerate(sockets):
+            data = json.dumps({"type": "cursor_update", "position": step * 7 + i})
+            await manager.handle_message(websocket, "doc", f"user{i}", data)
+            messages += 1
+        busy += time.perf_counter() - began
+        # Stay on the wall clock so ticks happen as they would live
+        await asyncio.sleep(max(0.0, start + (step + 1) / hz - time.perf_counter()))
+    await asyncio.sleep(0.6)
+    await manager.drain()
+    stats = manager.presence_batches.get_stats()
+    manager.presence_batches.close()
+    for outbox in list(manager.outboxes.values()):
+        outbox.close()
+    return messages, stats, CountingWebSocket.sends, busy / messages
+
+async def main_async(args):
+    print(
+        f"{'users':>6} {'messages in':>12} {'frames out':>11} {'tick Hz':>8} {'sends (batched)':>16} "
+        f"{'sends (each update)':>20} {'reduction':>10} {'us/message':>11}"
+    )
+    for users in args.users:
+        messages, stats, sends, cost = await run(users, args.seconds, args.hz, True)
+        tick_hz = PresenceAggregator(None).tick_rate(users)
+        if users == min(args.users):
+            _, _, immediate, _ = await run(users, args.seconds, args.hz, False)
+        else:
+            immediate = messages * (users - 1)
+        print(
+            f"{users:>6} {messages:>12} {stats['frames_out']:>11} {tick_hz:8.1f} {sends:>16} "
+            f"{immediate:>20} {immediate / sends:9.0f}x {cost * 1e6:11.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[30, 200, 500])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--hz", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for code/documentation similarity scoring.
+
+Compares the legacy per-element path (re-encoding the documentation for every
+code element) against BatchSimilarityEngine on synthetic Python files with an
+increasing number of definitions.
+
+Run with: python benchmarks/bench_similarity.py --sizes 100 1000 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.similarity_engine import BatchSimilarityEngine
+
+DOCUMENTATION = """
+# Payments module
+
+Provides helpers for creating invoices, applying discounts, validating card
+numbers and reconciling settlements against the ledger.
+"""
+
+def make_elements(count):
+    """Build code elements the way AIService._extract_code_elements returns them."""
+    elements = []
+    for i in range(count):
+        if i % 5 == 0:
+            elements.append(f"class InvoiceHandler{i}(BaseHandler):")
+        else:
+            elements.append(f"def apply_discount_{i}(invoice, rate={i % 7}, *, currency='EUR'):")
+    return elements
+
+def legacy_scores(model, elements, documentation):
+    """Per-element encoding, as the service did before batching."""
+    scores = []
+    for element in elements:
+        a = model.encode(element, convert_to_numpy=True, show_progress_bar=False)
+        b = model.encode(documentation, convert_to_numpy=True, show_progress_bar=False)
+        scores.append(float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b))))
+    return scores
+
+def time_call(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--legacy-limit", type=int, default=1000,
+                        help="Skip the legacy path above this many elements")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model, device=args.device)
+    engine = BatchSimilarityEngine(model, batch_size=args.batch_size, device=args.device)
+    engine.score(["warm up"], "warm up")
+
+    print(f"{'elements':>10} {'legacy ms/elem':>16} {'batched ms/elem':>16} {'speedup':>9}")
+    for size in args.sizes:
+        elements = make_elements(size)
+        batched = time_call(lambda: engine.score(elements, DOCUMENTATION))
+        if size <= args.legacy_limit:
+            legacy = time_call(lambda: legacy_scores(model, elements, DOCUMENTATION))
+            legacy_col = f"{legacy / size * 1000:16.3f}"
+            speedup_col = f"{legacy / batched:8.1f}x"
+        else:
+            legacy_col = f"{'skipped':>16}"
+            speedup_col = f"{'-':>9}"
+        print(f"{size:>10} {legacy_col} {batched / size * 1000:16.3f} {speedup_col}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for application startup time.
+
+Starts the API under uvicorn in a subprocess and measures how long it takes
+until the port is bound and ``/health`` answers, once per EMBEDDING_WARMUP
+mode:
+
+  off         models load lazily on first use (no AI stack at startup)
+  background  models load in a background task after the port is bound
+  blocking    models load before the server starts serving (legacy behaviour)
+
+Run with: python benchmarks/bench_startup.py --runs 3
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_health(mode, timeout):
+    """Return seconds from process start until /health responds with 200."""
+    port = free_port()
+    env = dict(os.environ, EMBEDDING_WARMUP=mode)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode} in mode '{mode}'")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"Server did not become healthy within {timeout}s in mode '{mode}'")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["off", "background", "blocking"])
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'median s':>10} {'min s':>8} {'max s':>8}")
+    for mode in args.modes:
+        samples = [time_to_health(mode, args.timeout) for _ in range(args.runs)]
+        print(f"{mode:>12} {statistics.median(samples):10.2f} {min(samples):8.2f} {max(samples):8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark for project input search.
+
+Compares the original case-insensitive substring scan over every snippet with
+the BM25 inverted index at increasing corpus sizes. Query latency for the
+index should stay roughly flat while the scan grows linearly.
+
+Run with: python benchmarks/bench_text_search.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.text_index import InvertedIndex
+
+VOCABULARY = [
+    "parse", "token", "config", "load", "save", "user", "session", "request",
+    "response", "handler", "cache", "index", "query", "render", "document",
+    "version", "diff", "upload", "stream", "socket", "schema", "model", "field",
+]
+QUERIES = ["parseToken", "load_config", "sessionHandler", "rareIdentifierXyz"]
+
+def make_snippets(count, seed=0):
+    rng = random.Random(seed)
+    snippets = []
+    for i in range(count):
+        name = rng.choice(VOCABULARY) + rng.choice(VOCABULARY).capitalize()
+        body = " ".join(rng.choice(VOCABULARY) for _ in range(30))
+        snippets.append((f"s{i}", f"def {name}_{i}(arg):\n    # {body}\n    return arg"))
+    snippets.append(("rare", "def rareIdentifierXyz(): pass"))
+    return snippets
+
+def substring_scan(snippets, query):
+    """The original search_inputs implementation."""
+    return [doc_id for doc_id, content in snippets if query.lower() in content.lower()]
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'snippets':>9} {'query':>18} {'scan ms':>9} {'bm25 ms':>9} {'index build s':>14}")
+    for size in args.sizes:
+        snippets = make_snippets(size)
+        start = time.perf_counter()
+        index = InvertedIndex()
+        for doc_id, content in snippets:
+            index.add(doc_id, content)
+        build = time.perf_counter() - start
+
+        for query in QUERIES:
+            scan = median_ms(lambda: substring_scan(snippets, query), args.repeat)
+            bm25 = median_ms(lambda: index.search(query, limit=20), args.repeat)
+            print(f"{size:>9} {query:>18} {scan:9.2f} {bm25:9.2f} {build:14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark for delta-compressed document version storage.
+
+Builds the history of a document that is edited many times (a few lines
+changed, inserted or deleted per version) and stores it with different
+keyframe intervals. Reports stored size against keeping a full copy of
+every version, and the time to rebuild the worst-case (last before a
+snapshot) and a random version. Interval 1 stores every version as a
+compressed snapshot.
+
+Run with: python benchmarks/bench_version_store.py --versions 2000 --doc-kb 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.version_store import VersionChain
+
+def make_history(versions, doc_kb, seed=0):
+    rng = random.Random(seed)
+    words = ["document", "version", "editor", "change", "review", "draft", "section", "note", "the", "a"]
+
+    def line():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 14))) + "\n"
+
+    lines = []
+    while sum(map(len, lines)) < doc_kb * 1024:
+        lines.append(line())
+    history = ["".join(lines)]
+    for _ in range(versions - 1):
+        for _ in range(rng.randint(1, 4)):
+            position = rng.randrange(len(lines))
+            action = rng.random()
+            if action < 0.6:
+                lines[position] = line()
+            elif action < 0.8:
+                lines.insert(position, line())
+            elif len(lines) > 1:
+                del lines[position]
+        history.append("".join(lines))
+    return history
+
+def time_reads(chain, indices):
+    samples = []
+    for index in indices:
+        chain._last = None  # measure a cold read, not the sequential-read cache
+        start = time.perf_counter()
+        chain.get(index)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--versions", type=int, default=2000)
+    parser.add_argument("--doc-kb", type=int, default=200, help="Initial document size in KB")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 5, 10, 20, 50, 100])
+    parser.add_argument("--codec", default="zlib", choices=["zlib", "zstd", "none"])
+    parser.add_argument("--reads", type=int, default=50, help="Random versions to rebuild per interval")
+    args = parser.parse_args()
+
+    history = make_history(args.versions, args.doc_kb)
+    full_bytes = sum(len(content.encode("utf-8")) for content in history)
+    rng = random.Random(1)
+    random_indices = [rng.randrange(len(history) - 1) for _ in range(args.reads)]
+    print(f"{len(history)} versions, {full_bytes / 1024 / 1024:.1f} MB as full copies, codec={args.codec}")
+    print(f"{'interval':>8} {'stored MB':>10} {'ratio':>7} {'append ms':>10} {'worst read ms':>14} {'mean read ms':>13}")
+
+    for interval in args.intervals:
+        chain = VersionChain(keyframe_interval=interval, codec=args.codec)
+        start = time.perf_counter()
+        for content in history:
+            chain.append(content)
+        append_ms = (time.perf_counter() - start) / len(history) * 1000
+
+        # The version just before a scheduled snapshot needs the most deltas
+        last_full_run = (len(history) - 2) // interval * interval
+        worst_index = min(last_full_run + interval - 1, len(history) - 2)
+        worst = max(time_reads(chain, [worst_index] * 5)) * 1000
+        mean = statistics.mean(time_reads(chain, random_indices)) * 1000
+        assert chain.get(worst_index) == history[worst_index]
+
+        stored = chain.stored_bytes()
+        print(
+            f"{interval:>8} {stored / 1024 / 1024:10.2f} {full_bytes / stored:6.1f}x "
+            f"{append_ms:10.2f} {worst:14.2f} {mean:13.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for WebSocket broadcast fan-out.
+
+Broadcasts a stream of content updates to one document with 1, 50 and
+500 subscribers, one of which is a slow mobile client (every send takes
+``--slow-ms``). Compares awaiting each subscriber's send in turn, as
+broadcast used to, with the per-connection outboxes. Reports how long the
+broadcasting coroutine is held, delivery latency to the healthy clients
+and end-to-end throughput. A second run adds a stuck client whose sends
+never complete: the sequential loop stalls on it for good, while with
+outboxes only its own queue grows (until it passes the lag limit).
+
+Run with: python benchmarks/bench_websocket_fanout.py --subscribers 1 50 500 --messages 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.websocket_manager import ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self, sent_at, delay=0.0, stuck=False):
+        self.sent_at = sent_at
+        self.delay = delay
+        self.stuck = stuck
+        self.latencies = []
+
+    async def send_text(self, data):
+        if self.stuck:
+            await asyncio.Event().wait()
+        # Every send yields to the loop, like a real socket write
+        await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - self.sent_at[data])
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+async def sequential_broadcast(connections, message):
+    """The previous broadcast: one awaited send per subscriber."""
+    for connection in connections:
+        await connection.send_text(message)
+
+async def run(subscribers, messages, slow_ms, outboxes, stuck=False):
+    sent_at = {}
+    healthy = [FakeWebSocket(sent_at) for _ in range(subscribers - 1 if subscribers > 1 else 1)]
+    others = [FakeWebSocket(sent_at, delay=slow_ms / 1000)] if subscribers > 1 else []
+    if stuck:
+        others.append(FakeWebSocket(sent_at, stuck=True))
+    connections = others + healthy
+
+    manager = ConnectionManager(queue_size=max(256, messages))
+    for i, connection in enumerate(connections):
+        await manager.connect(connection, "doc", f"user{i}")
+
+    held = []
+    start = time.perf_counter()
+    for n in range(messages):
+        message = {"type": "content_update", "user_id": "writer", "changes": [n, "x"], "version": n}
+        payload = json.dumps(message)
+        sent_at[payload] = time.perf_counter()
+        begin = time.perf_counter()
+        if outboxes:
+            await manager.broadcast("doc", message)
+        else:
+            await sequential_broadcast(connections, payload)
+        held.append(time.perf_counter() - begin)
+        # Edits arrive over time rather than all at once
+        await asyncio.sleep(0.001)
+    if outboxes:
+        await asyncio.gather(*(manager.outboxes[connection].drain() for connection in healthy))
+    elapsed = time.perf_counter() - start
+    stats = manager.get_stats()
+    for outbox in list(manager.outboxes.values()):
+        outbox.close()
+
+    latencies = sorted(latency for connection in healthy for latency in connection.latencies)
+    return {
+        "held_ms": statistics.mean(held) * 1e3,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "deliveries_per_s": len(latencies) / elapsed,
+        "stats": stats
+    }
+
+async def main_async(args):
+    print(f"{'subs':>5} {'mode':>11} {'held ms/msg':>12} {'p50 ms':>8} {'p99 ms':>8} {'deliveries/s':>13}")
+    for subscribers in args.subscribers:
+        for outboxes in (False, True):
+            result = await run(subscribers, args.messages, args.slow_ms, outboxes)
+            print(
+                f"{subscribers:>5} {'outboxes' if outboxes else 'sequential':>11} {result['held_ms']:12.3f} "
+                f"{result['p50_ms']:8.2f} {result['p99_ms']:8.2f} {result['deliveries_per_s']:13.0f}"
+            )
+
+    subscribers = max(args.subscribers)
+    result = await run(subscribers, args.messages, args.slow_ms, True, stuck=True)
+    print(
+        f"\n{subscribers} subscribers plus a stuck client: sequential broadcast never returns; "
+        f"outboxes p99 {result['p99_ms']:.2f} ms, stuck client queued {result['stats']['max_queued']} messages"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
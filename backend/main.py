@@ -9,6 +9,7 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.core.config import settings
 from app.api.api_v1.api import api_router
 from app.core.exception_handlers import http_exception_handler, validation_exception_handler
+from app.core.rate_limit import RateLimitMiddleware
 
 def get_application() -> FastAPI:
     # Create FastAPI app
@@ -21,6 +22,10 @@ def get_application() -> FastAPI:
         redoc_url="/redoc"
     )
 
+    # Rate-limit AI endpoints; added before CORS so rejections still carry CORS headers
+    if settings.RATE_LIMIT_ENABLED:
+        app.add_middleware(RateLimitMiddleware)
+
     # Set up CORS
     if settings.BACKEND_CORS_ORIGINS:
         from fastapi.middleware.cors import CORSMiddleware
@@ -46,6 +51,35 @@ def get_application() -> FastAPI:
     os.makedirs("static", exist_ok=True)
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+    # Optionally warm the embedding model so the first analysis request is fast
+    @app.on_event("startup")
+    async def warm_models():
+        from app.services.model_registry import model_registry
+        from app.services.similarity_engine import DEFAULT_EMBEDDING_MODEL
+        
+        model_names = [DEFAULT_EMBEDDING_MODEL]
+        if settings.EMBEDDING_WARMUP == "background":
+            model_registry.schedule_warmup(model_names)
+        elif settings.EMBEDDING_WARMUP == "blocking":
+            await model_registry.warm(model_names)
+
+    # Run background jobs (including ones left over from a previous process)
+    @app.on_event("startup")
+    async def start_job_workers():
+        from app.services.backplane import create_backplane
+        from app.services.job_queue import job_queue
+        from app.services.websocket_manager import websocket_manager
+        # Job updates reach clients connected to other processes
+        await websocket_manager.attach_backplane(create_backplane())
+        await job_queue.start()
+
+    @app.on_event("shutdown")
+    async def stop_job_workers():
+        from app.services.job_queue import job_queue
+        from app.services.websocket_manager import websocket_manager
+        await job_queue.stop()
+        await websocket_manager.detach_backplane()
+
     # Health check endpoint
     @app.get("/health")
     async def health_check():
@@ -0,0 +1,42 @@
+"""Delta-compressed document versions
+
+Revision ID: 5b7e2c9a1f40
+Revises: d4ef221d2d2c
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.services.version_store import compress_legacy_versions, expand_versions
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c9a1f40'
+down_revision: Union[str, Sequence[str], None] = 'd4ef221d2d2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Store versions as periodic snapshots plus compressed forward deltas."""
+    with op.batch_alter_table('document_versions') as batch_op:
+        batch_op.add_column(sa.Column('storage', sa.String(length=10), server_default='text', nullable=False))
+        batch_op.add_column(sa.Column('payload', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=True)
+
+    # Existing rows are full copies ('text'); re-encode them document by document
+    compress_legacy_versions(op.get_bind(), settings.VERSION_KEYFRAME_INTERVAL, settings.VERSION_COMPRESSION)
+
+
+def downgrade() -> None:
+    """Write every version back as a full copy and drop the compressed columns."""
+    expand_versions(op.get_bind())
+
+    with op.batch_alter_table('document_versions') as batch_op:
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('payload')
+        batch_op.drop_column('storage')
@@ -0,0 +1,35 @@
+"""Unique document version numbers
+
+Revision ID: 8e1f4b6d2c73
+Revises: 5b7e2c9a1f40
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.core.config import settings
+from app.services.version_store import renumber_duplicate_versions
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f4b6d2c73'
+down_revision: Union[str, Sequence[str], None] = '5b7e2c9a1f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Allow one row per (document, version number)."""
+    # Versions written concurrently before the constraint share a number; split them first
+    renumber_duplicate_versions(op.get_bind(), settings.VERSION_KEYFRAME_INTERVAL, settings.VERSION_COMPRESSION)
+
+    with op.batch_alter_table('document_versions') as batch_op:
+        batch_op.create_unique_constraint('uq_document_versions_number', ['document_id', 'version_number'])
+
+
+def downgrade() -> None:
+    """Drop the unique constraint; the renumbered versions stay as they are."""
+    with op.batch_alter_table('document_versions') as batch_op:
+        batch_op.drop_constraint('uq_document_versions_number', type_='unique')
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up test environment variables before the app settings are loaded
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ["DATABASE_URL"] = "sqlite:///./test.db"
+os.environ.setdefault("OPENAI_API_KEY", "test-api-key")
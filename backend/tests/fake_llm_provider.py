@@ -0,0 +1,160 @@
+"""
+Local fake OpenAI-compatible provider for tests.
+
+Serves ``POST /v1/chat/completions`` over plain asyncio streams, with a
+configurable response delay, and records request counts and peak concurrency
+so tests can exercise the real AsyncOpenAI client end to end. Requests with
+``"stream": true`` are answered with server-sent event chunks, one word each,
+``chunk_delay`` seconds apart.
+"""
+import json
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+def echo_last_message(messages: List[Dict[str, str]]) -> str:
+    return f"echo: {messages[-1]['content']}"
+
+class FakeLLMProvider:
+    def __init__(
+        self,
+        delay: float = 0.0,
+        respond: Callable[[List[Dict[str, str]]], str] = echo_last_message,
+        chunk_delay: float = 0.0
+    ):
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.respond = respond
+        self.requests: List[Dict] = []
+        self.active = 0
+        self.peak_active = 0
+        self.cancelled = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def start(self) -> "FakeLLMProvider":
+        self._server = await asyncio.start_server(self._handle_connection, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> "FakeLLMProvider":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, value in (line.split(":", 1) for line in lines[1:] if ":" in line)
+                }
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if not await self._handle_request(method, path, json.loads(body or b"{}"), reader, writer):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(
+        self,
+        method: str,
+        path: str,
+        payload: Dict,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> bool:
+        """Serve one request; returns False if the client hung up before the response."""
+        if method != "POST" or not path.endswith("/chat/completions"):
+            await self._send(writer, 404, {"error": {"message": "not found"}})
+            return True
+
+        self.requests.append(payload)
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        # A client that aborts its request closes the connection; watch for EOF while "generating"
+        hangup = asyncio.ensure_future(reader.read(1))
+        generation = asyncio.ensure_future(asyncio.sleep(self.delay))
+        try:
+            await asyncio.wait({hangup, generation}, return_when=asyncio.FIRST_COMPLETED)
+            if not generation.done():
+                self.cancelled += 1
+                return False
+        finally:
+            self.active -= 1
+            hangup.cancel()
+            generation.cancel()
+
+        if payload.get("stream"):
+            return await self._send_stream(writer, payload)
+
+        await self._send(writer, 200, {
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.respond(payload["messages"])},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+        return True
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, payload: Dict) -> bool:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+        words = self.respond(payload["messages"]).split(" ")
+        try:
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": f"chatcmpl-{len(self.requests)}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": None
+                    }]
+                }
+                self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n")
+                await writer.drain()
+                if self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+            self._write_chunk(writer, "data: [DONE]\n\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            self.cancelled += 1
+            return False
+        return True
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, text: str) -> None:
+        data = text.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
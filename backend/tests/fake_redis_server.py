@@ -0,0 +1,136 @@
+"""
+Local stand-in for Redis pub/sub in tests.
+
+Speaks enough RESP2 over plain asyncio streams for the backplane:
+``PING``, ``AUTH``, ``PUBLISH``, ``SUBSCRIBE`` and ``UNSUBSCRIBE``, with
+pushes in the same shape as Redis (``["message", channel, data]``), and
+``SET`` (``NX``, ``PX``), ``GET``, ``DEL`` and ``PEXPIRE`` for leases.
+Counts commands so tests can check what was sent over the wire.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+def _push(*items: bytes) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(
+        b":%d\r\n" % item if isinstance(item, int) else _bulk(item) for item in items
+    )
+
+class FakeRedisServer:
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.port: Optional[int] = None
+        self.commands: Dict[str, int] = {}
+        # channel -> subscribed connections
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.connections: Set[asyncio.StreamWriter] = set()
+        # key -> (value, expiry on the monotonic clock or None)
+        self.keys: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/0"
+
+    async def start(self, port: int = 0) -> "FakeRedisServer":
+        self._server = await asyncio.start_server(self._handle_connection, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        """Close the listener and every client connection, like a server restart."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for writer in list(self.connections):
+            writer.close()
+        self.connections.clear()
+        self.channels.clear()
+
+    async def __aenter__(self) -> "FakeRedisServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        entry = self.keys.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.keys[key]
+            entry = None
+        return entry[0] if entry is not None else None
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> List[bytes]:
+        line = await reader.readline()
+        if not line.startswith(b"*"):
+            raise ConnectionError("expected a command array")
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections.add(writer)
+        subscribed: Set[bytes] = set()
+        authenticated = self.password is None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                name = args[0].upper().decode()
+                self.commands[name] = self.commands.get(name, 0) + 1
+                if name == "AUTH":
+                    authenticated = args[-1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == "PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == "PUBLISH":
+                    receivers = list(self.channels.get(args[1], ()))
+                    for receiver in receivers:
+                        receiver.write(_push(b"message", args[1], args[2]))
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    for channel in args[1:]:
+                        if name == "SUBSCRIBE":
+                            subscribed.add(channel)
+                            self.channels.setdefault(channel, set()).add(writer)
+                        else:
+                            subscribed.discard(channel)
+                            self.channels.get(channel, set()).discard(writer)
+                        writer.write(_push(name.lower().encode(), channel, len(subscribed)))
+                elif name == "SET":
+                    options = [arg.upper() for arg in args[3:]]
+                    if b"NX" in options and self.get(args[1]) is not None:
+                        writer.write(b"$-1\r\n")
+                        continue
+                    expiry = None
+                    if b"PX" in options:
+                        expiry = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+                    self.keys[args[1]] = (args[2], expiry)
+                    writer.write(b"+OK\r\n")
+                elif name == "GET":
+                    value = self.get(args[1])
+                    writer.write(b"$-1\r\n" if value is None else _bulk(value))
+                elif name == "DEL":
+                    removed = sum(self.get(key) is not None and self.keys.pop(key) is not None for key in args[1:])
+                    writer.write(b":%d\r\n" % removed)
+                elif name == "PEXPIRE":
+                    value = self.get(args[1])
+                    if value is not None:
+                        self.keys[args[1]] = (value, time.monotonic() + int(args[2]) / 1000)
+                    writer.write(b":%d\r\n" % (value is not None))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % args[0])
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.channels.get(channel, set()).discard(writer)
+            self.connections.discard(writer)
+            writer.close()
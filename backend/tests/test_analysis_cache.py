@@ -0,0 +1,106 @@
+import pytest
+
+from app.services import document_service as document_service_module
+from app.services.document_service import DocumentService
+from app.services.llm_cache import LLMResponseCache
+
+SOURCE = '''
+class Greeter(Base):
+    """Says hello."""
+
+    def greet(self, name: str) -> str:
+        """Return a greeting."""
+        return f"Hello {name}"
+'''
+
+def make_service(cache=None):
+    service = DocumentService(analysis_cache=cache or LLMResponseCache(max_entries=100))
+    calls = []
+    analyze = service._analyze_code_structure
+
+    def counting_analyze(content, file_extension):
+        calls.append(file_extension)
+        return analyze(content, file_extension)
+
+    service._analyze_code_structure = counting_analyze
+    return service, calls
+
+def test_unchanged_content_is_analyzed_once():
+    service, calls = make_service()
+
+    first_structure, first_metadata = service._get_analysis(SOURCE, ".py")
+    second_structure, second_metadata = service._get_analysis(SOURCE, ".py")
+
+    assert calls == [".py"]
+    assert second_structure == first_structure
+    assert second_metadata == first_metadata
+    assert first_structure["classes"][0]["bases"] == ["Base"]
+    assert first_structure["functions"][0]["returns"] == "str"
+    assert service.get_analysis_stats()["reused"] == 1
+
+def test_cached_structure_is_not_shared_between_callers():
+    service, _ = make_service()
+    structure, _ = service._get_analysis(SOURCE, ".py")
+    structure["functions"].clear()
+
+    again, _ = service._get_analysis(SOURCE, ".py")
+
+    assert len(again["functions"]) == 1
+
+def test_changed_files_and_extensions_are_reanalyzed():
+    service, calls = make_service()
+    files = {f"module_{i}.py": f"def f{i}():\n    return {i}\n" for i in range(50)}
+    for content in files.values():
+        service._get_analysis(content, ".py")
+
+    # Re-upload with 2 of 50 files changed
+    files["module_3.py"] += "\ndef extra():\n    pass\n"
+    files["module_7.py"] += "\n# comment\n"
+    calls.clear()
+    for content in files.values():
+        service._get_analysis(content, ".py")
+    service._get_analysis(files["module_0.py"], ".ts")
+
+    assert calls == [".py", ".py", ".ts"]
+    assert service.get_analysis_stats()["reused"] == 48
+
+def test_analyzer_version_bump_invalidates_entries(monkeypatch):
+    service, calls = make_service()
+    service._get_analysis(SOURCE, ".py")
+
+    monkeypatch.setattr(document_service_module, "ANALYZER_VERSION", "test-next")
+    service._get_analysis(SOURCE, ".py")
+
+    assert len(calls) == 2
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "analysis.db")
+    first, first_calls = make_service(LLMResponseCache(max_entries=10, path=path))
+    first._get_analysis(SOURCE, ".py")
+
+    restarted, restarted_calls = make_service(LLMResponseCache(max_entries=10, path=path))
+    structure, metadata = restarted._get_analysis(SOURCE, ".py")
+
+    assert first_calls == [".py"]
+    assert restarted_calls == []
+    assert structure["metrics"]["class_count"] == 1
+    assert metadata["language"] == "python"
+
+@pytest.mark.asyncio
+async def test_process_document_reuses_analysis(tmp_path, monkeypatch):
+    service, calls = make_service()
+
+    async def fake_documentation(**kwargs):
+        return "Generated documentation"
+
+    monkeypatch.setattr(service, "_generate_documentation", fake_documentation)
+    path = tmp_path / "greeter.py"
+    path.write_text(SOURCE)
+
+    first = await service.process_document(str(path))
+    second = await service.process_document(str(path))
+
+    assert calls == [".py"]
+    assert second["code_structure"] == first["code_structure"]
+    assert second["version_hash"] == first["version_hash"]
+    assert "grade" in second["quality_metrics"]
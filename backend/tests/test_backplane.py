@@ -0,0 +1,232 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.backplane import InProcessBackplane, InProcessHub, RedisBackplane, UnixSocketBackplane, create_backplane
+from app.services.op_log import OpLog
+from app.services.ot_engine import OTEngine
+from app.services.websocket_manager import ConnectionManager, websocket_manager
+from tests.fake_redis_server import FakeRedisServer
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+async def wait_until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+async def worker(backplane, rooms=("doc",), log=None):
+    """A process's ConnectionManager with one client in each of ``rooms``."""
+    manager = ConnectionManager(log=log)
+    manager.handlers = websocket_manager.handlers
+    await manager.attach_backplane(backplane)
+    clients = {}
+    for room in rooms:
+        clients[room] = FakeWebSocket()
+        await manager.connect(clients[room], room, f"{room}-{backplane.origin[:6]}")
+    return manager, clients
+
+async def shutdown(*managers):
+    for manager in managers:
+        await manager.detach_backplane()
+        for outbox in list(manager.outboxes.values()):
+            outbox.close()
+
+@pytest.mark.asyncio
+async def test_in_process_backplane_spans_managers_without_echo():
+    hub = InProcessHub()
+    first, first_clients = await worker(InProcessBackplane(hub))
+    second, second_clients = await worker(InProcessBackplane(hub), rooms=("doc", "other"))
+    sender = first_clients["doc"]
+
+    await first.broadcast("doc", {"type": "comment", "id": 1}, exclude={sender})
+    await first.broadcast("doc", {"type": "cursor_update", "user_id": "u", "position": 3})
+    await asyncio.gather(first.drain(), second.drain())
+
+    # ``exclude`` is per process; everyone else gets each message exactly once
+    assert [message["type"] for message in sender.sent] == ["cursor_update"]
+    assert [message["type"] for message in second_clients["doc"].sent] == ["comment", "cursor_update"]
+    assert second_clients["other"].sent == []
+    assert first.backplane.room_stats["doc"]["published"] == 2
+    assert second.backplane.room_stats["doc"] == {"published": 0, "received": 2, "delivered": 2, "echoes_suppressed": 0}
+
+    # The last local client leaving unsubscribes the process from the room
+    await second.disconnect(second_clients["doc"], "doc")
+    assert second.backplane not in hub.subscribers["doc"]
+    await shutdown(first, second)
+    assert hub.subscribers == {}
+
+@pytest.mark.asyncio
+async def test_unix_socket_backplane_routes_by_room_and_fails_over(tmp_path):
+    path = str(tmp_path / "ws.sock")
+    hub, hub_clients = await worker(UnixSocketBackplane(path))
+    first, first_clients = await worker(UnixSocketBackplane(path))
+    second, second_clients = await worker(UnixSocketBackplane(path), rooms=("other",))
+    assert hub.backplane.is_hub and not first.backplane.is_hub
+    await wait_until(lambda: len(hub.backplane._peers) == 2 and all(hub.backplane._peers.values()))
+
+    await first.broadcast("doc", {"type": "comment", "id": 1})
+    await wait_until(lambda: hub_clients["doc"].sent)
+    await asyncio.sleep(0.05)
+    assert first_clients["doc"].sent == [{"type": "comment", "id": 1}]
+    # Not subscribed to the room, so never sent to
+    assert "doc" not in second.backplane.room_stats
+
+    # The hub process goes away and another worker takes over
+    await shutdown(hub)
+    await wait_until(lambda: (first.backplane.is_hub or second.backplane.is_hub) and first.backplane.connected and second.backplane.connected)
+    await second.connect(FakeWebSocket(), "doc", "late")
+    await asyncio.sleep(0.05)
+    await second.broadcast("doc", {"type": "comment", "id": 2})
+    await wait_until(lambda: len(first_clients["doc"].sent) == 2)
+    await shutdown(first, second)
+
+@pytest.mark.asyncio
+async def test_redis_backplane_suppresses_echo_and_resubscribes():
+    server = await FakeRedisServer(password="secret").start()
+    first, first_clients = await worker(RedisBackplane(server.url, "test:", reconnect_delay=0.05))
+    second, second_clients = await worker(RedisBackplane(server.url, "test:", reconnect_delay=0.05))
+    await wait_until(lambda: len(server.channels.get(b"test:doc", ())) == 2)
+
+    await first.broadcast("doc", {"type": "content_update", "version": 1})
+    await wait_until(lambda: second_clients["doc"].sent)
+    # Redis hands the publisher its own message back; it must not be delivered twice
+    await wait_until(lambda: first.backplane.room_stats["doc"]["echoes_suppressed"] == 1)
+    assert first_clients["doc"].sent == [{"type": "content_update", "version": 1}]
+    assert second.backplane.room_stats["doc"]["delivered"] == 1
+
+    # Restart the server on the same port: both reconnect and subscribe again
+    port = server.port
+    await server.stop()
+    await wait_until(lambda: not first.backplane.connected and not second.backplane.connected)
+    await server.start(port)
+    await wait_until(lambda: len(server.channels.get(b"test:doc", ())) == 2)
+    await second.broadcast("doc", {"type": "content_update", "version": 2})
+    await wait_until(lambda: len(first_clients["doc"].sent) == 2)
+
+    await second.disconnect(second_clients["doc"], "doc")
+    await wait_until(lambda: server.commands.get("UNSUBSCRIBE") == 1)
+    await shutdown(first, second)
+    await server.stop()
+
+@pytest.mark.asyncio
+async def test_each_document_is_edited_by_one_owning_process(tmp_path):
+    """Concurrent edits through two workers go through one session and are logged once each"""
+    hub = InProcessHub()
+    path = str(tmp_path / "op_log.db")
+    logs = [OpLog(path, engine=OTEngine()) for _ in range(2)]
+    first, _ = await worker(InProcessBackplane(hub), rooms=(), log=logs[0])
+    second, _ = await worker(InProcessBackplane(hub), rooms=(), log=logs[1])
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    # The first worker to need the document owns it
+    await first.open_document("doc")
+    await first.connect(alice, "doc", "alice")
+    await second.open_document("doc")
+    await second.connect(bob, "doc", "bob")
+    assert hub.owners["doc"] is first.backplane
+
+    def edit(manager, client, user_id, changes, version):
+        return manager.handle_message(client, "doc", user_id, json.dumps({"type": "content_update", "changes": changes, "version": version}))
+
+    await asyncio.gather(edit(first, alice, "alice", ["a"], 0), edit(second, bob, "bob", ["b"], 0))
+    await asyncio.gather(first.drain(), second.drain())
+
+    # Each client gets the other's edit and its own acknowledgement, with distinct revisions
+    assert sorted((m["version"], m["type"]) for m in alice.sent) == [(1, "content_update_ack"), (2, "content_update")]
+    assert sorted((m["version"], m["type"]) for m in bob.sent) == [(1, "content_update"), (2, "content_update_ack")]
+    assert "doc" not in logs[1].engine.sessions
+    assert logs[0].store.count("doc") == 2
+    state = await second.document_state("doc")
+    assert state["version"] == 2 and state["content"] == logs[0].engine.sessions["doc"].snapshot()[1]
+    assert sorted(state["content"]) == ["a", "b"]
+
+    # The owner's last client leaves: the next worker to need the document takes it over from the log
+    await first.disconnect(alice, "doc", "alice")
+    await asyncio.gather(*first._releases)
+    assert "doc" not in hub.owners and "doc" not in logs[0].engine.sessions
+    await edit(second, bob, "bob", [2, "c"], 2)
+    await second.drain()
+    assert bob.sent[-1]["type"] == "content_update_ack" and bob.sent[-1]["version"] == 3
+    assert hub.owners["doc"] is second.backplane
+    assert logs[1].engine.sessions["doc"].snapshot() == (3, state["content"] + "c")
+    assert logs[1].store.count("doc") == 3
+    await shutdown(first, second)
+    assert hub.owners == {}
+
+@pytest.mark.asyncio
+async def test_unix_socket_hub_keeps_one_owner_per_room(tmp_path):
+    path = str(tmp_path / "ws.sock")
+    hub, first, second = (UnixSocketBackplane(path) for _ in range(3))
+    for backplane in (hub, first, second):
+        await backplane.start(lambda *args: 0)
+    await wait_until(lambda: len(hub._peers) == 2)
+
+    assert await first.acquire("doc") == first.origin
+    assert await second.acquire("doc") == first.origin
+    assert await hub.acquire("doc") == first.origin
+    assert await hub.acquire("hub-doc") == hub.origin
+    first.release("doc")
+    await wait_until(lambda: "doc" not in hub._owners)
+    assert await second.acquire("doc") == second.origin
+
+    # The hub exits: its rooms are free, the others claim theirs again from the new hub
+    lost = []
+    second.on_lost = lost.append
+    await hub.stop()
+    await wait_until(lambda: (first.is_hub or second.is_hub) and first.connected and second.connected)
+    new_hub = first if first.is_hub else second
+    await wait_until(lambda: "doc" in new_hub._owners)
+    assert await first.acquire("doc") == second.origin
+    assert await first.acquire("hub-doc") == first.origin
+    assert lost == [] and second.owned == {"doc"}
+    await first.stop()
+    await second.stop()
+
+@pytest.mark.asyncio
+async def test_redis_leases_keep_one_owner_per_room():
+    server = await FakeRedisServer().start()
+    first, second = (RedisBackplane(server.url, "test:", reconnect_delay=0.05, lease_seconds=0.3) for _ in range(2))
+    for backplane in (first, second):
+        await backplane.start(lambda *args: 0)
+
+    assert await first.acquire("doc") == first.origin
+    assert await second.acquire("doc") == first.origin
+    # Renewed for as long as it is owned
+    await asyncio.sleep(0.6)
+    assert await second.acquire("doc") == first.origin
+    first.release("doc")
+    await wait_until(lambda: server.get(b"test:owner:doc") is None)
+    assert await second.acquire("doc") == second.origin
+
+    # An owner that stops renewing (hung, or its host went away) loses the room once the lease expires
+    lost = []
+    second.on_lost = lost.append
+    second._renewer.cancel()
+    await wait_until(lambda: server.get(b"test:owner:doc") is None)
+    assert await first.acquire("doc") == first.origin
+    second._renewer = asyncio.create_task(second._renew())
+    await wait_until(lambda: lost == ["doc"])
+    assert second.owned == set()
+    await first.stop()
+    await second.stop()
+    assert server.get(b"test:owner:doc") is None
+    await server.stop()
+
+def test_create_backplane_by_name(monkeypatch):
+    for mode, backend in [("memory", InProcessBackplane), ("unix", UnixSocketBackplane), ("redis", RedisBackplane)]:
+        monkeypatch.setattr(settings, "WS_BACKPLANE", mode)
+        assert isinstance(create_backplane(), backend)
+    monkeypatch.setattr(settings, "WS_BACKPLANE", "carrier-pigeon")
+    with pytest.raises(ValueError):
+        create_backplane()
@@ -0,0 +1,223 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app.services.batch_analysis import (
+    BatchAnalysisError,
+    BatchAnalyzer,
+    IgnoreRules,
+    collect_files,
+    extract_archive,
+    resolve_allowed_directory,
+)
+
+def write_tree(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content if isinstance(content, bytes) else content.encode("utf-8"))
+
+def test_ignore_rules_follow_gitignore_semantics():
+    rules = IgnoreRules()
+    rules.add_patterns(["# comment", "*.log", "/generated.py", "docs/build/", "!keep.log", "**/fixtures/*.json"])
+    rules.add_patterns(["local_*.py"], base="pkg")
+
+    assert rules.is_ignored("error.log")
+    assert rules.is_ignored("pkg/deep/error.log")
+    assert not rules.is_ignored("keep.log")
+    assert rules.is_ignored("generated.py")
+    assert not rules.is_ignored("pkg/generated.py")
+    assert rules.is_ignored("docs/build", is_dir=True)
+    assert not rules.is_ignored("docs/build")
+    assert rules.is_ignored("a/b/fixtures/data.json")
+    assert rules.is_ignored("pkg/local_settings.py")
+    assert not rules.is_ignored("local_settings.py")
+    assert rules.is_ignored("web/node_modules", is_dir=True)
+
+def test_collect_files_skips_ignored_and_dependency_paths(tmp_path):
+    write_tree(tmp_path, {
+        ".gitignore": "*.generated.js\nsecrets/\n",
+        "app/main.py": "x = 1\n",
+        "app/bundle.generated.js": "",
+        "app/.gitignore": "scratch.py\n",
+        "app/scratch.py": "",
+        "web/index.ts": "",
+        "web/node_modules/react/index.js": "",
+        "vendor/lib.py": "",
+        "secrets/keys.json": "{}",
+        "README.md": "# Project\n",
+        "logo.png": b"\x89PNG",
+    })
+    (tmp_path / "link.py").symlink_to(tmp_path / "app" / "main.py")
+
+    paths = [relative for relative, _, _ in collect_files(str(tmp_path))]
+
+    assert paths == ["README.md", "app/main.py", "web/index.ts"]
+
+def test_extract_archive_skips_unsafe_members(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("repo/app.py", "def f():\n    pass\n")
+        archive.writestr("repo/.gitignore", "*.log\n")
+        archive.writestr("../escape.py", "")
+        archive.writestr("/absolute.py", "")
+        archive.writestr("repo/image.png", "")
+        link = zipfile.ZipInfo("repo/link.py")
+        link.external_attr = 0o120777 << 16
+        archive.writestr(link, "/etc/passwd")
+    archive_path = tmp_path / "repo.zip"
+    archive_path.write_bytes(buffer.getvalue())
+    destination = tmp_path / "out"
+    destination.mkdir()
+
+    extracted = extract_archive(str(archive_path), str(destination), max_bytes=1024)
+
+    assert extracted == 2
+    assert sorted(p.relative_to(destination).as_posix() for p in destination.rglob("*") if p.is_file()) == [
+        "repo/.gitignore", "repo/app.py"
+    ]
+    assert not (tmp_path / "escape.py").exists()
+
+def test_extract_archive_limits_decompressed_size(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        data = b"#" * 10000
+        info = tarfile.TarInfo("big.py")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    archive_path = tmp_path / "repo.tar.gz"
+    archive_path.write_bytes(buffer.getvalue())
+
+    with pytest.raises(BatchAnalysisError):
+        extract_archive(str(archive_path), str(tmp_path), max_bytes=5000)
+
+    (tmp_path / "notes.txt").write_text("not an archive")
+    with pytest.raises(BatchAnalysisError):
+        extract_archive(str(tmp_path / "notes.txt"), str(tmp_path), max_bytes=5000)
+
+def test_resolve_allowed_directory(tmp_path):
+    allowed = tmp_path / "repos"
+    (allowed / "project").mkdir(parents=True)
+
+    assert resolve_allowed_directory(str(allowed / "project"), [str(allowed)]) == str((allowed / "project").resolve())
+    with pytest.raises(PermissionError):
+        resolve_allowed_directory(str(allowed / ".." / "other"), [str(allowed)])
+    with pytest.raises(PermissionError):
+        resolve_allowed_directory(str(allowed), [])
+    with pytest.raises(FileNotFoundError):
+        resolve_allowed_directory(str(allowed / "missing"), [str(allowed)])
+
+@pytest.mark.asyncio
+async def test_analyze_directory_streams_records_and_coverage(tmp_path):
+    files = {
+        f"pkg/module_{i}.py": f'def documented_{i}():\n    """Doc."""\n\ndef bare_{i}():\n    pass\n'
+        for i in range(12)
+    }
+    files.update({
+        "web/app.js": "/** Documented. */\nexport function run() {}\nclass Widget { render() {} }\n",
+        "broken.py": b"\xff\xfe not utf-8",
+        "big.py": "x = 1\n" * 100,
+        "README.md": "# Project\n",
+    })
+    write_tree(tmp_path, files)
+    analyzer = BatchAnalyzer(max_workers=2, max_file_bytes=500)
+
+    try:
+        records = [record async for record in analyzer.analyze_directory(str(tmp_path))]
+    finally:
+        analyzer.shutdown()
+
+    summary = records[-1]
+    by_path = {record["path"]: record for record in records[:-1]}
+
+    assert summary["type"] == "summary"
+    assert len(by_path) == len(files)
+    assert by_path["broken.py"]["type"] == "error"
+    assert by_path["big.py"]["type"] == "skipped"
+    assert by_path["web/app.js"]["documented"] == 1
+    assert by_path["pkg/module_0.py"]["code_structure"]["metrics"]["function_count"] == 2
+    assert summary["files"] == 14
+    assert summary["errors"] == 1
+    assert summary["skipped"] == 1
+    # 12 modules with 1 of 2 functions documented, plus run/render/Widget with only run documented
+    assert summary["documentable"] == 27
+    assert summary["documented"] == 13
+    assert summary["coverage"] == round(13 / 27, 4)
+    assert summary["languages"]["python"]["coverage"] == 0.5
+    assert summary["languages"]["markdown"]["files"] == 1
+    assert analyzer.get_stats()["files_analyzed"] == 14
+
+@pytest.mark.asyncio
+async def test_analyze_directory_truncates_to_max_files(tmp_path):
+    write_tree(tmp_path, {f"m{i}.py": "x = 1\n" for i in range(5)})
+    analyzer = BatchAnalyzer(max_workers=1, max_files=3)
+
+    try:
+        records = [record async for record in analyzer.analyze_directory(str(tmp_path))]
+    finally:
+        analyzer.shutdown()
+
+    assert len(records) == 4
+    assert records[-1]["truncated"]
+
+def test_worker_pool_is_not_forked_from_the_server():
+    analyzer = BatchAnalyzer(max_workers=1)
+    try:
+        assert analyzer._get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        analyzer.shutdown()
+
+def test_batch_endpoint_requires_the_project_owner(tmp_path, monkeypatch):
+    """Ownership is checked on the async session the app's get_db yields"""
+    import json
+
+    import sqlalchemy as sa
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    monkeypatch.setattr("app.services.grammar_service.language_tool_python.LanguageTool", lambda *args, **kwargs: None)
+    from app.api.endpoints import documentation
+    from app.core.config import settings
+    from app.core.security import create_access_token
+    from app.database import get_db
+    from app.models import Project, User
+
+    path = tmp_path / "app.db"
+    setup = sa.create_engine(f"sqlite:///{path}")
+    User.__table__.metadata.create_all(setup, tables=[User.__table__, Project.__table__])
+    with setup.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": "u1", "email": "owner@example.com", "hashed_password": "x", "is_active": True},
+            {"id": "u2", "email": "other@example.com", "hashed_password": "x", "is_active": True},
+        ])
+        connection.execute(Project.__table__.insert(), [
+            {"id": "p1", "name": "Mine", "owner_id": "u1"},
+            {"id": "p2", "name": "Theirs", "owner_id": "u2"},
+        ])
+    sessions = sessionmaker(bind=create_async_engine(f"sqlite+aiosqlite:///{path}"), class_=AsyncSession)
+
+    async def override_get_db():
+        async with sessions() as session:
+            yield session
+
+    async def records(root, project_id=None, documenter=None):
+        yield {"type": "summary", "project_id": project_id}
+
+    monkeypatch.setattr(documentation.batch_analyzer, "analyze_directory", records)
+    monkeypatch.setattr(settings, "BATCH_ANALYSIS_ALLOWED_ROOTS", str(tmp_path))
+    app = FastAPI()
+    app.include_router(documentation.router)
+    app.dependency_overrides[get_db] = override_get_db
+    headers = {"Authorization": f"Bearer {create_access_token('u1')}"}
+
+    with TestClient(app) as client:
+        assert client.post("/document/batch", data={"path": str(tmp_path)}).status_code == 401
+        response = client.post("/document/batch", data={"path": str(tmp_path), "project_id": "p2"}, headers=headers)
+        assert response.status_code == 404
+        response = client.post("/document/batch", data={"path": str(tmp_path), "project_id": "p1"}, headers=headers)
+        assert response.status_code == 200
+        assert [json.loads(line) for line in response.text.splitlines()] == [{"type": "summary", "project_id": "p1"}]
@@ -0,0 +1,124 @@
+import difflib
+import random
+
+from app.services import diff_engine
+from app.services.diff_engine import DiffCache, diff_texts, get_opcodes, matching_blocks, word_diff
+from app.services.document_service import DocumentCollaboration
+
+def random_pair(rng):
+    alphabet = "abcde"[:rng.randint(1, 5)]
+    a = [rng.choice(alphabet) for _ in range(rng.randint(0, 30))]
+    b = list(a)
+    for _ in range(rng.randint(0, 8)):
+        action = rng.random()
+        if action < 0.4 and b:
+            b[rng.randrange(len(b))] = rng.choice(alphabet)
+        elif action < 0.7:
+            b.insert(rng.randint(0, len(b)), rng.choice(alphabet))
+        elif b:
+            del b[rng.randrange(len(b))]
+    return a, b
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+def test_opcodes_transform_old_into_new():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a, b = random_pair(rng)
+        rebuilt, i, j = [], 0, 0
+        for tag, i1, i2, j1, j2 in get_opcodes(a, b):
+            assert (i1, j1) == (i, j)
+            if tag == "equal":
+                assert a[i1:i2] == b[j1:j2]
+            rebuilt.extend(b[j1:j2])
+            i, j = i2, j2
+        assert (i, j) == (len(a), len(b))
+        assert rebuilt == b
+
+def test_myers_fallback_finds_a_minimal_diff(monkeypatch):
+    monkeypatch.setattr(diff_engine, "_unique_anchors", lambda *args: [])
+    rng = random.Random(1)
+    for _ in range(1000):
+        a, b = random_pair(rng)
+        assert sum(size for _, _, size in matching_blocks(a, b)) == lcs_length(a, b)
+
+def test_patience_aligns_unique_lines_in_repetitive_text():
+    section = ["\n", "- item\n", "\n", "- item\n", "\n"]
+    old = ["## Intro\n"] + section + ["## Usage\n"] + section + ["## End\n"]
+    new = ["## Usage\n"] + section + ["## Intro\n"] + section + ["## End\n"]
+    matched = {(i + k, j + k) for i, j, size in matching_blocks(old, new) for k in range(size)}
+    # Unique headings anchor the alignment instead of the blank lines and list markers around them
+    assert (6, 0) in matched
+    assert (12, 12) in matched
+
+def test_unified_output_and_stats():
+    old = "".join(f"line {i}\n" for i in range(20))
+    new = old.replace("line 3\n", "line three\n").replace("line 15\n", "") + "line 20\n"
+    result = diff_texts(old, new)
+
+    expected = difflib.unified_diff(
+        old.splitlines(), new.splitlines(), fromfile="old", tofile="new", lineterm=""
+    )
+    assert result.unified() == "\n".join(expected)
+    assert result.stats == {"added": 1, "removed": 1, "modified": 1}
+    assert [(h["old_start"], h["old_count"], h["new_start"], h["new_count"]) for h in result.hunks] == [
+        (1, 7, 1, 7), (13, 8, 13, 8)
+    ]
+    assert result.hunks[0]["word_changes"][0]["segments"] == [
+        ("equal", "line "), ("delete", "3"), ("insert", "three"), ("equal", "\n")
+    ]
+    assert diff_texts(old, old).unified() == ""
+    assert diff_texts(old, old).hunks == []
+
+def test_word_diff_keeps_whitespace_and_punctuation():
+    segments = word_diff("The quick brown fox.", "The quick red fox!")
+    assert segments == [
+        ("equal", "The quick "), ("delete", "brown"), ("insert", "red"),
+        ("equal", " fox"), ("delete", "."), ("insert", "!")
+    ]
+
+def test_cache_computes_each_pair_once(monkeypatch):
+    cache = DiffCache(max_entries=2)
+    calls = []
+    original = diff_engine.diff_texts
+    monkeypatch.setattr(diff_engine, "diff_texts", lambda old, new: calls.append(1) or original(old, new))
+
+    first = cache.get_or_compute("v1", "v2", "a\n", "b\n")
+    assert cache.get_or_compute("v1", "v2", "a\n", "b\n") is first
+    cache.get_or_compute("v2", "v1", "b\n", "a\n")
+    cache.get_or_compute("v1", "v3", "a\n", "c\n")
+
+    assert len(calls) == 3
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["evictions"] == 1
+
+def test_collaboration_diff_hit_does_not_rebuild_versions(monkeypatch):
+    collaboration = DocumentCollaboration("doc-1")
+    old = collaboration.add_version("a\nb\n", "alice")
+    new = collaboration.add_version("a\nc\n", "bob")
+    first = collaboration.get_version_diff(old.version_id, new.version_id)
+
+    rebuilds = []
+    original = collaboration.chain.get
+    monkeypatch.setattr(collaboration.chain, "get", lambda index: rebuilds.append(index) or original(index))
+    assert collaboration.get_version_diff(old.version_id, new.version_id) == first
+    assert rebuilds == []
+
+def test_collaboration_version_diff():
+    collaboration = DocumentCollaboration("doc-1")
+    old = collaboration.add_version("# Title\n\nFirst draft.\n", "alice")
+    new = collaboration.add_version("# Title\n\nSecond draft.\n\nMore text.\n", "bob")
+
+    diff = collaboration.get_version_diff(old.version_id, new.version_id)
+
+    assert diff["changes"] == {"added": 0, "removed": 0, "modified": 1}
+    assert "-First draft." in diff["diff"]
+    assert diff["hunks"][0]["word_changes"][0]["segments"][:2] == [("delete", "First"), ("insert", "Second")]
+    assert collaboration.get_version_diff(old.version_id, "missing") == {"error": "One or both versions not found"}
@@ -0,0 +1,78 @@
+import tempfile
+
+import pytest
+
+from app.services.document_service import DocumentService, DocumentTooLargeError, read_text
+from app.services.llm_cache import LLMResponseCache
+
+async def chunked(data: bytes, size: int, consumed: list = None):
+    for start in range(0, len(data), size):
+        if consumed is not None:
+            consumed.append(start)
+        yield data[start:start + size]
+
+@pytest.mark.asyncio
+async def test_multibyte_characters_split_across_chunks():
+    text = "def größe():\n    return '€ and 🙂'\n" * 50
+    data = text.encode("utf-8")
+
+    for size in (1, 2, 3, 7, 64):
+        assert await read_text(chunked(data, size), max_bytes=len(data)) == text
+    assert await read_text(data, max_bytes=len(data)) == text
+    assert await read_text(text, max_bytes=len(data)) == text
+
+@pytest.mark.asyncio
+async def test_size_limit_is_enforced_while_reading():
+    data = b"x" * 10000
+    consumed = []
+
+    with pytest.raises(DocumentTooLargeError):
+        await read_text(chunked(data, 1000, consumed), max_bytes=2500)
+    # Reading stops at the chunk that crosses the limit
+    assert len(consumed) == 3
+
+    with pytest.raises(DocumentTooLargeError):
+        await read_text(data, max_bytes=2500)
+    with pytest.raises(DocumentTooLargeError):
+        await read_text("€" * 1000, max_bytes=2500)
+    assert await read_text("€" * 800, max_bytes=2500) == "€" * 800
+
+@pytest.mark.asyncio
+async def test_invalid_utf8_is_a_value_error():
+    with pytest.raises(ValueError, match="UTF-8"):
+        await read_text(chunked(b"ok \xff\xfe", 2), max_bytes=100)
+    # Truncated multi-byte sequence at the end of the stream
+    with pytest.raises(ValueError, match="UTF-8"):
+        await read_text(chunked("é".encode("utf-8")[:1], 1), max_bytes=100)
+
+@pytest.mark.asyncio
+async def test_process_source_never_touches_disk(monkeypatch):
+    service = DocumentService(analysis_cache=LLMResponseCache(max_entries=10))
+
+    async def fake_documentation(**kwargs):
+        return "Generated documentation"
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("temporary file created")
+
+    monkeypatch.setattr(service, "_generate_documentation", fake_documentation)
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", no_temp_files)
+    monkeypatch.setattr(tempfile, "SpooledTemporaryFile", no_temp_files)
+    source = b'class Greeter:\n    """Says hello."""\n'
+
+    streamed = await service.process_source(chunked(source, 5), "greeter.py")
+    in_memory = await service.process_source(source.decode("utf-8"), "greeter.py")
+
+    assert streamed["file_path"] == "greeter.py"
+    assert streamed["code_structure"]["classes"][0]["name"] == "Greeter"
+    assert streamed["version_hash"] == in_memory["version_hash"]
+    assert streamed["documentation"] == "Generated documentation"
+
+@pytest.mark.asyncio
+async def test_process_source_rejects_before_processing():
+    service = DocumentService(analysis_cache=LLMResponseCache(max_entries=10))
+
+    with pytest.raises(ValueError, match="Unsupported"):
+        await service.process_source("<html></html>", "page.html")
+    with pytest.raises(DocumentTooLargeError):
+        await service.process_source(chunked(b"x = 1\n" * 100, 64), "big.py", max_bytes=100)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from app.services.embedding_cache import DiskEmbeddingStore, EmbeddingCache
+from app.services.similarity_engine import BatchSimilarityEngine
+from tests.test_similarity_engine import FakeModel
+
+def test_lru_eviction_and_counters():
+    """Least recently used entries are evicted once the cache is full"""
+    cache = EmbeddingCache("test-model", max_entries=2)
+    vectors = np.eye(3, dtype=np.float32)
+    cache.put_many(["a", "b"], vectors[:2])
+    cache.get_many(["a"])  # 'a' becomes most recently used
+    cache.put_many(["c"], vectors[2:])
+
+    a, b, c = cache.get_many(["a", "b", "c"])
+    assert b is None
+    assert np.allclose(a, vectors[0]) and np.allclose(c, vectors[2])
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+def test_keys_include_model_name():
+    assert EmbeddingCache("model-a").key("text") != EmbeddingCache("model-b").key("text")
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Vectors written to the disk tier are readable by a fresh cache"""
+    vectors = np.random.default_rng(0).standard_normal((5, 8)).astype(np.float32)
+    texts = [f"def f{i}():" for i in range(5)]
+    EmbeddingCache("test-model", directory=str(tmp_path)).put_many(texts, vectors)
+
+    reopened = EmbeddingCache("test-model", directory=str(tmp_path))
+    results = reopened.get_many(texts)
+
+    assert all(r is not None for r in results)
+    assert np.allclose(np.stack(results), vectors.astype(np.float16), atol=1e-3)
+    assert reopened.get_stats()["disk_hits"] == 5
+
+def test_engine_only_encodes_misses():
+    """Re-scoring unchanged elements does not call the model for them again"""
+    model = FakeModel()
+    engine = BatchSimilarityEngine(model, cache=EmbeddingCache("fake"))
+    elements = ["def a():", "def b():", "def a():"]
+
+    first = engine.score(elements, "docs")
+    calls_after_first = len(model.calls)
+    second = engine.score(elements + ["def c():"], "docs")
+
+    assert model.calls[1]["texts"] == ["def a():", "def b():"]
+    assert len(model.calls) == calls_after_first + 1
+    assert model.calls[-1]["texts"] == ["def c():"]
+    assert np.allclose(first, second[:3], atol=1e-3)
+
+def test_disk_batch_is_appended_in_one_write(tmp_path, monkeypatch):
+    store = DiskEmbeddingStore(str(tmp_path))
+    vectors = np.random.default_rng(1).standard_normal((4, 8)).astype(np.float32)
+    store.put("a", vectors[0])
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda path, *args, **kwargs: opened.append(path) or real_open(path, *args, **kwargs))
+    store.put_many(["a", "b", "c", "b"], vectors[:4])
+    monkeypatch.undo()
+
+    assert len(opened) == 2
+    assert (store.rows["b"], store.rows["c"]) == (1, 2)
+    reopened = DiskEmbeddingStore(str(tmp_path))
+    assert len(reopened) == 3
+    assert np.allclose(reopened.get("c"), vectors[2].astype(np.float16))
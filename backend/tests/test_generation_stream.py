@@ -0,0 +1,93 @@
+import gc
+import json
+import time
+
+import pytest
+
+from app.services.generation_stream import relay_generation
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import LLMGateway
+from tests.fake_llm_provider import FakeLLMProvider
+
+class RecordingManager:
+    """Stand-in for ConnectionManager that records broadcasts."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def broadcast(self, document_id, message, **kwargs):
+        self.messages.append((document_id, message))
+
+def parse_sse(events):
+    parsed = []
+    for event in events:
+        lines = event.strip().split("\n")
+        parsed.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return parsed
+
+async def deltas(*parts):
+    for part in parts:
+        yield part
+
+@pytest.mark.asyncio
+async def test_relay_streams_chunks_then_completes():
+    manager = RecordingManager()
+    saved = []
+
+    async def save(text):
+        saved.append(text)
+        return {"document_id": "doc-1", "analysis": {"word_count": 3}}
+
+    events = [e async for e in relay_generation(deltas("# SRS", "\nIntro", " text"), save, "doc-1", manager)]
+
+    parsed = parse_sse(events)
+    assert [name for name, _ in parsed] == ["chunk", "chunk", "chunk", "complete"]
+    assert parsed[1][1] == {"index": 1, "delta": "\nIntro"}
+    assert parsed[-1][1]["document_id"] == "doc-1"
+    assert saved == ["# SRS\nIntro text"]
+    types = [message["type"] for _, message in manager.messages]
+    assert types == ["generation_chunk"] * 3 + ["generation_complete"]
+    assert all(document_id == "doc-1" for document_id, _ in manager.messages)
+
+@pytest.mark.asyncio
+async def test_relay_reports_errors():
+    manager = RecordingManager()
+
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream failed")
+
+    async def save(text):
+        raise AssertionError("should not persist a failed generation")
+
+    events = parse_sse([e async for e in relay_generation(failing(), save, "doc-1", manager)])
+
+    assert events[-1] == ("error", {"detail": "upstream failed"})
+    assert manager.messages[-1][1]["type"] == "generation_error"
+
+@pytest.mark.asyncio
+async def test_gateway_stream_yields_before_generation_finishes():
+    """The first delta arrives long before the whole completion is done"""
+    async with FakeLLMProvider(chunk_delay=0.05) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url, cache=LLMResponseCache())
+        messages = [{"role": "user", "content": "one two three four five six seven eight"}]
+
+        # Keep a collection of the whole suite's garbage out of the timing
+        gc.collect()
+        start = time.perf_counter()
+        first_delta_at = None
+        streamed = []
+        async for delta in gateway.stream(messages, model="gpt-4"):
+            if first_delta_at is None:
+                first_delta_at = time.perf_counter() - start
+            streamed.append(delta)
+        total = time.perf_counter() - start
+
+        replayed = [delta async for delta in gateway.stream(messages, model="gpt-4")]
+
+    assert "".join(streamed) == "echo: one two three four five six seven eight"
+    assert len(streamed) == 9
+    assert first_delta_at < total / 3
+    # The completed stream is cached and replayed in one piece
+    assert replayed == ["".join(streamed)]
+    assert len(provider.requests) == 1
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import JobQueue, JobStatus, JobStore
+
+class RecordingManager:
+    def __init__(self):
+        self.messages = []
+
+    async def broadcast(self, channel, message, **kwargs):
+        self.messages.append((channel, message))
+
+def make_queue(path, manager=None, **kwargs):
+    options = {"workers": 2, "poll_interval": 0.05, "lease_seconds": 1.0}
+    options.update(kwargs)
+    return JobQueue(path=str(path), manager=manager or RecordingManager(), **options)
+
+async def wait_for_status(queue, job_id, status, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {status}: {job['status']}")
+
+@pytest.mark.asyncio
+async def test_job_runs_and_pushes_completion(tmp_path):
+    manager = RecordingManager()
+    queue = make_queue(tmp_path / "jobs.db", manager)
+
+    @queue.register("echo")
+    async def echo(payload):
+        return {"echo": payload["text"]}
+
+    await queue.start()
+    try:
+        job = await queue.submit("echo", {"text": "hello"}, owner="user-1")
+        assert job["status"] == JobStatus.QUEUED
+        done = await wait_for_status(queue, job["id"], JobStatus.DONE)
+        for _ in range(100):
+            if manager.messages:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+
+    assert done["result"] == {"echo": "hello"}
+    assert done["attempts"] == 1
+    channel, message = manager.messages[-1]
+    assert channel == f"job:{job['id']}"
+    assert message["type"] == "job_update" and message["status"] == "done"
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(tmp_path):
+    queue = make_queue(tmp_path / "jobs.db")
+
+    @queue.register("boom")
+    async def boom(payload):
+        raise RuntimeError("LLM unavailable")
+
+    await queue.start()
+    try:
+        job = await queue.submit("boom", {})
+        failed = await wait_for_status(queue, job["id"], JobStatus.FAILED)
+    finally:
+        await queue.stop()
+
+    assert failed["error"] == "LLM unavailable"
+
+@pytest.mark.asyncio
+async def test_jobs_survive_worker_restart(tmp_path):
+    path = tmp_path / "jobs.db"
+    # A previous process queued one job and died while running another
+    store = JobStore(str(path))
+    orphaned = store.enqueue("echo", {"text": "orphaned"})
+    assert store.claim("dead-worker")["id"] == orphaned["id"]
+    queued = store.enqueue("echo", {"text": "queued"})
+    store.close()
+
+    queue = make_queue(path, lease_seconds=0.3)
+
+    @queue.register("echo")
+    async def echo(payload):
+        return {"echo": payload["text"]}
+
+    await queue.start()
+    try:
+        first = await wait_for_status(queue, queued["id"], JobStatus.DONE)
+        second = await wait_for_status(queue, orphaned["id"], JobStatus.DONE)
+    finally:
+        await queue.stop()
+
+    assert first["result"] == {"echo": "queued"}
+    assert second["result"] == {"echo": "orphaned"}
+    assert second["attempts"] == 2
+
+@pytest.mark.asyncio
+async def test_stop_hands_running_job_back_to_queue(tmp_path):
+    queue = make_queue(tmp_path / "jobs.db", workers=1)
+    started = asyncio.Event()
+
+    @queue.register("slow")
+    async def slow(payload):
+        started.set()
+        await asyncio.sleep(60)
+
+    await queue.start()
+    job = await queue.submit("slow", {})
+    await asyncio.wait_for(started.wait(), timeout=5)
+    await queue.stop()
+
+    job = await queue.get(job["id"])
+    assert job["status"] == JobStatus.QUEUED
+    assert job["attempts"] == 0
@@ -0,0 +1,147 @@
+from app.services.document_service import DocumentService
+from app.services.js_analyzer import analyze_javascript
+
+def by_name(items):
+    return {item["name"]: item for item in items}
+
+def test_jsdoc_attaches_only_to_the_next_declaration():
+    source = (
+        "/** Documented. */\n"
+        "function documented() {}\n"
+        "function undocumented() {}\n"
+        "/** Stray comment */\n"
+        "const value = 1;\n"
+        "function afterStatement() {}\n"
+    )
+    functions = by_name(analyze_javascript(source)["functions"])
+
+    assert functions["documented"]["docstring"] == "Documented."
+    assert not functions["undocumented"]["has_docstring"]
+    assert not functions["afterStatement"]["has_docstring"]
+
+def test_arrow_functions_expressions_and_exports():
+    source = (
+        "/**\n * Adds.\n * @returns {number}\n */\n"
+        "export const add = (a, b) => a + b;\n"
+        "const inc = async x => x + 1;\n"
+        "let legacy = function () { return 1; };\n"
+        "export default function () {}\n"
+        "export { inc as increment, legacy };\n"
+    )
+    result = analyze_javascript(source)
+    functions = by_name(result["functions"])
+
+    assert functions["add"]["type"] == "arrow_function"
+    assert functions["add"]["exported"]
+    assert functions["add"]["docstring"] == "Adds.\n@returns {number}"
+    assert functions["add"]["line"] == 5
+    assert functions["inc"]["type"] == "arrow_function"
+    assert functions["legacy"]["type"] == "function"
+    assert "default" in functions
+    assert [e["name"] for e in result["exports"]] == ["add", "default", "increment", "legacy"]
+
+def test_classes_and_methods():
+    source = (
+        "/** A widget. */\n"
+        "export class Widget extends Base {\n"
+        "  state = { open: false }\n"
+        "  /** Toggles. */\n"
+        "  toggle = () => { this.open = !this.open; }\n"
+        "  static create() { return new Widget(); }\n"
+        "  async load(url) { const data = fetch(url); return data; }\n"
+        "  get size() { return 1 }\n"
+        "  *ids() { yield 1 }\n"
+        "}\n"
+    )
+    result = analyze_javascript(source)
+    widget = result["classes"][0]
+    methods = by_name(widget["methods"])
+
+    assert widget["name"] == "Widget"
+    assert widget["docstring"] == "A widget."
+    assert widget["exported"]
+    assert set(methods) == {"toggle", "create", "load", "size", "ids"}
+    assert methods["toggle"]["docstring"] == "Toggles."
+    assert methods["load"]["line"] == 7
+    # Calls inside method bodies are not methods
+    assert "fetch" not in by_name(result["functions"])
+    assert result["metrics"]["method_count"] == 5
+
+def test_strings_templates_regexes_and_comments_are_skipped():
+    source = (
+        "const a = 'class Fake { function fake() {} }';\n"
+        "const b = `function inTemplate() { ${ { nested: `class X {` }.nested } }`;\n"
+        "const c = /function inRegex\\(\\)[/]/g.test(a) ? 1 : 2 / 3;\n"
+        "// function inComment() {}\n"
+        "/* class InComment {} */\n"
+        "function real() { return '}'; }\n"
+        "class After { method() {} }\n"
+    )
+    result = analyze_javascript(source)
+
+    assert [f["name"] for f in result["functions"]] == ["real", "method"]
+    assert [c["name"] for c in result["classes"]] == ["After"]
+    assert result["classes"][0]["line"] == 7
+
+def test_imports_and_requires():
+    source = (
+        "import React, { useState } from 'react';\n"
+        "import './styles.css';\n"
+        "const fs = require(\"fs\");\n"
+        "const url = import.meta.url;\n"
+        "const lazy = import('./lazy');\n"
+        "export * from './reexported';\n"
+    )
+    modules = [i["module"] for i in analyze_javascript(source)["imports"]]
+
+    assert modules == ["react", "./styles.css", "fs", "./lazy", "./reexported"]
+
+def test_typescript_annotations_decorators_and_modifiers():
+    source = (
+        "export interface Props { onClick(): void }\n"
+        "/** Formats. */\n"
+        "export const format = (value: number, digits = 2): string => value.toFixed(digits);\n"
+        "/** Service. */\n"
+        "@Injectable({ providedIn: 'root' })\n"
+        "export abstract class Service<T> implements Base {\n"
+        "  private readonly cache = new Map<string, T>();\n"
+        "  constructor(private http: Http) {}\n"
+        "  /** Fetches. */\n"
+        "  public async fetch(id: string): Promise<T> { return this.http.get(`/items/${id}`); }\n"
+        "  protected abstract build(): T;\n"
+        "}\n"
+        "export enum Color { Red, Green }\n"
+    )
+    result = analyze_javascript(source, "typescript")
+    functions = by_name(result["functions"])
+    service = result["classes"][0]
+
+    assert result["language"] == "typescript"
+    assert functions["format"]["docstring"] == "Formats."
+    assert service["name"] == "Service"
+    assert service["docstring"] == "Service."
+    assert [m["name"] for m in service["methods"]] == ["constructor", "fetch", "build"]
+    assert by_name(service["methods"])["fetch"]["docstring"] == "Fetches."
+    # Interface members are not functions
+    assert "onClick" not in functions
+    assert [e["name"] for e in result["exports"]] == ["Props", "format", "Service", "Color"]
+
+def test_minified_source():
+    source = (
+        "import{a}from\"./a\";class B extends a{run(){return 1}stop(){}}"
+        "function c(d){return d/2}const e=f=>f*2;export{c,e};"
+    )
+    result = analyze_javascript(source)
+
+    assert [f["name"] for f in result["functions"]] == ["run", "stop", "c", "e"]
+    assert result["classes"][0]["name"] == "B"
+    assert [e["name"] for e in result["exports"]] == ["c", "e"]
+    assert all(f["line"] == 1 for f in result["functions"])
+
+def test_document_service_uses_tokenizer():
+    service = DocumentService()
+    structure = service._analyze_code_structure("/** Doc. */\nexport function f() {}\n", ".ts")
+
+    assert structure["language"] == "typescript"
+    assert structure["functions"][0]["has_docstring"]
+    assert structure["metrics"]["docstring_coverage"] == 1.0
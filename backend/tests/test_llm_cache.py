@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from app.services.llm_cache import LLMResponseCache, make_cache_key
+from app.services.llm_gateway import LLMGateway
+from tests.fake_llm_provider import FakeLLMProvider
+
+MESSAGES = [
+    {"role": "system", "content": "You are a technical writer."},
+    {"role": "user", "content": "Generate an SRS for project X"}
+]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_key_ignores_insignificant_whitespace_only():
+    reformatted = [
+        {"role": "system", "content": "You are a technical writer.   \r\n"},
+        {"role": "User", "content": "\nGenerate an SRS for project X  "}
+    ]
+    assert make_cache_key("gpt-4", 0.7, MESSAGES, 2000) == make_cache_key("gpt-4", 0.7, reformatted, 2000)
+    assert make_cache_key("gpt-4", 0.7, MESSAGES, 2000) != make_cache_key("gpt-4", 0.2, MESSAGES, 2000)
+    assert make_cache_key("gpt-4", 0.7, MESSAGES, 2000) != make_cache_key("gpt-3.5", 0.7, MESSAGES, 2000)
+    changed = [MESSAGES[0], {"role": "user", "content": "Generate an SRS for project Y"}]
+    assert make_cache_key("gpt-4", 0.7, MESSAGES, 2000) != make_cache_key("gpt-4", 0.7, changed, 2000)
+
+def test_ttl_and_lru_eviction():
+    clock = FakeClock()
+    cache = LLMResponseCache(max_entries=2, ttl=60, clock=clock)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # 'a' becomes most recently used
+    cache.put("c", "C")
+    assert cache.get("b") is None
+
+    clock.now += 61
+    assert cache.get("a") is None
+
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["expired"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "llm.db")
+    LLMResponseCache(path=path).put("key", "persisted response")
+
+    reopened = LLMResponseCache(path=path)
+    assert reopened.get("key") == "persisted response"
+    assert reopened.get_stats()["disk_hits"] == 1
+
+def test_sqlite_tier_honours_ttl(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "llm.db")
+    LLMResponseCache(path=path, ttl=60, clock=clock).put("key", "old response")
+
+    clock.now += 120
+    reopened = LLMResponseCache(path=path, ttl=60, clock=clock)
+    assert reopened.get("key") is None
+    assert len(reopened.disk) == 0
+
+@pytest.mark.asyncio
+async def test_async_access_keeps_sqlite_io_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm.db")
+    cache = LLMResponseCache(path=path)
+    loop_thread = threading.get_ident()
+    disk_threads = []
+    for name in ("get", "put"):
+        original = getattr(cache.disk, name)
+        def spy(*args, original=original):
+            disk_threads.append(threading.get_ident())
+            return original(*args)
+        monkeypatch.setattr(cache.disk, name, spy)
+
+    assert await cache.aget("key") is None
+    await cache.aput("key", "response")
+    assert await cache.aget("key") == "response"  # served from memory, no disk read
+
+    assert len(disk_threads) == 2 and loop_thread not in disk_threads
+    assert LLMResponseCache(path=path).get("key") == "response"
+
+@pytest.mark.asyncio
+async def test_gateway_serves_repeated_prompts_from_cache():
+    async with FakeLLMProvider() as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url, cache=LLMResponseCache())
+        first = await gateway.complete(MESSAGES, model="gpt-4")
+        second = await gateway.complete(MESSAGES, model="gpt-4")
+        bypassed = await gateway.complete(MESSAGES, model="gpt-4", use_cache=False)
+
+    assert first == second == bypassed == "echo: Generate an SRS for project X"
+    assert len(provider.requests) == 2
+    stats = gateway.get_stats()["cache"]
+    assert stats["hits"] == 1
+    assert stats["bypassed"] == 1
+    assert stats["hit_rate"] == 0.5
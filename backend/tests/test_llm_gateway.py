@@ -0,0 +1,159 @@
+import asyncio
+import gc
+import time
+
+import pytest
+
+from app.services.llm_gateway import (
+    ClientDisconnectedError,
+    LLMGateway,
+    LLMTimeoutError,
+    cancel_on_disconnect,
+)
+from tests.fake_llm_provider import FakeLLMProvider
+
+MESSAGES = [{"role": "user", "content": "Generate an SRS"}]
+
+class FakeRequest:
+    """Stand-in for a Starlette request whose client disconnects after a delay."""
+
+    def __init__(self, disconnect_after: float, once=lambda: True):
+        self.disconnect_at = time.perf_counter() + disconnect_after
+        self.once = once
+
+    async def is_disconnected(self):
+        return time.perf_counter() >= self.disconnect_at and self.once()
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    """Return the worst scheduling delay seen by a ticker task."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+@pytest.mark.asyncio
+async def test_complete_returns_message_content():
+    async with FakeLLMProvider() as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        content = await gateway.complete(MESSAGES, model="gpt-4")
+
+    assert content == "echo: Generate an SRS"
+    assert provider.requests[0]["model"] == "gpt-4"
+    assert gateway.get_stats()["completed"] == 1
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_under_100_generations():
+    """100 concurrent generations neither block the loop nor exceed the concurrency cap"""
+    # Collect garbage left by earlier tests so a full collection is not what gets measured
+    gc.collect()
+    async with FakeLLMProvider(delay=0.2) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url, max_concurrency=20)
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+
+        results = await asyncio.gather(*(
+            gateway.complete([{"role": "user", "content": str(i)}], model="gpt-4")
+            for i in range(100)
+        ))
+        stop.set()
+        worst_lag = await lag_task
+
+    assert sorted(results) == sorted(f"echo: {i}" for i in range(100))
+    assert provider.peak_active <= 20
+    assert worst_lag < 0.1
+
+@pytest.mark.asyncio
+async def test_timeout_raises():
+    async with FakeLLMProvider(delay=1.0) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        with pytest.raises(LLMTimeoutError):
+            await gateway.complete(MESSAGES, model="gpt-4", timeout=0.1)
+
+    assert gateway.get_stats()["timeouts"] == 1
+    assert gateway.get_stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_upstream_call():
+    async with FakeLLMProvider(delay=5.0) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        with pytest.raises(ClientDisconnectedError):
+            await cancel_on_disconnect(
+                # Disconnect only once the call has reached the provider
+                FakeRequest(disconnect_after=0.1, once=lambda: provider.active),
+                gateway.complete(MESSAGES, model="gpt-4"),
+                poll_interval=0.02
+            )
+        for _ in range(50):
+            if provider.cancelled:
+                break
+            await asyncio.sleep(0.02)
+
+    assert provider.cancelled == 1
+    assert gateway.get_stats()["cancelled"] == 1
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_upstream_call():
+    async with FakeLLMProvider(delay=0.2) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        results = await asyncio.gather(*(gateway.complete(MESSAGES, model="gpt-4") for _ in range(10)))
+        different = await gateway.complete([{"role": "user", "content": "Generate an SDS"}], model="gpt-4")
+
+    assert results == ["echo: Generate an SRS"] * 10
+    assert different == "echo: Generate an SDS"
+    assert len(provider.requests) == 2
+    stats = gateway.get_stats()
+    assert stats["coalesced"] == 9
+    assert stats["distinct_in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_upstream_call_survives_until_last_waiter_leaves():
+    async with FakeLLMProvider(delay=0.3) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        waiters = [asyncio.create_task(gateway.complete(MESSAGES, model="gpt-4")) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        waiters[0].cancel()
+        waiters[1].cancel()
+
+        assert await waiters[2] == "echo: Generate an SRS"
+        assert provider.cancelled == 0
+        assert len(provider.requests) == 1
+
+@pytest.mark.asyncio
+async def test_upstream_call_cancelled_when_every_waiter_leaves():
+    async with FakeLLMProvider(delay=5.0) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        waiters = [asyncio.create_task(gateway.complete(MESSAGES, model="gpt-4")) for _ in range(3)]
+        # Cancel only once the shared call has reached the provider
+        for _ in range(100):
+            if provider.active:
+                break
+            await asyncio.sleep(0.02)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        for _ in range(50):
+            if provider.cancelled:
+                break
+            await asyncio.sleep(0.02)
+
+    assert provider.cancelled == 1
+    assert gateway.get_stats()["cancelled"] == 1
+    assert gateway.get_stats()["distinct_in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_request_after_cancellation_does_not_join_the_cancelled_call():
+    async with FakeLLMProvider(delay=0.2) as provider:
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url)
+        waiter = asyncio.create_task(gateway.complete(MESSAGES, model="gpt-4"))
+        for _ in range(100):
+            if provider.active:
+                break
+            await asyncio.sleep(0.02)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        # The cancelled call may still be unwinding; this one starts afresh
+        assert await gateway.complete(MESSAGES, model="gpt-4") == "echo: Generate an SRS"
+        assert gateway.get_stats()["coalesced"] == 0
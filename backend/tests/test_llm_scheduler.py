@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_gateway import LLMGateway
+from app.services.llm_scheduler import (
+    BATCH,
+    INTERACTIVE,
+    LLMScheduler,
+    current_request_context,
+    llm_request_context,
+    stream_in_context,
+)
+from tests.fake_llm_provider import FakeLLMProvider
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+async def run_jobs(scheduler, jobs, hold=0.01):
+    """Run (label, tenant, priority, cost) jobs through the scheduler and return labels in admission order."""
+    order = []
+
+    async def job(label, tenant, priority, cost):
+        async with scheduler.slot(cost, tenant=tenant, priority=priority):
+            order.append(label)
+            await asyncio.sleep(hold)
+
+    await asyncio.gather(*(job(*spec) for spec in jobs))
+    return order
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    scheduler = LLMScheduler(max_concurrency=3, tokens_per_minute=0)
+    peak = 0
+
+    async def job():
+        nonlocal peak
+        async with scheduler.slot(10):
+            peak = max(peak, scheduler.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(job() for _ in range(20)))
+
+    assert peak == 3
+    assert scheduler.in_flight == 0
+    assert scheduler.waiting == 0
+
+@pytest.mark.asyncio
+async def test_heavy_tenant_does_not_starve_light_tenant():
+    """A light user's calls are admitted alongside a user who queued 200"""
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0)
+    jobs = [(f"heavy-{i}", "heavy", BATCH, 100) for i in range(200)]
+    jobs += [(f"light-{i}", "light", BATCH, 100) for i in range(3)]
+
+    order = await run_jobs(scheduler, jobs, hold=0)
+
+    light_positions = [order.index(f"light-{i}") for i in range(3)]
+    # The heavy user's first call was admitted before the light user queued; after that they alternate
+    assert light_positions == [1, 3, 5]
+
+@pytest.mark.asyncio
+async def test_tenant_weights_scale_share():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0)
+    scheduler.set_tenant_weight("gold", 3.0)
+    jobs = [(f"gold-{i}", "gold", BATCH, 100) for i in range(30)]
+    jobs += [(f"basic-{i}", "basic", BATCH, 100) for i in range(30)]
+
+    order = await run_jobs(scheduler, jobs, hold=0)
+
+    first_twenty = order[:20]
+    gold = sum(label.startswith("gold") for label in first_twenty)
+    assert 14 <= gold <= 16
+
+@pytest.mark.asyncio
+async def test_interactive_is_preferred_but_batch_is_not_starved():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0, class_weights={INTERACTIVE: 4.0, BATCH: 1.0})
+    jobs = [(f"batch-{i}", "a", BATCH, 100) for i in range(20)]
+    jobs += [(f"interactive-{i}", "b", INTERACTIVE, 100) for i in range(20)]
+
+    order = await run_jobs(scheduler, jobs, hold=0)
+
+    first_ten = order[:10]
+    interactive = sum(label.startswith("interactive") for label in first_ten)
+    assert interactive >= 7
+    assert any(label.startswith("batch") for label in first_ten[1:])
+
+@pytest.mark.asyncio
+async def test_token_budget_delays_dispatch():
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, tokens_per_minute=600, clock=clock)
+
+    await scheduler.acquire(500)
+    blocked = asyncio.create_task(scheduler.acquire(500))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert scheduler.waiting == 1
+
+    # 40 seconds refill 400 tokens, enough for the waiting call once a slot is released
+    clock.now = 40.0
+    scheduler.release(500)
+    await asyncio.wait_for(blocked, timeout=1.0)
+    assert scheduler.in_flight == 1
+
+@pytest.mark.asyncio
+async def test_release_reconciles_budget_with_actual_usage():
+    clock = FakeClock()
+    scheduler = LLMScheduler(max_concurrency=10, tokens_per_minute=1000, clock=clock)
+
+    await scheduler.acquire(900)
+    scheduler.release(900, used_tokens=100)
+
+    assert scheduler.get_stats()["tokens_available"] == 900
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0)
+    await scheduler.acquire(10)
+    abandoned = asyncio.create_task(scheduler.acquire(10, tenant="gone"))
+    kept = asyncio.create_task(scheduler.acquire(10, tenant="kept"))
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 2
+
+    abandoned.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 1
+
+    scheduler.release(10)
+    await asyncio.wait_for(kept, timeout=1.0)
+    assert scheduler.in_flight == 1
+    assert scheduler.waiting == 0
+
+@pytest.mark.asyncio
+async def test_request_context_supplies_tenant_and_priority():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0)
+    await scheduler.acquire(10)
+
+    with llm_request_context(tenant="alice", priority=BATCH):
+        assert current_request_context() == ("alice", BATCH)
+        waiter = asyncio.create_task(scheduler.acquire(10))
+        await asyncio.sleep(0)
+
+    assert current_request_context() == ("default", INTERACTIVE)
+    assert scheduler.get_stats()["queued_tenants"][BATCH] == {"alice": 1}
+    scheduler.release(10)
+    await waiter
+
+@pytest.mark.asyncio
+async def test_stream_in_context_applies_while_iterating():
+    seen = []
+
+    async def chunks():
+        for i in range(2):
+            seen.append(current_request_context())
+            yield i
+
+    collected = [chunk async for chunk in stream_in_context(chunks(), tenant="bob", priority=BATCH)]
+
+    assert collected == [0, 1]
+    assert seen == [("bob", BATCH), ("bob", BATCH)]
+
+@pytest.mark.asyncio
+async def test_stats_report_depth_and_wait_histogram():
+    scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=0)
+    await run_jobs(scheduler, [(i, "t", BATCH, 10) for i in range(3)], hold=0.02)
+
+    batch = scheduler.get_stats()["classes"][BATCH]
+    assert batch["dispatched"] == 3
+    assert batch["queue_depth"] == 0
+    histogram = batch["wait_seconds"]
+    assert histogram["count"] == 3
+    assert histogram["buckets"]["+Inf"] == 3
+    # The last call waited behind two others
+    assert histogram["sum"] >= 0.04
+
+@pytest.mark.asyncio
+async def test_gateway_admits_calls_through_scheduler():
+    async with FakeLLMProvider(delay=0.05) as provider:
+        scheduler = LLMScheduler(max_concurrency=2, tokens_per_minute=0)
+        gateway = LLMGateway(api_key="test", base_url=provider.base_url, scheduler=scheduler)
+        with llm_request_context(tenant="carol", priority=BATCH):
+            await asyncio.gather(*(
+                gateway.complete([{"role": "user", "content": str(i)}], model="gpt-4")
+                for i in range(6)
+            ))
+
+    assert provider.peak_active <= 2
+    stats = gateway.get_stats()["scheduler"]
+    assert stats["classes"][BATCH]["dispatched"] == 6
+    assert stats["classes"][INTERACTIVE]["dispatched"] == 0
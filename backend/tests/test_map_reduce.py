@@ -0,0 +1,103 @@
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_gateway import LLMGateway
+from app.services.map_reduce import MapReduceGenerator, chunk_source, estimate_tokens
+from tests.fake_llm_provider import FakeLLMProvider
+
+def python_module(functions, body_lines=5, name="f"):
+    parts = ["import os\n"]
+    for i in range(functions):
+        body = "\n".join(f"    x{j} = os.getcwd()  # step {j}" for j in range(body_lines))
+        parts.append(f"@decorator\ndef {name}{i}(arg):\n{body}\n    return arg\n")
+    return "\n".join(parts)
+
+def short_summary(messages):
+    return f"summary of {len(messages[-1]['content'])} chars"
+
+def test_python_chunks_split_between_top_level_definitions():
+    source = python_module(40)
+    chunks = chunk_source("module.py", source, max_tokens=200)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk.text) <= 200 for chunk in chunks)
+    for chunk in chunks[1:]:
+        # Decorators stay attached to their function
+        assert chunk.text.lstrip().startswith("@decorator\ndef ")
+    assert "\n".join(chunk.text for chunk in chunks).split() == source.split()
+
+def test_oversized_definition_is_split_by_lines():
+    source = python_module(1, body_lines=400)
+    chunks = chunk_source("big.py", source, max_tokens=300)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk.text) <= 300 for chunk in chunks)
+    assert chunks[0].start_line == 1 and chunks[-1].end_line == len(source.split("\n"))
+
+def test_js_chunks_split_at_declarations_with_leading_comments():
+    source = "\n".join(
+        f"/**\n * Handler {i}\n */\nexport function handler{i}(req) {{\n  return req.body.value{i};\n}}\n"
+        for i in range(30)
+    )
+    chunks = chunk_source("handlers.js", source, max_tokens=60)
+
+    assert len(chunks) > 1
+    assert all(chunk.text.startswith("/**") for chunk in chunks)
+
+@pytest.mark.asyncio
+async def test_only_changed_chunks_are_resummarized():
+    files = [{"path": f"mod{i}.py", "content": python_module(10, name=f"m{i}_")} for i in range(6)]
+    async with FakeLLMProvider(delay=0.05, respond=short_summary) as provider:
+        generator = MapReduceGenerator(
+            gateway=LLMGateway(api_key="test", base_url=provider.base_url),
+            summary_cache=LLMResponseCache(),
+            prompt_budget=4000,
+            chunk_tokens=250,
+            concurrency=3
+        )
+        first = await generator.condense(files, "an SRS document")
+        first_calls = len(provider.requests)
+
+        files[2] = {"path": "mod2.py", "content": files[2]["content"].replace("return arg", "return arg + 1", 1)}
+        second = await generator.condense(files, "an SRS document")
+
+    chunks = generator.chunk_files(files)
+    assert first_calls == len(chunks)
+    assert len(provider.requests) == first_calls + 1
+    assert generator.chunks_reused == len(chunks) - 1
+    assert provider.peak_active <= 3
+    assert len(second) == len(first)
+
+@pytest.mark.asyncio
+async def test_reduce_merges_until_notes_fit_budget():
+    async with FakeLLMProvider(respond=lambda messages: "x" * 400) as provider:
+        generator = MapReduceGenerator(
+            gateway=LLMGateway(api_key="test", base_url=provider.base_url),
+            summary_cache=LLMResponseCache(),
+            prompt_budget=1000,
+            summary_tokens=100
+        )
+        notes = await generator.reduce(["y" * 400] * 40, "an SDS document", reserved_tokens=200)
+
+    assert sum(estimate_tokens(note) for note in notes) <= 800
+    assert len(provider.requests) > 0
+
+@pytest.mark.asyncio
+async def test_large_upload_prompt_stays_within_budget():
+    snippets = [f"File: mod{i}.py\n```\n{python_module(30, name=f'm{i}_')}\n```" for i in range(8)]
+    async with FakeLLMProvider(respond=short_summary) as provider:
+        service = AIService()
+        service.map_reduce = MapReduceGenerator(
+            gateway=LLMGateway(api_key="test", base_url=provider.base_url),
+            summary_cache=LLMResponseCache(),
+            prompt_budget=3000,
+            chunk_tokens=800
+        )
+        direct = service._build_messages("srs", snippets, "Inventory system", None)
+        messages = await service._prepare_messages("srs", snippets, "Inventory system", None)
+
+    assert sum(estimate_tokens(m["content"]) for m in direct) > 3000
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 3000
+    assert "summary of" in messages[-1]["content"]
+    assert "mod3.py" in messages[-1]["content"]
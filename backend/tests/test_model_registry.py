@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.model_registry import ModelRegistry
+
+class CountingLoader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.loaded = []
+
+    def __call__(self, name):
+        time.sleep(self.delay)
+        self.loaded.append(name)
+        return object()
+
+def test_models_load_lazily_and_are_shared():
+    loader = CountingLoader()
+    registry = ModelRegistry(loader=loader)
+    assert loader.loaded == []
+
+    first = registry.get("all-MiniLM-L6-v2")
+    second = registry.get("all-MiniLM-L6-v2")
+
+    assert first is second
+    assert loader.loaded == ["all-MiniLM-L6-v2"]
+
+def test_concurrent_first_use_loads_once():
+    loader = CountingLoader(delay=0.05)
+    registry = ModelRegistry(loader=loader)
+    threads = [threading.Thread(target=registry.get, args=("model",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.loaded == ["model"]
+
+@pytest.mark.asyncio
+async def test_background_warmup_does_not_block_loop():
+    loader = CountingLoader(delay=0.2)
+    registry = ModelRegistry(loader=loader)
+
+    start = time.perf_counter()
+    task = registry.schedule_warmup(["model"])
+    await asyncio.sleep(0)
+    assert time.perf_counter() - start < 0.1
+    assert "model" in registry.get_stats()["warming"]
+
+    await task
+    assert registry.is_loaded("model")
+    assert registry.schedule_warmup(["model"]) is None
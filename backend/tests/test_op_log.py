@@ -0,0 +1,191 @@
+import asyncio
+import random
+import sqlite3
+
+import pytest
+
+from app.services import websocket_manager as websocket_manager_module
+from app.services.op_log import OpLog, OpLogCommitError
+from app.services.ot_engine import OTEngine, TextOperation
+from app.services.websocket_manager import document_sync
+
+def random_operation(rng, length):
+    position = rng.randint(0, length)
+    deleted = rng.randint(0, min(3, length - position)) if rng.random() < 0.3 else 0
+    return TextOperation().retain(position).insert(rng.choice(["a", "bc", "\n"])).delete(deleted).retain(length - position - deleted)
+
+async def edit(log, document_id, count, seed=0):
+    """Apply ``count`` random edits through the log's session, waiting for them to commit."""
+    rng = random.Random(seed)
+    session = await log.open_session(document_id)
+    committed = []
+    for _ in range(count):
+        applied = session.submit(session.revision, random_operation(rng, len(session.buffer)))
+        committed.append(log.record(document_id, session.revision, applied))
+    await asyncio.gather(*committed)
+    return session
+
+@pytest.mark.asyncio
+async def test_group_commit_and_restore_after_restart(tmp_path):
+    path = str(tmp_path / "ops.db")
+    log = OpLog(path, engine=OTEngine())
+    await log.start()
+    session = await log.open_session("doc")
+
+    async def editor(seed):
+        # Like the WebSocket handler: the next edit waits for the previous one to be durable
+        rng = random.Random(seed)
+        for _ in range(10):
+            applied = session.submit(session.revision, random_operation(rng, len(session.buffer)))
+            await log.record("doc", session.revision, applied)
+
+    await asyncio.gather(*(editor(seed) for seed in range(50)))
+    await log.stop()
+
+    # Edits made while a commit was on disk share the next one
+    assert log.operations_written == 500
+    assert log.commits <= 50
+
+    restarted = OpLog(path, engine=OTEngine(history_limit=100))
+    restored = await restarted.open_session("doc")
+    assert restored.snapshot() == session.snapshot()
+    assert list(restored.history) == list(session.history)[-100:]
+
+@pytest.mark.asyncio
+async def test_compaction_snapshots_and_trims_the_log(tmp_path):
+    path = str(tmp_path / "ops.db")
+    log = OpLog(path, engine=OTEngine(), snapshot_every=100, retain=50)
+    session = await edit(log, "doc", 300)
+
+    assert await log.compact() == 1
+    assert log.store.load_snapshot("doc") == session.snapshot()
+    assert log.store.count("doc") == 50
+    assert log.store.operations_between("doc", 260, 300) == list(session.history)[-40:]
+    assert log.store.operations_between("doc", 200, 300) is None
+    # Nothing new since the snapshot
+    assert await log.compact() == 0
+
+    # Edits after the snapshot are replayed on top of it
+    session = await edit(log, "doc", 30, seed=1)
+    restored = await OpLog(path, engine=OTEngine()).open_session("doc")
+    assert restored.snapshot() == session.snapshot()
+    assert len(restored.history) == 80
+
+@pytest.mark.asyncio
+async def test_reconnecting_client_gets_only_missing_operations(tmp_path, monkeypatch):
+    log = OpLog(str(tmp_path / "ops.db"), engine=OTEngine(history_limit=10), snapshot_every=150, retain=100)
+    monkeypatch.setattr(websocket_manager_module, "op_log", log)
+
+    state = await document_sync("doc", content="# Notes\n")
+    assert state == {"type": "document_state", "document_id": "doc", "version": 0, "content": "# Notes\n"}
+    session = await log.open_session("doc")
+    texts = [str(session.buffer)]
+    rng = random.Random(2)
+    for _ in range(200):
+        applied = session.submit(session.revision, random_operation(rng, len(session.buffer)))
+        log.record("doc", session.revision, applied)
+        texts.append(str(session.buffer))
+    await log.flush()
+    assert await log.compact() == 1
+
+    def caught_up(version):
+        text = texts[version]
+        for operation in message["operations"]:
+            text = TextOperation.from_json(operation).apply(text)
+        return text
+
+    # Within the in-memory history
+    message = await document_sync("doc", 195)
+    assert message["type"] == "catch_up" and len(message["operations"]) == 5
+    assert caught_up(195) == texts[200]
+
+    # Older than the history but still in the trimmed log
+    message = await document_sync("doc", 120)
+    assert (message["from_version"], message["version"], len(message["operations"])) == (120, 200, 80)
+    assert caught_up(120) == texts[200]
+
+    # Trimmed from the log, ahead of the server or malformed: the whole document
+    for version in [50, 201, "7"]:
+        message = await document_sync("doc", version)
+        assert message["type"] == "document_state" and message["content"] == texts[200]
+
+@pytest.mark.asyncio
+async def test_session_is_released_when_the_last_connection_leaves(tmp_path, monkeypatch):
+    engine = OTEngine()
+    log = OpLog(str(tmp_path / "ops.db"), engine=engine)
+    monkeypatch.setattr(websocket_manager_module, "op_log", log)
+    manager = websocket_manager_module.ConnectionManager()
+    first, second = object(), object()
+    await manager.connect(first, "doc", "alice")
+    await manager.connect(second, "doc", "bob")
+    session = await edit(log, "doc", 20)
+
+    await manager.disconnect(first, "doc", "alice")
+    await asyncio.sleep(0)
+    assert "doc" in engine.sessions
+
+    # Queued operations are committed before the session is dropped
+    applied = session.submit(session.revision, TextOperation().retain(len(session.buffer)).insert("!"))
+    log.record("doc", session.revision, applied)
+    await manager.disconnect(second, "doc", "bob")
+    await asyncio.gather(*manager._releases)
+    assert "doc" not in engine.sessions
+
+    restored = await log.open_session("doc")
+    assert restored.snapshot() == session.snapshot()
+
+@pytest.mark.asyncio
+async def test_rejected_operations_fail_without_blocking_other_documents(tmp_path):
+    path = str(tmp_path / "ops.db")
+    engine = OTEngine()
+    log = OpLog(path, engine=engine)
+    await log.start()
+    session = await log.open_session("doc")
+    # Another writer on the same file logs revision 1 of "doc" first
+    await edit(OpLog(path, engine=OTEngine()), "doc", 1)
+
+    failed = log.record("doc", 1, session.submit(0, TextOperation().insert("lost")))
+    other = await log.open_session("other")
+    committed = log.record("other", 1, other.submit(0, TextOperation().insert("ok")))
+    with pytest.raises(OpLogCommitError):
+        await failed
+    await committed
+    await log.stop()
+
+    assert log.operations_failed == 1 and not log._pending
+    # Reopened from what the log holds
+    assert "doc" not in engine.sessions
+    assert (await log.open_session("doc")).revision == 1
+    assert (await OpLog(path, engine=OTEngine()).open_session("other")).snapshot() == (1, "ok")
+
+@pytest.mark.asyncio
+async def test_flush_without_flusher_fails_waiters_instead_of_hanging(tmp_path):
+    log = OpLog(str(tmp_path / "ops.db"), engine=OTEngine())
+    session = await log.open_session("doc")
+
+    def locked(rows):
+        raise sqlite3.OperationalError("database is locked")
+    log.store.append = locked
+    applied = session.submit(0, TextOperation().insert("a"))
+    with pytest.raises(OpLogCommitError):
+        await asyncio.wait_for(log.record("doc", session.revision, applied), 1)
+
+@pytest.mark.asyncio
+async def test_unseen_documents_start_from_their_stored_content(tmp_path):
+    loaded = []
+
+    async def loader(document_id):
+        loaded.append(document_id)
+        return "# Stored\n" if document_id == "saved" else None
+
+    path = str(tmp_path / "ops.db")
+    log = OpLog(path, engine=OTEngine(), content_loader=loader)
+    assert (await log.open_session("saved")).snapshot() == (0, "# Stored\n")
+    assert (await log.open_session("new")).snapshot() == (0, "")
+    assert (await log.open_session("given", "# Given\n")).snapshot() == (0, "# Given\n")
+    assert loaded == ["saved", "new"]
+
+    # Once in the log, the stored content is not read again
+    restarted = OpLog(path, engine=OTEngine(), content_loader=loader)
+    assert (await restarted.open_session("saved")).snapshot() == (0, "# Stored\n")
+    assert loaded == ["saved", "new"]
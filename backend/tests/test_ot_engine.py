@@ -0,0 +1,173 @@
+import json
+import random
+
+import pytest
+
+from app.services.ot_engine import (
+    DocumentSession,
+    OTClient,
+    OTError,
+    Rope,
+    StaleRevisionError,
+    TextOperation,
+    compose,
+    transform,
+)
+from app.services.websocket_manager import ConnectionManager, websocket_manager
+
+def random_operation(rng, text):
+    operation = TextOperation()
+    position = rng.randint(0, len(text))
+    deleted = rng.randint(0, min(5, len(text) - position))
+    operation.retain(position)
+    if rng.random() < 0.7 or not deleted:
+        operation.insert("".join(rng.choice("ab é\n") for _ in range(rng.randint(1, 6))))
+    operation.delete(deleted)
+    operation.retain(len(text) - position - deleted)
+    return operation
+
+def test_transform_converges_and_compose_matches_sequential_apply():
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice("xyz\n") for _ in range(rng.randint(0, 30)))
+        a, b = random_operation(rng, text), random_operation(rng, text)
+        a_prime, b_prime = transform(a, b)
+        assert b_prime.apply(a.apply(text)) == a_prime.apply(b.apply(text))
+
+        after_a = a.apply(text)
+        c = random_operation(rng, after_a)
+        assert compose(a, c).apply(text) == c.apply(after_a)
+
+def test_concurrent_inserts_at_same_position_are_ordered():
+    a = TextOperation().retain(2).insert("A").retain(2)
+    b = TextOperation().retain(2).insert("B").retain(2)
+    a_prime, b_prime = transform(a, b)
+    assert b_prime.apply(a.apply("xxxx")) == "xxABxx"
+    assert a_prime.apply(b.apply("xxxx")) == "xxABxx"
+
+def test_operation_json_validation():
+    assert TextOperation.from_json([3, "ab", -1, 2]).to_json() == [3, "ab", -1, 2]
+    # Normalized: adjacent components merge, inserts go before deletes
+    assert TextOperation.from_json([1, 2, -1, "x"]).to_json() == [3, "x", -1]
+    for bad in ["abc", [0], [True], [1.5], [None], {"retain": 1}]:
+        with pytest.raises(OTError):
+            TextOperation.from_json(bad)
+    with pytest.raises(OTError):
+        TextOperation.from_json([5]).apply("abc")
+
+def test_rope_matches_plain_string():
+    rng = random.Random(1)
+    text = "".join(rng.choice("abc\n") for _ in range(300))
+    rope = Rope(text, chunk_size=16)
+    for _ in range(1000):
+        operation = random_operation(rng, text)
+        text = operation.apply(text)
+        rope.apply(operation)
+        assert len(rope) == len(text)
+    assert str(rope) == text
+    assert rope.chunk_count <= 2 * len(text) // 16 + 2
+
+    rope = Rope("")
+    rope.apply(TextOperation().insert("hello"))
+    rope.apply(TextOperation().delete(5))
+    assert str(rope) == ""
+
+def test_simulated_editors_converge():
+    rng = random.Random(2)
+    session = DocumentSession("doc", "shared document\n", history_limit=10000)
+    clients = [OTClient(0, "shared document\n") for _ in range(25)]
+    to_server = []  # (client index, revision, operation), delivered in order
+    to_clients = [[] for _ in clients]  # ("ack", revision) or ("op", revision, operation)
+
+    def deliver_to_server():
+        index, revision, operation = to_server.pop(0)
+        applied = session.submit(revision, operation)
+        for other, inbox in enumerate(to_clients):
+            inbox.append(("ack", session.revision) if other == index else ("op", session.revision, applied))
+
+    def deliver_to_client(index):
+        message = to_clients[index].pop(0)
+        if message[0] == "ack":
+            pending = clients[index].acknowledge(message[1])
+            if pending:
+                to_server.append((index, *pending))
+        else:
+            clients[index].receive(message[1], message[2])
+
+    for _ in range(3000):
+        action = rng.random()
+        index = rng.randrange(len(clients))
+        if action < 0.4:
+            pending = clients[index].edit(random_operation(rng, clients[index].text))
+            if pending:
+                to_server.append((index, *pending))
+        elif action < 0.6 and to_server:
+            deliver_to_server()
+        elif to_clients[index]:
+            deliver_to_client(index)
+
+    while to_server or any(to_clients):
+        if to_server:
+            deliver_to_server()
+        for index in range(len(clients)):
+            while to_clients[index]:
+                deliver_to_client(index)
+
+    revision, content = session.snapshot()
+    assert session.transforms > 0
+    for client in clients:
+        assert client.outstanding is None and client.buffer is None
+        assert (client.revision, client.text) == (revision, content)
+
+def test_stale_and_invalid_revisions():
+    session = DocumentSession("doc", "abc", history_limit=2)
+    for _ in range(3):
+        session.submit(session.revision, TextOperation().retain(len(session.buffer)).insert("!"))
+
+    with pytest.raises(StaleRevisionError):
+        session.submit(0, TextOperation().retain(3).insert("?"))
+    with pytest.raises(OTError):
+        session.submit(99, TextOperation().retain(6))
+    assert [op.to_json() for op in session.operations_since(1)] == [[4, "!"], [5, "!"]]
+    assert session.snapshot() == (3, "abc!!!")
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+@pytest.mark.asyncio
+async def test_content_update_handler_applies_and_broadcasts_transformed_ops(monkeypatch):
+    from app.services import websocket_manager as websocket_manager_module
+    from app.services.op_log import OpLog
+    from app.services.ot_engine import OTEngine
+
+    engine = OTEngine()
+    monkeypatch.setattr(websocket_manager_module, "op_log", OpLog(":memory:", engine=engine))
+    manager = ConnectionManager()
+    manager.handlers = websocket_manager.handlers
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(alice, "doc", "alice")
+    await manager.connect(bob, "doc", "bob")
+
+    # Both edit revision 0 of an empty document
+    await manager.handle_message(alice, "doc", "alice", json.dumps({"type": "content_update", "changes": ["Hello"], "version": 0}))
+    await manager.handle_message(bob, "doc", "bob", json.dumps({"type": "content_update", "changes": ["World"], "version": 0}))
+    await manager.drain()
+
+    assert engine.get_session("doc").snapshot() == (2, "WorldHello")
+    assert alice.sent[-1] == {"type": "content_update", "user_id": "bob", "changes": ["World", 5], "version": 2, "timestamp": alice.sent[-1]["timestamp"]}
+    assert bob.sent[0]["changes"] == ["Hello"]
+    assert bob.sent[-1]["type"] == "content_update_ack" and bob.sent[-1]["version"] == 2
+
+    await manager.handle_message(bob, "doc", "bob", json.dumps({"type": "content_update", "changes": [99, "x"], "version": 2}))
+    await manager.drain()
+    assert bob.sent[-1]["type"] == "error"
+    await manager.handle_message(bob, "doc", "bob", json.dumps({"type": "get_document_state"}))
+    await manager.drain()
+    assert bob.sent[-1]["content"] == "WorldHello"
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.presence import PresenceAggregator
+from app.services.websocket_manager import ConnectionManager, websocket_manager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+async def connected_manager(users, **presence_options):
+    manager = ConnectionManager()
+    manager.handlers = websocket_manager.handlers
+    manager.presence_batches = PresenceAggregator(manager, **presence_options)
+    sockets = {}
+    for i in range(users):
+        sockets[f"user{i}"] = FakeWebSocket()
+        await manager.connect(sockets[f"user{i}"], "doc", f"user{i}")
+    return manager, sockets
+
+@pytest.mark.asyncio
+async def test_updates_are_merged_into_one_frame_per_tick():
+    manager, sockets = await connected_manager(30, max_hz=20)
+    for position in range(60):
+        for user_id, websocket in sockets.items():
+            await manager.handle_message(websocket, "doc", user_id, json.dumps({"type": "cursor_update", "position": position}))
+    await manager.handle_message(sockets["user3"], "doc", "user3", json.dumps({"type": "presence_update", "status": {"typing": True}}))
+    await asyncio.sleep(0.1)
+    await manager.drain()
+
+    frames = [message for message in sockets["user0"].sent if message["type"] == "presence_batch"]
+    assert len(frames) == 1
+    users = frames[0]["users"]
+    assert len(users) == 30
+    assert users["user7"] == {"cursor": {"position": 59, "user_info": {}}}
+    assert users["user3"]["status"] == {"typing": True}
+
+    stats = manager.presence_batches.get_stats()
+    assert (stats["messages_in"], stats["frames_out"], stats["sends_out"]) == (1801, 1, 30)
+    # Ticker stops once the room goes quiet
+    await asyncio.sleep(0.1)
+    assert manager.presence_batches.tickers == {}
+
+def test_tick_rate_adapts_to_room_size():
+    aggregator = PresenceAggregator(None, max_hz=20, min_hz=2, sends_per_second=2000)
+    assert aggregator.tick_rate(1) == 20
+    assert aggregator.tick_rate(30) == 20
+    assert aggregator.tick_rate(400) == 5
+    assert aggregator.tick_rate(5000) == 2
+
+@pytest.mark.asyncio
+async def test_disabled_batching_broadcasts_each_update():
+    manager, sockets = await connected_manager(2, max_hz=0)
+    await manager.handle_message(sockets["user0"], "doc", "user0", json.dumps({"type": "cursor_update", "position": 4}))
+    await manager.drain()
+
+    assert sockets["user0"].sent == []
+    assert sockets["user1"].sent[0]["type"] == "cursor_update"
+    assert sockets["user1"].sent[0]["position"] == 4
+    assert isinstance(manager.get_connected_users("doc")[0]["last_seen"], str)
+
+class SlowWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.unblock = asyncio.Event()
+
+    async def send_text(self, data):
+        await self.unblock.wait()
+        await super().send_text(data)
+
+@pytest.mark.asyncio
+async def test_client_that_missed_a_frame_gets_the_whole_room():
+    manager = ConnectionManager(queue_size=1)
+    aggregator = manager.presence_batches = PresenceAggregator(manager, max_hz=50)
+    slow, fast = SlowWebSocket(), FakeWebSocket()
+    await manager.connect(slow, "doc", "slow")
+    await manager.connect(fast, "doc", "fast")
+
+    # The first frame blocks the writer, the second fills the queue, the third is dropped
+    for user_id, position in [("alice", 1), ("bob", 1), ("alice", 2)]:
+        aggregator.update("doc", user_id, cursor=position)
+        await asyncio.sleep(0.03)
+    assert manager.outboxes[slow].dropped >= 1
+    slow.unblock.set()
+    await asyncio.sleep(0.1)
+    await manager.drain()
+
+    # Bob stopped moving, yet his cursor reaches the client again
+    assert slow.sent[-1]["users"] == {"alice": {"cursor": 2}, "bob": {"cursor": 1}}
+    assert aggregator.get_stats()["resyncs"] >= 1
+    await asyncio.sleep(0.1)
+    assert aggregator.tickers == {}
+
+@pytest.mark.asyncio
+async def test_no_presence_is_sent_for_a_user_who_left():
+    manager, sockets = await connected_manager(2, max_hz=20)
+    await manager.handle_message(sockets["user0"], "doc", "user0", json.dumps({"type": "cursor_update", "position": 4}))
+    await manager.disconnect(sockets["user0"], "doc", "user0")
+    await asyncio.sleep(0.1)
+    await manager.drain()
+
+    assert sockets["user1"].sent == []
+    assert manager.presence_batches.state == {}
@@ -0,0 +1,120 @@
+import pytest
+
+from app.services import batch_analysis as batch_analysis_module
+from app.services.batch_analysis import BatchAnalyzer
+from app.services.project_manifest import ManifestEntry, ProjectManifestStore
+
+def write_files(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+async def run(analyzer, root, project_id="project-1", documenter=None):
+    records = [record async for record in analyzer.analyze_directory(str(root), project_id=project_id, documenter=documenter)]
+    return {record["path"]: record for record in records[:-1]}, records[-1]
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = BatchAnalyzer(max_workers=2, manifests=ProjectManifestStore(str(tmp_path / "manifests.db")))
+    yield analyzer
+    analyzer.shutdown()
+    analyzer.manifests.close()
+
+def test_store_round_trip_and_delete(tmp_path):
+    store = ProjectManifestStore(str(tmp_path / "manifests.db"))
+    store.upsert("a", [
+        ManifestEntry("x.py", "h1", "2", {"language": "python"}, documentation="Docs"),
+        ManifestEntry("y.py", "h2", "2", {"language": "python"}),
+    ])
+    store.upsert("b", [ManifestEntry("x.py", "h3", "2", {})])
+    store.upsert("a", [ManifestEntry("y.py", "h4", "2", {"language": "python"})])
+    store.delete("a", ["x.py"])
+
+    entries = store.load("a")
+    assert list(entries) == ["y.py"]
+    assert entries["y.py"].version_hash == "h4"
+    assert store.load("b")["x.py"].version_hash == "h3"
+    store.close()
+
+    reopened = ProjectManifestStore(str(tmp_path / "manifests.db"))
+    assert reopened.count("a") == 1
+    reopened.close()
+
+@pytest.mark.asyncio
+async def test_resubmission_only_recomputes_changed_files(tmp_path, analyzer):
+    root = tmp_path / "repo"
+    files = {f"pkg/module_{i}.py": f'def f{i}():\n    """Doc."""\n' for i in range(20)}
+    write_files(root, files)
+
+    first, first_summary = await run(analyzer, root)
+    assert first_summary["recomputed"] == 20
+    assert first_summary["added"] == 20
+    assert first_summary["reused"] == 0
+
+    (root / "pkg/module_3.py").write_text("def changed():\n    pass\n")
+    (root / "pkg/module_4.py").unlink()
+    write_files(root, {"pkg/new.py": "x = 1\n"})
+    second, second_summary = await run(analyzer, root)
+
+    assert second_summary["reused"] == 18
+    assert second_summary["recomputed"] == 2
+    assert second_summary["added"] == 1
+    assert second_summary["modified"] == 1
+    assert second_summary["deleted"] == 1
+    assert second["pkg/module_4.py"]["type"] == "deleted"
+    assert second["pkg/module_0.py"]["reused"]
+    # Reused records carry the stored analysis
+    assert second["pkg/module_0.py"]["code_structure"] == first["pkg/module_0.py"]["code_structure"]
+    assert second["pkg/module_3.py"]["code_structure"]["functions"][0]["name"] == "changed"
+    assert second_summary["files"] == 20
+    assert second_summary["documented"] == 18
+    assert analyzer.manifests.count("project-1") == 20
+
+    # Other projects and runs without a project id do not use the manifest
+    _, other = await run(analyzer, root, project_id="project-2")
+    _, anonymous = await run(analyzer, root, project_id=None)
+    assert other["reused"] == 0
+    assert anonymous["reused"] == 0
+    assert "deleted" not in anonymous
+
+@pytest.mark.asyncio
+async def test_documentation_is_generated_only_for_changed_files(tmp_path, analyzer):
+    root = tmp_path / "repo"
+    write_files(root, {"a.py": "def a():\n    pass\n", "b.py": "def b():\n    pass\n"})
+    calls = []
+
+    async def documenter(content, file_extension, code_structure, previous):
+        calls.append((code_structure["functions"][0]["name"], previous))
+        if "fail" in content:
+            raise RuntimeError("LLM unavailable")
+        return f"Docs for {code_structure['functions'][0]['name']}"
+
+    await run(analyzer, root, documenter=documenter)
+    (root / "b.py").write_text("def b2():\n    pass\n")
+    records, summary = await run(analyzer, root, documenter=documenter)
+
+    assert sorted(calls) == [("a", None), ("b", None), ("b2", "Docs for b")]
+    assert records["a.py"]["documentation"] == "Docs for a"
+    assert records["b.py"]["documentation"] == "Docs for b2"
+    assert summary["reused"] == 1
+
+    # A failed generation is not stored, so the next run retries it
+    (root / "a.py").write_text("def fail():\n    pass\n")
+    records, _ = await run(analyzer, root, documenter=documenter)
+    assert records["a.py"]["documentation_error"] == "LLM unavailable"
+    calls.clear()
+    await run(analyzer, root, documenter=documenter)
+    assert calls == [("fail", None)]
+
+@pytest.mark.asyncio
+async def test_analyzer_version_bump_recomputes_everything(tmp_path, analyzer, monkeypatch):
+    root = tmp_path / "repo"
+    write_files(root, {"a.py": "x = 1\n", "b.py": "y = 2\n"})
+    await run(analyzer, root)
+
+    monkeypatch.setattr(batch_analysis_module, "ANALYZER_VERSION", "test-next")
+    _, summary = await run(analyzer, root)
+
+    assert summary["recomputed"] == 2
+    assert summary["modified"] == 2
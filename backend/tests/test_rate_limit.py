@@ -0,0 +1,145 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, UploadFile
+
+from app.core.rate_limit import (
+    InMemoryRateLimitBackend,
+    RateLimitMiddleware,
+    SQLiteRateLimitBackend,
+)
+from app.core.security import create_access_token
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def build_app(**limits):
+    """App with a costly upload route, a slow route and an unlimited route."""
+    app = FastAPI()
+    app.state.uploads_read = 0
+    gate = asyncio.Event()
+    app.state.gate = gate
+
+    @app.post("/api/v1/documentation/document/upload")
+    async def upload(file: UploadFile = File(...)):
+        await file.read()
+        app.state.uploads_read += 1
+        return {"status": "success"}
+
+    @app.post("/api/v1/ai/generate-document")
+    async def generate():
+        await gate.wait()
+        return {"status": "success"}
+
+    @app.get("/api/v1/documents")
+    async def list_documents():
+        return []
+
+    limits.setdefault("backend", InMemoryRateLimitBackend())
+    app.add_middleware(RateLimitMiddleware, **limits)
+    return app
+
+def client_for(app, host="10.0.0.1"):
+    transport = httpx.ASGITransport(app=app, client=(host, 1234))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+async def upload(client, headers=None):
+    return await client.post(
+        "/api/v1/documentation/document/upload",
+        files={"file": ("spec.md", b"x" * 4096)},
+        headers=headers or {}
+    )
+
+@pytest.mark.asyncio
+async def test_rejects_with_retry_after_before_reading_upload():
+    app = build_app(burst=10, refill_per_second=1.0, max_concurrent=0)
+    async with client_for(app) as client:
+        first = await upload(client)
+        second = await upload(client)
+        third = await upload(client)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert third.status_code == 429
+    # Upload costs 5 and the bucket is empty, so 5 tokens at 1/s are needed
+    assert third.headers["retry-after"] == "5"
+    assert third.json()["status_code"] == 429
+    assert app.state.uploads_read == 2
+
+@pytest.mark.asyncio
+async def test_unlisted_routes_are_not_limited():
+    app = build_app(burst=1, refill_per_second=0.0, max_concurrent=0)
+    async with client_for(app) as client:
+        responses = [await client.get("/api/v1/documents") for _ in range(5)]
+
+    assert all(response.status_code == 200 for response in responses)
+
+@pytest.mark.asyncio
+async def test_users_and_addresses_have_separate_buckets():
+    app = build_app(burst=5, refill_per_second=0.0, max_concurrent=0)
+    alice = {"Authorization": f"Bearer {create_access_token(1)}"}
+    bob = {"Authorization": f"Bearer {create_access_token(2)}"}
+    forged = {"Authorization": "Bearer not-a-token"}
+
+    async with client_for(app) as client:
+        assert (await upload(client, alice)).status_code == 200
+        assert (await upload(client, alice)).status_code == 429
+        assert (await upload(client, bob)).status_code == 200
+        # An invalid token is keyed by address, which still has budget once
+        assert (await upload(client, forged)).status_code == 200
+        assert (await upload(client)).status_code == 429
+
+    async with client_for(app, host="10.0.0.2") as client:
+        assert (await upload(client)).status_code == 200
+
+@pytest.mark.asyncio
+async def test_bucket_refills_over_time():
+    clock = FakeClock()
+    app = build_app(backend=InMemoryRateLimitBackend(clock=clock), burst=5, refill_per_second=1.0, max_concurrent=0)
+    async with client_for(app) as client:
+        assert (await upload(client)).status_code == 200
+        assert (await upload(client)).status_code == 429
+        clock.now += 5
+        assert (await upload(client)).status_code == 200
+
+@pytest.mark.asyncio
+async def test_concurrency_guard_limits_in_flight_requests_per_caller():
+    app = build_app(burst=100, refill_per_second=0.0, max_concurrent=1)
+    async with client_for(app) as client:
+        slow = asyncio.create_task(client.post("/api/v1/ai/generate-document"))
+        await asyncio.sleep(0.05)
+        rejected = await client.post("/api/v1/ai/generate-document")
+        app.state.gate.set()
+        finished = await slow
+        after = await client.post("/api/v1/ai/generate-document")
+
+    assert rejected.status_code == 429
+    assert rejected.json()["detail"] == "Too many concurrent requests"
+    assert finished.status_code == 200
+    assert after.status_code == 200
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    worker_a = SQLiteRateLimitBackend(path)
+    worker_b = SQLiteRateLimitBackend(path)
+
+    assert await worker_a.take("user:1", 6, 10, 0.0) == 0
+    assert await worker_b.take("user:1", 6, 10, 0.0) == float("inf")
+    assert await worker_b.take("user:1", 4, 10, 0.0) == 0
+    assert await worker_a.take("user:2", 6, 10, 0.0) == 0
+    worker_a.close()
+    worker_b.close()
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_is_bounded():
+    backend = InMemoryRateLimitBackend(max_keys=3)
+    for i in range(10):
+        await backend.take(f"ip:{i}", 1, 10, 1.0)
+
+    assert len(backend._buckets) == 3
@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+from app.services.semantic_search import SemanticSearchService
+from app.services.text_index import InvertedIndex, TextSearchService, tokenize
+from app.services.similarity_engine import BatchSimilarityEngine
+from app.services.vector_index import VectorIndex
+from tests.test_similarity_engine import FakeModel
+
+@pytest.fixture
+def search_service():
+    return SemanticSearchService(engine_factory=lambda: BatchSimilarityEngine(FakeModel()))
+
+def test_exact_search_ranks_by_cosine():
+    index = VectorIndex()
+    index.add_many(["x", "y", "xy"], np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32))
+
+    results = index.search(np.array([1.0, 0.1]), k=2)
+
+    assert [item_id for item_id, _ in results] == ["x", "xy"]
+    assert results[0][1] > results[1][1]
+
+def test_remove_and_replace():
+    index = VectorIndex()
+    index.add_many(["a", "b", "c"], np.eye(3, dtype=np.float32))
+    assert index.remove("a")
+    assert not index.remove("a")
+    index.add("c", np.array([1, 0, 0], dtype=np.float32))
+
+    assert len(index) == 2
+    assert index.search(np.array([1.0, 0, 0]), k=1)[0][0] == "c"
+
+def test_ivf_index_recall():
+    """The approximate index finds most exact neighbours of clustered data"""
+    rng = np.random.default_rng(1)
+    centers = rng.standard_normal((20, 32))
+    data = (centers[rng.integers(0, 20, 3000)] + 0.1 * rng.standard_normal((3000, 32))).astype(np.float32)
+    ids = [str(i) for i in range(len(data))]
+
+    exact = VectorIndex(ivf_threshold=10 ** 9)
+    approx = VectorIndex(ivf_threshold=1000, n_probe=8)
+    exact.add_many(ids, data)
+    approx.add_many(ids, data)
+    assert approx.uses_ivf and not exact.uses_ivf
+
+    recall = []
+    for query in data[:50]:
+        truth = {item_id for item_id, _ in exact.search(query, 10)}
+        found = {item_id for item_id, _ in approx.search(query, 10)}
+        recall.append(len(truth & found) / 10)
+    assert np.mean(recall) > 0.9
+
+def test_semantic_search_ranks_project_items(search_service):
+    """Items are indexed incrementally per project and ranked by similarity"""
+    search_service.index_items("p1", [("code_snippets", "s1", "def parse_tokens(): pass")])
+    search_service.index_items("p1", [("comments", "c1", "zzz qqq")])
+    search_service.index_items("p1", [("user_prompts", "u1", "explain the token parser")])
+    search_service.index_items("p2", [("comments", "c2", "token parser")])
+
+    results = search_service.search("p1", "token parser", limit=2)
+
+    assert len(results) == 2
+    assert results[0]["score"] >= results[1]["score"]
+    assert {r["id"] for r in results} == {"s1", "u1"}
+    assert search_service.get_stats("p1") == {"indexed_items": 3, "index_type": "exact"}
+
+def test_semantic_search_kind_filter(search_service):
+    search_service.index_items("p1", [
+        ("code_snippets", "s1", "def parse_tokens(): pass"),
+        ("comments", "c1", "zzz qqq"),
+    ])
+
+    filtered = search_service.search("p1", "token parser", kinds=["comments"])
+    assert [r["id"] for r in filtered] == ["c1"]
+    assert search_service.search("p1", "token parser", kinds=["user_prompts"]) == []
+    assert search_service.search("unknown", "token parser") == []
+
+def test_semantic_search_fills_the_page_with_a_rare_kind(search_service):
+    """Matches of a rare kind ranked far below the others are still found"""
+    search_service.index_items("p1", [("code_snippets", f"s{i}", f"token parser {i}") for i in range(100)])
+    search_service.index_items("p1", [("comments", f"c{i}", f"zzz qqq {i}") for i in range(3)])
+
+    filtered = search_service.search("p1", "token parser", limit=2, kinds=["comments"])
+    assert len(filtered) == 2 and all(r["kind"] == "comments" for r in filtered)
+    assert len(search_service.search("p1", "token parser", limit=5, kinds=["comments"])) == 3
+
+def test_tokenize_splits_identifiers():
+    terms = tokenize("def parseHTTPResponse(raw_bytes): return 42")
+    assert "parsehttpresponse" in terms
+    assert {"parse", "http", "response", "raw_bytes", "raw", "bytes", "42"} <= set(terms)
+
+def test_bm25_ranking_and_pagination():
+    index = InvertedIndex()
+    index.add("a", "token parser parses tokens")
+    index.add("b", "parser")
+    index.add("c", "unrelated lexer code " * 20 + "parser")
+    index.add("d", "nothing relevant here")
+
+    page, has_more = index.search("parser", limit=2)
+    assert [doc_id for doc_id, _ in page] == ["b", "a"]
+    assert has_more
+
+    rest, has_more = index.search("parser", offset=2, limit=2)
+    assert [doc_id for doc_id, _ in rest] == ["c"]
+    assert not has_more
+
+def test_incremental_update_and_delete():
+    index = InvertedIndex()
+    index.add("a", "def load_config(): pass")
+    assert len(index.search("config")[0]) == 1
+
+    index.add("a", "def save_state(): pass")
+    assert index.search("config")[0] == []
+    assert len(index.search("state")[0]) == 1
+
+    assert index.remove("a")
+    assert index.search("state") == ([], False)
+    assert index.postings == {}
+
+def test_text_search_service_kind_filter():
+    service = TextSearchService()
+    service.index_items("p1", [
+        ("code_snippets", "s1", "def parse_tokens(): pass"),
+        ("comments", "c1", "the parser is slow"),
+    ])
+
+    page = service.search("p1", "parse parser", kinds=["comments"])
+    assert [r["id"] for r in page["results"]] == ["c1"]
+    assert not page["has_more"]
+    assert service.search("missing", "parse") == {"results": [], "has_more": False}
+
+def test_threshold_search_matches_exhaustive_bm25():
+    """Early-terminating top-k returns the same ranking as scoring every document"""
+    import random
+    rng = random.Random(3)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta"]
+    index = InvertedIndex()
+    for i in range(500):
+        index.add(str(i), " ".join(rng.choice(words) for _ in range(rng.randint(1, 30))))
+    for i in range(0, 500, 7):
+        index.remove(str(i))
+    for i in range(0, 500, 11):
+        index.add(str(i), "alpha beta " * rng.randint(1, 5))
+
+    exhaustive, _ = index.search("alpha gamma", limit=1000)
+    top, _ = index.search("alpha gamma", limit=10)
+    assert [score for _, score in top] == pytest.approx([score for _, score in exhaustive[:10]])
+
+def test_add_input_survives_semantic_indexing_failure(monkeypatch):
+    """A failing embedding model is logged; the snippet is still stored and keyword-searchable"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    class OfflineTool:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    # Importing app.api builds the documentation router's GrammarService, which
+    # would download and start LanguageTool
+    monkeypatch.setattr("app.services.grammar_service.language_tool_python.LanguageTool", OfflineTool)
+    from app.api import inputs
+
+    def broken_index(*args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(inputs.semantic_search_service, "index_items", broken_index)
+    app = FastAPI()
+    app.include_router(inputs.router)
+    client = TestClient(app)
+
+    response = client.post(
+        "/projects/index-failure/code",
+        json={"language": "python", "content": "def parse_tokens(): pass"}
+    )
+    assert response.status_code == 200
+
+    hits = client.get("/projects/index-failure/search", params={"query": "parse"}).json()
+    assert [s["id"] for s in hits["code_snippets"]] == [response.json()["snippet_id"]]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from app.services.similarity_engine import BatchSimilarityEngine
+
+class FakeModel:
+    """Deterministic bag-of-characters encoder that records encode calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, device=None, convert_to_numpy=True, show_progress_bar=False):
+        self.calls.append({"texts": list(texts), "batch_size": batch_size, "device": device})
+        vectors = np.zeros((len(texts), 26), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text.lower():
+                if 'a' <= char <= 'z':
+                    vectors[row, ord(char) - ord('a')] += 1
+        return vectors
+
+def test_score_encodes_reference_once():
+    """The reference text is encoded once and elements in a single call"""
+    model = FakeModel()
+    engine = BatchSimilarityEngine(model, batch_size=8, device="cpu")
+    elements = [f"def func_{i}(x):" for i in range(300)]
+
+    scores = engine.score(elements, "documentation for func")
+
+    assert scores.shape == (300,)
+    assert len(model.calls) == 2
+    assert model.calls[0]["texts"] == ["documentation for func"]
+    assert model.calls[1]["batch_size"] == 8
+    assert model.calls[1]["device"] == "cpu"
+
+def test_score_matches_pairwise_cosine():
+    """Batched scores match per-pair cosine similarity"""
+    model = FakeModel()
+    engine = BatchSimilarityEngine(model)
+    elements = ["def add(a, b):", "class Parser:", "def zzz():"]
+    documentation = "Adds two numbers and parses input"
+
+    scores = engine.score(elements, documentation)
+
+    doc_vec = model.encode([documentation])[0]
+    for element, score in zip(elements, scores):
+        vec = model.encode([element])[0]
+        expected = vec @ doc_vec / (np.linalg.norm(vec) * np.linalg.norm(doc_vec))
+        assert score == pytest.approx(expected, rel=1e-5)
+
+def test_score_empty_input():
+    engine = BatchSimilarityEngine(FakeModel())
+    assert engine.score([], "docs").shape == (0,)
+
+def test_invalid_batch_size():
+    with pytest.raises(ValueError):
+        BatchSimilarityEngine(FakeModel(), batch_size=0)
@@ -0,0 +1,208 @@
+import json
+import random
+import time
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.models import DocumentVersion
+from app.services.document_service import DocumentCollaboration
+from app.services.version_store import (
+    DELTA,
+    KEYFRAME,
+    VersionChain,
+    apply_delta,
+    compress,
+    compress_legacy_versions,
+    add_document_version,
+    decompress,
+    encode_next_version,
+    expand_versions,
+    get_latest_content,
+    get_version_content,
+    get_version_range,
+    make_delta,
+    renumber_duplicate_versions,
+)
+from app.services import version_store
+
+def edit_history(count, seed=0):
+    rng = random.Random(seed)
+    lines = [f"line {i} of the document\n" for i in range(200)]
+    history = ["".join(lines)]
+    for step in range(count - 1):
+        position = rng.randrange(len(lines))
+        if step % 3 == 0:
+            lines.insert(position, f"inserted at step {step}\n")
+        elif step % 3 == 1 and len(lines) > 1:
+            del lines[position]
+        else:
+            lines[position] = f"changed at step {step} — ünïcode\n"
+        history.append("".join(lines))
+    return history
+
+versions_table = DocumentVersion.__table__
+
+@pytest.fixture
+def db():
+    engine = sa.create_engine("sqlite://")
+    versions_table.create(engine)
+    with Session(engine) as session:
+        yield session
+
+def insert_version(db, document_id, number, **values):
+    db.execute(versions_table.insert().values(
+        id=f"{document_id}-{number}", document_id=document_id, version_number=number, author_id="user-1", **values
+    ))
+
+def test_delta_round_trip():
+    base = "a\nb\nc\nd"
+    for target in ["a\nb\nc\nd", "a\nx\nc\nd\ne", "", "no newline at end", "b\nc\n"]:
+        assert apply_delta(base, make_delta(base, target)) == target
+    assert apply_delta("", make_delta("", "new\n")) == "new\n"
+    for codec in ("zlib", "none"):
+        assert decompress(compress(b"payload", codec)) == b"payload"
+    with pytest.raises(ValueError):
+        compress(b"payload", "lz4")
+
+def test_delta_of_a_large_repetitive_spec_stays_fast():
+    """Tables and checklists repeat the same lines thousands of times"""
+    base = "# Spec\n\n" + "".join(f"| {i % 7} | - [ ] item |\n" if i % 3 else "\n" for i in range(10000))
+    target = base.replace("| 3 | - [ ] item |\n", "| 3 | - [x] item |\n", 40)
+
+    started = time.perf_counter()
+    delta = make_delta(base, target)
+    assert time.perf_counter() - started < 1.0
+    assert apply_delta(base, delta) == target
+    assert len(json.dumps(delta)) < 10000
+
+def test_chain_rebuilds_every_version_with_bounded_deltas():
+    history = edit_history(60)
+    chain = VersionChain(keyframe_interval=10, codec="zlib")
+    for content in history:
+        chain.append(content)
+
+    assert chain.get_stats()["keyframes"] == 6
+    assert chain.stored_bytes() < sum(len(c) for c in history) / 10
+    for index in reversed(range(len(history))):
+        chain._last = None
+        before = chain.deltas_applied
+        assert chain.get(index) == history[index]
+        assert chain.deltas_applied - before <= 9
+
+    # Walking forward applies each delta once
+    chain._last = None
+    before = chain.deltas_applied
+    for index in range(len(history) - 1):
+        chain.get(index)
+    # Versions 0-58 include snapshots at 0, 10, ..., 50
+    assert chain.deltas_applied - before == 53
+    assert chain.get(-1) == history[-1]
+
+def test_large_rewrite_is_stored_as_keyframe():
+    chain = VersionChain(keyframe_interval=100)
+    chain.append("old text\n" * 100)
+    chain.append("".join(f"new line {i}\n" for i in range(100)))
+    chain.append("".join(f"new line {i}\n" for i in range(101)))
+    assert [kind for kind, _ in chain._entries] == [KEYFRAME, KEYFRAME, DELTA]
+
+def test_collaboration_versions_keep_their_content():
+    collaboration = DocumentCollaboration("doc-1")
+    versions = [collaboration.add_version(content, "alice") for content in edit_history(30)]
+
+    assert versions[3].content == edit_history(30)[3]
+    assert versions[3].content_length == len(edit_history(30)[3])
+    assert versions[-1].content == edit_history(30)[-1]
+    assert collaboration.chain.get_stats()["keyframes"] < 30
+
+def test_sql_versions_round_trip(db):
+    history = edit_history(25)
+    for content in history:
+        number, storage, payload = encode_next_version(db, "doc-1", content, keyframe_interval=10)
+        insert_version(db, "doc-1", number, storage=storage, payload=payload)
+    number, storage, payload = encode_next_version(db, "doc-2", "other document")
+    insert_version(db, "doc-2", number, storage=storage, payload=payload)
+
+    storages = db.execute(
+        sa.select(versions_table.c.storage).where(versions_table.c.document_id == "doc-1").order_by(versions_table.c.version_number)
+    ).scalars().all()
+    assert storages.count(KEYFRAME) == 3
+    assert storages[1] == DELTA
+    assert get_version_content(db, "doc-1", 15) == history[14]
+    assert get_version_content(db, "doc-1", 26) is None
+    assert get_version_range(db, "doc-1", 9, 21) == {n: history[n - 1] for n in range(9, 22)}
+    assert get_version_content(db, "doc-2", 1) == "other document"
+    assert get_latest_content(db, "doc-1") == history[-1]
+    assert get_latest_content(db, "doc-3") is None
+
+def test_legacy_rows_are_migrated_and_restored(db):
+    history = edit_history(12)
+    for number, content in enumerate(history, start=1):
+        insert_version(db, "doc-1", number, content=content)
+    # Legacy rows are readable before the migration runs
+    assert get_version_content(db, "doc-1", 5) == history[4]
+
+    connection = db.connection()
+    assert compress_legacy_versions(connection, keyframe_interval=5) == 12
+    rows = connection.execute(sa.text("SELECT storage, content FROM document_versions ORDER BY version_number")).all()
+    assert [storage for storage, _ in rows].count(KEYFRAME) == 3
+    assert all(content is None for _, content in rows)
+    assert get_version_range(db, "doc-1", 1, 12) == {n: history[n - 1] for n in range(1, 13)}
+
+    assert expand_versions(connection) == 12
+    rows = connection.execute(sa.text("SELECT content FROM document_versions ORDER BY version_number")).scalars().all()
+    assert rows == history
+
+def test_add_version_retries_when_its_number_is_taken(db, monkeypatch):
+    # Map only the versions table so the test does not depend on the other models' relationships
+    class Base(sa.orm.DeclarativeBase):
+        pass
+
+    class Version(Base):
+        __table__ = versions_table
+
+    monkeypatch.setattr("app.models.DocumentVersion", Version)
+    history = edit_history(3)
+    add_document_version(db, "doc-1", history[0], "user-1")
+    encode = version_store.encode_next_version
+
+    def racing_encode(session, document_id, content):
+        encoded = encode(session, document_id, content)
+        if racing_encode.first:
+            # Another writer commits the same number between our read and our insert
+            racing_encode.first = False
+            number, storage, payload = encode(session, document_id, history[1])
+            insert_version(session, document_id, number, storage=storage, payload=payload)
+        return encoded
+
+    racing_encode.first = True
+    monkeypatch.setattr(version_store, "encode_next_version", racing_encode)
+    version = add_document_version(db, "doc-1", history[2], "user-1")
+    db.commit()
+
+    assert version.version_number == 3
+    assert get_version_range(db, "doc-1", 1, 3) == {1: history[0], 2: history[1], 3: history[2]}
+
+def test_duplicate_version_numbers_are_split_by_the_migration():
+    # The table as it was before the unique constraint
+    legacy_table = sa.Table("document_versions", sa.MetaData(), *[column.copy() for column in versions_table.columns])
+    engine = sa.create_engine("sqlite://")
+    legacy_table.create(engine)
+    first, second, third = "intro\nbody\n", "intro\nbody\nfirst edit\n", "intro\nsecond edit\nbody\n"
+    with engine.begin() as connection:
+        db = Session(bind=connection)
+        insert_version(db, "doc-1", 1, storage=KEYFRAME, payload=compress(first.encode()))
+        # Two concurrent writers both encoded version 2 against version 1
+        for suffix, content in (("a", second), ("b", third)):
+            storage, payload = version_store.encode_version(first, content, 1, keyframe_interval=10)
+            db.execute(legacy_table.insert().values(
+                id=f"doc-1-2{suffix}", document_id="doc-1", version_number=2, author_id="user-1",
+                storage=storage, payload=payload
+            ))
+        later = "intro\nthird edit\nbody\n"
+        number, storage, payload = encode_next_version(db, "doc-1", later, keyframe_interval=10)
+        insert_version(db, "doc-1", number, storage=storage, payload=payload)
+
+        assert renumber_duplicate_versions(connection, keyframe_interval=10) == 1
+        assert get_version_range(db, "doc-1", 1, 4) == {1: first, 2: second, 3: third, 4: later}
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import websocket_manager as websocket_manager_module
+from app.services.op_log import OpLog
+from app.services.ot_engine import OTEngine
+from app.services.websocket_manager import LAGGING_CLOSE_CODE, ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.closed = None
+        self.unblock = asyncio.Event()
+        if not blocked:
+            self.unblock.set()
+
+    async def send_text(self, data):
+        await self.unblock.wait()
+        self.sent.append(data)
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code=1000, reason=""):
+        self.closed = code
+
+@pytest.mark.asyncio
+async def test_stuck_client_does_not_delay_others():
+    manager = ConnectionManager(queue_size=1000)
+    stuck = FakeWebSocket(blocked=True)
+    clients = [FakeWebSocket() for _ in range(20)]
+    await manager.connect(stuck, "doc", "stuck")
+    for i, client in enumerate(clients):
+        await manager.connect(client, "doc", f"user{i}")
+
+    for n in range(100):
+        await manager.broadcast("doc", {"type": "content_update", "version": n})
+    await asyncio.wait_for(asyncio.gather(*(manager.outboxes[client].drain() for client in clients)), 1)
+
+    for client in clients:
+        assert [json.loads(text)["version"] for text in client.sent] == list(range(100))
+        # Serialized once: every client got the same string objects
+        assert all(a is b for a, b in zip(client.sent, clients[0].sent))
+    assert stuck.sent == []
+    assert manager.get_stats()["max_queued"] == 99
+
+@pytest.mark.asyncio
+async def test_full_outbox_coalesces_drops_or_disconnects():
+    manager = ConnectionManager(queue_size=3)
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow, "doc", "slow")
+
+    await manager.broadcast("doc", {"type": "comment", "id": 1})  # taken by the writer, blocked in send
+    await asyncio.sleep(0)
+    for position in range(5):
+        await manager.broadcast("doc", {"type": "cursor_update", "user_id": "alice", "position": position})
+    await manager.broadcast("doc", {"type": "cursor_update", "user_id": "bob", "position": 0})
+    await manager.broadcast("doc", {"type": "comment", "id": 2})
+    await manager.broadcast("doc", {"type": "user_joined", "user_id": "carol"})
+
+    stats = manager.get_stats()
+    assert (stats["queued"], stats["coalesced"], stats["dropped"]) == (3, 4, 1)
+    slow.unblock.set()
+    await manager.drain()
+    assert [json.loads(text).get("position") for text in slow.sent] == [None, 4, 0, None]
+
+    # A message that has to arrive but does not fit: the client must reconnect and catch up
+    slow.unblock.clear()
+    for n in range(5):
+        await manager.broadcast("doc", {"type": "content_update", "version": n})
+    await asyncio.sleep(0)
+    assert slow.closed == LAGGING_CLOSE_CODE
+    assert "doc" not in manager.active_connections
+    assert manager.get_stats()["lag_disconnects"] == 1
+
+@pytest.mark.asyncio
+async def test_lagging_client_is_disconnected():
+    manager = ConnectionManager(queue_size=100, max_lag=0.05)
+    slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+    await manager.connect(slow, "doc", "slow")
+    await manager.connect(fast, "doc", "fast")
+
+    await manager.broadcast("doc", {"type": "content_update", "version": 1})
+    await manager.broadcast("doc", {"type": "content_update", "version": 2})
+    await asyncio.sleep(0.1)
+    await manager.broadcast("doc", {"type": "content_update", "version": 3})
+    await asyncio.sleep(0)
+
+    assert slow.closed == LAGGING_CLOSE_CODE
+    assert list(manager.active_connections["doc"]) == ["fast"]
+    await manager.drain()
+    assert len(fast.sent) == 3
+
+@pytest.mark.asyncio
+async def test_stale_disconnect_keeps_the_reconnected_socket():
+    manager = ConnectionManager()
+    old, new = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(old, "doc", "alice")
+    await manager.connect(new, "doc", "alice")
+    await manager.disconnect(old, "doc", "alice")
+
+    assert manager.active_connections["doc"]["alice"] is new
+    await manager.send(new, {"type": "ping"})
+    await manager.drain()
+    assert json.loads(new.sent[-1]) == {"type": "ping"}
+
+@pytest.mark.asyncio
+async def test_job_channels_have_no_document(monkeypatch):
+    engine = OTEngine()
+    monkeypatch.setattr(websocket_manager_module, "op_log", OpLog(":memory:", engine=engine))
+    manager = ConnectionManager()
+    manager.handlers = websocket_manager_module.websocket_manager.handlers
+    client = FakeWebSocket()
+    await manager.connect(client, "job:1", "alice")
+
+    for message in [{"type": "content_update", "changes": ["a"], "version": 0}, {"type": "sync"}]:
+        await manager.handle_message(client, "job:1", "alice", json.dumps(message))
+    await manager.outboxes[client].drain()
+
+    assert all("only valid on document channels" in json.loads(text)["error"] for text in client.sent)
+    assert len(client.sent) == 2 and not engine.sessions